@@ -1,8 +1,9 @@
 import logging
 import json
-import re
 from lxml import etree
-from openai import OpenAI
+
+from llm_json import parse_json
+from parse_docx import parse_xml
 
 # --- 日志配置 ---
 logging.basicConfig(
@@ -27,16 +28,23 @@ class WordSemanticParser:
             'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main',
             'w14': 'http://schemas.microsoft.com/office/word/2010/wordml'
         }
-        # 初始化 OpenAI 客户端
-        self.client = OpenAI(
-            api_key=LLM_CONFIG["api_key"],
-            base_url=LLM_CONFIG["base_url"]
-        )
+        self._client = None
+
+    @property
+    def client(self):
+        """OpenAI 客户端，首次调用模型时才导入SDK并创建"""
+        if self._client is None:
+            from openai import OpenAI
+            self._client = OpenAI(
+                api_key=LLM_CONFIG["api_key"],
+                base_url=LLM_CONFIG["base_url"]
+            )
+        return self._client
 
     def get_raw_candidates(self):
         """第一阶段：从 XML 中提取所有包含下划线或占位符的候选段落"""
         try:
-            tree = etree.parse(self.xml_path)
+            tree = parse_xml(self.xml_path)
             logger.info(f"解析 XML 成功: {self.xml_path}")
         except Exception as e:
             logger.error(f"解析 XML 失败: {e}")
@@ -119,9 +127,8 @@ class WordSemanticParser:
             )
             
             content = response.choices[0].message.content
-            # 清洗模型可能返回的 Markdown 代码块标签
-            clean_json = re.sub(r'```json\s*|\s*```', '', content).strip()
-            result = json.loads(clean_json)
+            # 容错解析：代码块、前后说明文字、尾随逗号、截断等
+            result = parse_json(content, {"type": "array"})
             logger.info("模型响应解析成功")
             return result
 
@@ -1,14 +1,19 @@
 from lxml import etree
-from openai import OpenAI
 import json
+import os
 import re
 
+from parse_docx import is_docx, replace_part
+from table_model import load_tables
+
 # ------------------------------
 # 解析空单元格 + 获取上下文 label
 # ------------------------------
 def find_empty_cells_with_context(xml_file):
     """
     解析 Word XML 表格，获取空单元格及上下文 label。
+    xml_file 可以是 document.xml，也可以直接是 docx 文件。
+    基于 table_model 的逻辑网格：合并单元格只计一次，有标题行时按列标题推断 label。
     返回格式：
     [
         {
@@ -17,46 +22,17 @@ def find_empty_cells_with_context(xml_file):
             "cell_index": 1,
             "label": "投标人名称",
             "full_label": "投标人名称",  # 可根据上下文生成完整 label
-            "text": ""
+            "text": "",
+            "header": "",               # 列标题（无标题行时为空）
+            "grid_col": 1, "col_span": 1, "row_span": 1
         },
         ...
     ]
     """
-    ns = {'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'}
-    tree = etree.parse(xml_file)
-    root = tree.getroot()
-
+    _, tables = load_tables(xml_file)
     results = []
-
-    tables = root.xpath("//w:tbl", namespaces=ns)
-    for t_index, table in enumerate(tables):
-        rows = table.xpath(".//w:tr", namespaces=ns)
-        for r_index, row in enumerate(rows):
-            cells = row.xpath(".//w:tc", namespaces=ns)
-            row_labels = []
-            for c_index, cell in enumerate(cells):
-                texts = cell.xpath(".//w:t", namespaces=ns)
-                cell_text = "".join([t.text for t in texts if t.text]).strip()
-                row_labels.append(cell_text)
-
-            # 再遍历一次填充空单元格信息
-            for c_index, cell in enumerate(cells):
-                texts = cell.xpath(".//w:t", namespaces=ns)
-                cell_text = "".join([t.text for t in texts if t.text]).strip()
-
-                if cell_text == "" and c_index > 0:
-                    # 左邻单元格文本
-                    label = row_labels[c_index - 1]
-                    # 上下文完整 label，可加入整行信息区分同名字段
-                    context_label = "_".join([l for l in row_labels[:c_index] if l.strip()])
-                    results.append({
-                        "table_index": t_index,
-                        "row_index": r_index,
-                        "cell_index": c_index,
-                        "label": label,
-                        "full_label": context_label,
-                        "text": cell_text
-                    })
+    for table in tables:
+        results.extend(table.empty_cells())
     return results
 
 # ------------------------------
@@ -86,35 +62,29 @@ def fill_cell(cell, value):
 # 填充表格函数（使用 full_label）
 # ------------------------------
 def fill_table_cells_by_label(xml_file, fill_dict, output_file=None):
-    ns = {'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'}
-    tree = etree.parse(xml_file)
-    root = tree.getroot()
-
-    tables = root.xpath("//w:tbl", namespaces=ns)
-    for t_index, table in enumerate(tables):
-        rows = table.xpath(".//w:tr", namespaces=ns)
-        for r_index, row in enumerate(rows):
-            cells = row.xpath(".//w:tc", namespaces=ns)
-            row_labels = []
-            for c_index, cell in enumerate(cells):
-                texts = cell.xpath(".//w:t", namespaces=ns)
-                cell_text = "".join([t.text for t in texts if t.text]).strip()
-                row_labels.append(cell_text)
-
-            for c_index, cell in enumerate(cells):
-                texts = cell.xpath(".//w:t", namespaces=ns)
-                cell_text = "".join([t.text for t in texts if t.text]).strip()
-
-                if cell_text == "" and c_index > 0:
-                    # 左邻单元格
-                    label = row_labels[c_index - 1]
-                    # 上下文完整 label
-                    full_label = "_".join([l for l in row_labels[:c_index] if l.strip()])
-                    if full_label in fill_dict:
-                        fill_cell(cell, fill_dict[full_label])
+    """
+    按 full_label 填充空单元格（纵向合并的单元格只填起始单元格）
+
+    :param xml_file: document.xml 或 docx 路径
+    :param fill_dict: {full_label: 值}
+    :param output_file: 输出路径，默认覆盖输入；为docx时直接写回docx
+    """
+    tree, tables = load_tables(xml_file)
+    for table in tables:
+        for cell in table.empty_cells():
+            if cell['full_label'] in fill_dict:
+                fill_cell(table.cell_element(cell['row_index'], cell['cell_index']), fill_dict[cell['full_label']])
 
     if output_file is None:
         output_file = xml_file
+    if is_docx(output_file):
+        # 输入为docx时直接写回docx，不生成中间XML
+        if not is_docx(xml_file):
+            raise ValueError(f"输出为docx时输入也必须是docx: {xml_file}")
+        tmp_file = output_file + '.tmp'
+        replace_part(xml_file, tmp_file, tree)
+        os.replace(tmp_file, output_file)
+        return tree
     tree.write(output_file, encoding="utf-8", xml_declaration=True, pretty_print=True)
     return tree
 
@@ -125,6 +95,8 @@ def normalize_labels_with_llm_openai(table_full_labels, user_fields, api_key, ba
     """
     使用 OpenAI LLM 将用户字段归一化到表格 full_label（上下文 label）
     """
+    from openai import OpenAI
+
     client = OpenAI(api_key=api_key, base_url=base_url)
 
     user_field_keys = list(user_fields.keys())
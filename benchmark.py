@@ -0,0 +1,390 @@
+"""
+基准测试
+用合成招标文件测量各处理阶段的耗时与内存，结果写为JSON便于版本间对比
+
+用法:
+    python benchmark.py                         # 10/100/1000 页
+    python benchmark.py --sizes 10 100 --repeat 3
+    python benchmark.py --compare old.json new.json
+    python benchmark.py --import-budget         # 检查 split/merge/pack 的导入耗时预算
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+from synthetic_tender import TenderSpec, generate_tender
+from workflow_metrics import format_mb, peak_rss_kb
+
+DEFAULT_SIZES = [10, 100, 1000]
+
+# 纯XML命令 → (入口模块, 导入耗时预算毫秒)，用 -X importtime 测量
+IMPORT_BUDGETS = {
+    'split': ('split_pages', 60),
+    'merge': ('merge_pages', 60),
+    'pack': ('xml_to_docx', 60),
+}
+# 纯XML命令不应加载的重量级依赖
+HEAVY_MODULES = ('openai', 'pydantic', 'httpx', 'requests', 'anthropic')
+
+# 各阶段在工作目录中使用的固定文件名
+TENDER_DOCX = 'tender.docx'
+DOCUMENT_XML = 'document.xml'
+PAGES_DIR = 'pages'
+MERGED_XML = 'merged.xml'
+OUTPUT_DOCX = 'output.docx'
+
+
+def _stage_docx_to_xml(workdir: str) -> Dict[str, Any]:
+    from parse_docx import docx_to_xml
+    docx_to_xml(os.path.join(workdir, TENDER_DOCX), os.path.join(workdir, DOCUMENT_XML))
+    return {'bytes': os.path.getsize(os.path.join(workdir, DOCUMENT_XML))}
+
+
+def _stage_split(workdir: str) -> Dict[str, Any]:
+    from split_pages import split_word_by_pages
+    pages_dir = os.path.join(workdir, PAGES_DIR)
+    shutil.rmtree(pages_dir, ignore_errors=True)
+    # 直接从docx流式读取 document.xml
+    split_word_by_pages(os.path.join(workdir, TENDER_DOCX), pages_dir)
+    return {'pages': len(glob.glob(os.path.join(pages_dir, 'page_*.xml')))}
+
+
+def _stage_analyze(workdir: str) -> Dict[str, Any]:
+    from process_with_llm import XMLPageAnalyzer
+    slots = 0
+    page_files = glob.glob(os.path.join(workdir, PAGES_DIR, 'page_*.xml'))
+    for page_file in page_files:
+        info = XMLPageAnalyzer(page_file).get_page_info()
+        slots += len(info['blank_fields']) + len(info['placeholder_fields'])
+    return {'pages': len(page_files), 'slots': slots}
+
+
+def _stage_empty_cells(workdir: str) -> Dict[str, Any]:
+    from analyze_table import find_empty_cells_with_context
+    return {'cells': len(find_empty_cells_with_context(os.path.join(workdir, TENDER_DOCX)))}
+
+
+def _stage_merge(workdir: str) -> Dict[str, Any]:
+    from merge_pages import merge_pages
+    merge_pages(os.path.join(workdir, PAGES_DIR), os.path.join(workdir, MERGED_XML))
+    return {'bytes': os.path.getsize(os.path.join(workdir, MERGED_XML))}
+
+
+def _stage_xml_to_docx(workdir: str) -> Dict[str, Any]:
+    from xml_to_docx import xml_to_docx
+    cwd = os.getcwd()
+    # xml_to_docx 在当前目录创建临时目录，切换到工作目录避免污染仓库
+    os.chdir(workdir)
+    try:
+        ok = xml_to_docx(MERGED_XML, OUTPUT_DOCX, TENDER_DOCX)
+    finally:
+        os.chdir(cwd)
+    return {'ok': bool(ok), 'bytes': os.path.getsize(os.path.join(workdir, OUTPUT_DOCX)) if ok else 0}
+
+
+# 阶段名 → (预先导入的模块, 执行函数)；按顺序执行，后一阶段依赖前一阶段的输出
+STAGES: Dict[str, tuple] = {
+    'docx_to_xml': ('parse_docx', _stage_docx_to_xml),
+    'split_word_by_pages': ('split_pages', _stage_split),
+    'XMLPageAnalyzer': ('process_with_llm', _stage_analyze),
+    'find_empty_cells_with_context': ('analyze_table', _stage_empty_cells),
+    'merge_pages': ('merge_pages', _stage_merge),
+    'xml_to_docx': ('xml_to_docx', _stage_xml_to_docx),
+}
+
+
+def run_stage(stage: str, workdir: str, trace_memory: bool = False) -> Dict[str, Any]:
+    """
+    在当前进程中执行单个阶段并测量（由子进程调用，保证每次测量都是干净的进程）
+    """
+    module_name, func = STAGES[stage]
+    __import__(module_name)
+
+    if trace_memory:
+        import tracemalloc
+        tracemalloc.start()
+
+    rss_before = peak_rss_kb(children=False)
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        counters = func(workdir)
+
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    peak_rss = peak_rss_kb(children=False)
+
+    result = {
+        'wall_s': round(wall, 4),
+        'cpu_s': round(cpu, 4),
+        'peak_rss_kb': peak_rss,
+        'rss_delta_kb': None if peak_rss is None else peak_rss - rss_before,
+        'counters': counters,
+    }
+    if trace_memory:
+        import tracemalloc
+        result['tracemalloc_peak_kb'] = tracemalloc.get_traced_memory()[1] // 1024
+        tracemalloc.stop()
+    return result
+
+
+def _run_stage_subprocess(stage: str, workdir: str, trace_memory: bool) -> Dict[str, Any]:
+    cmd = [sys.executable, os.path.abspath(__file__), '--run-stage', stage, '--workdir', workdir]
+    if trace_memory:
+        cmd.append('--tracemalloc')
+    proc = subprocess.run(cmd, capture_output=True, text=True,
+                          cwd=os.path.dirname(os.path.abspath(__file__)))
+    if proc.returncode != 0:
+        lines = proc.stderr.strip().splitlines()
+        return {'error': lines[-1] if lines else f'exit code {proc.returncode}'}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def _summarize(samples: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """多次重复取中位数耗时、最大内存（内存不可用时为 None）"""
+    ok = [s for s in samples if 'error' not in s]
+    if not ok:
+        return {'error': samples[-1]['error']}
+    rss = [s['peak_rss_kb'] for s in ok if s['peak_rss_kb'] is not None]
+    deltas = [s['rss_delta_kb'] for s in ok if s['rss_delta_kb'] is not None]
+    summary = {
+        'wall_s': round(statistics.median(s['wall_s'] for s in ok), 4),
+        'wall_min_s': round(min(s['wall_s'] for s in ok), 4),
+        'cpu_s': round(statistics.median(s['cpu_s'] for s in ok), 4),
+        'peak_rss_kb': max(rss) if rss else None,
+        'rss_delta_kb': max(deltas) if deltas else None,
+        'counters': ok[-1]['counters'],
+        'repeat': len(ok),
+    }
+    if 'tracemalloc_peak_kb' in ok[-1]:
+        summary['tracemalloc_peak_kb'] = max(s['tracemalloc_peak_kb'] for s in ok)
+    return summary
+
+
+def measure_import_time(module: str, repeat: int = 5) -> Dict[str, Any]:
+    """
+    用 python -X importtime 测量模块的导入耗时（新进程，取中位数）
+
+    :param module: 模块名
+    :param repeat: 重复次数
+    :return: {'cumulative_ms', 'process_ms', 'heavy_modules', 'top_self_ms'}
+    """
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    cumulative, process, last_lines = [], [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                              capture_output=True, text=True, cwd=cwd)
+        process.append((time.perf_counter() - start) * 1000)
+        if proc.returncode != 0:
+            lines = proc.stderr.strip().splitlines()
+            return {'error': lines[-1] if lines else f'exit code {proc.returncode}'}
+
+        # 每行格式: "import time:  self [us] | cumulative | imported package"
+        last_lines = []
+        for line in proc.stderr.splitlines():
+            if not line.startswith('import time:') or 'imported package' in line:
+                continue
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            last_lines.append((name.strip(), int(self_us), int(cumulative_us)))
+        cumulative.append(next(c for n, _, c in reversed(last_lines) if n == module) / 1000)
+
+    loaded = {name.split('.')[0] for name, _, _ in last_lines}
+    top_self = sorted(last_lines, key=lambda x: x[1], reverse=True)[:5]
+    return {
+        'cumulative_ms': round(statistics.median(cumulative), 2),
+        'process_ms': round(statistics.median(process), 2),
+        'heavy_modules': sorted(loaded.intersection(HEAVY_MODULES)),
+        'top_self_ms': {name: round(self_us / 1000, 2) for name, self_us, _ in top_self},
+    }
+
+
+def check_import_budgets(repeat: int = 5, budgets: Dict[str, tuple] = None) -> Dict[str, Any]:
+    """
+    检查各命令入口模块的导入耗时是否在预算内，且未加载重量级依赖
+
+    :return: {命令: 测量结果 + budget_ms + ok}
+    """
+    budgets = budgets or IMPORT_BUDGETS
+    results = {}
+    print(f"\n导入耗时 (-X importtime, {repeat} 次中位数)")
+    for command, (module, budget_ms) in budgets.items():
+        result = measure_import_time(module, repeat)
+        result.update({'module': module, 'budget_ms': budget_ms})
+        if 'error' in result:
+            result['ok'] = False
+            print(f"  ✗ {command:<8} {module}: {result['error']}")
+        else:
+            result['ok'] = result['cumulative_ms'] <= budget_ms and not result['heavy_modules']
+            mark = '✓' if result['ok'] else '✗'
+            heavy = f"  加载了 {', '.join(result['heavy_modules'])}" if result['heavy_modules'] else ''
+            print(f"  {mark} {command:<8} {module:<16} {result['cumulative_ms']:>8.1f} ms "
+                  f"(预算 {budget_ms} ms, 进程启动 {result['process_ms']:.0f} ms){heavy}")
+        results[command] = result
+    return results
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ''
+
+
+def run_benchmarks(sizes: List[int] = DEFAULT_SIZES,
+                   stages: List[str] = None,
+                   repeat: int = 1,
+                   trace_memory: bool = False,
+                   spec_overrides: Dict[str, Any] = None,
+                   output_file: str = None) -> Dict[str, Any]:
+    """
+    运行基准测试
+
+    :param sizes: 合成文档页数列表
+    :param stages: 要测量的阶段（默认全部）
+    :param repeat: 每个阶段重复次数（取中位数）
+    :param trace_memory: 是否同时用 tracemalloc 统计Python对象内存（有额外开销）
+    :param spec_overrides: 覆盖 TenderSpec 的其他参数
+    :param output_file: 结果JSON路径
+    :return: 结果字典
+    """
+    stages = stages or list(STAGES)
+    try:
+        from lxml import etree
+        lxml_version = '.'.join(map(str, etree.LXML_VERSION))
+    except ImportError:
+        lxml_version = ''
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'git_revision': _git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'lxml': lxml_version,
+        },
+        'params': {'sizes': sizes, 'stages': stages, 'repeat': repeat, 'spec': spec_overrides or {}},
+        'imports': check_import_budgets(),
+        'results': [],
+    }
+
+    for pages in sizes:
+        spec = TenderSpec(pages=pages, **(spec_overrides or {}))
+        workdir = tempfile.mkdtemp(prefix=f'bench_{pages}_')
+        try:
+            gen_start = time.perf_counter()
+            generate_tender(os.path.join(workdir, TENDER_DOCX), spec)
+            print(f"\n【{pages} 页】合成文档已生成 ({time.perf_counter() - gen_start:.2f}s, "
+                  f"{os.path.getsize(os.path.join(workdir, TENDER_DOCX)) // 1024} KB)")
+
+            for stage in stages:
+                samples = [_run_stage_subprocess(stage, workdir, trace_memory) for _ in range(repeat)]
+                summary = _summarize(samples)
+                report['results'].append({'pages': pages, 'stage': stage, **summary})
+
+                if 'error' in summary:
+                    print(f"  ✗ {stage}: {summary['error']}")
+                else:
+                    print(f"  ✓ {stage:<32} {summary['wall_s']:>9.3f}s  cpu {summary['cpu_s']:>8.3f}s  "
+                          f"peak {format_mb(summary['peak_rss_kb']):>9}")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if output_file is None:
+        os.makedirs('benchmark_results', exist_ok=True)
+        output_file = os.path.join('benchmark_results', f"bench_{datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n✓ 结果已保存: {output_file}")
+
+    return report
+
+
+def compare_results(baseline_file: str, current_file: str):
+    """对比两次基准测试结果"""
+    with open(baseline_file, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(current_file, 'r', encoding='utf-8') as f:
+        current = json.load(f)
+
+    base_index = {(r['pages'], r['stage']): r for r in baseline['results']}
+
+    print(f"基线: {baseline_file} ({baseline['meta'].get('git_revision', '')})")
+    print(f"当前: {current_file} ({current['meta'].get('git_revision', '')})\n")
+    print(f"{'页数':>6}  {'阶段':<32} {'基线(s)':>10} {'当前(s)':>10} {'倍数':>7}  {'内存':>16}")
+
+    for row in current['results']:
+        base = base_index.get((row['pages'], row['stage']))
+        if base is None or 'error' in base or 'error' in row:
+            continue
+        ratio = row['wall_s'] / base['wall_s'] if base['wall_s'] else float('inf')
+        memory = f"{format_mb(base.get('peak_rss_kb'))} → {format_mb(row.get('peak_rss_kb'))}"
+        print(f"{row['pages']:>6}  {row['stage']:<32} {base['wall_s']:>10.3f} {row['wall_s']:>10.3f} "
+              f"{ratio:>6.2f}x  {memory:>16}")
+
+    base_imports = baseline.get('imports', {})
+    current_imports = current.get('imports', {})
+    shared = [c for c in current_imports if c in base_imports
+              and 'error' not in current_imports[c] and 'error' not in base_imports[c]]
+    if shared:
+        print(f"\n{'命令':<8} {'模块':<16} {'基线(ms)':>10} {'当前(ms)':>10}")
+        for command in shared:
+            print(f"{command:<8} {current_imports[command]['module']:<16} "
+                  f"{base_imports[command]['cumulative_ms']:>10.1f} {current_imports[command]['cumulative_ms']:>10.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Word 处理流程基准测试')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='合成文档页数')
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=None, help='要测量的阶段')
+    parser.add_argument('--repeat', type=int, default=1, help='每个阶段重复次数')
+    parser.add_argument('--tracemalloc', action='store_true', help='同时统计Python内存分配峰值')
+    parser.add_argument('--tables-per-page', type=int, default=None)
+    parser.add_argument('--table-rows', type=int, default=None)
+    parser.add_argument('--images', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('-o', '--output', default=None, help='结果JSON路径')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'), help='对比两份结果')
+    parser.add_argument('--import-budget', action='store_true',
+                        help='只检查 split/merge/pack 的导入耗时预算，超出时返回非零')
+    parser.add_argument('--run-stage', choices=list(STAGES), help=argparse.SUPPRESS)
+    parser.add_argument('--workdir', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_stage:
+        print(json.dumps(run_stage(args.run_stage, args.workdir, args.tracemalloc)))
+        return 0
+
+    if args.compare:
+        compare_results(*args.compare)
+        return 0
+
+    if args.import_budget:
+        results = check_import_budgets(max(args.repeat, 5))
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+        return 0 if all(r['ok'] for r in results.values()) else 1
+
+    overrides = {name: getattr(args, name) for name in ('tables_per_page', 'table_rows', 'images', 'seed')
+                 if getattr(args, name) is not None}
+    run_benchmarks(args.sizes, args.stages, args.repeat, args.tracemalloc, overrides, args.output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
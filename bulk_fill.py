@@ -0,0 +1,206 @@
+"""
+批量套打：从 JSONL / CSV 流式读取记录，每条记录生成一份Word文档
+模板只解析一次，工作进程通过 fork 写时复制共享
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+import zipfile
+from collections import deque
+from typing import Any, Dict, Iterator, Optional
+
+from fill_engine import CompiledTemplate, load_compiled_template
+
+# 进程级共享模板：父进程编译后 fork，子进程直接继承
+_TEMPLATE: Optional[CompiledTemplate] = None
+_OPTIONS: Dict[str, Any] = {}
+
+
+def iter_records(records_file: str) -> Iterator[Dict[str, Any]]:
+    """
+    流式读取数据记录
+
+    :param records_file: .jsonl / .ndjson（每行一个JSON对象）、.csv 或 .json（对象数组）
+    """
+    ext = os.path.splitext(records_file)[1].lower()
+
+    if ext == '.csv':
+        with open(records_file, 'r', encoding='utf-8-sig', newline='') as f:
+            for row in csv.DictReader(f):
+                yield row
+    elif ext == '.json':
+        with open(records_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        yield from (data if isinstance(data, list) else [data])
+    else:
+        with open(records_file, 'r', encoding='utf-8') as f:
+            for line_num, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"{records_file} 第{line_num}行不是有效的JSON: {e}")
+
+
+def _output_name(index: int, record: Dict[str, Any], name_field: Optional[str]) -> str:
+    """生成输出文件名"""
+    if name_field and record.get(name_field):
+        name = re.sub(r'[\\/:*?"<>|\s]+', '_', str(record[name_field])).strip('_')
+        return f'{index:05d}_{name}.docx'
+    return f'{index:05d}.docx'
+
+
+def _init_worker(template_docx: str, options: Dict[str, Any]):
+    """工作进程初始化（spawn 模式下需要自行编译模板）"""
+    global _TEMPLATE, _OPTIONS
+    if _TEMPLATE is None:
+        _TEMPLATE = load_compiled_template(template_docx, options.get('cache_dir'))
+    _OPTIONS = options
+
+
+def _render_one(index: int, record: Dict[str, Any]):
+    """
+    渲染一条记录
+    输出到目录时由工作进程直接写文件，只回传文件名和大小；输出到zip时回传文档内容
+    """
+    name = _output_name(index, record, _OPTIONS.get('name_field'))
+    output_dir = _OPTIONS.get('output_dir')
+    keep_missing = _OPTIONS.get('keep_missing', True)
+    compresslevel = _OPTIONS.get('compresslevel')
+
+    if output_dir:
+        path = os.path.join(output_dir, name)
+        _TEMPLATE.render_docx(record, path, keep_missing, compresslevel)
+        return name, os.path.getsize(path), None
+
+    data = _TEMPLATE.render_bytes(record, keep_missing, compresslevel)
+    return name, len(data), data
+
+
+def bulk_fill(template_docx: str,
+              records_file: str,
+              output: str,
+              workers: Optional[int] = None,
+              name_field: Optional[str] = None,
+              keep_missing: bool = True,
+              compresslevel: Optional[int] = None,
+              max_pending: Optional[int] = None,
+              cache_dir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    批量生成文档
+
+    :param template_docx: 模板Word文件
+    :param records_file: 数据记录文件（JSONL/CSV/JSON）
+    :param output: 输出目录，或以 .zip 结尾的单个压缩包
+    :param workers: 工作进程数，默认CPU核数；1 表示在当前进程内串行处理
+    :param name_field: 用于命名输出文件的字段
+    :param keep_missing: 记录中缺少的占位符是否原样保留
+    :param compresslevel: docx 压缩级别（1最快，9最小）
+    :param max_pending: 同时在途的记录数上限，默认 workers*4
+    :param cache_dir: 模板编译结果缓存目录
+    :return: 统计信息
+    """
+    global _TEMPLATE, _OPTIONS
+
+    start = time.perf_counter()
+    _TEMPLATE = load_compiled_template(template_docx, cache_dir)
+    compile_time = time.perf_counter() - start
+    print(f"✓ 模板已编译: {template_docx} ({len(_TEMPLATE.placeholders)} 个占位符, {compile_time:.2f}s)")
+
+    to_zip = output.lower().endswith('.zip')
+    if not to_zip:
+        os.makedirs(output, exist_ok=True)
+
+    options = {
+        'output_dir': None if to_zip else output,
+        'name_field': name_field,
+        'keep_missing': keep_missing,
+        'compresslevel': compresslevel,
+        'cache_dir': cache_dir,
+    }
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or workers * 4
+
+    stats = {
+        'documents': 0,
+        'bytes': 0,
+        'workers': workers,
+        'output': output,
+    }
+
+    archive = zipfile.ZipFile(output, 'w', zipfile.ZIP_STORED) if to_zip else None
+
+    def collect(result):
+        name, size, data = result
+        if archive is not None:
+            # docx 本身已压缩，打包时不再重复压缩
+            archive.writestr(name, data)
+        stats['documents'] += 1
+        stats['bytes'] += size
+
+    render_start = time.perf_counter()
+    try:
+        if workers == 1:
+            _OPTIONS = options
+            for index, record in enumerate(iter_records(records_file), 1):
+                collect(_render_one(index, record))
+        else:
+            methods = multiprocessing.get_all_start_methods()
+            ctx = multiprocessing.get_context('fork' if 'fork' in methods else None)
+            with ctx.Pool(workers, initializer=_init_worker,
+                          initargs=(template_docx, options)) as pool:
+                pending = deque()
+                for index, record in enumerate(iter_records(records_file), 1):
+                    pending.append(pool.apply_async(_render_one, (index, record)))
+                    # 有界在途窗口：按提交顺序收集，避免一次性读入全部记录
+                    while len(pending) >= max_pending:
+                        collect(pending.popleft().get())
+                while pending:
+                    collect(pending.popleft().get())
+    finally:
+        if archive is not None:
+            archive.close()
+
+    elapsed = time.perf_counter() - render_start
+    stats['compile_seconds'] = round(compile_time, 3)
+    stats['render_seconds'] = round(elapsed, 3)
+    stats['docs_per_second'] = round(stats['documents'] / elapsed, 2) if elapsed > 0 else 0.0
+    stats['docs_per_minute'] = round(stats['docs_per_second'] * 60, 1)
+
+    print(f"✓ 已生成 {stats['documents']} 份文档 → {output}")
+    print(f"  耗时: {elapsed:.2f}s, 吞吐: {stats['docs_per_second']} 份/秒 "
+          f"({stats['docs_per_minute']} 份/分钟), 进程数: {workers}")
+
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='批量套打：每条数据记录生成一份Word文档')
+    parser.add_argument('template', help='模板Word文件')
+    parser.add_argument('records', help='数据记录文件 (.jsonl / .csv / .json)')
+    parser.add_argument('output', help='输出目录，或 .zip 文件')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='工作进程数（默认CPU核数）')
+    parser.add_argument('--name-field', default=None, help='用于命名输出文件的字段')
+    parser.add_argument('--blank-missing', action='store_true', help='缺少数据的占位符置空（默认原样保留）')
+    parser.add_argument('--compresslevel', type=int, default=None, help='docx压缩级别 1-9')
+    parser.add_argument('--cache-dir', default=None, help='模板编译结果缓存目录')
+    args = parser.parse_args(argv)
+
+    bulk_fill(args.template, args.records, args.output,
+              workers=args.workers,
+              name_field=args.name_field,
+              keep_missing=not args.blank_missing,
+              compresslevel=args.compresslevel,
+              cache_dir=args.cache_dir)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,193 @@
+"""
+填充数据的本地倒排索引（BM25）
+按页面上的字段标签检索最相关的数据键，提示词中只放这些键，
+提示词大小随页面需要的字段变化，而不是随企业资料的大小变化
+
+用法:
+    index = DataIndex(fill_data)
+    page_data = index.select(['投标人名称', '法定代表人', '联系电话'], top_k=5)
+"""
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# 数据叶子键少于此数时不做筛选：整份发送，提示词前缀在各页之间保持一致，便于缓存
+MIN_KEYS_TO_FILTER = 24
+
+# 同义词组：字段标签或数据键命中组内任一词时，用整组词参与检索（含常见英文键名）
+ALIAS_GROUPS = [
+    ('供应商名称', '投标人名称', '投标人', '公司名称', '单位名称', '企业名称', 'bidder', 'investorName', 'companyName'),
+    ('法定代表人', '法人代表', '法人', 'legalRepresentative'),
+    ('授权委托人', '委托代理人', '被授权人', '授权代表', 'authorizedAgent'),
+    ('注册地址', '通讯地址', '联系地址', '地址', 'registeredAddress', 'address'),
+    ('邮政编码', '邮编', 'postalCode', 'zipCode'),
+    ('联系电话', '电话', '联系方式', '手机', 'phone', 'tel', 'mobile'),
+    ('传真', 'fax'),
+    ('联系人', 'contact'),
+    ('网址', '网站', 'website'),
+    ('注册资本', 'registeredCapital'),
+    ('成立日期', '成立时间', '注册日期', 'foundingDate'),
+    ('开户银行', '开户行', 'bankName'),
+    ('银行账号', '账号', 'bankAccountNo'),
+    ('统一社会信用代码', '营业执照号', '注册号', 'registrationNo'),
+    ('经营范围', 'businessScope'),
+    ('员工总数', '职工人数', '员工人数', 'totalEmployees'),
+    ('技术负责人', 'technicalDirector'),
+    ('资质', '资质证书', '资质等级', 'qualifications'),
+    ('项目名称', 'projectName'),
+    ('标段', '包号', '标包', 'packageNo'),
+    ('日期', 'date'),
+]
+
+_RUN_RE = re.compile(r'[一-鿿]+|[A-Za-z0-9]+')
+_CAMEL_RE = re.compile(r'[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+')
+_CJK_RE = re.compile(r'[一-鿿]')
+_PLACEHOLDER_RE = re.compile(r'\$\{([^}]+)\}')
+_BLANK_LABEL_RE = re.compile(r'([^\s:：_{}，,。；;]{1,16})[:：]\s*_{2,}')
+
+
+def tokenize(text: str) -> List[str]:
+    """中文按相邻两字切分（单字保留），英文按驼峰和下划线拆成小写单词"""
+    tokens = []
+    for run in _RUN_RE.findall(text):
+        if not _CJK_RE.match(run):
+            tokens.extend(word.lower() for word in _CAMEL_RE.findall(run))
+        elif len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def _alias_terms(text: str) -> List[str]:
+    """text 命中的同义词组的全部词（中文词包含即命中，英文词需与整段或末段键名相同）"""
+    lowered = text.lower()
+    last = re.split(r'[.\s/]', lowered)[-1]
+    terms = []
+    for group in ALIAS_GROUPS:
+        for member in group:
+            hit = member in text if _CJK_RE.match(member) else member.lower() in (lowered, last)
+            if hit:
+                terms.extend(group)
+                break
+    return terms
+
+
+def flatten(data: Any, prefix: str = '') -> List[Tuple[str, Any]]:
+    """展平嵌套字典为 (路径, 值) 列表；列表作为一个整体的值"""
+    if not isinstance(data, dict):
+        return [(prefix, data)] if prefix else []
+    items = []
+    for key, value in data.items():
+        path = f'{prefix}.{key}' if prefix else str(key)
+        if isinstance(value, dict) and value:
+            items.extend(flatten(value, path))
+        else:
+            items.append((path, value))
+    return items
+
+
+class DataIndex:
+    """数据键的 BM25 索引：每个叶子键是一篇文档，由键路径、同义词和值组成"""
+
+    def __init__(self, data: Dict[str, Any], k1: float = 1.5, b: float = 0.75, key_weight: int = 2):
+        """
+        :param data: 填充数据（可嵌套）
+        :param key_weight: 键路径和同义词的词频倍数（键名比值更能说明含义）
+        """
+        self.data = data
+        self.k1 = k1
+        self.b = b
+        self.entries = flatten(data)
+        self.postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self.lengths: List[int] = []
+
+        for doc_id, (path, value) in enumerate(self.entries):
+            key_tokens = tokenize(path) + [t for term in _alias_terms(path) for t in tokenize(term)]
+            tokens = key_tokens * key_weight + tokenize('' if value is None else str(value))
+            for term, tf in Counter(tokens).items():
+                self.postings[term][doc_id] = tf
+            self.lengths.append(len(tokens))
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def search(self, query: str, top_k: int = 5) -> List[Tuple[str, float]]:
+        """
+        :return: [(键路径, 得分)]，按得分降序，只含得分大于0的键
+        """
+        terms = set(tokenize(query) + [t for term in _alias_terms(query) for t in tokenize(term)])
+        n = len(self.entries)
+        scores: Dict[int, float] = defaultdict(float)
+        for term in terms:
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[doc_id] / (self.avg_length or 1))
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        ranked = sorted(scores.items(), key=lambda item: -item[1])[:top_k]
+        return [(self.entries[doc_id][0], score) for doc_id, score in ranked]
+
+    def select(self, queries: Iterable[str], top_k: int = 5) -> Dict[str, Any]:
+        """
+        为每个查询取前 top_k 个键，返回只含这些键的数据（保持原有嵌套结构和键顺序）
+
+        查询全部为空时返回空字典；任一查询没有命中时返回全部数据（宁多勿漏：
+        该字段需要的键可能不在同义词表中，只按其余字段筛选会把它漏掉）
+        """
+        queries = [q for q in queries if q and q.strip()]
+        if not queries:
+            return {}
+        selected = set()
+        for query in queries:
+            hits = self.search(query, top_k)
+            if not hits:
+                return self.data
+            selected.update(path for path, _ in hits)
+        return _subset(self.data, selected)
+
+
+def _subset(data: Dict[str, Any], paths: set, prefix: str = '') -> Dict[str, Any]:
+    result = {}
+    for key, value in data.items():
+        path = f'{prefix}.{key}' if prefix else str(key)
+        if path in paths:
+            result[key] = value
+        elif isinstance(value, dict) and value:
+            sub = _subset(value, paths, path)
+            if sub:
+                result[key] = sub
+    return result
+
+
+def page_queries(page_info: Dict[str, Any], context_chars: int = 60) -> List[str]:
+    """
+    页面字段的检索词：占位符名称、表格空单元格的标签，以及空白字段所在段落中的字段标签
+    （“标签：____” 和跨 run 未被识别的 ${占位符}）；段落中找不到标签时用段落开头的文字
+    """
+    queries = [f['placeholder_name'] for f in page_info.get('placeholder_fields', [])]
+    queries += page_info.get('table_slots', [])
+    for field in page_info.get('blank_fields', []):
+        context = field.get('context', '')
+        labels = _PLACEHOLDER_RE.findall(context) + _BLANK_LABEL_RE.findall(context)
+        queries += labels or [context[:context_chars]]
+    return list(dict.fromkeys(q.strip() for q in queries))
+
+
+def select_page_data(data: Dict[str, Any], queries: Sequence[str], top_k: int = 5,
+                     index: Optional[DataIndex] = None) -> Dict[str, Any]:
+    """
+    筛选本页需要的数据；数据键较少（少于 MIN_KEYS_TO_FILTER）或 top_k 为 0 时原样返回
+
+    :param index: 已建好的索引（同一份数据在多页之间复用）
+    """
+    if not data or top_k <= 0:
+        return data
+    index = index or DataIndex(data)
+    if len(index) < MIN_KEYS_TO_FILTER:
+        return data
+    return index.select(queries, top_k)
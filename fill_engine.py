@@ -0,0 +1,285 @@
+"""
+模板填充引擎
+解析一次模板 → 预编译 ${占位符} 位置 → 按记录快速渲染 docx
+正文、页眉、页脚、脚注、尾注、批注中的占位符都会被填充
+"""
+import hashlib
+import io
+import os
+import pickle
+import re
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+from xml.sax.saxutils import escape, unescape
+
+from lxml import etree
+
+from parse_docx import DOCUMENT_PART
+
+W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+W_P = f'{{{W_NS}}}p'
+W_T = f'{{{W_NS}}}t'
+XML_SPACE = '{http://www.w3.org/XML/1998/namespace}space'
+
+# 含正文文本的部件
+TEXT_PART_RE = re.compile(r'^word/(document|header\d*|footer\d*|footnotes|endnotes|comments)\.xml$')
+
+PLACEHOLDER_RE = re.compile(r'\$\{([^}]+)\}')
+PLACEHOLDER_BYTES_RE = re.compile(rb'\$\{([^}<>]+)\}')
+
+_XML_ATTR_ENTITIES = {'"': '&quot;'}
+
+# 编译结果缓存格式版本，CompiledTemplate 结构变化时递增
+CACHE_VERSION = 2
+
+
+def merge_split_placeholders(root) -> int:
+    """
+    合并被Word拆分到多个 w:r 中的 ${占位符}，使每个占位符完整落在一个 w:t 内。
+    占位符之外的文本保留在原来的 run 中，格式不变。
+
+    :param root: 文档根元素
+    :return: 合并的占位符数量
+    """
+    # 按最近的 w:p 分组（文本框内的段落单独成组）
+    paragraphs: Dict[int, List] = {}
+    for t in root.iter(W_T):
+        parent = t.getparent()
+        while parent is not None and parent.tag != W_P:
+            parent = parent.getparent()
+        if parent is not None:
+            paragraphs.setdefault(id(parent), []).append(t)
+
+    merged = 0
+    for t_nodes in paragraphs.values():
+        if len(t_nodes) < 2:
+            continue
+        texts = [t.text or '' for t in t_nodes]
+        full_text = ''.join(texts)
+        if '${' not in full_text:
+            continue
+
+        offsets = []
+        pos = 0
+        for text in texts:
+            offsets.append(pos)
+            pos += len(text)
+
+        def locate(char_pos):
+            for i in range(len(offsets) - 1, -1, -1):
+                if offsets[i] <= char_pos and (texts[i] or i == 0):
+                    return i
+            return 0
+
+        # 倒序处理，保证前面节点的偏移量不变
+        for match in reversed(list(PLACEHOLDER_RE.finditer(full_text))):
+            first = locate(match.start())
+            last = locate(match.end() - 1)
+            if first == last:
+                continue
+            head = t_nodes[first].text or ''
+            t_nodes[first].text = head[:match.start() - offsets[first]] + match.group(0)
+            for i in range(first + 1, last):
+                t_nodes[i].text = ''
+            tail = t_nodes[last].text or ''
+            t_nodes[last].text = tail[match.end() - offsets[last]:]
+            for i in range(first, last + 1):
+                t_nodes[i].set(XML_SPACE, 'preserve')
+            merged += 1
+
+    return merged
+
+
+def compile_segments(xml_bytes: bytes) -> List[Union[bytes, str]]:
+    """
+    将序列化后的XML按占位符切分为片段列表：bytes 为原样输出的文本，str 为占位符名称
+    """
+    segments: List[Union[bytes, str]] = []
+    pos = 0
+    for match in PLACEHOLDER_BYTES_RE.finditer(xml_bytes):
+        segments.append(xml_bytes[pos:match.start()])
+        segments.append(unescape(match.group(1).decode('utf-8')))
+        pos = match.end()
+    segments.append(xml_bytes[pos:])
+    return segments
+
+
+def compile_part(data: bytes) -> Optional[List[Union[bytes, str]]]:
+    """
+    解析一个部件并切分为占位符片段（线程安全，lxml 解析时释放GIL）
+
+    :return: 片段列表；部件中没有占位符时返回 None
+    """
+    # 占位符可能被拆在多个run中，只要求 '$' 出现
+    if b'$' not in data:
+        return None
+    root = etree.fromstring(data)
+    merge_split_placeholders(root)
+    xml_bytes = etree.tostring(root, encoding='utf-8', xml_declaration=True, standalone=True)
+    segments = compile_segments(xml_bytes)
+    return segments if len(segments) > 1 else None
+
+
+def flatten_record(record: Dict[str, Any], prefix: str = '') -> Dict[str, Any]:
+    """
+    展开嵌套数据，{"contact": {"name": "李明"}} → {"contact": {...}, "contact.name": "李明"}
+    """
+    flat = {}
+    for key, value in record.items():
+        full_key = f'{prefix}{key}'
+        flat[full_key] = value
+        if isinstance(value, dict):
+            flat.update(flatten_record(value, f'{full_key}.'))
+    return flat
+
+
+def _xml_value(value: Any) -> bytes:
+    if value is None:
+        value = ''
+    return escape(str(value), _XML_ATTR_ENTITIES).encode('utf-8')
+
+
+def render_segments(segments: List[Union[bytes, str]], values: Dict[str, Any],
+                    keep_missing: bool = True) -> bytes:
+    """
+    用数据拼接片段
+
+    :param values: 已展开的数据 {占位符: 值}
+    :param keep_missing: 没有数据的占位符是否原样保留（否则置空）
+    """
+    out = [segments[0]]
+    for i in range(1, len(segments), 2):
+        name = segments[i]
+        if name in values:
+            out.append(_xml_value(values[name]))
+        elif keep_missing:
+            out.append(_xml_value('${%s}' % name))
+        out.append(segments[i + 1])
+    return b''.join(out)
+
+
+class CompiledTemplate:
+    """预编译的docx模板：读取一次、解析一次，之后每条记录只做字节拼接"""
+
+    def __init__(self, template_docx: Union[str, bytes], parts: Optional[Iterable[str]] = None,
+                 workers: Optional[int] = None):
+        """
+        :param template_docx: 模板Word文件路径，或docx文件内容
+        :param parts: 需要填充占位符的部件，默认为全部文本部件（正文、页眉页脚、脚注尾注、批注）
+        :param workers: 解析部件的线程数，默认 min(8, CPU核数)
+        """
+        self.template_docx = template_docx if isinstance(template_docx, str) else '<bytes>'
+        self.entries: List[Tuple[zipfile.ZipInfo, bytes]] = []
+        self.segments: Dict[str, List[Union[bytes, str]]] = {}
+        # 占位符名称 → 出现的部件
+        self.slot_index: Dict[str, List[str]] = {}
+
+        source = io.BytesIO(template_docx) if isinstance(template_docx, bytes) else template_docx
+        with zipfile.ZipFile(source) as docx:
+            for info in docx.infolist():
+                self.entries.append((info, docx.read(info)))
+
+        contents = {info.filename: data for info, data in self.entries}
+        if parts is None:
+            parts = [name for name in contents if TEXT_PART_RE.match(name)]
+        candidates = [part for part in parts if part in contents and b'$' in contents[part]]
+
+        workers = workers or min(8, os.cpu_count() or 1)
+        if workers > 1 and len(candidates) > 1:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                compiled = list(pool.map(compile_part, [contents[part] for part in candidates]))
+        else:
+            compiled = [compile_part(contents[part]) for part in candidates]
+
+        for part, segments in zip(candidates, compiled):
+            if segments is None:
+                continue
+            self.segments[part] = segments
+            for name in dict.fromkeys(segments[1::2]):
+                self.slot_index.setdefault(name, []).append(part)
+
+    @property
+    def placeholders(self) -> set:
+        """全部占位符名称"""
+        return set(self.slot_index)
+
+    def render_parts(self, record: Dict[str, Any], keep_missing: bool = True) -> Dict[str, bytes]:
+        """
+        用一条记录渲染所有含占位符的部件
+
+        :param record: 数据记录（支持嵌套，占位符可写为 ${contact.name}）
+        :param keep_missing: 记录中没有的占位符是否原样保留（否则置空）
+        :return: {部件名: 渲染后的XML}，没有任何占位符被替换的部件不返回（保持原始字节）
+        """
+        values = flatten_record(record)
+        rendered = {}
+        for part, segments in self.segments.items():
+            if keep_missing and not any(name in values for name in segments[1::2]):
+                continue
+            rendered[part] = render_segments(segments, values, keep_missing)
+        return rendered
+
+    def write_docx(self, output, replacements: Dict[str, bytes], compresslevel: Optional[int] = None):
+        """
+        写出docx，replacements 中的部件替换为新内容，其余部件原样写入
+
+        :param output: 输出路径或可写的文件对象
+        """
+        with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED, compresslevel=compresslevel) as docx_zip:
+            for info, data in self.entries:
+                docx_zip.writestr(info, replacements.get(info.filename, data),
+                                  compresslevel=compresslevel)
+
+    def render_docx(self, record: Dict[str, Any], output, keep_missing: bool = True,
+                    compresslevel: Optional[int] = None):
+        """渲染一条记录并写出docx"""
+        self.write_docx(output, self.render_parts(record, keep_missing), compresslevel)
+
+    def render_bytes(self, record: Dict[str, Any], keep_missing: bool = True,
+                     compresslevel: Optional[int] = None) -> bytes:
+        """渲染一条记录，返回docx文件内容"""
+        buffer = io.BytesIO()
+        self.render_docx(record, buffer, keep_missing, compresslevel)
+        return buffer.getvalue()
+
+
+def load_compiled_template(template_docx: str, cache_dir: Optional[str] = None) -> CompiledTemplate:
+    """
+    编译模板；指定 cache_dir 时按docx内容哈希缓存编译结果，再次运行直接加载
+
+    :param template_docx: 模板Word文件
+    :param cache_dir: 缓存目录，None 表示不缓存
+    """
+    if not cache_dir:
+        return CompiledTemplate(template_docx)
+
+    with open(template_docx, 'rb') as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()
+    cache_file = os.path.join(cache_dir, f'template_v{CACHE_VERSION}_{digest}.pickle')
+
+    if os.path.exists(cache_file):
+        try:
+            with open(cache_file, 'rb') as f:
+                template = pickle.load(f)
+            template.template_docx = template_docx
+            return template
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            pass
+
+    template = CompiledTemplate(data)
+    template.template_docx = template_docx
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_file = f'{cache_file}.{os.getpid()}.tmp'
+    with open(tmp_file, 'wb') as f:
+        pickle.dump(template, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_file, cache_file)
+    return template
+
+
+if __name__ == '__main__':
+    template = CompiledTemplate('template.docx')
+    print(f"模板占位符: {sorted(template.placeholders)}")
+    template.render_docx({'项目名称': '测试项目', '包编号': 'PKG-001'}, 'output_tender.docx')
+    print("✓ 已生成: output_tender.docx")
@@ -0,0 +1,502 @@
+"""
+常驻填充服务
+进程常驻，模板解析结果按docx哈希缓存（LRU），LLM连接保持复用，
+CPU密集的渲染/解析在线程池中执行，超出并发和排队上限时返回 503
+
+接口:
+    POST /fill     渲染占位符，返回docx
+    POST /analyze  分析模板中的占位符与空白字段，可选调用大模型给出填写建议
+    GET  /health   运行状态
+    GET  /metrics  Prometheus 指标
+
+请求体为JSON，模板三选一:
+    {"template_path": "template.docx", ...}          服务端本地文件
+    {"template_base64": "<docx内容base64>", ...}      直接上传
+    {"template_sha256": "<哈希>", ...}                已缓存的模板，免重复上传
+
+用法:
+    python fill_service.py --port 8800 --workers 4 --max-queue 32
+    curl -s localhost:8800/fill -d '{"template_path": "template.docx", "data": {"项目名称": "测试"}}' -o out.docx
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from http import HTTPStatus
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from lxml import etree
+
+from fill_engine import DOCUMENT_PART, CompiledTemplate, flatten_record
+from llm_telemetry import LATENCY_BUCKETS, Histogram, LLMTelemetry
+
+logger = logging.getLogger(__name__)
+
+DOCX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+MAX_BODY_BYTES = 64 * 1024 * 1024
+KEEP_ALIVE_TIMEOUT = 15
+
+
+class ServiceError(Exception):
+    """请求处理错误，携带HTTP状态码"""
+
+    def __init__(self, status: int, message: str, headers: Optional[Dict[str, str]] = None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+class AdmissionGate:
+    """并发上限 + 有界等待队列：队列满或等待超时即拒绝"""
+
+    def __init__(self, name: str, limit: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._semaphore = asyncio.Semaphore(limit)
+
+    @asynccontextmanager
+    async def admit(self):
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise ServiceError(503, f'{self.name} 队列已满', {'Retry-After': '1'})
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise ServiceError(503, f'{self.name} 排队超时', {'Retry-After': '2'})
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+    def to_dict(self) -> Dict[str, int]:
+        return {'limit': self.limit, 'active': self.active, 'waiting': self.waiting,
+                'max_queue': self.max_queue, 'rejected': self.rejected}
+
+
+class TemplateCache:
+    """按docx内容哈希缓存的已编译模板（LRU）"""
+
+    def __init__(self, max_size: int = 16):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._items: 'OrderedDict[str, CompiledTemplate]' = OrderedDict()
+        # 同一模板的并发请求只编译一次
+        self._pending: Dict[str, asyncio.Future] = {}
+
+    def get(self, digest: str) -> Optional[CompiledTemplate]:
+        template = self._items.get(digest)
+        if template is not None:
+            self._items.move_to_end(digest)
+            self.hits += 1
+        return template
+
+    async def get_or_compile(self, digest: str, data: bytes, loop, executor) -> CompiledTemplate:
+        template = self.get(digest)
+        if template is not None:
+            return template
+        if digest in self._pending:
+            self.hits += 1
+            return await asyncio.shield(self._pending[digest])
+
+        self.misses += 1
+        future = loop.run_in_executor(executor, CompiledTemplate, data)
+        self._pending[digest] = future
+        try:
+            template = await future
+        finally:
+            del self._pending[digest]
+        self._items[digest] = template
+        while len(self._items) > self.max_size:
+            evicted, _ = self._items.popitem(last=False)
+            logger.info("模板缓存淘汰: %s", evicted[:12])
+        return template
+
+    def to_dict(self) -> Dict[str, int]:
+        return {'size': len(self._items), 'max_size': self.max_size,
+                'hits': self.hits, 'misses': self.misses}
+
+
+def analyze_template(template: CompiledTemplate) -> List[Dict[str, Any]]:
+    """解析正文部件，返回字段记录（结果缓存在模板对象上）"""
+    slots = getattr(template, 'slot_records', None)
+    if slots is None:
+        from process_with_llm import XMLPageAnalyzer
+
+        document = dict((info.filename, data) for info, data in template.entries)[DOCUMENT_PART]
+        tree = etree.ElementTree(etree.fromstring(document))
+        slots = XMLPageAnalyzer(DOCUMENT_PART, tree=tree).slot_records()
+        template.slot_records = slots
+    return slots
+
+
+class FillService:
+    """常驻填充服务"""
+
+    def __init__(self, workers: int = 4, max_queue: int = 32, queue_timeout: float = 10.0,
+                 cache_size: int = 16, llm_config_file: Optional[str] = 'llm_config.json',
+                 llm_concurrency: int = 4, template_root: str = '.'):
+        """
+        :param workers: CPU线程池大小，同时也是渲染并发上限
+        :param max_queue: 渲染排队上限，超出返回 503
+        :param queue_timeout: 排队最长等待秒数
+        :param cache_size: 模板缓存条数
+        :param llm_config_file: LLM配置文件，不存在时 /analyze 不提供大模型建议
+        :param llm_concurrency: 同时进行的大模型调用数
+        :param template_root: template_path 允许访问的根目录
+        """
+        self.workers = workers
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.llm_concurrency = llm_concurrency
+        self.template_root = os.path.realpath(template_root)
+        self.cache = TemplateCache(cache_size)
+        # 使用线程池而非进程池：模板缓存留在本进程内共享；压缩和lxml解析会释放GIL
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='fill')
+        self.llm_executor = ThreadPoolExecutor(max_workers=llm_concurrency, thread_name_prefix='llm')
+        self.started_at = time.time()
+        self.requests: Dict[Tuple[str, int], int] = {}
+        self.latency: Dict[str, Histogram] = {}
+
+        self.llm_config = None
+        self.telemetry = LLMTelemetry(keep_records=False)
+        self._llm_local = threading.local()
+        if llm_config_file and os.path.exists(llm_config_file):
+            from llm_connector import load_config_from_file
+            self.llm_config = load_config_from_file(llm_config_file)
+            logger.info("已加载LLM配置: %s / %s", self.llm_config.provider.value, self.llm_config.model)
+
+        self.fill_gate: Optional[AdmissionGate] = None
+        self.llm_gate: Optional[AdmissionGate] = None
+
+    # ---------- 模板 ----------
+
+    def _read_template_path(self, path: str) -> bytes:
+        full_path = os.path.realpath(os.path.join(self.template_root, path))
+        if os.path.commonpath([full_path, self.template_root]) != self.template_root:
+            raise ServiceError(403, f'不允许访问: {path}')
+        if not os.path.isfile(full_path):
+            raise ServiceError(404, f'模板不存在: {path}')
+        with open(full_path, 'rb') as f:
+            return f.read()
+
+    async def _template(self, body: Dict[str, Any]) -> Tuple[str, CompiledTemplate]:
+        loop = asyncio.get_running_loop()
+        if body.get('template_base64'):
+            try:
+                data = base64.b64decode(body['template_base64'], validate=True)
+            except ValueError as e:
+                raise ServiceError(400, f'template_base64 无效: {e}')
+        elif body.get('template_path'):
+            data = await loop.run_in_executor(self.executor, self._read_template_path, body['template_path'])
+        elif body.get('template_sha256'):
+            digest = body['template_sha256']
+            template = self.cache.get(digest)
+            if template is None:
+                raise ServiceError(404, f'模板未缓存，请重新上传: {digest}')
+            return digest, template
+        else:
+            raise ServiceError(400, '缺少 template_path / template_base64 / template_sha256')
+
+        digest = hashlib.sha256(data).hexdigest()
+        try:
+            template = await self.cache.get_or_compile(digest, data, loop, self.executor)
+        except (ValueError, zipfile.BadZipFile, etree.XMLSyntaxError) as e:
+            raise ServiceError(400, f'模板无法解析: {e}')
+        return digest, template
+
+    # ---------- 接口 ----------
+
+    async def handle_fill(self, body: Dict[str, Any]):
+        data = body.get('data') or {}
+        if not isinstance(data, dict):
+            raise ServiceError(400, 'data 必须是对象')
+
+        async with self.fill_gate.admit():
+            digest, template = await self._template(body)
+            loop = asyncio.get_running_loop()
+            docx_bytes = await loop.run_in_executor(
+                self.executor, template.render_bytes, data, body.get('keep_missing', True))
+
+        values = flatten_record(data)
+        missing = sorted(name for name in template.placeholders if name not in values)
+        headers = {
+            'X-Template-SHA256': digest,
+            'X-Placeholders-Filled': str(len(template.placeholders) - len(missing)),
+            'X-Placeholders-Missing': str(len(missing)),
+        }
+        return 200, DOCX_CONTENT_TYPE, docx_bytes, headers
+
+    async def handle_analyze(self, body: Dict[str, Any]):
+        data = body.get('data') or {}
+        if not isinstance(data, dict):
+            raise ServiceError(400, 'data 必须是对象')
+
+        async with self.fill_gate.admit():
+            digest, template = await self._template(body)
+            loop = asyncio.get_running_loop()
+            slots = await loop.run_in_executor(self.executor, analyze_template, template)
+
+        values = flatten_record(data)
+        placeholders = sorted(template.placeholders)
+        result = {
+            'template_sha256': digest,
+            'placeholders': placeholders,
+            'resolved': [name for name in placeholders if name in values],
+            'missing': [name for name in placeholders if name not in values],
+            'slots': slots,
+        }
+
+        if body.get('use_llm'):
+            if self.llm_config is None:
+                raise ServiceError(503, '服务未配置LLM')
+            async with self.llm_gate.admit():
+                result['llm'] = await asyncio.get_running_loop().run_in_executor(
+                    self.llm_executor, self._llm_suggest, slots, data, body.get('template_name', 'tender_form'))
+
+        return 200, 'application/json', json.dumps(result, ensure_ascii=False).encode('utf-8'), {}
+
+    def _llm_suggest(self, slots: List[Dict[str, Any]], data: Dict[str, Any], template_name: str) -> Dict:
+        """在LLM线程中调用大模型；每个线程复用自己的连接器（连接池保持长连接）"""
+        from process_with_llm import LLMPageProcessor
+
+        processor = getattr(self._llm_local, 'processor', None)
+        if processor is None:
+            from llm_connector import LLMConnector
+            processor = LLMPageProcessor(LLMConnector(self.llm_config, self.telemetry))
+            self._llm_local.processor = processor
+
+        page_info = {
+            'blank_fields': [s for s in slots if s['kind'] == 'blank'],
+            'placeholder_fields': [dict(s, placeholder_name=s['name']) for s in slots
+                                   if s['kind'] == 'placeholder'],
+        }
+        result = processor.process_page_with_llm(1, page_info, {'page_title': '', 'data': data}, template_name)
+        result.pop('raw_response', None)
+        return result
+
+    def health(self) -> Dict[str, Any]:
+        return {
+            'status': 'ok',
+            'uptime_s': round(time.time() - self.started_at, 1),
+            'template_cache': self.cache.to_dict(),
+            'fill_gate': self.fill_gate.to_dict(),
+            'llm_gate': self.llm_gate.to_dict(),
+            'llm_configured': self.llm_config is not None,
+            'llm': self.telemetry.totals(),
+        }
+
+    def to_prometheus(self, prefix: str = 'fill_service') -> str:
+        lines = []
+
+        def metric(name, metric_type, help_text, samples):
+            lines.append(f'# HELP {prefix}_{name} {help_text}')
+            lines.append(f'# TYPE {prefix}_{name} {metric_type}')
+            for labels, value in samples:
+                label_str = ','.join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f'{prefix}_{name}{{{label_str}}} {value}' if label_str
+                             else f'{prefix}_{name} {value}')
+
+        metric('requests_total', 'counter', 'HTTP requests by endpoint and status.',
+               [((('path', path), ('status', status)), count)
+                for (path, status), count in sorted(self.requests.items())])
+        metric('template_cache_hits_total', 'counter', 'Template cache hits.', [((), self.cache.hits)])
+        metric('template_cache_misses_total', 'counter', 'Template cache misses.', [((), self.cache.misses)])
+        metric('template_cache_size', 'gauge', 'Compiled templates held in memory.',
+               [((), len(self.cache._items))])
+        for gate in (self.fill_gate, self.llm_gate):
+            labels = (('gate', gate.name),)
+            metric(f'{gate.name}_active', 'gauge', 'Requests currently being processed.', [(labels, gate.active)])
+            metric(f'{gate.name}_waiting', 'gauge', 'Requests waiting for a slot.', [(labels, gate.waiting)])
+            metric(f'{gate.name}_rejected_total', 'counter', 'Requests rejected with 503.',
+                   [(labels, gate.rejected)])
+
+        lines.append(f'# HELP {prefix}_request_seconds Request latency by endpoint.')
+        lines.append(f'# TYPE {prefix}_request_seconds histogram')
+        for path, hist in sorted(self.latency.items()):
+            cumulative = 0
+            for bound, count in zip(list(hist.buckets) + ['+Inf'], hist.counts):
+                cumulative += count
+                lines.append(f'{prefix}_request_seconds_bucket{{path="{path}",le="{bound}"}} {cumulative}')
+            lines.append(f'{prefix}_request_seconds_sum{{path="{path}"}} {round(hist.sum, 4)}')
+            lines.append(f'{prefix}_request_seconds_count{{path="{path}"}} {hist.count}')
+
+        return '\n'.join(lines) + '\n' + self.telemetry.to_prometheus()
+
+    async def dispatch(self, method: str, path: str, body: bytes):
+        """路由请求，返回 (状态码, Content-Type, 响应体, 额外响应头)"""
+        if method == 'GET' and path == '/health':
+            return 200, 'application/json', json.dumps(self.health(), ensure_ascii=False).encode('utf-8'), {}
+        if method == 'GET' and path == '/metrics':
+            return 200, 'text/plain; version=0.0.4', self.to_prometheus().encode('utf-8'), {}
+
+        handlers = {'/fill': self.handle_fill, '/analyze': self.handle_analyze}
+        if path not in handlers:
+            raise ServiceError(404, f'未知接口: {path}')
+        if method != 'POST':
+            raise ServiceError(405, '仅支持 POST')
+        try:
+            payload = json.loads(body or b'{}')
+        except json.JSONDecodeError as e:
+            raise ServiceError(400, f'请求体不是有效的JSON: {e}')
+        if not isinstance(payload, dict):
+            raise ServiceError(400, '请求体必须是JSON对象')
+        return await handlers[path](payload)
+
+    # ---------- HTTP ----------
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """处理一个连接（支持 HTTP/1.1 keep-alive）"""
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), KEEP_ALIVE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                keep_alive = (headers.get('connection', '').lower() != 'close'
+                              and version.upper() == 'HTTP/1.1')
+                try:
+                    length = int(headers.get('content-length', 0) or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    # 长度无效时无法确定请求体的边界，回应后关闭连接
+                    await self._respond(writer, 400, 'application/json',
+                                        json.dumps({'error': 'Content-Length 无效'}).encode('utf-8'), {}, False)
+                    break
+                if length > MAX_BODY_BYTES:
+                    await self._respond(writer, 413, 'application/json',
+                                        json.dumps({'error': '请求体过大'}).encode('utf-8'), {}, False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                path = urlsplit(target).path.rstrip('/') or '/'
+                start = time.perf_counter()
+                try:
+                    status, content_type, payload, extra = await self.dispatch(method.upper(), path, body)
+                except ServiceError as e:
+                    status, content_type, extra = e.status, 'application/json', e.headers
+                    payload = json.dumps({'error': str(e)}, ensure_ascii=False).encode('utf-8')
+                except Exception as e:
+                    logger.exception("请求处理异常: %s %s", method, path)
+                    status, content_type, extra = 500, 'application/json', {}
+                    payload = json.dumps({'error': str(e)}, ensure_ascii=False).encode('utf-8')
+
+                elapsed = time.perf_counter() - start
+                self.requests[(path, status)] = self.requests.get((path, status), 0) + 1
+                if path in ('/fill', '/analyze'):
+                    self.latency.setdefault(path, Histogram(LATENCY_BUCKETS)).observe(elapsed)
+                logger.info("%s %s %d %.1fms", method, path, status, elapsed * 1000)
+
+                await self._respond(writer, status, content_type, payload, extra, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer, status: int, content_type: str, payload: bytes,
+                       extra: Dict[str, str], keep_alive: bool):
+        reason = HTTPStatus(status).phrase
+        head = [f'HTTP/1.1 {status} {reason}',
+                f'Content-Type: {content_type}',
+                f'Content-Length: {len(payload)}',
+                f'Connection: {"keep-alive" if keep_alive else "close"}']
+        head.extend(f'{k}: {v}' for k, v in extra.items())
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + payload)
+        await writer.drain()
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 8800, ready: Optional[asyncio.Event] = None):
+        """启动服务并一直运行"""
+        self.fill_gate = AdmissionGate('fill', self.workers, self.max_queue, self.queue_timeout)
+        self.llm_gate = AdmissionGate('llm', self.llm_concurrency, self.max_queue, self.queue_timeout)
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        self.port = server.sockets[0].getsockname()[1]
+        print(f"✓ 填充服务已启动: http://{host}:{self.port}")
+        print(f"  工作线程: {self.workers}, 排队上限: {self.max_queue}, 模板缓存: {self.cache.max_size}")
+        if ready is not None:
+            ready.set()
+        async with server:
+            await server.serve_forever()
+
+    def preload(self, paths: List[str]):
+        """启动时预编译模板"""
+        for path in paths:
+            with open(path, 'rb') as f:
+                data = f.read()
+            digest = hashlib.sha256(data).hexdigest()
+            self.cache._items[digest] = CompiledTemplate(data)
+            print(f"✓ 已预加载模板: {path} ({digest[:12]})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='常驻填充服务')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8800)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 4, help='CPU工作线程数')
+    parser.add_argument('--max-queue', type=int, default=32, help='排队上限，超出返回503')
+    parser.add_argument('--queue-timeout', type=float, default=10.0, help='排队最长等待秒数')
+    parser.add_argument('--cache-size', type=int, default=16, help='模板缓存条数')
+    parser.add_argument('--llm-config', default='llm_config.json')
+    parser.add_argument('--llm-concurrency', type=int, default=4)
+    parser.add_argument('--template-root', default='.', help='template_path 的根目录')
+    parser.add_argument('--preload', nargs='*', default=[], help='启动时预编译的模板')
+    parser.add_argument('--log-level', default='INFO')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=getattr(logging, args.log_level.upper(), logging.INFO),
+                        format='%(asctime)s %(message)s')
+
+    service = FillService(workers=args.workers, max_queue=args.max_queue, queue_timeout=args.queue_timeout,
+                          cache_size=args.cache_size, llm_config_file=args.llm_config,
+                          llm_concurrency=args.llm_concurrency, template_root=args.template_root)
+    service.preload(args.preload)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print("\n服务已停止")
+    finally:
+        service.executor.shutdown(wait=False)
+        service.llm_executor.shutdown(wait=False)
+
+
+if __name__ == '__main__':
+    main()
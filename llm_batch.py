@@ -0,0 +1,286 @@
+"""
+服务商批量接口（OpenAI Batch / Anthropic Message Batches）
+把一组请求写成批量文件提交，轮询到任务结束后下载结果，按 custom_id 对应回请求。
+批量请求不占用实时接口的限流额度、价格通常为实时接口的一半，适合不要求时效的夜间大批量任务
+
+工作目录中的文件:
+    <name>.jsonl          提交的批量文件
+    <name>.state.json     批次ID、批量文件哈希和任务状态；中断后用相同的请求重新运行会继续等待，不会重复提交
+    <name>.results.jsonl  下载的结果；再次运行相同的请求直接读取
+
+用法:
+    results = connector.call_batch([{'custom_id': 'page-1', 'prompt': '...'}], 'batch_dir', name='pages')
+    text = results['page-1'].get('text')
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+from llm_connector import RETRY_STATUS_CODES, LLMConnector, LLMProvider
+from llm_telemetry import CallRecord
+
+logger = logging.getLogger(__name__)
+
+# 两家接口对 custom_id 的共同要求
+CUSTOM_ID_RE = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+# OpenAI 批次的结束状态；除 failed（批量文件校验未通过）外都可下载已完成的部分
+OPENAI_ENDED = ('completed', 'failed', 'expired', 'cancelled')
+COMPLETION_WINDOW = '24h'
+# 提交、轮询、下载请求的最少重试次数（丢失已提交的批次代价远高于多等几秒）
+MIN_RETRIES = 3
+
+
+class BatchJob:
+    """一个批量任务：写批量文件 → 提交 → 轮询 → 下载结果"""
+
+    def __init__(self, connector: LLMConnector, work_dir: str, name: str = 'batch'):
+        """
+        :param connector: 连接器（OpenAI 或 Claude），提供配置、HTTP会话和遥测
+        :param work_dir: 批量文件目录
+        :param name: 任务名（文件名前缀）
+        """
+        if connector.provider not in (LLMProvider.OPENAI, LLMProvider.CLAUDE):
+            raise ValueError(f"{connector.provider.value} 不支持批量接口")
+        self.llm = connector
+        self.config = connector.config
+        self.name = name
+        self.input_path = os.path.join(work_dir, f'{name}.jsonl')
+        self.state_path = os.path.join(work_dir, f'{name}.state.json')
+        self.results_path = os.path.join(work_dir, f'{name}.results.jsonl')
+        os.makedirs(work_dir, exist_ok=True)
+
+    def run(self, requests: List[Dict[str, Any]], poll_interval: Optional[float] = None,
+            timeout: Optional[float] = None) -> Dict[str, Dict[str, str]]:
+        """
+        提交并等待批量任务，参数和返回值见 LLMConnector.call_batch
+        """
+        if not requests:
+            return {}
+        ids = [r['custom_id'] for r in requests]
+        digest = self.write(requests)
+
+        state = self.load_state()
+        if state.get('input_hash') != digest or state.get('status') == 'failed':
+            state = {}
+        if state.get('status') == 'ended' and os.path.exists(self.results_path):
+            logger.info("批量任务 %s 已完成，读取已下载的结果", state['batch_id'])
+            return self._collect(self._read_results(), ids)
+
+        if state:
+            logger.info("继续等待已提交的批量任务 %s", state['batch_id'])
+        else:
+            state = self.submit(digest, len(requests))
+        state = self.wait(state, poll_interval, timeout)
+        lines = self.download(state)
+        self._record_telemetry(lines, state)
+        return self._collect(lines, ids)
+
+    # ---------- 批量文件 ----------
+
+    def write(self, requests: List[Dict[str, Any]]) -> str:
+        """
+        写批量文件
+
+        :return: 文件内容的 sha256
+        :raises ValueError: custom_id 不合法或重复
+        """
+        seen = set()
+        lines = []
+        for request in requests:
+            custom_id = request['custom_id']
+            if not CUSTOM_ID_RE.match(custom_id):
+                raise ValueError(f"custom_id 只能包含字母、数字、下划线和连字符（1-64位）: {custom_id!r}")
+            if custom_id in seen:
+                raise ValueError(f"custom_id 重复: {custom_id}")
+            seen.add(custom_id)
+            line = self.llm.batch_request(custom_id, request['prompt'], request.get('system_prompt'),
+                                          request.get('context'), request.get('schema'))
+            lines.append(json.dumps(line, ensure_ascii=False))
+        content = ('\n'.join(lines) + '\n').encode('utf-8')
+        with open(self.input_path, 'wb') as f:
+            f.write(content)
+        return hashlib.sha256(content).hexdigest()
+
+    def load_state(self) -> Dict[str, Any]:
+        if not os.path.exists(self.state_path):
+            return {}
+        with open(self.state_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def save_state(self, state: Dict[str, Any]):
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    # ---------- 提交 / 轮询 / 下载 ----------
+
+    def submit(self, digest: str, count: int) -> Dict[str, Any]:
+        """提交批量文件，返回任务状态（已写入状态文件）"""
+        api_url = self.config.api_url
+        if self.llm.provider == LLMProvider.CLAUDE:
+            with open(self.input_path, 'r', encoding='utf-8') as f:
+                requests = [json.loads(line) for line in f if line.strip()]
+            batch = self._request('POST', f'{api_url}/messages/batches', json={'requests': requests}).json()
+        else:
+            with open(self.input_path, 'rb') as f:
+                content = f.read()
+            uploaded = self._request('POST', f'{api_url}/files', data={'purpose': 'batch'},
+                                     files={'file': (os.path.basename(self.input_path), content,
+                                                     'application/jsonl')}).json()
+            batch = self._request('POST', f'{api_url}/batches', json={
+                'input_file_id': uploaded['id'],
+                'endpoint': self.llm.batch_endpoint(),
+                'completion_window': COMPLETION_WINDOW,
+            }).json()
+
+        state = {'batch_id': batch['id'], 'provider': self.llm.provider.value, 'model': self.config.model,
+                 'input_hash': digest, 'requests': count, 'submitted_at': time.time(), 'status': 'submitted'}
+        self.save_state(state)
+        logger.info("已提交批量任务 %s（%d 个请求）", batch['id'], count)
+        return state
+
+    def poll(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """查询一次任务状态；任务结束时 state['status'] 为 'ended'"""
+        api_url = self.config.api_url
+        batch_id = state['batch_id']
+        if self.llm.provider == LLMProvider.CLAUDE:
+            batch = self._request('GET', f'{api_url}/messages/batches/{batch_id}').json()
+            state['progress'] = batch.get('request_counts', {})
+            if batch.get('processing_status') == 'ended':
+                state.update(status='ended', results_url=batch.get('results_url'))
+        else:
+            batch = self._request('GET', f'{api_url}/batches/{batch_id}').json()
+            state['progress'] = batch.get('request_counts', {})
+            status = batch.get('status')
+            if status == 'failed':
+                errors = (batch.get('errors') or {}).get('data') or []
+                state.update(status='failed', errors=[e.get('message', '') for e in errors])
+            elif status in OPENAI_ENDED:
+                state.update(status='ended', batch_status=status, output_file_id=batch.get('output_file_id'),
+                             error_file_id=batch.get('error_file_id'))
+        if state['status'] in ('ended', 'failed'):
+            state['ended_at'] = time.time()
+        self.save_state(state)
+        return state
+
+    def wait(self, state: Dict[str, Any], poll_interval: Optional[float] = None,
+             timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        轮询到任务结束
+
+        :raises RuntimeError: 批量文件未通过服务商校验
+        :raises TimeoutError: 超过 timeout 仍未结束（重新运行可继续等待）
+        """
+        interval = self.config.batch_poll_interval if poll_interval is None else poll_interval
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            state = self.poll(state)
+            if state['status'] == 'failed':
+                raise RuntimeError(f"批量任务 {state['batch_id']} 失败: {'; '.join(state['errors']) or '未知原因'}")
+            if state['status'] == 'ended':
+                return state
+            logger.info("批量任务 %s 处理中: %s", state['batch_id'], state.get('progress'))
+            if deadline is not None and time.monotonic() + interval > deadline:
+                raise TimeoutError(f"批量任务 {state['batch_id']} 在 {timeout:.0f} 秒内未完成，重新运行可继续等待")
+            time.sleep(interval)
+
+    def download(self, state: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """下载结果（OpenAI 的成功结果和错误结果分两个文件）并保存到 results_path"""
+        if self.llm.provider == LLMProvider.CLAUDE:
+            urls = [state['results_url']] if state.get('results_url') else []
+        else:
+            urls = [f"{self.config.api_url}/files/{file_id}/content"
+                    for file_id in (state.get('output_file_id'), state.get('error_file_id')) if file_id]
+        text = ''.join(self._request('GET', url).content.decode('utf-8') for url in urls)
+        tmp_path = self.results_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, self.results_path)
+        return self._read_results()
+
+    def _read_results(self) -> List[Dict[str, Any]]:
+        with open(self.results_path, 'r', encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def _request(self, method: str, url: str, **kwargs):
+        """任务管理请求：429/5xx/连接错误时重试"""
+        import requests
+
+        if self.llm.provider == LLMProvider.CLAUDE:
+            headers = self.llm._claude_headers()
+        else:
+            headers = {'Authorization': f'Bearer {self.config.api_key}'}
+        retries = max(self.config.max_retries, MIN_RETRIES)
+        attempt = 0
+        while True:
+            try:
+                response = self.llm.session.request(method, url, headers=headers,
+                                                    timeout=self.config.timeout, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt >= retries:
+                    raise RuntimeError(f"批量接口请求失败: {method} {url}: {e}")
+                attempt += 1
+                time.sleep(min(2 ** attempt * 0.5, 10))
+                continue
+            if response.status_code in RETRY_STATUS_CODES and attempt < retries:
+                attempt += 1
+                time.sleep(self.llm._retry_delay(response, attempt))
+                continue
+            if response.status_code >= 400:
+                raise RuntimeError(f"批量接口请求失败: {method} {url}: HTTP {response.status_code} "
+                                   f"{response.text[:200]}")
+            return response
+
+    # ---------- 结果 ----------
+
+    def _parse_line(self, line: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        单行结果 → {'text'} 或 {'error'}，附带响应体 body（用于统计token）
+        """
+        if self.llm.provider == LLMProvider.CLAUDE:
+            result = line.get('result') or {}
+            if result.get('type') == 'succeeded':
+                body = result.get('message') or {}
+                return {'text': self.llm.response_text(body), 'body': body, 'status': 200}
+            error = (result.get('error') or {}).get('error') or {}
+            return {'error': error.get('message') or result.get('type', 'unknown'), 'status': 0}
+
+        response = line.get('response') or {}
+        body = response.get('body') or {}
+        status = response.get('status_code', 0)
+        if status == 200:
+            return {'text': self.llm.response_text(body), 'body': body, 'status': status}
+        error = line.get('error') or body.get('error') or {}
+        return {'error': error.get('message') or f'HTTP {status}', 'status': status}
+
+    def _collect(self, lines: List[Dict[str, Any]], ids: List[str]) -> Dict[str, Dict[str, str]]:
+        results = {}
+        for line in lines:
+            parsed = self._parse_line(line)
+            results[line.get('custom_id')] = {k: v for k, v in parsed.items() if k in ('text', 'error')}
+        missing = {custom_id: {'error': '批量结果中没有该请求'} for custom_id in ids if custom_id not in results}
+        results.update(missing)
+        return {custom_id: results[custom_id] for custom_id in ids}
+
+    def _record_telemetry(self, lines: List[Dict[str, Any]], state: Dict[str, Any]):
+        """
+        每个结果记一次调用；服务商名加 -batch 后缀，与实时调用的延迟分开统计，
+        延迟为从提交到任务结束的时间，费用按 batch_price_ratio 折算
+        """
+        turnaround = state.get('ended_at', time.time()) - state['submitted_at']
+        for line in lines:
+            parsed = self._parse_line(line)
+            record = CallRecord(provider=f'{self.llm.provider.value}-batch', model=self.config.model,
+                                started_at=state['submitted_at'], http_status=parsed['status'],
+                                latency_s=turnaround)
+            if 'error' in parsed:
+                record.status = 'error'
+                record.error = parsed['error']
+            else:
+                self.llm.record_usage(record, parsed['body'], self.config.batch_price_ratio)
+            self.llm.telemetry.record(record)
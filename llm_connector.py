@@ -4,11 +4,34 @@ LLM 连接配置模块
 """
 import os
 import json
-import requests
-from typing import Dict, List, Optional
-from dataclasses import dataclass
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+from dataclasses import dataclass, replace
 from enum import Enum
 
+from llm_hedge import RequestCancelled, check_cancelled, hedged_call, is_cancelled
+from llm_pool import LLMPool, PoolEntry, PoolExhaustedError, estimate_tokens
+from llm_telemetry import CallRecord, LLMTelemetry, extract_usage, extract_rate_limit_headers
+from prompt_library import join_prompt
+
+# 可重试的HTTP状态码
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+# Claude 结构化输出使用的工具名
+CLAUDE_OUTPUT_TOOL = "output"
+
+logger = logging.getLogger(__name__)
+
+# 当前线程正在发送的请求的提示词估算token数，_post 记入 CallRecord.prompt_estimate
+_current = threading.local()
+
+
+def prompt_estimate(prompt: str, system_prompt: Optional[str] = None, context: Optional[str] = None) -> int:
+    """提示词的估算token数（连接池 tpm 计数和对冲延迟分档共用同一口径）"""
+    return estimate_tokens(''.join((system_prompt or '', context or '', prompt)))
+
+
 class LLMProvider(Enum):
     """支持的LLM服务商"""
     OPENAI = "openai"
@@ -28,6 +51,24 @@ class LLMConfig:
     temperature: float = 0.3
     max_tokens: int = 2000
     timeout: int = 60
+    max_retries: int = 0  # 429/5xx/连接错误时的重试次数
+    prompt_price: float = 0.0  # 每百万输入token价格（用于估算费用）
+    completion_price: float = 0.0  # 每百万输出token价格
+    stream: bool = False  # 流式接收响应（OpenAI兼容、Claude、自定义API）
+    prompt_cache: bool = True  # Claude 接口在系统提示词和共用上下文后设置 cache_control 缓存断点
+    cached_prompt_price: Optional[float] = None  # 每百万缓存命中token价格，默认同 prompt_price
+    json_mode: str = 'off'  # 模板声明输出结构时的JSON输出模式: off / json_object / json_schema，服务商支持时再开启
+    repair_rounds: int = 1  # 字段校验未通过时补填请求的最大轮数，0 表示不补填
+    min_confidence: float = 0.6  # 低于此置信度的字段视为未通过校验
+    data_top_k: int = 5  # 每个字段从填充数据中检索的相关键数，0 表示整份数据发送
+    batch_price_ratio: float = 0.5  # 批量接口相对实时接口的价格比例
+    batch_poll_interval: float = 60.0  # 批量任务状态轮询间隔（秒）
+    pool: Optional[LLMPool] = None  # 多账号连接池（见 llm_pool），设置后请求分配到池中各账号
+    hedge: bool = False  # 对冲请求（见 llm_hedge）：超过同类请求的历史延迟分位数仍未返回时向另一账号/服务商再发一次
+    hedge_quantile: float = 0.95  # 发出对冲请求的延迟分位数
+    hedge_to: Optional[dict] = None  # 没有连接池时对冲请求使用的服务商（覆盖字段，如 {"provider": "claude", ...}），默认同一配置
+    adaptive_timeout: bool = False  # 按 max_tokens 和历史输出速度推算超时，不超过 timeout
+    min_timeout: float = 10.0  # 自适应超时的下限（秒）
     
     def to_dict(self) -> dict:
         return {
@@ -37,43 +78,452 @@ class LLMConfig:
             'model': self.model,
             'temperature': self.temperature,
             'max_tokens': self.max_tokens,
+            'timeout': self.timeout,
+            'max_retries': self.max_retries,
+            'prompt_price': self.prompt_price,
+            'completion_price': self.completion_price,
+            'stream': self.stream,
+            'prompt_cache': self.prompt_cache,
+            'cached_prompt_price': self.cached_prompt_price,
+            'json_mode': self.json_mode,
+            'repair_rounds': self.repair_rounds,
+            'min_confidence': self.min_confidence,
+            'data_top_k': self.data_top_k,
+            'batch_price_ratio': self.batch_price_ratio,
+            'batch_poll_interval': self.batch_poll_interval,
+            **({'pool': self.pool.to_config()} if self.pool is not None else {}),
+            'hedge': self.hedge,
+            'hedge_quantile': self.hedge_quantile,
+            **({'hedge_to': self.hedge_to} if self.hedge_to else {}),
+            'adaptive_timeout': self.adaptive_timeout,
+            'min_timeout': self.min_timeout,
         }
 
 
 class LLMConnector:
     """LLM 连接器 - 统一调用接口"""
     
-    def __init__(self, config: LLMConfig):
+    def __init__(self, config: LLMConfig, telemetry: Optional[LLMTelemetry] = None):
+        """
+        :param config: LLM配置
+        :param telemetry: 遥测收集器，多个连接器可共用一个；默认新建
+        """
         self.config = config
         self.provider = config.provider
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Word-LLM-Processor/1.0'
-        })
+        self.telemetry = telemetry if telemetry is not None else LLMTelemetry()
+        self.last_call: Optional[CallRecord] = None
+        self._session = None
+        self._pool_connectors: Dict[str, 'LLMConnector'] = {}
+        self._hedge_connector: Optional['LLMConnector'] = None
+    
+    @property
+    def session(self):
+        """HTTP会话，首次请求时才导入 requests 并创建，之后复用连接池"""
+        if self._session is None:
+            import requests
+            self._session = requests.Session()
+            self._session.headers.update({
+                'User-Agent': 'Word-LLM-Processor/1.0'
+            })
+        return self._session
     
-    def call(self, prompt: str, system_prompt: Optional[str] = None) -> str:
+    def call(self, prompt: str, system_prompt: Optional[str] = None, context: Optional[str] = None,
+             schema: Optional[dict] = None) -> str:
         """
         调用LLM API
         
-        :param prompt: 用户提示词
+        提示词按"静态在前"排列：系统提示词 → 共用上下文 → 页面提示词。
+        前缀保持不变时，OpenAI 兼容接口可自动命中提示词缓存；
+        Claude 接口在系统提示词和共用上下文之后设置 cache_control 断点。
+        
+        传入 schema 时启用服务商的结构化输出：OpenAI/智谱/通义千问使用 response_format，
+        Claude 使用强制工具调用；自定义API没有JSON模式，由调用方用 llm_json.parse_json 容错解析。
+        
+        配置 hedge 时，请求超过同类请求的历史延迟分位数仍未返回，会向另一账号/服务商再发一次，取先返回的结果。
+        
+        :param prompt: 用户提示词（每次调用不同的部分）
         :param system_prompt: 系统提示词
-        :return: LLM的响应文本
+        :param context: 共用上下文（多次调用相同的部分），放在用户提示词之前
+        :param schema: 期望输出的 JSON Schema（见 PromptTemplate.output_schema）
+        :return: LLM的响应文本（结构化输出时为JSON文本）
         """
+        if self.config.hedge:
+            return self._call_hedged(prompt, system_prompt, context, schema)
+        return self._call_once(prompt, system_prompt, context, schema)
+    
+    def _call_once(self, prompt: str, system_prompt: Optional[str] = None, context: Optional[str] = None,
+                   schema: Optional[dict] = None) -> str:
+        """不对冲的一次调用：有连接池时在池中选账号，否则直接调用服务商"""
+        if self.config.pool is not None:
+            return self._call_pool(prompt, system_prompt, context, schema)
+        _current.prompt_estimate = prompt_estimate(prompt, system_prompt, context)
+        if self.config.json_mode == 'off':
+            schema = None
+        if self.provider == LLMProvider.CLAUDE:
+            return self._call_claude(prompt, system_prompt, context, schema)
+        
+        prompt = join_prompt(context or '', prompt)
         if self.provider == LLMProvider.OPENAI:
-            return self._call_openai(prompt, system_prompt)
-        elif self.provider == LLMProvider.CLAUDE:
-            return self._call_claude(prompt, system_prompt)
+            return self._call_openai(prompt, system_prompt, schema)
         elif self.provider == LLMProvider.QWEN:
-            return self._call_qwen(prompt, system_prompt)
+            return self._call_qwen(prompt, system_prompt, schema)
         elif self.provider == LLMProvider.ZHIPU:
-            return self._call_zhipu(prompt, system_prompt)
+            return self._call_zhipu(prompt, system_prompt, schema)
         elif self.provider == LLMProvider.CUSTOM:
             return self._call_custom(prompt, system_prompt)
         else:
             raise ValueError(f"不支持的LLM提供商: {self.provider}")
     
-    def _call_openai(self, prompt: str, system_prompt: Optional[str] = None) -> str:
-        """调用OpenAI API"""
+    def _call_hedged(self, prompt: str, system_prompt: Optional[str] = None, context: Optional[str] = None,
+                     schema: Optional[dict] = None) -> str:
+        """
+        对冲调用：等待同类请求延迟的 hedge_quantile 分位数后仍未返回时发出对冲请求，
+        有连接池时发往池中另一个账号，否则发往 hedge_to 指定的服务商；历史样本不足时不对冲
+        
+        延迟分位数按实际发出主请求的服务商和模型（连接池中为选中账号的覆盖值）查询
+        """
+        tokens = prompt_estimate(prompt, system_prompt, context)
+        if self.config.pool is None:
+            backup = self.hedge_connector()
+            text, hedged, backup_won = hedged_call(
+                lambda: self._call_once(prompt, system_prompt, context, schema),
+                lambda: backup._call_once(prompt, system_prompt, context, schema),
+                self._hedge_delay(self, tokens))
+        else:
+            # 两路共用已用账号集合（由连接池在池锁内更新），对冲请求不会发往主请求用过的账号
+            tried = set()
+            served: List['LLMConnector'] = []
+            acquired = threading.Event()
+            
+            def on_acquire(connector: 'LLMConnector'):
+                if not served:
+                    served.append(connector)
+                acquired.set()
+            
+            def primary() -> str:
+                try:
+                    return self._call_pool(prompt, system_prompt, context, schema, tried, on_acquire)
+                finally:
+                    acquired.set()
+            
+            def delay() -> Optional[float]:
+                acquired.wait()
+                return self._hedge_delay(served[0], tokens) if served else None
+            
+            text, hedged, backup_won = hedged_call(
+                primary, lambda: self._call_pool(prompt, system_prompt, context, schema, tried), delay)
+        if hedged:
+            self.telemetry.record_hedge(backup_won)
+        return text
+    
+    def _hedge_delay(self, connector: 'LLMConnector', tokens: int) -> Optional[float]:
+        """connector 所用服务商/模型的同类请求延迟分位数，样本不足时为 None"""
+        return self.telemetry.latency.hedge_delay(connector.provider.value, connector.config.model, tokens,
+                                                  self.config.hedge_quantile)
+    
+    def hedge_connector(self) -> 'LLMConnector':
+        """没有连接池时对冲请求使用的连接器（本连接器的配置加上 hedge_to 的覆盖字段，共用遥测）"""
+        if self._hedge_connector is None:
+            overrides = dict(self.config.hedge_to or {})
+            if 'provider' in overrides:
+                overrides['provider'] = LLMProvider(overrides['provider'])
+            self._hedge_connector = LLMConnector(replace(self.config, hedge=False, **overrides), self.telemetry)
+        return self._hedge_connector
+    
+    def request_timeout(self) -> float:
+        """
+        单次请求的超时（秒）：启用 adaptive_timeout 且历史样本足够时按 max_tokens 和历史输出速度推算，
+        限制在 [min_timeout, timeout] 之间；否则为 timeout
+        """
+        if self.config.adaptive_timeout:
+            derived = self.telemetry.latency.timeout_for(self.provider.value, self.config.model,
+                                                         self.config.max_tokens)
+            if derived is not None:
+                return min(float(self.config.timeout), max(self.config.min_timeout, derived))
+        return float(self.config.timeout)
+    
+    def _call_pool(self, prompt: str, system_prompt: Optional[str] = None, context: Optional[str] = None,
+                   schema: Optional[dict] = None, tried: Optional[set] = None,
+                   on_acquire: Optional[Callable[['LLMConnector'], None]] = None) -> str:
+        """
+        在连接池中选一个账号调用；失败时记入该账号的熔断计数，换下一个账号重试，直到全部账号都试过
+        
+        请求被对冲的另一路取代时归还账号但不计入熔断，也不再换账号
+        
+        :param tried: 本次请求已用过的账号（对冲的两路共用；只由连接池在池锁内加入）
+        :param on_acquire: 选定账号后以该账号的连接器调用
+        """
+        pool = self.config.pool
+        tokens = prompt_estimate(prompt, system_prompt, context) + self.config.max_tokens
+        tried = set() if tried is None else tried
+        error = None
+        while len(tried) < len(pool.entries):
+            try:
+                entry = pool.acquire(tokens, exclude=tried)
+            except PoolExhaustedError:
+                if error is None:
+                    raise
+                break
+            connector = self.pool_connector(entry)
+            if on_acquire is not None:
+                on_acquire(connector)
+            try:
+                result = connector._call_once(prompt, system_prompt, context, schema)
+            except RequestCancelled:
+                pool.release(entry, ok=None)
+                raise
+            except Exception as e:
+                pool.release(entry, ok=False)
+                self.last_call = connector.last_call
+                logger.warning("连接池: %s 调用失败: %s", entry.name, e)
+                error = e
+                continue
+            pool.release(entry, ok=True)
+            self.last_call = connector.last_call
+            return result
+        if error is None:
+            # tried 在调用前已包含全部账号（对冲请求的另一路已用过所有账号）
+            raise PoolExhaustedError(f"连接池没有可用账号: 本次请求已使用全部 {len(pool.entries)} 个账号")
+        raise error
+    
+    def pool_connector(self, entry: PoolEntry) -> 'LLMConnector':
+        """池中账号对应的连接器（本连接器的配置加上账号的覆盖字段，共用遥测），按账号复用"""
+        connector = self._pool_connectors.get(entry.name)
+        if connector is None:
+            overrides = dict(entry.overrides)
+            if 'provider' in overrides:
+                overrides['provider'] = LLMProvider(overrides['provider'])
+            connector = LLMConnector(replace(self.config, pool=None, hedge=False, **overrides), self.telemetry)
+            self._pool_connectors[entry.name] = connector
+        return connector
+    
+    def batch_request(self, custom_id: str, prompt: str, system_prompt: Optional[str] = None,
+                      context: Optional[str] = None, schema: Optional[dict] = None) -> dict:
+        """
+        批量文件中的一行请求（OpenAI Batch / Anthropic Message Batches 格式），参数同 call()
+        
+        :param custom_id: 请求标识，结果按此对应回请求
+        :raises ValueError: 服务商没有批量接口
+        """
+        if self.config.json_mode == 'off':
+            schema = None
+        if self.provider == LLMProvider.CLAUDE:
+            return {"custom_id": custom_id,
+                    "params": self._claude_payload(prompt, system_prompt, context, schema)}
+        if self.provider == LLMProvider.OPENAI:
+            return {"custom_id": custom_id, "method": "POST", "url": self.batch_endpoint(),
+                    "body": self._openai_payload(join_prompt(context or '', prompt), system_prompt, schema)}
+        raise ValueError(f"{self.provider.value} 不支持批量接口")
+    
+    def batch_endpoint(self) -> str:
+        """OpenAI 批量请求的目标路径（api_url 的路径部分 + /chat/completions）"""
+        from urllib.parse import urlparse
+        return urlparse(self.config.api_url).path.rstrip('/') + '/chat/completions'
+    
+    def response_text(self, result: dict) -> str:
+        """从响应体中取出模型输出文本（批量结果与实时响应结构相同）"""
+        if self.provider == LLMProvider.CLAUDE:
+            return self._claude_text(result)
+        return self._openai_text(result)
+    
+    def call_batch(self, requests: List[dict], work_dir: str, name: str = 'batch',
+                   poll_interval: Optional[float] = None, timeout: Optional[float] = None) -> Dict[str, dict]:
+        """
+        通过服务商批量接口离线处理一组请求（不占用实时接口的限流额度，价格按 batch_price_ratio 折算）
+        
+        批量文件和任务状态保存在 work_dir，中断后重新调用会继续等待已提交的任务，不会重复提交
+        
+        :param requests: [{'custom_id', 'prompt', 'system_prompt', 'context', 'schema'}]，后三项可省略
+        :param work_dir: 批量文件目录
+        :param name: 任务名（同一目录下的文件名前缀）
+        :param poll_interval: 轮询间隔（秒），默认 config.batch_poll_interval
+        :param timeout: 最长等待时间（秒），None 表示一直等待
+        :return: {custom_id: {'text': 输出文本} 或 {'error': 错误信息}}
+        """
+        from llm_batch import BatchJob
+        
+        job = BatchJob(self, work_dir, name)
+        return job.run(requests, poll_interval, timeout)
+    
+    def _post(self, url: str, payload: dict, headers: dict, service_name: str,
+              stream_format: Optional[str] = None) -> dict:
+        """
+        发送请求并记录遥测：token用量、首字节时间、总延迟、重试次数和限流响应头
+        
+        :param service_name: 用于错误信息的服务名称
+        :param stream_format: 流式响应格式 ('openai' / 'claude' / 'custom')，None 表示非流式
+        :return: 响应JSON（流式响应会还原为非流式的结构）
+        """
+        import requests
+        
+        record = CallRecord(provider=self.provider.value, model=self.config.model,
+                            prompt_estimate=getattr(_current, 'prompt_estimate', 0))
+        start = time.perf_counter()
+        attempt = 0
+        timeout = self.request_timeout()
+        
+        try:
+            while True:
+                check_cancelled()
+                try:
+                    response = self.session.post(url, json=payload, headers=headers, timeout=timeout,
+                                                 stream=stream_format is not None)
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                    if attempt >= self.config.max_retries:
+                        raise
+                    attempt += 1
+                    time.sleep(min(2 ** attempt * 0.5, 10))
+                    continue
+                
+                # elapsed 为发出请求到解析完响应头的时间
+                record.ttfb_s = response.elapsed.total_seconds()
+                record.http_status = response.status_code
+                record.rate_limit = extract_rate_limit_headers(response.headers)
+                
+                if response.status_code in RETRY_STATUS_CODES and attempt < self.config.max_retries:
+                    response.close()
+                    attempt += 1
+                    time.sleep(self._retry_delay(response, attempt))
+                    continue
+                
+                response.raise_for_status()
+                if stream_format is None:
+                    result = response.json()
+                else:
+                    result = self._read_stream(response, stream_format, record, start, timeout)
+                break
+            self.record_usage(record, result)
+        
+        except RequestCancelled:
+            record.status = 'cancelled'
+            raise
+        
+        except requests.exceptions.RequestException as e:
+            record.error = str(e)
+            # 对冲请求中已落败的一路随后超时或出错，按取消记录
+            record.status = 'cancelled' if is_cancelled() else 'error'
+            check_cancelled()
+            raise RuntimeError(f"{service_name} 调用失败: {e}")
+        
+        except Exception as e:
+            # 响应体不是JSON、SSE 数据块损坏、用量字段异常等：同样计入遥测的失败调用
+            record.error = f"{type(e).__name__}: {e}"
+            record.status = 'cancelled' if is_cancelled() else 'error'
+            raise
+        
+        finally:
+            record.retries = attempt
+            record.latency_s = time.perf_counter() - start
+            self.last_call = record
+            if record.status != 'ok':
+                self.telemetry.record(record)
+        
+        self.telemetry.record(record)
+        return result
+    
+    def record_usage(self, record: CallRecord, result: dict, price_ratio: float = 1.0):
+        """
+        从响应体中提取token用量并估算费用
+        
+        :param price_ratio: 价格折扣（批量接口为 config.batch_price_ratio）
+        """
+        record.prompt_tokens, record.completion_tokens, record.cached_tokens = extract_usage(result)
+        cached_price = self.config.cached_prompt_price
+        if cached_price is None:
+            cached_price = self.config.prompt_price
+        record.cost = ((record.prompt_tokens - record.cached_tokens) * self.config.prompt_price +
+                       record.cached_tokens * cached_price +
+                       record.completion_tokens * self.config.completion_price) * price_ratio / 1_000_000
+    
+    @staticmethod
+    def _read_stream(response, stream_format: str, record: CallRecord, start: float,
+                     timeout: Optional[float] = None) -> dict:
+        """
+        读取SSE流式响应，首个数据块到达时间记为首字节时间
+        
+        请求被对冲的另一路取代时在下一个数据块处断开连接；
+        timeout 限制整个响应的接收时间（requests 的超时只限制两次读取之间的间隔）
+        
+        :return: 与非流式响应结构一致的字典
+        """
+        parts = []
+        usage = {}
+        # SSE 规定为 UTF-8；未声明 charset 时 requests 会按 ISO-8859-1 解码
+        response.encoding = 'utf-8'
+        
+        for line in response.iter_lines(decode_unicode=True):
+            try:
+                check_cancelled()
+            except RequestCancelled:
+                response.close()
+                raise
+            if timeout is not None and time.perf_counter() - start > timeout:
+                import requests
+                response.close()
+                raise requests.exceptions.Timeout(f"流式响应超过 {timeout:.1f} 秒未接收完")
+            if not line or not line.startswith('data:'):
+                continue
+            data = line[5:].strip()
+            if data == '[DONE]':
+                break
+            if not parts and not usage:
+                record.ttfb_s = time.perf_counter() - start
+            chunk = json.loads(data)
+            
+            if stream_format == 'claude':
+                if chunk.get('type') == 'message_start':
+                    usage.update(chunk.get('message', {}).get('usage', {}))
+                elif chunk.get('type') == 'content_block_delta':
+                    delta = chunk.get('delta', {})
+                    parts.append(delta.get('text') or delta.get('partial_json') or '')
+                elif chunk.get('type') == 'message_delta':
+                    usage.update(chunk.get('usage', {}))
+            elif stream_format == 'custom':
+                chunk = chunk.get('Response', chunk)
+                for choice in chunk.get('Choices') or []:
+                    parts.append((choice.get('Delta') or {}).get('Content', ''))
+                if chunk.get('Usage'):
+                    usage = chunk['Usage']
+            else:
+                for choice in chunk.get('choices') or []:
+                    parts.append((choice.get('delta') or {}).get('content') or '')
+                if chunk.get('usage'):
+                    usage = chunk['usage']
+        
+        text = ''.join(parts)
+        if stream_format == 'claude':
+            return {'content': [{'type': 'text', 'text': text}], 'usage': usage}
+        if stream_format == 'custom':
+            return {'Choices': [{'Message': {'Role': 'assistant', 'Content': text}}], 'Usage': usage}
+        return {'choices': [{'message': {'role': 'assistant', 'content': text}}], 'usage': usage}
+    
+    @staticmethod
+    def _retry_delay(response, attempt: int) -> float:
+        """优先使用服务端的 Retry-After，否则指数退避"""
+        retry_after = response.headers.get('retry-after')
+        if retry_after:
+            try:
+                return min(float(retry_after), 60)
+            except ValueError:
+                pass
+        return min(2 ** attempt * 0.5, 10)
+    
+    def _response_format(self, schema: Optional[dict], allow_schema: bool = False) -> Optional[dict]:
+        """
+        OpenAI 兼容的 response_format
+
+        :param allow_schema: 接口是否支持 json_schema；不支持时退回 json_object
+        """
+        if not schema or self.config.json_mode == 'off':
+            return None
+        if self.config.json_mode == 'json_schema' and allow_schema:
+            return {"type": "json_schema",
+                    "json_schema": {"name": "output", "schema": schema, "strict": False}}
+        return {"type": "json_object"}
+    
+    def _openai_payload(self, prompt: str, system_prompt: Optional[str] = None,
+                        schema: Optional[dict] = None) -> dict:
+        """OpenAI 兼容接口的请求体（不含流式参数）"""
         messages = []
         
         if system_prompt:
@@ -87,165 +537,206 @@ class LLMConnector:
             "content": prompt
         })
         
-        try:
-            response = self.session.post(
-                f"{self.config.api_url}/chat/completions",
-                json={
-                    "model": self.config.model,
-                    "messages": messages,
-                    "temperature": self.config.temperature,
-                    "max_tokens": self.config.max_tokens,
-                },
-                headers={
-                    "Authorization": f"Bearer {self.config.api_key}",
-                    "Content-Type": "application/json"
-                },
-                timeout=self.config.timeout
-            )
-            response.raise_for_status()
-            result = response.json()
-            return result['choices'][0]['message']['content']
+        payload = {
+            "model": self.config.model,
+            "messages": messages,
+            "temperature": self.config.temperature,
+            "max_tokens": self.config.max_tokens,
+        }
+        response_format = self._response_format(schema, allow_schema=True)
+        if response_format:
+            payload["response_format"] = response_format
+        return payload
+    
+    @staticmethod
+    def _openai_text(result: dict) -> str:
+        return result['choices'][0]['message']['content']
+    
+    def _call_openai(self, prompt: str, system_prompt: Optional[str] = None,
+                     schema: Optional[dict] = None) -> str:
+        """调用OpenAI API"""
+        payload = self._openai_payload(prompt, system_prompt, schema)
+        if self.config.stream:
+            payload["stream"] = True
+            payload["stream_options"] = {"include_usage": True}
         
-        except requests.exceptions.RequestException as e:
-            raise RuntimeError(f"OpenAI API 调用失败: {e}")
+        result = self._post(
+            f"{self.config.api_url}/chat/completions",
+            payload,
+            {
+                "Authorization": f"Bearer {self.config.api_key}",
+                "Content-Type": "application/json"
+            },
+            "OpenAI API",
+            "openai" if self.config.stream else None
+        )
+        return self._openai_text(result)
     
-    def _call_claude(self, prompt: str, system_prompt: Optional[str] = None) -> str:
-        """调用Claude API"""
-        try:
-            response = self.session.post(
-                f"{self.config.api_url}/messages",
-                json={
-                    "model": self.config.model,
-                    "max_tokens": self.config.max_tokens,
-                    "system": system_prompt or "",
-                    "messages": [
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ]
-                },
-                headers={
-                    "x-api-key": self.config.api_key,
-                    "anthropic-version": "2023-06-01",
-                    "Content-Type": "application/json"
-                },
-                timeout=self.config.timeout
-            )
-            response.raise_for_status()
-            result = response.json()
-            return result['content'][0]['text']
+    def _claude_payload(self, prompt: str, system_prompt: Optional[str] = None,
+                        context: Optional[str] = None, schema: Optional[dict] = None) -> dict:
+        """Claude 接口的请求体（不含流式参数）"""
+        if self.config.prompt_cache:
+            cache = {"type": "ephemeral"}
+            system = [{"type": "text", "text": system_prompt, "cache_control": cache}] if system_prompt else ""
+            content = [{"type": "text", "text": context, "cache_control": cache}] if context else []
+            content.append({"type": "text", "text": prompt})
+        else:
+            system = system_prompt or ""
+            content = join_prompt(context or '', prompt)
         
-        except requests.exceptions.RequestException as e:
-            raise RuntimeError(f"Claude API 调用失败: {e}")
+        payload = {
+            "model": self.config.model,
+            "max_tokens": self.config.max_tokens,
+            "system": system,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": content
+                }
+            ]
+        }
+        if schema:
+            payload["tools"] = [{"name": CLAUDE_OUTPUT_TOOL, "description": "按要求的结构返回结果",
+                                 "input_schema": schema}]
+            payload["tool_choice"] = {"type": "tool", "name": CLAUDE_OUTPUT_TOOL}
+        return payload
+    
+    @staticmethod
+    def _claude_text(result: dict) -> str:
+        for block in result['content']:
+            if block.get('type') == 'tool_use':
+                return json.dumps(block.get('input', {}), ensure_ascii=False)
+        return ''.join(block.get('text', '') for block in result['content'])
+    
+    def _call_claude(self, prompt: str, system_prompt: Optional[str] = None,
+                     context: Optional[str] = None, schema: Optional[dict] = None) -> str:
+        """
+        调用Claude API（系统提示词和共用上下文分别设置缓存断点）
+        
+        传入 schema 时强制调用以其为参数结构的工具，返回工具参数的JSON文本
+        """
+        payload = self._claude_payload(prompt, system_prompt, context, schema)
+        if self.config.stream:
+            payload["stream"] = True
+        
+        result = self._post(
+            f"{self.config.api_url}/messages",
+            payload,
+            self._claude_headers(),
+            "Claude API",
+            "claude" if self.config.stream else None
+        )
+        return self._claude_text(result)
     
-    def _call_qwen(self, prompt: str, system_prompt: Optional[str] = None) -> str:
+    def _claude_headers(self) -> dict:
+        return {
+            "x-api-key": self.config.api_key,
+            "anthropic-version": "2023-06-01",
+            "Content-Type": "application/json"
+        }
+    
+    def _call_qwen(self, prompt: str, system_prompt: Optional[str] = None,
+                   schema: Optional[dict] = None) -> str:
         """调用阿里通义千问API"""
-        try:
-            response = self.session.post(
-                self.config.api_url,
-                json={
-                    "model": self.config.model,
-                    "messages": [
-                        {
-                            "role": "system",
-                            "content": system_prompt or "你是一个有用的助手。"
-                        },
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ],
-                    "temperature": self.config.temperature,
-                    "max_tokens": self.config.max_tokens,
+        payload = {
+            "model": self.config.model,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": system_prompt or "你是一个有用的助手。"
                 },
-                headers={
-                    "Authorization": f"Bearer {self.config.api_key}",
-                    "Content-Type": "application/json"
-                },
-                timeout=self.config.timeout
-            )
-            response.raise_for_status()
-            result = response.json()
-            return result['output']['choices'][0]['message']['content']
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            "temperature": self.config.temperature,
+            "max_tokens": self.config.max_tokens,
+        }
+        response_format = self._response_format(schema)
+        if response_format:
+            payload["response_format"] = response_format
         
-        except requests.exceptions.RequestException as e:
-            raise RuntimeError(f"通义千问API 调用失败: {e}")
+        result = self._post(
+            self.config.api_url,
+            payload,
+            {
+                "Authorization": f"Bearer {self.config.api_key}",
+                "Content-Type": "application/json"
+            },
+            "通义千问API"
+        )
+        return result['output']['choices'][0]['message']['content']
     
-    def _call_zhipu(self, prompt: str, system_prompt: Optional[str] = None) -> str:
+    def _call_zhipu(self, prompt: str, system_prompt: Optional[str] = None,
+                    schema: Optional[dict] = None) -> str:
         """调用智谱清言API"""
-        try:
-            response = self.session.post(
-                f"{self.config.api_url}/openai/v1/chat/completions",
-                json={
-                    "model": self.config.model,
-                    "messages": [
-                        {
-                            "role": "system",
-                            "content": system_prompt or ""
-                        },
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ],
-                    "temperature": self.config.temperature,
-                    "max_tokens": self.config.max_tokens,
+        payload = {
+            "model": self.config.model,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": system_prompt or ""
                 },
-                headers={
-                    "Authorization": f"Bearer {self.config.api_key}",
-                    "Content-Type": "application/json"
-                },
-                timeout=self.config.timeout
-            )
-            response.raise_for_status()
-            result = response.json()
-            return result['choices'][0]['message']['content']
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            "temperature": self.config.temperature,
+            "max_tokens": self.config.max_tokens,
+        }
+        response_format = self._response_format(schema)
+        if response_format:
+            payload["response_format"] = response_format
         
-        except requests.exceptions.RequestException as e:
-            raise RuntimeError(f"智谱清言API 调用失败: {e}")
+        result = self._post(
+            f"{self.config.api_url}/openai/v1/chat/completions",
+            payload,
+            {
+                "Authorization": f"Bearer {self.config.api_key}",
+                "Content-Type": "application/json"
+            },
+            "智谱清言API"
+        )
+        return result['choices'][0]['message']['content']
     
     def _call_custom(self, prompt: str, system_prompt: Optional[str] = None) -> str:
         """调用腾讯云 DeepSeek V3 自定义API"""
-        try:
-            messages = []
-            # system_prompt 官方示例没有 system，但是你可以自己加成 user 消息或者 role=system
-            if system_prompt:
-                messages.append({"Role": "system", "Content": system_prompt})
-            messages.append({"Role": "user", "Content": prompt})
-
-            payload = {
-                "MaxTokens": self.config.max_tokens,
-                "Temperature": self.config.temperature,
-                "Model": self.config.model,
-                "Messages": messages,
-                "Stream": False   # 流式输出设 False，方便直接返回
-            }
+        messages = []
+        # system_prompt 官方示例没有 system，但是你可以自己加成 user 消息或者 role=system
+        if system_prompt:
+            messages.append({"Role": "system", "Content": system_prompt})
+        messages.append({"Role": "user", "Content": prompt})
 
-            response = self.session.post(
-                self.config.api_url,
-                json=payload,
-                headers={
-                    "Authorization": f"Bearer {self.config.api_key}",
-                    "Content-Type": "application/json",
-                    "X-TC-Action": "ChatCompletions"   # 官方要求
-                },
-                timeout=self.config.timeout
-            )
-            response.raise_for_status()
-            result = response.json()
+        payload = {
+            "MaxTokens": self.config.max_tokens,
+            "Temperature": self.config.temperature,
+            "Model": self.config.model,
+            "Messages": messages,
+            "Stream": self.config.stream   # 流式响应由 _post 还原为完整结果
+        }
 
-            # 官方返回通常在 result.Choices[0].Message.Content
-            if "Choices" in result and len(result["Choices"]) > 0:
-                choice = result["Choices"][0]
-                if "Message" in choice and "Content" in choice["Message"]:
-                    return choice["Message"]["Content"]
+        result = self._post(
+            self.config.api_url,
+            payload,
+            {
+                "Authorization": f"Bearer {self.config.api_key}",
+                "Content-Type": "application/json",
+                "X-TC-Action": "ChatCompletions"   # 官方要求
+            },
+            "自定义API",
+            "custom" if self.config.stream else None
+        )
 
-            # fallback
-            return str(result)
+        # 官方返回通常在 result.Choices[0].Message.Content
+        if "Choices" in result and len(result["Choices"]) > 0:
+            choice = result["Choices"][0]
+            if "Message" in choice and "Content" in choice["Message"]:
+                return choice["Message"]["Content"]
 
-        except requests.exceptions.RequestException as e:
-            raise RuntimeError(f"自定义API 调用失败: {e}")
+        # fallback
+        return str(result)
 
 
 def load_config_from_file(config_file: str = 'llm_config.json') -> LLMConfig:
@@ -268,7 +759,25 @@ def load_config_from_file(config_file: str = 'llm_config.json') -> LLMConfig:
         model=config_data['model'],
         temperature=config_data.get('temperature', 0.3),
         max_tokens=config_data.get('max_tokens', 2000),
-        timeout=config_data.get('timeout', 60)
+        timeout=config_data.get('timeout', 60),
+        max_retries=config_data.get('max_retries', 0),
+        prompt_price=config_data.get('prompt_price', 0.0),
+        completion_price=config_data.get('completion_price', 0.0),
+        stream=config_data.get('stream', False),
+        prompt_cache=config_data.get('prompt_cache', True),
+        cached_prompt_price=config_data.get('cached_prompt_price'),
+        json_mode=config_data.get('json_mode', 'off'),
+        repair_rounds=config_data.get('repair_rounds', 1),
+        min_confidence=config_data.get('min_confidence', 0.6),
+        data_top_k=config_data.get('data_top_k', 5),
+        batch_price_ratio=config_data.get('batch_price_ratio', 0.5),
+        batch_poll_interval=config_data.get('batch_poll_interval', 60.0),
+        pool=LLMPool.from_config(config_data['pool']) if config_data.get('pool') else None,
+        hedge=config_data.get('hedge', False),
+        hedge_quantile=config_data.get('hedge_quantile', 0.95),
+        hedge_to=config_data.get('hedge_to'),
+        adaptive_timeout=config_data.get('adaptive_timeout', False),
+        min_timeout=config_data.get('min_timeout', 10.0)
     )
 
 
@@ -0,0 +1,90 @@
+"""
+对冲请求
+主请求超过同类请求（同模型、同规模提示词）的历史 p95 延迟仍未返回时，向另一个账号或服务商发出相同的请求，
+先成功返回的结果胜出，另一个请求被取消：流式响应在下一个数据块处断开，尚未发出的重试不再发出；
+非流式请求发出后无法中断，只能在响应到达后丢弃
+
+用法:
+    text, hedged, backup_won = hedged_call(lambda: primary.call(...), lambda: backup.call(...), delay=1.8)
+"""
+import queue
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple, TypeVar, Union
+
+T = TypeVar('T')
+
+_local = threading.local()
+
+
+class RequestCancelled(Exception):
+    """请求已被对冲的另一路请求取代"""
+
+
+def is_cancelled() -> bool:
+    """当前线程的请求是否已被对冲的另一路取代（不在对冲调用中时总是 False）"""
+    event = getattr(_local, 'cancel', None)
+    return event is not None and event.is_set()
+
+
+def check_cancelled():
+    """请求已被取代时抛出 RequestCancelled（连接器在重试前和读取流式数据块时调用）"""
+    if is_cancelled():
+        raise RequestCancelled("请求已被对冲请求取代")
+
+
+def hedged_call(primary: Callable[[], T], backup: Optional[Callable[[], T]],
+                delay: Union[None, float, Callable[[], Optional[float]]]) -> Tuple[T, bool, bool]:
+    """
+    先发主请求，超过 delay 秒仍未返回时再发对冲请求，返回先成功的结果
+
+    一路失败时等待另一路；两路都失败时抛出主请求的异常
+
+    :param primary: 主请求
+    :param backup: 对冲请求，None 表示不对冲
+    :param delay: 发出对冲请求前的等待时间（秒，从主请求发出时算起），None 表示不对冲（历史样本不足）；
+                  也可以是函数，在主请求发出后调用（如等主请求选定账号后按该账号的模型取延迟）
+    :return: (结果, 是否发出了对冲请求, 是否由对冲请求返回)
+    """
+    if backup is None or delay is None:
+        return primary(), False, False
+
+    results: 'queue.Queue[Tuple[str, bool, object]]' = queue.Queue()
+    cancels: Dict[str, threading.Event] = {}
+
+    def launch(name: str, fn: Callable[[], T]):
+        cancel = cancels[name] = threading.Event()
+
+        def run():
+            _local.cancel = cancel
+            try:
+                results.put((name, True, fn()))
+            except BaseException as e:
+                results.put((name, False, e))
+
+        # 守护线程：被取消但无法中断的请求不会阻止进程退出
+        threading.Thread(target=run, name=f'hedge-{name}', daemon=True).start()
+
+    start = time.monotonic()
+    launch('primary', primary)
+    if callable(delay):
+        delay = delay()
+    try:
+        if delay is None:
+            finished = [results.get()]
+        else:
+            finished = [results.get(timeout=max(0.0, start + delay - time.monotonic()))]
+    except queue.Empty:
+        launch('backup', backup)
+        finished = [results.get()]
+    if not finished[0][1] and len(cancels) > 1:
+        finished.append(results.get())
+
+    winner = next((item for item in finished if item[1]), None)
+    for name, cancel in cancels.items():
+        if winner is None or name != winner[0]:
+            cancel.set()
+    if winner is None:
+        errors = {name: value for name, _, value in finished}
+        raise errors.get('primary', finished[0][2])
+    return winner[2], len(cancels) > 1, winner[0] == 'backup'
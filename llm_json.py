@@ -0,0 +1,245 @@
+"""
+大模型JSON输出解析
+容忍模型输出中常见的格式问题：Markdown 代码块、前后说明文字、尾随逗号、注释、
+单引号、Python 字面量（True/False/None）、字符串内未转义的换行，以及输出被截断
+
+用法:
+    data = parse_json(response, schema=PromptLibrary.get_template('tender_form').output_schema)
+    errors = validate(data, schema)
+"""
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+_FENCE_RE = re.compile(r'```[\w-]*[ \t]*\n?(.*?)(?:```|$)', re.S)
+_WORD_RE = re.compile(r'[^\W\d][\w-]*')
+_LITERALS = {'true': 'true', 'false': 'false', 'null': 'null',
+             'True': 'true', 'False': 'false', 'None': 'null', 'NaN': 'null'}
+_CLOSERS = {'{': '}', '[': ']'}
+_JSON_TYPES = {
+    'object': dict, 'array': list, 'string': str, 'boolean': bool,
+    'integer': int, 'number': (int, float), 'null': type(None),
+}
+
+
+class LLMJSONError(ValueError):
+    """模型输出中找不到可解析的JSON"""
+
+    def __init__(self, message: str, text: str = ''):
+        super().__init__(message)
+        self.text = text
+
+
+def _candidates(text: str):
+    """依次给出可能包含JSON的片段：代码块内容优先，然后是全文"""
+    for match in _FENCE_RE.finditer(text):
+        yield match.group(1)
+    yield text
+
+
+def _find_start(text: str, start_chars: str) -> int:
+    positions = [p for p in (text.find(ch) for ch in start_chars) if p >= 0]
+    return min(positions) if positions else -1
+
+
+def repair_json(text: str) -> str:
+    """
+    修复常见的非标准JSON，返回可交给 json.loads 的字符串
+
+    从第一个 { 或 [ 开始扫描，到与之配对的括号结束（之后的文字忽略）；
+    输出被截断时补全未闭合的字符串和括号
+    """
+    out: List[str] = []
+    stack: List[str] = []
+    i, n = 0, len(text)
+    quote = None
+    started = False
+
+    def drop_trailing_comma():
+        while out and out[-1].isspace():
+            out.pop()
+        if out and out[-1] == ',':
+            out.pop()
+
+    while i < n:
+        ch = text[i]
+        if quote:
+            if ch == '\\' and i + 1 < n:
+                out.append(text[i:i + 2] if text[i + 1] != "'" else "'")
+                i += 2
+                continue
+            if ch == quote:
+                out.append('"')
+                quote = None
+            elif ch == '"':
+                out.append('\\"')
+            elif ch in '\n\r\t':
+                out.append({'\n': '\\n', '\r': '\\r', '\t': '\\t'}[ch])
+            elif ch != '\\':
+                out.append(ch)
+            i += 1
+            continue
+
+        if not started:
+            if ch in _CLOSERS:
+                started = True
+            else:
+                i += 1
+                continue
+
+        if ch in '"\'':
+            quote = ch
+            out.append('"')
+        elif ch in _CLOSERS:
+            stack.append(_CLOSERS[ch])
+            out.append(ch)
+        elif ch in '}]':
+            drop_trailing_comma()
+            if stack:
+                out.append(stack.pop())
+            if not stack:
+                break
+        elif ch == '/' and text.startswith('//', i):
+            end = text.find('\n', i)
+            i = n if end < 0 else end
+            continue
+        elif ch == '/' and text.startswith('/*', i):
+            end = text.find('*/', i + 2)
+            i = n if end < 0 else end + 2
+            continue
+        elif ch.isalpha() or ch == '_':
+            word = _WORD_RE.match(text, i).group()
+            rest = text[i + len(word):].lstrip()
+            if rest.startswith(':'):
+                out.append(json.dumps(word))  # 未加引号的键
+            else:
+                out.append(_LITERALS.get(word, json.dumps(word)))
+            i += len(word)
+            continue
+        else:
+            out.append(ch)
+        i += 1
+
+    if quote:
+        out.append('"')
+    drop_trailing_comma()
+    if out and out[-1] == ':':
+        out.append('null')
+    out.extend(reversed(stack))
+    return ''.join(out)
+
+
+def _truncate_to_last_item(repaired: str) -> Optional[str]:
+    """截断输出的最后一项往往不完整：逐个回退到前一个逗号再补全括号"""
+    depth_stack: List[str] = []
+    commas = []
+    in_string = escaped = False
+    for pos, ch in enumerate(repaired):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in _CLOSERS:
+            depth_stack.append(_CLOSERS[ch])
+        elif ch in '}]':
+            if depth_stack:
+                depth_stack.pop()
+        elif ch == ',':
+            commas.append((pos, ''.join(reversed(depth_stack))))
+
+    for pos, closers in reversed(commas):
+        candidate = repaired[:pos] + closers
+        try:
+            json.loads(candidate)
+            return candidate
+        except json.JSONDecodeError:
+            continue
+    return None
+
+
+def parse_json(text: str, schema: Optional[Dict[str, Any]] = None) -> Any:
+    """
+    从模型输出中解析JSON
+
+    :param text: 模型原始输出
+    :param schema: 期望的 JSON Schema；用其顶层 type 确定要找对象还是数组，并校验顶层类型
+    :return: 解析结果
+    :raises LLMJSONError: 找不到可解析的JSON，或顶层类型与 schema 不符
+    """
+    if text is None:
+        raise LLMJSONError('模型未返回内容', '')
+    expected = (schema or {}).get('type')
+    start_chars = {'object': '{', 'array': '['}.get(expected, '{[')
+    decoder = json.JSONDecoder()
+
+    try:
+        result = json.loads(text)
+    except (json.JSONDecodeError, TypeError):
+        result = None
+        for candidate in _candidates(text):
+            start = _find_start(candidate, start_chars)
+            if start < 0:
+                continue
+            try:
+                result = decoder.raw_decode(candidate, start)[0]
+                break
+            except json.JSONDecodeError:
+                pass
+            repaired = repair_json(candidate[start:])
+            try:
+                result = json.loads(repaired)
+                break
+            except json.JSONDecodeError:
+                truncated = _truncate_to_last_item(repaired)
+                if truncated is not None:
+                    result = json.loads(truncated)
+                    break
+        else:
+            raise LLMJSONError('模型输出中找不到可解析的JSON', text)
+
+    if expected and not _is_type(result, expected):
+        raise LLMJSONError(f'JSON顶层类型应为 {expected}，实际为 {type(result).__name__}', text)
+    return result
+
+
+def _is_type(value: Any, expected) -> bool:
+    types = expected if isinstance(expected, list) else [expected]
+    for name in types:
+        py_type = _JSON_TYPES.get(name)
+        if py_type is None:
+            return True
+        if isinstance(value, bool) and name in ('integer', 'number'):
+            continue
+        if isinstance(value, py_type):
+            return True
+    return False
+
+
+def validate(value: Any, schema: Dict[str, Any], path: str = '$') -> List[str]:
+    """
+    按 JSON Schema 的常用子集校验（type / required / properties / items / enum）
+
+    :return: 错误描述列表，为空表示通过
+    """
+    errors = []
+    expected = schema.get('type')
+    if expected and not _is_type(value, expected):
+        return [f'{path}: 应为 {expected}，实际为 {type(value).__name__}']
+    if 'enum' in schema and value not in schema['enum']:
+        errors.append(f'{path}: 取值 {value!r} 不在 {schema["enum"]} 中')
+    if isinstance(value, dict):
+        for key in schema.get('required', []):
+            if key not in value:
+                errors.append(f'{path}.{key}: 缺少必填字段')
+        for key, sub in schema.get('properties', {}).items():
+            if key in value:
+                errors.extend(validate(value[key], sub, f'{path}.{key}'))
+    elif isinstance(value, list) and 'items' in schema:
+        for index, item in enumerate(value):
+            errors.extend(validate(item, schema['items'], f'{path}[{index}]'))
+    return errors
@@ -0,0 +1,179 @@
+"""
+LLM 连接器压测
+以 N 路并发调用 LLMConnector，统计吞吐量和 p50/p95/p99 延迟；
+默认在进程内启动模拟LLM服务，也可指向任意兼容地址
+
+用法:
+    python llm_load_test.py --concurrency 1 8 32 --requests 200 --latency lognormal:-1,0.5
+    python llm_load_test.py --url http://127.0.0.1:8765/v1 --provider claude --stream
+    python llm_load_test.py --concurrency 16 --pool 4 --pool-rpm 120 --pool-dead 1
+    python llm_load_test.py --concurrency 16 --requests 500 --rate-stall 0.02 --hedge --adaptive-timeout
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from llm_connector import LLMConfig, LLMConnector, LLMProvider
+from llm_pool import LLMPool
+from llm_telemetry import LLMTelemetry
+from mock_llm_server import MockSettings, start_mock_server
+from prompt_library import PromptLibrary
+
+SAMPLE_FIELDS = "  - ${投标人名称}: 投标人名称：${投标人名称}\n  - ${法定代表人}: 法定代表人：${法定代表人}"
+SAMPLE_DATA = "投标人名称: 上海星辰科技有限公司\n法定代表人: 王强"
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def run_load(config: LLMConfig, concurrency: int, total_requests: int) -> Dict[str, Any]:
+    """
+    以固定并发数发送请求
+
+    :param config: 连接器配置
+    :param concurrency: 并发数
+    :param total_requests: 请求总数
+    :return: 统计结果
+    """
+    telemetry = LLMTelemetry(keep_records=False)
+    template = PromptLibrary.get_template('tender_form')
+    system_prompt, context, user_prompt = template.format_parts(
+        page_num=1, page_title='第1页', fields_to_fill=SAMPLE_FIELDS, provided_data=SAMPLE_DATA)
+
+    # 每个工作线程使用独立的连接器（独立的 requests.Session），共享遥测
+    local = threading.local()
+    latencies: List[float] = []
+    errors: List[str] = []
+    lock = threading.Lock()
+
+    def one_call(_):
+        if not hasattr(local, 'connector'):
+            local.connector = LLMConnector(config, telemetry)
+        start = time.perf_counter()
+        try:
+            local.connector.call(user_prompt, system_prompt, context=context,
+                                 schema=template.output_schema)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+        except Exception as e:
+            with lock:
+                errors.append(str(e))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one_call, range(total_requests)))
+    wall = time.perf_counter() - started
+
+    totals = telemetry.totals()
+    models = telemetry.summary()['models']
+    ttfb = models[0]['ttfb_s'] if models else {}
+    return {
+        'concurrency': concurrency,
+        'requests': total_requests,
+        'ok': len(latencies),
+        'errors': len(errors),
+        'retries': totals['retries'],
+        'wall_s': round(wall, 3),
+        'throughput_rps': round(len(latencies) / wall, 2) if wall else 0.0,
+        'latency_p50_s': round(_percentile(latencies, 0.5), 4),
+        'latency_p95_s': round(_percentile(latencies, 0.95), 4),
+        'latency_p99_s': round(_percentile(latencies, 0.99), 4),
+        'ttfb_p50_s': ttfb.get('p50', 0.0),
+        'hedged': telemetry.hedges['hedged'],
+        'cancelled': totals['cancelled'],
+        'prompt_tokens': totals['prompt_tokens'],
+        'completion_tokens': totals['completion_tokens'],
+        'sample_error': errors[0] if errors else '',
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='LLM 连接器并发压测')
+    parser.add_argument('--url', default=None, help='服务地址；不指定时在进程内启动模拟服务')
+    parser.add_argument('--provider', default='openai', choices=['openai', 'claude', 'custom', 'zhipu'])
+    parser.add_argument('--model', default='mock-model')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--requests', type=int, default=100, help='每个并发级别的请求数')
+    parser.add_argument('--stream', action='store_true', help='使用流式响应')
+    parser.add_argument('--max-retries', type=int, default=2)
+    parser.add_argument('--timeout', type=int, default=60)
+    parser.add_argument('--max-tokens', type=int, default=2000)
+    parser.add_argument('--pool', type=int, default=0, help='连接池账号数（0 表示不使用连接池）')
+    parser.add_argument('--pool-rpm', type=int, default=0, help='每个账号的每分钟请求数上限')
+    parser.add_argument('--pool-dead', type=int, default=0, help='其中指向不可达地址的账号数（验证熔断）')
+    parser.add_argument('--hedge', action='store_true', help='对冲请求（无连接池时对冲到同一地址）')
+    parser.add_argument('--adaptive-timeout', action='store_true', help='按历史输出速度推算超时')
+    parser.add_argument('--min-timeout', type=float, default=10.0, help='自适应超时的下限（秒）')
+    # 以下参数仅用于内置模拟服务
+    parser.add_argument('--latency', default='lognormal:-1.5,0.5', help='模拟服务延迟分布')
+    parser.add_argument('--tps', type=float, default=200.0, help='模拟服务输出 tokens/秒')
+    parser.add_argument('--rate-429', type=float, default=0.0)
+    parser.add_argument('--rate-500', type=float, default=0.0)
+    parser.add_argument('--retry-after', type=float, default=0.1)
+    parser.add_argument('--rate-stall', type=float, default=0.0, help='响应前额外卡住 --stall 秒的概率')
+    parser.add_argument('--stall', type=float, default=30.0)
+    parser.add_argument('--seed', type=int, default=2026)
+    parser.add_argument('-o', '--output', default=None, help='结果JSON路径')
+    args = parser.parse_args(argv)
+
+    server = None
+    url = args.url
+    if url is None:
+        server = start_mock_server(MockSettings(latency=args.latency, tokens_per_second=args.tps,
+                                                rate_429=args.rate_429, rate_500=args.rate_500,
+                                                retry_after=args.retry_after, seed=args.seed,
+                                                rate_stall=args.rate_stall, stall=args.stall))
+        # openai/claude 的地址约定包含 /v1，custom/zhipu 直接使用根地址
+        url = f'{server.url}/v1' if args.provider in ('openai', 'claude') else server.url
+        print(f"✓ 已启动模拟LLM服务: {server.url}")
+
+    config = LLMConfig(provider=LLMProvider(args.provider), api_key='mock-key', api_url=url,
+                       model=args.model, max_tokens=args.max_tokens, timeout=args.timeout,
+                       max_retries=args.max_retries, stream=args.stream, hedge=args.hedge,
+                       adaptive_timeout=args.adaptive_timeout, min_timeout=args.min_timeout)
+    if args.pool:
+        dead_url = 'http://127.0.0.1:9/v1'
+        config.pool = LLMPool.from_config({
+            'entries': [{'name': f'acct-{i + 1}', 'api_key': f'mock-key-{i + 1}', 'rpm': args.pool_rpm,
+                         **({'api_url': dead_url} if i < args.pool_dead else {})}
+                        for i in range(args.pool)],
+            'cooldown': 5.0,
+        })
+
+    print(f"\n{'并发':>6} {'请求':>6} {'成功':>6} {'失败':>5} {'重试':>5} {'吞吐(req/s)':>12} "
+          f"{'p50(s)':>8} {'p95(s)':>8} {'p99(s)':>8} {'首字节p50':>10} {'对冲':>5} {'取消':>5}")
+    results = []
+    try:
+        for concurrency in args.concurrency:
+            r = run_load(config, concurrency, args.requests)
+            results.append(r)
+            print(f"{r['concurrency']:>6} {r['requests']:>6} {r['ok']:>6} {r['errors']:>5} {r['retries']:>5} "
+                  f"{r['throughput_rps']:>12} {r['latency_p50_s']:>8} {r['latency_p95_s']:>8} "
+                  f"{r['latency_p99_s']:>8} {r['ttfb_p50_s']:>10} {r['hedged']:>5} {r['cancelled']:>5}")
+            if r['sample_error']:
+                print(f"       错误示例: {r['sample_error'][:120]}")
+    finally:
+        if server is not None:
+            server.shutdown()
+    if config.pool is not None:
+        config.pool.print_summary()
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'provider': args.provider, 'stream': args.stream, 'url': url, 'results': results},
+                      f, ensure_ascii=False, indent=2)
+        print(f"\n✓ 结果已保存: {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,234 @@
+"""
+API账号/接入点连接池
+llm_config.json 的 pool 一节列出多个账号，请求分配给"未完成请求数/权重"最小的健康账号，
+吞吐量随账号数增加；每个账号可设每分钟请求数(rpm)和token数(tpm)上限，达到上限时换用其他账号或等待。
+
+熔断：账号连续失败 failure_threshold 次后暂停使用 cooldown 秒；冷却结束后放行一个探测请求（半开），
+成功则恢复，失败则再次熔断且冷却时间翻倍（不超过 max_cooldown）
+
+配置（未列出的字段取配置文件主体的值，如 provider、api_url、model）:
+    "pool": [
+        {"name": "acct-a", "api_key": "sk-a", "weight": 2, "rpm": 500, "tpm": 200000},
+        {"name": "acct-b", "api_key": "sk-b", "api_url": "https://proxy.example.com/v1", "rpm": 300}
+    ]
+    或 "pool": {"entries": [...], "failure_threshold": 3, "cooldown": 30}
+"""
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Collection, Deque, Dict, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# 池控制字段，其余字段都是对 LLMConfig 的覆盖
+ENTRY_KEYS = ('name', 'weight', 'rpm', 'tpm')
+POOL_DEFAULTS = {'failure_threshold': 3, 'cooldown': 30.0, 'max_cooldown': 300.0, 'max_wait': 60.0}
+WINDOW_S = 60.0
+
+
+class PoolExhaustedError(RuntimeError):
+    """没有可用的账号：全部熔断，或在最长等待时间内都达到速率上限"""
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算token数（中文约1字1token，英文约4字符1token）"""
+    cjk = sum(1 for ch in text if '一' <= ch <= '鿿')
+    return max(1, cjk + (len(text) - cjk) // 4)
+
+
+@dataclass
+class PoolEntry:
+    """池中的一个账号及其运行状态"""
+    name: str
+    overrides: Dict[str, Any]  # 覆盖 LLMConfig 的字段（api_key、api_url、provider、model 等）
+    weight: float = 1.0
+    rpm: int = 0  # 每分钟请求数上限，0 表示不限
+    tpm: int = 0  # 每分钟token数上限（按 提示词估算 + max_tokens 计），0 表示不限
+    state: str = CLOSED
+    outstanding: int = 0
+    failures: int = 0  # 连续失败次数
+    opened_until: float = 0.0
+    cooldown: float = 0.0
+    probing: bool = False
+    window: Deque[Tuple[float, int]] = field(default_factory=deque)  # 近一分钟的 (时间, token数)
+    calls: int = 0
+    errors: int = 0
+    ejections: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {'name': self.name, **self.overrides, 'weight': self.weight}
+        if self.rpm:
+            data['rpm'] = self.rpm
+        if self.tpm:
+            data['tpm'] = self.tpm
+        return data
+
+
+class LLMPool:
+    """账号池（线程安全，同一配置创建的所有连接器共用）"""
+
+    def __init__(self, entries: List[PoolEntry], failure_threshold: int = 3, cooldown: float = 30.0,
+                 max_cooldown: float = 300.0, max_wait: float = 60.0):
+        """
+        :param entries: 账号列表
+        :param failure_threshold: 连续失败多少次后熔断
+        :param cooldown: 首次熔断的冷却时间（秒）
+        :param max_cooldown: 冷却时间上限（秒）
+        :param max_wait: 没有可用账号时最多等待的时间（秒）
+        """
+        if not entries:
+            raise ValueError("连接池至少需要一个账号")
+        names = [entry.name for entry in entries]
+        if len(set(names)) != len(names):
+            raise ValueError(f"连接池账号名称重复: {names}")
+        self.entries = entries
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.max_wait = max_wait
+        self._cond = threading.Condition()
+        self._turn = 0
+
+    @classmethod
+    def from_config(cls, pool: Union[List[Dict[str, Any]], Dict[str, Any]]) -> 'LLMPool':
+        """
+        从配置文件的 pool 一节创建
+
+        :param pool: 账号列表，或 {'entries': 账号列表, 熔断参数...}
+        """
+        settings = dict(pool) if isinstance(pool, dict) else {'entries': pool}
+        entries = []
+        for index, item in enumerate(settings.pop('entries', [])):
+            entries.append(PoolEntry(
+                name=str(item.get('name') or f'entry-{index + 1}'),
+                overrides={k: v for k, v in item.items() if k not in ENTRY_KEYS},
+                weight=float(item.get('weight', 1.0)),
+                rpm=int(item.get('rpm', 0)),
+                tpm=int(item.get('tpm', 0)),
+            ))
+        return cls(entries, **{k: settings[k] for k in POOL_DEFAULTS if k in settings})
+
+    def to_config(self) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
+        """配置文件中的 pool 一节（熔断参数都为默认值时只写账号列表）"""
+        entries = [entry.to_dict() for entry in self.entries]
+        settings = {k: getattr(self, k) for k in POOL_DEFAULTS if getattr(self, k) != POOL_DEFAULTS[k]}
+        return {'entries': entries, **settings} if settings else entries
+
+    def acquire(self, tokens: int = 0, exclude: Collection[str] = ()) -> PoolEntry:
+        """
+        取一个可用账号（调用结束后必须 release）
+
+        :param tokens: 本次请求预计消耗的token数（用于 tpm 上限）
+        :param exclude: 不使用的账号名称（本次请求已用过的账号）；传入 set 时选中的账号在池锁内加入其中，
+                        对冲请求的两路共用同一个 set，不会选到同一账号
+        :raises PoolExhaustedError: 没有可用账号
+        """
+        deadline = time.monotonic() + self.max_wait
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                entry, wait = self._pick(now, tokens, exclude)
+                if entry is not None:
+                    entry.outstanding += 1
+                    entry.window.append((now, tokens))
+                    if isinstance(exclude, set):
+                        exclude.add(entry.name)
+                    if entry.state == HALF_OPEN:
+                        entry.probing = True
+                        logger.info("连接池: %s 冷却结束，发送探测请求", entry.name)
+                    return entry
+                if wait is None or now + wait > deadline:
+                    raise PoolExhaustedError(f"连接池没有可用账号: {self._describe(now)}")
+                self._cond.wait(wait)
+
+    def release(self, entry: PoolEntry, ok: Optional[bool]):
+        """
+        归还账号并更新熔断状态
+
+        :param ok: 调用是否成功（服务商错误、连接失败记为失败；响应内容无法解析不算账号的问题）；
+                   None 表示请求被对冲的另一路取代而取消，不影响熔断状态
+        """
+        with self._cond:
+            now = time.monotonic()
+            entry.outstanding -= 1
+            entry.calls += 1
+            entry.probing = False
+            if ok:
+                if entry.state != CLOSED:
+                    logger.info("连接池: %s 已恢复", entry.name)
+                entry.state, entry.failures, entry.cooldown = CLOSED, 0, 0.0
+            elif ok is False:
+                entry.errors += 1
+                entry.failures += 1
+                # 熔断前已发出的请求随后失败时不再重复熔断
+                if entry.state == HALF_OPEN or (entry.state == CLOSED and entry.failures >= self.failure_threshold):
+                    entry.cooldown = min(self.max_cooldown, entry.cooldown * 2 if entry.cooldown else self.cooldown)
+                    entry.state = OPEN
+                    entry.opened_until = now + entry.cooldown
+                    entry.ejections += 1
+                    logger.warning("连接池: %s 连续失败%d次，熔断 %.1f 秒", entry.name, entry.failures, entry.cooldown)
+            self._cond.notify_all()
+
+    def _pick(self, now: float, tokens: int,
+              exclude: Collection[str]) -> Tuple[Optional[PoolEntry], Optional[float]]:
+        """
+        :return: (可用账号, None)；没有可用账号时为 (None, 最早可能可用的等待秒数)，全部被排除时等待秒数为 None
+        """
+        best, wait = None, None
+        count = len(self.entries)
+        for offset in range(count):
+            entry = self.entries[(self._turn + offset) % count]
+            if entry.name in exclude:
+                continue
+            ready_in = self._ready_in(entry, now, tokens)
+            if ready_in > 0:
+                wait = ready_in if wait is None else min(wait, ready_in)
+            elif best is None or (entry.outstanding + 1) / entry.weight < (best.outstanding + 1) / best.weight:
+                best = entry
+        if best is not None:
+            # 负载相同的账号轮流使用
+            self._turn = (self._turn + 1) % count
+            return best, None
+        return None, wait
+
+    def _ready_in(self, entry: PoolEntry, now: float, tokens: int) -> float:
+        """账号多久后可接受请求（秒），0 表示现在可用"""
+        if entry.state == OPEN:
+            if now < entry.opened_until:
+                return entry.opened_until - now
+            entry.state = HALF_OPEN
+        if entry.state == HALF_OPEN and entry.probing:
+            return 1.0  # 探测请求结束时会唤醒等待者
+        while entry.window and now - entry.window[0][0] >= WINDOW_S:
+            entry.window.popleft()
+        if not entry.window:
+            return 0.0
+        oldest = WINDOW_S - (now - entry.window[0][0])
+        if entry.rpm and len(entry.window) >= entry.rpm:
+            return oldest
+        if entry.tpm and sum(t for _, t in entry.window) + tokens > entry.tpm:
+            return oldest
+        return 0.0
+
+    def _describe(self, now: float) -> str:
+        return ', '.join(f"{e.name}({e.state}" + (f" {e.opened_until - now:.0f}s" if e.state == OPEN else '') + ')'
+                         for e in self.entries)
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """各账号的状态和调用统计"""
+        with self._cond:
+            return [{'name': e.name, 'state': e.state, 'outstanding': e.outstanding, 'calls': e.calls,
+                     'errors': e.errors, 'ejections': e.ejections} for e in self.entries]
+
+    def print_summary(self):
+        """打印各账号的调用分布"""
+        parts = [f"{s['name']} {s['calls']}次" + (f"/失败{s['errors']}" if s['errors'] else '') +
+                 (f"/熔断{s['ejections']}" if s['ejections'] else '') +
+                 (f" [{s['state']}]" if s['state'] != CLOSED else '') for s in self.summary()]
+        print(f"  连接池: {', '.join(parts)}")
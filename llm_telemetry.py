@@ -0,0 +1,406 @@
+"""
+LLM 调用遥测
+记录每次调用的token用量、首字节时间、总延迟、重试和限流响应头，
+按服务商/模型聚合为直方图，运行结束时导出 JSON 或 Prometheus 格式
+"""
+import bisect
+import json
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field, asdict
+from typing import Deque, Dict, List, Optional, Sequence, Tuple
+
+# 延迟直方图边界（秒）
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+# token 数直方图边界
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+
+# 每个直方图保留的原始样本上限（用于精确分位数）
+MAX_SAMPLES = 10000
+
+# 对冲和自适应超时只看近期样本：每类保留的样本数，以及给出估计所需的最少样本数
+RECENT_SAMPLES = 200
+MIN_SAMPLES = 20
+
+
+@dataclass
+class CallRecord:
+    """单次LLM调用记录"""
+    provider: str
+    model: str
+    started_at: float = field(default_factory=time.time)
+    status: str = 'ok'
+    http_status: int = 0
+    latency_s: float = 0.0
+    ttfb_s: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    retries: int = 0
+    prompt_estimate: int = 0  # 发送前估算的提示词token数（estimate_tokens），对冲延迟按此分档
+    cost: float = 0.0
+    rate_limit: Dict[str, str] = field(default_factory=dict)
+    error: str = ''
+
+
+class Histogram:
+    """固定边界直方图，同时保留有限样本以计算分位数"""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.samples: List[float] = []
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if len(self.samples) < MAX_SAMPLES:
+            self.samples.append(value)
+
+    def quantile(self, q: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def to_dict(self) -> Dict:
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(list(self.buckets) + ['+Inf'], self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 4),
+            'mean': round(self.sum / self.count, 4) if self.count else 0.0,
+            'p50': round(self.quantile(0.5), 4),
+            'p95': round(self.quantile(0.95), 4),
+            'p99': round(self.quantile(0.99), 4),
+            'buckets': buckets,
+        }
+
+
+def _quantile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class LatencyModel:
+    """
+    近期成功调用的延迟和输出速度，按 (服务商, 模型) 和提示词规模（估算token数按2的幂分档）分类，
+    用于决定对冲请求的发出时间和自适应超时
+
+    分档使用发送前的估算值（CallRecord.prompt_estimate）而不是服务商返回的token数，
+    查询时才能用同一口径；没有估算值的记录只计入整个模型的样本
+    """
+
+    def __init__(self, window: int = RECENT_SAMPLES, min_samples: int = MIN_SAMPLES):
+        """
+        :param window: 每类保留的近期样本数
+        :param min_samples: 样本少于此数时不给出估计（提示词规模分档的样本不足时改用整个模型的样本）
+        """
+        self.window = window
+        self.min_samples = min_samples
+        self._latency: Dict[Tuple[str, str, int], Deque[float]] = {}
+        self._model_latency: Dict[Tuple[str, str], Deque[float]] = {}
+        self._speed: Dict[Tuple[str, str], Deque[Tuple[float, float]]] = {}  # (首字节前耗时, 每秒输出token)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def size_class(prompt_tokens: int) -> int:
+        """提示词规模分档：token数的以2为底的对数（向下取整）"""
+        return max(0, int(prompt_tokens).bit_length() - 1)
+
+    def _samples(self, table: Dict, key) -> deque:
+        if key not in table:
+            table[key] = deque(maxlen=self.window)
+        return table[key]
+
+    def observe(self, record: CallRecord):
+        """记录一次成功调用"""
+        if record.status != 'ok' or record.latency_s <= 0:
+            return
+        model = (record.provider, record.model)
+        with self._lock:
+            if record.prompt_estimate:
+                self._samples(self._latency, (*model, self.size_class(record.prompt_estimate))).append(
+                    record.latency_s)
+            self._samples(self._model_latency, model).append(record.latency_s)
+            if record.completion_tokens > 0:
+                # 流式响应的首字节早于结束，生成时间从首字节算起；非流式响应只能按总延迟计
+                streamed = 0 < record.ttfb_s < record.latency_s * 0.9
+                overhead = record.ttfb_s if streamed else 0.0
+                generation = max(record.latency_s - overhead, 1e-3)
+                self._samples(self._speed, model).append((overhead, record.completion_tokens / generation))
+
+    def hedge_delay(self, provider: str, model: str, prompt_tokens: int, quantile: float = 0.95) -> Optional[float]:
+        """
+        同类请求延迟的分位数（秒）
+
+        :param prompt_tokens: 提示词的估算token数（与 CallRecord.prompt_estimate 同一口径）
+        :return: 样本不足时为 None
+        """
+        with self._lock:
+            samples = self._latency.get((provider, model, self.size_class(prompt_tokens)), ())
+            if len(samples) < self.min_samples:
+                samples = self._model_latency.get((provider, model), ())
+            if len(samples) < self.min_samples:
+                return None
+            return _quantile(samples, quantile)
+
+    def timeout_for(self, provider: str, model: str, max_tokens: int, margin: float = 1.5) -> Optional[float]:
+        """
+        按历史速度推算输出 max_tokens 个token所需的时间：(首字节前耗时 p95 + max_tokens / 输出速度 p10) × margin
+
+        :return: 样本不足时为 None
+        """
+        with self._lock:
+            samples = list(self._speed.get((provider, model), ()))
+        if len(samples) < self.min_samples:
+            return None
+        overhead = _quantile([o for o, _ in samples], 0.95)
+        speed = _quantile([s for _, s in samples], 0.1)
+        return (overhead + max_tokens / speed) * margin
+
+
+class _ModelStats:
+    """单个 (服务商, 模型) 的聚合数据"""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.cancelled = 0
+        self.retries = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.cost = 0.0
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.ttfb = Histogram(LATENCY_BUCKETS)
+        self.prompt_token_hist = Histogram(TOKEN_BUCKETS)
+        self.completion_token_hist = Histogram(TOKEN_BUCKETS)
+        self.status_codes: Dict[str, int] = {}
+        self.rate_limit: Dict[str, str] = {}
+
+    def add(self, record: CallRecord):
+        self.calls += 1
+        self.retries += record.retries
+        code = str(record.http_status or 'none')
+        self.status_codes[code] = self.status_codes.get(code, 0) + 1
+        if record.rate_limit:
+            self.rate_limit = dict(record.rate_limit)
+        if record.status == 'cancelled':
+            # 对冲请求中落败而被取消的一路，不算失败
+            self.cancelled += 1
+            return
+        if record.status != 'ok':
+            self.errors += 1
+            return
+        self.prompt_tokens += record.prompt_tokens
+        self.completion_tokens += record.completion_tokens
+        self.cached_tokens += record.cached_tokens
+        self.cost += record.cost
+        self.latency.observe(record.latency_s)
+        self.ttfb.observe(record.ttfb_s)
+        self.prompt_token_hist.observe(record.prompt_tokens)
+        self.completion_token_hist.observe(record.completion_tokens)
+
+    def to_dict(self) -> Dict:
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'cancelled': self.cancelled,
+            'retries': self.retries,
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'cached_tokens': self.cached_tokens,
+            'cost': round(self.cost, 6),
+            'status_codes': self.status_codes,
+            'latency_s': self.latency.to_dict(),
+            'ttfb_s': self.ttfb.to_dict(),
+            'prompt_tokens_hist': self.prompt_token_hist.to_dict(),
+            'completion_tokens_hist': self.completion_token_hist.to_dict(),
+            'last_rate_limit': self.rate_limit,
+        }
+
+
+class LLMTelemetry:
+    """LLM 调用遥测收集器（线程安全）"""
+
+    def __init__(self, keep_records: bool = True):
+        """
+        :param keep_records: 是否保留每次调用的明细记录
+        """
+        self.keep_records = keep_records
+        self.records: List[CallRecord] = []
+        self._stats: Dict[Tuple[str, str], _ModelStats] = {}
+        self.latency = LatencyModel()
+        self.hedges = {'hedged': 0, 'backup_won': 0}
+        self._lock = threading.Lock()
+
+    def record(self, record: CallRecord):
+        """记录一次调用"""
+        with self._lock:
+            if self.keep_records:
+                self.records.append(record)
+            key = (record.provider, record.model)
+            if key not in self._stats:
+                self._stats[key] = _ModelStats()
+            self._stats[key].add(record)
+        self.latency.observe(record)
+
+    def record_hedge(self, backup_won: bool):
+        """记录一次发出了对冲请求的调用"""
+        with self._lock:
+            self.hedges['hedged'] += 1
+            self.hedges['backup_won'] += int(backup_won)
+
+    def totals(self) -> Dict:
+        """全部模型的合计"""
+        with self._lock:
+            stats = list(self._stats.values())
+        return {
+            'calls': sum(s.calls for s in stats),
+            'errors': sum(s.errors for s in stats),
+            'cancelled': sum(s.cancelled for s in stats),
+            'retries': sum(s.retries for s in stats),
+            'prompt_tokens': sum(s.prompt_tokens for s in stats),
+            'completion_tokens': sum(s.completion_tokens for s in stats),
+            'cached_tokens': sum(s.cached_tokens for s in stats),
+            'cost': round(sum(s.cost for s in stats), 6),
+        }
+
+    def summary(self) -> Dict:
+        """按服务商/模型汇总"""
+        with self._lock:
+            models = [{'provider': provider, 'model': model, **stats.to_dict()}
+                      for (provider, model), stats in self._stats.items()]
+            hedges = dict(self.hedges)
+        return {'totals': self.totals(), 'hedges': hedges, 'models': models}
+
+    def export_json(self, path: str, include_records: bool = False) -> str:
+        """导出JSON"""
+        data = self.summary()
+        if include_records:
+            with self._lock:
+                data['records'] = [asdict(r) for r in self.records]
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        return path
+
+    def to_prometheus(self, prefix: str = 'llm') -> str:
+        """生成 Prometheus 文本格式（直方图 + 计数器）"""
+        lines = []
+        with self._lock:
+            items = list(self._stats.items())
+
+        def labels(provider, model, extra=''):
+            base = f'provider="{provider}",model="{model}"'
+            return '{' + base + (',' + extra if extra else '') + '}'
+
+        counters = [
+            ('calls_total', 'LLM calls.', lambda s: s.calls),
+            ('errors_total', 'Failed LLM calls.', lambda s: s.errors),
+            ('cancelled_total', 'Hedged LLM requests cancelled after losing the race.', lambda s: s.cancelled),
+            ('retries_total', 'Retried LLM requests.', lambda s: s.retries),
+            ('prompt_tokens_total', 'Prompt tokens.', lambda s: s.prompt_tokens),
+            ('completion_tokens_total', 'Completion tokens.', lambda s: s.completion_tokens),
+            ('cached_tokens_total', 'Prompt tokens served from the provider cache.', lambda s: s.cached_tokens),
+            ('cost_total', 'Estimated cost in configured currency.', lambda s: round(s.cost, 6)),
+        ]
+        for name, help_text, getter in counters:
+            lines.append(f'# HELP {prefix}_{name} {help_text}')
+            lines.append(f'# TYPE {prefix}_{name} counter')
+            for (provider, model), stats in items:
+                lines.append(f'{prefix}_{name}{labels(provider, model)} {getter(stats)}')
+
+        histograms = [
+            ('latency_seconds', 'Total LLM call latency.', lambda s: s.latency),
+            ('ttfb_seconds', 'Time to first response byte.', lambda s: s.ttfb),
+            ('prompt_tokens', 'Prompt tokens per call.', lambda s: s.prompt_token_hist),
+            ('completion_tokens', 'Completion tokens per call.', lambda s: s.completion_token_hist),
+        ]
+        for name, help_text, getter in histograms:
+            lines.append(f'# HELP {prefix}_{name} {help_text}')
+            lines.append(f'# TYPE {prefix}_{name} histogram')
+            for (provider, model), stats in items:
+                hist = getter(stats)
+                cumulative = 0
+                for bound, count in zip(list(hist.buckets) + ['+Inf'], hist.counts):
+                    cumulative += count
+                    le = 'le="%s"' % bound
+                    lines.append(f'{prefix}_{name}_bucket{labels(provider, model, le)} {cumulative}')
+                lines.append(f'{prefix}_{name}_sum{labels(provider, model)} {round(hist.sum, 4)}')
+                lines.append(f'{prefix}_{name}_count{labels(provider, model)} {hist.count}')
+
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path: str, prefix: str = 'llm') -> str:
+        """输出 textfile collector 文件（原子替换）"""
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus(prefix))
+        os.replace(tmp_path, path)
+        return path
+
+    def print_summary(self):
+        """打印简要统计"""
+        summary = self.summary()
+        totals = summary['totals']
+        print(f"\nLLM 调用统计: {totals['calls']} 次调用, {totals['errors']} 次失败, "
+              f"{totals['retries']} 次重试")
+        if summary['hedges']['hedged']:
+            print(f"  对冲: {summary['hedges']['hedged']} 次发出对冲请求, 其中 {summary['hedges']['backup_won']} 次"
+                  f"对冲请求先返回, {totals['cancelled']} 个请求被取消")
+        print(f"  Token: 输入 {totals['prompt_tokens']} (缓存命中 {totals['cached_tokens']}), "
+              f"输出 {totals['completion_tokens']}, 估算费用 {totals['cost']:.4f}")
+        for m in summary['models']:
+            print(f"  [{m['provider']}/{m['model']}] 延迟 p50 {m['latency_s']['p50']:.2f}s "
+                  f"p95 {m['latency_s']['p95']:.2f}s p99 {m['latency_s']['p99']:.2f}s, "
+                  f"首字节 p50 {m['ttfb_s']['p50']:.2f}s")
+
+
+def extract_usage(result: Dict) -> Tuple[int, int, int]:
+    """
+    从各服务商的响应体中提取token用量
+
+    :return: (输入token, 输出token, 缓存命中token)
+    """
+    if not isinstance(result, dict):
+        return 0, 0, 0
+
+    # 腾讯云接口的字段在 Response 中且为大驼峰
+    body = result.get('Response', result)
+    usage = body.get('Usage')
+    if isinstance(usage, dict):
+        return (int(usage.get('PromptTokens', 0) or 0),
+                int(usage.get('CompletionTokens', 0) or 0), 0)
+
+    usage = result.get('usage')
+    if not isinstance(usage, dict):
+        return 0, 0, 0
+
+    if 'input_tokens' in usage:
+        # Claude / 通义千问
+        cached = int(usage.get('cache_read_input_tokens', 0) or 0)
+        prompt = int(usage.get('input_tokens', 0) or 0)
+        prompt += cached + int(usage.get('cache_creation_input_tokens', 0) or 0)
+        return prompt, int(usage.get('output_tokens', 0) or 0), cached
+
+    # OpenAI 兼容接口（DeepSeek 使用 prompt_cache_hit_tokens）
+    details = usage.get('prompt_tokens_details') or {}
+    cached = details.get('cached_tokens') or usage.get('prompt_cache_hit_tokens') or 0
+    return (int(usage.get('prompt_tokens', 0) or 0),
+            int(usage.get('completion_tokens', 0) or 0),
+            int(cached))
+
+
+def extract_rate_limit_headers(headers) -> Dict[str, str]:
+    """提取限流相关的响应头"""
+    return {k.lower(): v for k, v in headers.items()
+            if 'ratelimit' in k.lower() or k.lower() in ('retry-after', 'retry-after-ms')}
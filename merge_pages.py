@@ -2,15 +2,20 @@
 合并所有分割的页面XML文件为一个完整的XML文档
 """
 import os
+import logging
+import time
 from lxml import etree
 import glob
 
-def merge_pages(input_dir='split_pages', output_file='merged_document.xml'):
+logger = logging.getLogger(__name__)
+
+def merge_pages(input_dir='split_pages', output_file='merged_document.xml', metrics=None):
     """
     将所有页面XML合并为一个文档
     
     :param input_dir: 包含分割页面的目录
     :param output_file: 输出合并后的XML文件名
+    :param metrics: 可选的 WorkflowMetrics，记录每页耗时
     """
     
     # 获取所有页面文件，按页码排序
@@ -43,21 +48,22 @@ def merge_pages(input_dir='split_pages', output_file='merged_document.xml'):
     
     # 遍历所有页面文件，合并内容
     for idx, page_file in enumerate(page_files, 1):
+        page_start = time.perf_counter()
         tree = etree.parse(page_file)
         page_root = tree.getroot()
         page_body = page_root.find('ns0:body', ns)
         
         if page_body is None:
-            print(f"⚠ 第 {idx} 页没有body元素，跳过")
+            logger.warning("⚠ 第 %d 页没有body元素，跳过", idx)
             continue
         
-        # 复制这个页面的所有段落到主body
-        for para in page_body.findall('ns0:p', ns):
-            # 深度复制元素
-            para_copy = etree.fromstring(etree.tostring(para))
-            body.append(para_copy)
+        # 移入这个页面body的全部子元素：段落、表格、内容控件，以及最后一页末尾的节属性(sectPr)
+        for child in list(page_body):
+            body.append(child)
         
-        print(f"✓ 第 {idx} 页已合并")
+        logger.info("✓ 第 %d 页已合并", idx)
+        if metrics is not None:
+            metrics.record_page('merge', idx, time.perf_counter() - page_start)
     
     # 保存合并后的文档
     first_tree.write(output_file, encoding='utf-8', xml_declaration=True, pretty_print=False)
@@ -67,4 +73,8 @@ def merge_pages(input_dir='split_pages', output_file='merged_document.xml'):
 
 
 if __name__ == '__main__':
+    import sys
+
+    # 进度信息与 print 的输出一样写到标准输出
+    logging.basicConfig(level=logging.INFO, format='%(message)s', stream=sys.stdout)
     merge_pages()
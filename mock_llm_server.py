@@ -0,0 +1,673 @@
+"""
+本地模拟LLM服务
+兼容 OpenAI、Claude 和腾讯云自定义(CUSTOM)接口格式，用于离线压测连接器的并发、重试和流式处理
+
+用法:
+    python mock_llm_server.py --port 8765 --latency lognormal:-0.5,0.4 --tps 80 --rate-429 0.05
+    然后把 llm_config.json 的 api_url 指向 http://127.0.0.1:8765/v1
+    批量接口（OpenAI Batch / Anthropic Message Batches）在提交 --batch-delay 秒后完成
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from email import policy as email_policy
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+PLACEHOLDER_RE = re.compile(r'\$\{([^}]+)\}')
+
+
+@dataclass
+class MockSettings:
+    """模拟服务参数"""
+    latency: str = 'fixed:0.2'  # 首字节延迟分布，见 sample_latency
+    tokens_per_second: float = 0.0  # 输出速度，0 表示瞬间返回
+    rate_429: float = 0.0  # 返回 429 的概率
+    rate_500: float = 0.0  # 返回 500 的概率
+    retry_after: float = 1.0  # 429 响应的 Retry-After（秒）
+    response_file: Optional[str] = None  # 固定响应内容文件，默认按 tender_form 结构生成
+    seed: Optional[int] = None
+    prompt_cache: bool = False  # 模拟服务商提示词前缀缓存（usage 中返回缓存命中token数）
+    cache_min_tokens: int = 1024  # OpenAI 兼容接口可缓存的最短前缀
+    rate_malformed: float = 0.0  # 未启用JSON模式时返回不规范JSON（代码块、尾随逗号、截断）的概率
+    rate_unfilled: float = 0.0  # 每个字段被放入 unfilled_fields 的概率
+    model_latency: Dict[str, str] = field(default_factory=dict)  # 按模型名覆盖 latency
+    low_confidence: Dict[str, float] = field(default_factory=dict)  # 按模型名：字段置信度为 0.5 的概率
+    rate_stall: float = 0.0  # 响应前额外卡住 stall 秒的概率（模拟个别极慢的响应）
+    stall: float = 30.0
+    batch_delay: float = 2.0  # 批量任务从提交到完成的时间（秒）；批量请求不受 429 和延迟设置影响
+
+
+
+def sample_latency(spec: str, rng: random.Random) -> float:
+    """
+    按分布描述采样延迟（秒）
+
+    fixed:0.5 | uniform:0.2,1.0 | normal:0.5,0.1 | lognormal:mu,sigma | exp:0.5
+    """
+    kind, _, args = spec.partition(':')
+    values = [float(v) for v in args.split(',') if v] if args else []
+    if kind == 'uniform':
+        return rng.uniform(values[0], values[1])
+    if kind == 'normal':
+        return max(0.0, rng.gauss(values[0], values[1]))
+    if kind == 'lognormal':
+        return rng.lognormvariate(values[0], values[1])
+    if kind == 'exp':
+        return rng.expovariate(1.0 / values[0])
+    return values[0] if values else 0.0
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算token数（中文约1字1token，英文约4字符1token）"""
+    cjk = sum(1 for ch in text if '一' <= ch <= '鿿')
+    return max(1, cjk + (len(text) - cjk) // 4)
+
+
+def provided_data(prompt: str) -> Dict[str, str]:
+    """从提示词的【提供的数据】一节中取出 键: 值"""
+    _, _, section = prompt.partition('【提供的数据】')
+    values = {}
+    for line in section.strip().split('\n\n')[0].splitlines():
+        key, sep, value = line.strip().partition(': ')
+        if sep and value:
+            values[key] = value
+    return values
+
+
+def tender_form_response(prompt: str, skip=None, confidence=None) -> str:
+    """
+    生成 tender_form 模板结构的模拟响应：为提示词中的每个 ${占位符} 给出一个填写值
+    （提供的数据中有同名键时取其值）
+
+    :param skip: 可选的 skip(name) -> bool，为 True 的字段放入 unfilled_fields
+    :param confidence: 可选的 confidence(name) -> float，默认 0.95
+    """
+    names = list(dict.fromkeys(PLACEHOLDER_RE.findall(prompt)))
+    data = provided_data(prompt)
+    unfilled = [n for n in names if skip is not None and skip(n)]
+    fields = [{'field_name': n, 'original_value': f'${{{n}}}', 'new_value': data.get(n, f'模拟{n}'),
+               'confidence': confidence(n) if confidence is not None else 0.95}
+              for n in names if n not in unfilled]
+    return json.dumps({
+        'fields_filled': fields,
+        'unfilled_fields': unfilled,
+        'notes': 'mock response',
+        'xml_updates': [{'xpath': '', 'old_content': f['original_value'], 'new_content': f['new_value']}
+                        for f in fields],
+    }, ensure_ascii=False)
+
+
+def malform_json(text: str, rng: random.Random) -> str:
+    """模拟模型常见的不规范JSON输出"""
+    kind = rng.choice(('fence', 'trailing_comma', 'truncate'))
+    if kind == 'fence':
+        return f'好的，以下是填写结果：\n```json\n{text}\n```\n如需调整请告诉我。'
+    if kind == 'trailing_comma':
+        return re.sub(r'([}\]])(\s*[}\]])', r'\1,\2', text)
+    return text[:max(1, int(len(text) * 0.9))]
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    """多线程模拟服务"""
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], settings: MockSettings):
+        super().__init__(address, MockRequestHandler)
+        self.settings = settings
+        self.rng = random.Random(settings.seed)
+        self.rng_lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.stats: Dict[str, int] = {'requests': 0, 'ok': 0, '429': 0, '500': 0, 'stream': 0}
+        self.canned = None
+        self.cache_lock = threading.Lock()
+        self.cached_prefixes: 'OrderedDict[str, None]' = OrderedDict()  # Claude cache_control 断点前缀
+        self.recent_prompts = deque(maxlen=64)  # OpenAI 兼容接口按最长公共前缀命中
+        self.batch_lock = threading.Lock()
+        self.files: Dict[str, bytes] = {}  # OpenAI 文件接口上传的批量文件和生成的结果文件
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        if settings.response_file:
+            with open(settings.response_file, 'r', encoding='utf-8') as f:
+                self.canned = f.read()
+
+    def handle_error(self, request, client_address):
+        # 客户端超时或取消请求（对冲请求中落败的一路）后断开连接，不打印异常
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            self.count('disconnected')
+            return
+        super().handle_error(request, client_address)
+
+    def count(self, key: str):
+        with self.stats_lock:
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+    def respond(self, prompt: str, model: str = '') -> str:
+        """按 tender_form 结构生成响应，按 rate_unfilled 概率漏填字段、按模型的 low_confidence 概率给出低置信度"""
+        rate = self.settings.rate_unfilled
+        low = self.settings.low_confidence.get(model, 0.0)
+
+        def skip(name):
+            with self.rng_lock:
+                return self.rng.random() < rate
+
+        def confidence(name):
+            with self.rng_lock:
+                return 0.5 if self.rng.random() < low else 0.95
+
+        return tender_form_response(prompt, skip if rate else None, confidence if low else None)
+
+    def malform(self, text: str) -> str:
+        """按 rate_malformed 概率改写为不规范JSON"""
+        with self.rng_lock:
+            if self.rng.random() >= self.settings.rate_malformed:
+                return text
+            self.stats['malformed'] = self.stats.get('malformed', 0) + 1
+            return malform_json(text, self.rng)
+
+    def draw(self, model: str = '') -> Tuple[float, float]:
+        """返回 (错误抽签, 延迟)"""
+        spec = self.settings.model_latency.get(model, self.settings.latency)
+        with self.rng_lock:
+            roll, latency = self.rng.random(), sample_latency(spec, self.rng)
+            if self.settings.rate_stall and self.rng.random() < self.settings.rate_stall:
+                self.stats['stalls'] = self.stats.get('stalls', 0) + 1
+                latency += self.settings.stall
+            return roll, latency
+
+    def claude_cache(self, prefix: str) -> Tuple[int, int]:
+        """
+        按 cache_control 断点前的内容模拟 Claude 缓存
+
+        :return: (cache_read_input_tokens, cache_creation_input_tokens)
+        """
+        if not self.settings.prompt_cache or not prefix:
+            return 0, 0
+        tokens = estimate_tokens(prefix)
+        with self.cache_lock:
+            if prefix in self.cached_prefixes:
+                self.cached_prefixes.move_to_end(prefix)
+                return tokens, 0
+            self.cached_prefixes[prefix] = None
+            if len(self.cached_prefixes) > 256:
+                self.cached_prefixes.popitem(last=False)
+        return 0, tokens
+
+    def openai_cache(self, prompt: str) -> int:
+        """按与近期请求的最长公共前缀模拟自动前缀缓存，返回 cached_tokens"""
+        if not self.settings.prompt_cache:
+            return 0
+        with self.cache_lock:
+            best = max((len(os.path.commonprefix([prompt, p])) for p in self.recent_prompts), default=0)
+            self.recent_prompts.append(prompt)
+        tokens = estimate_tokens(prompt[:best]) if best else 0
+        return tokens if tokens >= self.settings.cache_min_tokens else 0
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+
+class MockRequestHandler(BaseHTTPRequestHandler):
+    """按路径/请求头识别接口格式"""
+
+    protocol_version = 'HTTP/1.1'
+    server: MockLLMServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        path = self.path.rstrip('/')
+        content = re.search(r'/files/([^/]+)/content$', path)
+        results = re.search(r'/messages/batches/([^/]+)/results$', path)
+        batch = re.search(r'/batches/([^/]+)$', path)
+        if path.endswith('/stats'):
+            with self.server.stats_lock:
+                self._send_json(200, dict(self.server.stats))
+        elif content:
+            data = self.server.files.get(content.group(1))
+            if data is None:
+                self._send_json(404, {'error': {'message': f'file {content.group(1)} not found'}})
+            else:
+                self._send_bytes(200, data, 'application/jsonl')
+        elif results:
+            record = self._batch(results.group(1))
+            if record is None or record.get('results') is None:
+                self._send_json(404, {'error': {'type': 'not_found_error', 'message': 'results not ready'}})
+            else:
+                self._send_bytes(200, record['results'], 'application/jsonl')
+        elif batch:
+            record = self._batch(batch.group(1))
+            if record is None:
+                self._send_json(404, {'error': {'message': f'batch {batch.group(1)} not found'}})
+            else:
+                self._send_json(200, record['object'])
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        raw = self.rfile.read(length)
+        path = self.path.rstrip('/')
+        if path.endswith('/files'):
+            self._upload_file(raw)
+            return
+        body = json.loads(raw or b'{}')
+        if path.endswith('/batches'):
+            self._create_batch('claude' if path.endswith('/messages/batches') else 'openai', body)
+            return
+        self.server.count('requests')
+
+        if self.headers.get('X-TC-Action') or 'Messages' in body:
+            api = 'custom'
+        elif self.path.rstrip('/').endswith('/messages'):
+            api = 'claude'
+        elif self.path.rstrip('/').endswith('/chat/completions'):
+            api = 'openai'
+        else:
+            self._send_json(404, {'error': f'unknown endpoint {self.path}'})
+            return
+
+        settings = self.server.settings
+        model = body.get('model') or body.get('Model') or ''
+        roll, latency = self.server.draw(model)
+        time.sleep(latency)
+
+        if roll < settings.rate_429:
+            self.server.count('429')
+            self._send_json(429, {'error': {'type': 'rate_limit_error', 'message': 'mock rate limit'}},
+                            {'Retry-After': str(settings.retry_after)})
+            return
+        if roll < settings.rate_429 + settings.rate_500:
+            self.server.count('500')
+            self._send_json(500, {'error': {'type': 'server_error', 'message': 'mock server error'}})
+            return
+
+        text, prompt_tokens, completion_tokens, cache, tool = self._answer(api, body, model)
+
+        streaming = bool(body.get('stream') or body.get('Stream'))
+        if streaming:
+            self.server.count('stream')
+            self._send_stream(api, text, prompt_tokens, completion_tokens, body, cache, tool)
+        else:
+            if settings.tokens_per_second > 0:
+                time.sleep(completion_tokens / settings.tokens_per_second)
+            self._send_json(200, self._completion(api, text, prompt_tokens, completion_tokens, body, cache, tool))
+        self.server.count('ok')
+
+    def _answer(self, api: str, body: Dict[str, Any], model: str) -> Tuple[str, int, int, Tuple[int, int], Optional[str]]:
+        """
+        生成响应内容
+
+        :return: (文本, 输入token, 输出token, 缓存token, Claude 强制调用的工具名)
+        """
+        prompt = self._prompt_text(api, body)
+        text = self.server.canned if self.server.canned is not None else self.server.respond(prompt, model)
+        prompt_tokens = estimate_tokens(prompt)
+        tool = (body.get('tool_choice') or {}).get('name') if api == 'claude' else None
+        if not tool and not body.get('response_format') and self.server.settings.rate_malformed:
+            text = self.server.malform(text)
+        completion_tokens = estimate_tokens(text)
+        cache = (0, 0)
+        if api == 'claude':
+            cache = self.server.claude_cache(self._cache_prefix(body))
+            prompt_tokens = max(0, prompt_tokens - sum(cache))  # input_tokens 不含缓存部分
+        elif api == 'openai':
+            cache = (self.server.openai_cache(prompt), 0)
+        if cache[0]:
+            self.server.count('cache_hits')
+        return text, prompt_tokens, completion_tokens, cache, tool
+
+    # ---------- 批量接口 ----------
+
+    def _upload_file(self, raw: bytes):
+        """OpenAI 文件上传（multipart/form-data，purpose=batch）"""
+        header = f"Content-Type: {self.headers.get('Content-Type', '')}\r\n\r\n".encode('latin-1')
+        message = BytesParser(policy=email_policy.HTTP).parsebytes(header + raw)
+        fields = {part.get_param('name', header='content-disposition'): part
+                  for part in message.iter_parts()}
+        upload = fields.get('file')
+        if upload is None:
+            self._send_json(400, {'error': {'message': 'missing file'}})
+            return
+        data = upload.get_payload(decode=True) or b''
+        file_id = f'file-{uuid.uuid4().hex[:24]}'
+        with self.server.batch_lock:
+            self.server.files[file_id] = data
+        purpose = fields['purpose'].get_payload(decode=True).decode() if 'purpose' in fields else ''
+        self._send_json(200, {'id': file_id, 'object': 'file', 'bytes': len(data), 'purpose': purpose,
+                              'filename': upload.get_filename(), 'created_at': int(time.time())})
+
+    def _create_batch(self, api: str, body: Dict[str, Any]):
+        """创建批量任务：OpenAI 引用已上传的文件，Claude 直接提交请求列表"""
+        now = time.time()
+        if api == 'claude':
+            lines = body.get('requests') or []
+            batch_id = f'msgbatch_{uuid.uuid4().hex[:24]}'
+            obj = {'id': batch_id, 'type': 'message_batch', 'processing_status': 'in_progress',
+                   'request_counts': {'processing': len(lines), 'succeeded': 0, 'errored': 0,
+                                      'canceled': 0, 'expired': 0},
+                   'created_at': now, 'ended_at': None, 'results_url': None}
+        else:
+            data = self.server.files.get(body.get('input_file_id', ''))
+            if data is None:
+                self._send_json(400, {'error': {'message': f"file {body.get('input_file_id')} not found"}})
+                return
+            lines = [json.loads(line) for line in data.decode('utf-8').splitlines() if line.strip()]
+            batch_id = f'batch_{uuid.uuid4().hex[:24]}'
+            obj = {'id': batch_id, 'object': 'batch', 'endpoint': body.get('endpoint'),
+                   'input_file_id': body.get('input_file_id'),
+                   'completion_window': body.get('completion_window'), 'status': 'validating',
+                   'output_file_id': None, 'error_file_id': None, 'created_at': int(now),
+                   'request_counts': {'total': len(lines), 'completed': 0, 'failed': 0}}
+            errors = [{'code': 'invalid_url', 'line': i + 1,
+                       'message': f"url {line.get('url')} does not match endpoint {body.get('endpoint')}"}
+                      for i, line in enumerate(lines) if line.get('url') != body.get('endpoint')]
+            if errors:
+                obj.update(status='failed', errors={'object': 'list', 'data': errors})
+        with self.server.batch_lock:
+            self.server.batches[batch_id] = {'api': api, 'lines': lines, 'object': obj, 'created': now,
+                                             'results': None, 'base_url': f"http://{self.headers.get('Host')}"}
+        self.server.count('batches')
+        self._send_json(200, obj)
+
+    def _batch(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        """取批量任务；提交超过 batch_delay 秒后首次查询时生成全部结果"""
+        with self.server.batch_lock:
+            record = self.server.batches.get(batch_id)
+            if record is None or record['results'] is not None:
+                return record
+            if record['object'].get('status') == 'failed':
+                return record
+            if time.time() - record['created'] < self.server.settings.batch_delay:
+                if record['api'] == 'openai':
+                    record['object']['status'] = 'in_progress'
+                return record
+            self._finish_batch(batch_id, record)
+            return record
+
+    def _finish_batch(self, batch_id: str, record: Dict[str, Any]):
+        """逐行生成结果；按 rate_500 概率返回单行错误"""
+        api = record['api']
+        ok_lines, error_lines = [], []
+        for line in record['lines']:
+            body = line.get('params' if api == 'claude' else 'body') or {}
+            roll, _ = self.server.draw(body.get('model', ''))
+            self.server.count('batch_lines')
+            if roll < self.server.settings.rate_500:
+                self.server.count('batch_errors')
+                if api == 'claude':
+                    result = {'type': 'errored', 'error': {'type': 'error', 'error': {
+                        'type': 'api_error', 'message': 'mock server error'}}}
+                    error_lines.append({'custom_id': line.get('custom_id'), 'result': result})
+                else:
+                    error_lines.append({'id': f'batch_req_{uuid.uuid4().hex[:24]}',
+                                        'custom_id': line.get('custom_id'),
+                                        'response': {'status_code': 500, 'body': {'error': {
+                                            'type': 'server_error', 'message': 'mock server error'}}},
+                                        'error': None})
+                continue
+            text, prompt_tokens, completion_tokens, cache, tool = self._answer(api, body, body.get('model', ''))
+            message = self._completion(api, text, prompt_tokens, completion_tokens, body, cache, tool)
+            if api == 'claude':
+                ok_lines.append({'custom_id': line.get('custom_id'),
+                                 'result': {'type': 'succeeded', 'message': message}})
+            else:
+                ok_lines.append({'id': f'batch_req_{uuid.uuid4().hex[:24]}', 'custom_id': line.get('custom_id'),
+                                 'response': {'status_code': 200, 'request_id': uuid.uuid4().hex,
+                                              'body': message},
+                                 'error': None})
+
+        def jsonl(items):
+            return ''.join(json.dumps(item, ensure_ascii=False) + '\n' for item in items).encode('utf-8')
+
+        obj = record['object']
+        if api == 'claude':
+            record['results'] = jsonl(ok_lines + error_lines)
+            obj['request_counts'].update(processing=0, succeeded=len(ok_lines), errored=len(error_lines))
+            obj.update(processing_status='ended', ended_at=time.time(),
+                       results_url=f"{record['base_url']}/v1/messages/batches/{batch_id}/results")
+        else:
+            record['results'] = b''
+            for key, items in (('output_file_id', ok_lines), ('error_file_id', error_lines)):
+                if items:
+                    file_id = f'file-{uuid.uuid4().hex[:24]}'
+                    self.server.files[file_id] = jsonl(items)
+                    obj[key] = file_id
+            obj['request_counts'].update(completed=len(ok_lines), failed=len(error_lines))
+            obj.update(status='completed', completed_at=int(time.time()))
+
+    # ---------- 请求/响应格式 ----------
+
+    @staticmethod
+    def _prompt_text(api: str, body: Dict[str, Any]) -> str:
+        def flatten(content):
+            if isinstance(content, list):
+                return ''.join(c.get('text', '') for c in content if isinstance(c, dict))
+            return content or ''
+
+        if api == 'custom':
+            return ''.join(m.get('Content', '') for m in body.get('Messages', []))
+        parts = [flatten(body.get('system'))] if api == 'claude' else []
+        parts += [flatten(m.get('content')) for m in body.get('messages', [])]
+        return ''.join(parts)
+
+    @staticmethod
+    def _cache_prefix(body: Dict[str, Any]) -> str:
+        """Claude 请求中最后一个 cache_control 断点之前（含）的全部文本"""
+        blocks = []
+        for content in [body.get('system')] + [m.get('content') for m in body.get('messages', [])]:
+            if isinstance(content, list):
+                blocks += [c for c in content if isinstance(c, dict)]
+            elif content:
+                blocks.append({'text': content})
+        marks = [i for i, c in enumerate(blocks) if c.get('cache_control')]
+        if not marks:
+            return ''
+        return ''.join(c.get('text', '') for c in blocks[:marks[-1] + 1])
+
+    @staticmethod
+    def _claude_usage(prompt_tokens: int, completion_tokens: int, cache: Tuple[int, int]) -> Dict[str, int]:
+        usage = {'input_tokens': prompt_tokens, 'output_tokens': completion_tokens}
+        if any(cache):
+            usage.update(cache_read_input_tokens=cache[0], cache_creation_input_tokens=cache[1])
+        return usage
+
+    @staticmethod
+    def _openai_usage(prompt_tokens: int, completion_tokens: int, cache: Tuple[int, int]) -> Dict[str, Any]:
+        return {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens,
+                'prompt_tokens_details': {'cached_tokens': cache[0]}}
+
+    @classmethod
+    def _completion(cls, api: str, text: str, prompt_tokens: int, completion_tokens: int,
+                    body: Dict[str, Any], cache: Tuple[int, int] = (0, 0),
+                    tool: Optional[str] = None) -> Dict[str, Any]:
+        if api == 'claude':
+            if tool:
+                content = [{'type': 'tool_use', 'id': f'toolu_{uuid.uuid4().hex[:24]}',
+                            'name': tool, 'input': json.loads(text)}]
+            else:
+                content = [{'type': 'text', 'text': text}]
+            return {
+                'id': f'msg_{uuid.uuid4().hex[:24]}', 'type': 'message', 'role': 'assistant',
+                'model': body.get('model', ''), 'stop_reason': 'tool_use' if tool else 'end_turn',
+                'content': content,
+                'usage': cls._claude_usage(prompt_tokens, completion_tokens, cache),
+            }
+        if api == 'custom':
+            return {
+                'Id': uuid.uuid4().hex, 'Created': int(time.time()),
+                'Choices': [{'FinishReason': 'stop', 'Message': {'Role': 'assistant', 'Content': text}}],
+                'Usage': {'PromptTokens': prompt_tokens, 'CompletionTokens': completion_tokens,
+                          'TotalTokens': prompt_tokens + completion_tokens},
+            }
+        return {
+            'id': f'chatcmpl-{uuid.uuid4().hex[:24]}', 'object': 'chat.completion',
+            'created': int(time.time()), 'model': body.get('model', ''),
+            'choices': [{'index': 0, 'finish_reason': 'stop',
+                         'message': {'role': 'assistant', 'content': text}}],
+            'usage': cls._openai_usage(prompt_tokens, completion_tokens, cache),
+        }
+
+    def _stream_events(self, api: str, text: str, prompt_tokens: int, completion_tokens: int,
+                       body: Dict[str, Any], cache: Tuple[int, int] = (0, 0), tool: Optional[str] = None
+                       ) -> List[Tuple[Optional[Dict[str, Any]], float]]:
+        """切分为 (事件, 发送前等待秒数) 列表"""
+        tps = self.server.settings.tokens_per_second
+        pieces = [text[i:i + 8] for i in range(0, len(text), 8)] or ['']
+        delay = (completion_tokens / tps / len(pieces)) if tps > 0 else 0.0
+        usage_openai = self._openai_usage(prompt_tokens, completion_tokens, cache)
+
+        if api == 'claude':
+            events = [({'type': 'message_start', 'message': {
+                'id': f'msg_{uuid.uuid4().hex[:24]}', 'role': 'assistant', 'model': body.get('model', ''),
+                'usage': self._claude_usage(prompt_tokens, 0, cache)}}, 0.0),
+                ({'type': 'content_block_start', 'index': 0, 'content_block':
+                    {'type': 'tool_use', 'id': f'toolu_{uuid.uuid4().hex[:24]}', 'name': tool, 'input': {}}
+                    if tool else {'type': 'text', 'text': ''}}, 0.0)]
+            delta = (lambda p: {'type': 'input_json_delta', 'partial_json': p}) if tool else \
+                (lambda p: {'type': 'text_delta', 'text': p})
+            events += [({'type': 'content_block_delta', 'index': 0, 'delta': delta(p)}, delay) for p in pieces]
+            events += [({'type': 'content_block_stop', 'index': 0}, 0.0),
+                       ({'type': 'message_delta', 'delta': {'stop_reason': 'tool_use' if tool else 'end_turn'},
+                         'usage': {'output_tokens': completion_tokens}}, 0.0),
+                       ({'type': 'message_stop'}, 0.0)]
+            return events
+        if api == 'custom':
+            events = [({'Choices': [{'Delta': {'Role': 'assistant', 'Content': p}}]}, delay) for p in pieces]
+            events.append(({'Choices': [{'Delta': {'Content': ''}, 'FinishReason': 'stop'}],
+                            'Usage': {'PromptTokens': prompt_tokens, 'CompletionTokens': completion_tokens,
+                                      'TotalTokens': prompt_tokens + completion_tokens}}, 0.0))
+            return events
+
+        events = [({'object': 'chat.completion.chunk',
+                    'choices': [{'index': 0, 'delta': {'content': p}}]}, delay) for p in pieces]
+        events.append(({'object': 'chat.completion.chunk',
+                        'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]}, 0.0))
+        if (body.get('stream_options') or {}).get('include_usage'):
+            events.append(({'object': 'chat.completion.chunk', 'choices': [], 'usage': usage_openai}, 0.0))
+        events.append((None, 0.0))
+        return events
+
+    def _send_stream(self, api: str, text: str, prompt_tokens: int, completion_tokens: int,
+                     body: Dict[str, Any], cache: Tuple[int, int] = (0, 0), tool: Optional[str] = None):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self._rate_limit_headers()
+        self.end_headers()
+
+        for event, delay in self._stream_events(api, text, prompt_tokens, completion_tokens, body, cache, tool):
+            if delay:
+                time.sleep(delay)
+            if event is None:
+                payload = 'data: [DONE]\n\n'
+            elif api == 'claude':
+                payload = f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+            else:
+                payload = f'data: {json.dumps(event, ensure_ascii=False)}\n\n'
+            data = payload.encode('utf-8')
+            self.wfile.write(f'{len(data):X}\r\n'.encode() + data + b'\r\n')
+            self.wfile.flush()
+        self.wfile.write(b'0\r\n\r\n')
+
+    def _rate_limit_headers(self):
+        self.send_header('x-ratelimit-limit-requests', '10000')
+        self.send_header('x-ratelimit-remaining-requests', '9999')
+        self.send_header('anthropic-ratelimit-requests-remaining', '9999')
+
+    def _send_bytes(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, data: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self._rate_limit_headers()
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_mock_server(settings: Optional[MockSettings] = None, host: str = '127.0.0.1',
+                      port: int = 0) -> MockLLMServer:
+    """
+    在后台线程启动模拟服务
+
+    :param port: 0 表示自动分配端口
+    :return: 服务对象，server.url 为根地址，server.shutdown() 停止
+    """
+    server = MockLLMServer((host, port), settings or MockSettings())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='本地模拟LLM服务 (OpenAI / Claude / 腾讯云CUSTOM)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', default='fixed:0.2',
+                        help='首字节延迟分布: fixed:S | uniform:A,B | normal:MU,SD | lognormal:MU,SIGMA | exp:MEAN')
+    parser.add_argument('--tps', type=float, default=0.0, help='输出 tokens/秒，0 表示瞬间返回')
+    parser.add_argument('--rate-429', type=float, default=0.0, help='返回429的概率')
+    parser.add_argument('--rate-500', type=float, default=0.0, help='返回500的概率')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='429响应的 Retry-After 秒数')
+    parser.add_argument('--response-file', default=None, help='固定响应内容文件')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--prompt-cache', action='store_true', help='模拟提示词前缀缓存')
+    parser.add_argument('--cache-min-tokens', type=int, default=1024, help='OpenAI兼容接口可缓存的最短前缀')
+    parser.add_argument('--rate-malformed', type=float, default=0.0,
+                        help='未启用JSON模式时返回不规范JSON的概率')
+    parser.add_argument('--rate-unfilled', type=float, default=0.0, help='每个字段漏填的概率')
+    parser.add_argument('--model-latency', action='append', default=[], metavar='MODEL=SPEC',
+                        help='按模型覆盖延迟分布，可重复')
+    parser.add_argument('--low-confidence', action='append', default=[], metavar='MODEL=RATE',
+                        help='按模型设置低置信度字段的概率，可重复')
+    parser.add_argument('--rate-stall', type=float, default=0.0, help='响应前额外卡住 --stall 秒的概率')
+    parser.add_argument('--stall', type=float, default=30.0, help='卡住的秒数')
+    parser.add_argument('--batch-delay', type=float, default=2.0, help='批量任务从提交到完成的秒数')
+    args = parser.parse_args(argv)
+
+    settings = MockSettings(latency=args.latency, tokens_per_second=args.tps, rate_429=args.rate_429,
+                            rate_500=args.rate_500, retry_after=args.retry_after,
+                            response_file=args.response_file, seed=args.seed,
+                            prompt_cache=args.prompt_cache, cache_min_tokens=args.cache_min_tokens,
+                            rate_malformed=args.rate_malformed, rate_unfilled=args.rate_unfilled,
+                            model_latency=dict(item.split('=', 1) for item in args.model_latency),
+                            low_confidence={k: float(v) for k, v in
+                                            (item.split('=', 1) for item in args.low_confidence)},
+                            rate_stall=args.rate_stall, stall=args.stall, batch_delay=args.batch_delay)
+    server = MockLLMServer((args.host, args.port), settings)
+    print(f"✓ 模拟LLM服务已启动: {server.url}")
+    print(f"  OpenAI: {server.url}/v1/chat/completions")
+    print(f"  Claude: {server.url}/v1/messages")
+    print(f"  CUSTOM: {server.url}/ (请求头 X-TC-Action: ChatCompletions)")
+    print(f"  批量: {server.url}/v1/files + /v1/batches (OpenAI), {server.url}/v1/messages/batches (Claude)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n已停止")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""
+按页面复杂度路由模型
+字段少、没有大表格、字段名都能在数据中找到对应键的页面交给快速廉价的模型，
+复杂页面交给强模型；快速模型返回的低置信度字段再升级给强模型补填
+
+配置（llm_config.json 中的 routing 一节，其余字段为强模型配置）:
+    "routing": {
+        "fast": {"model": "deepseek-chat", "prompt_price": 0.27},
+        "max_fast_score": 12,
+        "escalate_below": 0.8
+    }
+"""
+import json
+import os
+import threading
+from dataclasses import dataclass, replace
+from typing import Any, Dict, Optional, Tuple
+
+from llm_connector import LLMConfig, LLMProvider
+from slot_repair import data_keys, has_source
+
+FAST = 'fast'
+STRONG = 'strong'
+
+# 复杂度评分权重
+DEFAULT_WEIGHTS = {
+    'slots': 1.0,  # 每个待填字段
+    'table_cells': 0.1,  # 每个表格单元格（多为标签，权重低于字段）
+    'ambiguous': 2.0,  # 每个在数据中找不到对应键的字段（含无名称的空白）
+}
+
+
+@dataclass
+class PageComplexity:
+    """页面复杂度"""
+    slots: int
+    table_cells: int
+    ambiguous: int
+    score: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'slots': self.slots, 'table_cells': self.table_cells,
+                'ambiguous': self.ambiguous, 'score': round(self.score, 2)}
+
+
+def score_page(page_info: Dict[str, Any], data: Any,
+               weights: Optional[Dict[str, float]] = None) -> PageComplexity:
+    """
+    计算页面复杂度
+
+    :param page_info: XMLPageAnalyzer.get_page_info() 的结果
+    :param data: 本页提供的数据
+    :param weights: 评分权重，默认 DEFAULT_WEIGHTS
+    """
+    weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+    blanks = page_info.get('blank_fields', [])
+    placeholders = page_info.get('placeholder_fields', [])
+    keys = data_keys(data)
+    ambiguous = len(blanks) + sum(1 for f in placeholders if not has_source(f['placeholder_name'], keys))
+    slots = len(blanks) + len(placeholders)
+    table_cells = page_info.get('table_cells', 0)
+    score = (slots * weights['slots'] + table_cells * weights['table_cells'] +
+             ambiguous * weights['ambiguous'])
+    return PageComplexity(slots, table_cells, ambiguous, score)
+
+
+class ModelRouter:
+    """模型路由器（线程安全，只保存配置和统计；连接器由各线程的处理器持有）"""
+
+    def __init__(self, strong_config: LLMConfig, fast_config: LLMConfig,
+                 max_fast_score: float = 12.0, escalate_below: float = 0.8,
+                 weights: Optional[Dict[str, float]] = None):
+        """
+        :param strong_config: 强模型配置
+        :param fast_config: 快速模型配置
+        :param max_fast_score: 复杂度不超过此分数的页面使用快速模型
+        :param escalate_below: 快速模型返回的字段置信度低于此值时升级给强模型
+        :param weights: 复杂度评分权重
+        """
+        self.configs = {STRONG: strong_config, FAST: fast_config}
+        self.max_fast_score = max_fast_score
+        self.escalate_below = escalate_below
+        self.weights = weights
+        self._lock = threading.Lock()
+        self.stats = {'pages': {FAST: 0, STRONG: 0}, 'escalated_pages': 0, 'escalated_slots': 0}
+
+    def route(self, page_info: Dict[str, Any], data: Any) -> Tuple[str, PageComplexity]:
+        """
+        :return: (档位 'fast' / 'strong', 页面复杂度)
+        """
+        complexity = score_page(page_info, data, self.weights)
+        tier = FAST if complexity.score <= self.max_fast_score else STRONG
+        with self._lock:
+            self.stats['pages'][tier] += 1
+        return tier, complexity
+
+    def record_escalation(self, slots: int):
+        with self._lock:
+            self.stats['escalated_pages'] += 1
+            self.stats['escalated_slots'] += slots
+
+
+def load_router(config_file: str, strong_config: LLMConfig) -> Optional[ModelRouter]:
+    """
+    读取配置文件中的 routing 一节
+
+    :param strong_config: 配置文件主体对应的配置（强模型）
+    :return: 未配置 routing 时返回 None
+    """
+    if not os.path.exists(config_file):
+        return None
+    with open(config_file, 'r', encoding='utf-8') as f:
+        routing = json.load(f).get('routing')
+    if not routing:
+        return None
+
+    overrides = dict(routing.get('fast', {}))
+    if 'provider' in overrides:
+        overrides['provider'] = LLMProvider(overrides['provider'])
+    fast_config = replace(strong_config, **overrides)
+    return ModelRouter(strong_config, fast_config,
+                       max_fast_score=routing.get('max_fast_score', 12.0),
+                       escalate_below=routing.get('escalate_below', 0.8),
+                       weights=routing.get('weights'))
@@ -111,10 +111,25 @@ def custom_replace_text(input_dir='split_pages', search_text='', replace_text=''
     modify_pages_content(input_dir, replacer)
 
 
-def extract_all_text(input_dir='split_pages'):
+def extract_all_text(input_dir='split_pages', db_path=None):
     """
     提取所有页面的文本内容（用于查看和修改规划）
+    
+    :param db_path: 全文检索索引路径（见 search_index）；指定时只解析有变化的页面，预览从索引读取
     """
+    if db_path:
+        from search_index import SearchIndex
+        
+        with SearchIndex(db_path) as index:
+            index.index_pages_dir(input_dir)
+            previews = index.page_previews(input_dir)
+        print("\n=== 文档内容预览 ===\n")
+        for page_num, preview in previews:
+            if preview:
+                print(f"【第 {page_num} 页】")
+                print(preview)
+                print()
+        return
     
     page_files = sorted(glob.glob(os.path.join(input_dir, 'page_*.xml')),
                        key=lambda x: int(x.split('page_')[1].split('.')[0]))
@@ -0,0 +1,193 @@
+"""
+多进程页面分割与分析
+父进程只扫描一遍字节流确定每页的字节范围，工作进程各自解析、分析并写出页面，
+返回紧凑的字段记录
+"""
+import logging
+import multiprocessing
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from lxml import etree
+
+from parse_docx import read_part
+from process_with_llm import XMLPageAnalyzer
+
+logger = logging.getLogger(__name__)
+
+# 匹配开始/结束/自闭合标签（不含注释、处理指令）
+_TAG_RE = re.compile(rb'<(/?)([^\s/>!?]+)[^>]*?(/?)>')
+
+# 进程级共享数据：父进程读入后 fork，子进程按字节范围切片
+_DOC: bytes = b''
+_WRAP: Tuple[bytes, bytes] = (b'', b'')
+_OPTIONS: Dict[str, Any] = {}
+
+
+def scan_page_ranges(xml_bytes: bytes) -> Tuple[bytes, bytes, List[Tuple[int, int, int]]]:
+    """
+    扫描 document.xml 字节流，按 sectPr 划分页面
+
+    :param xml_bytes: document.xml 原始字节
+    :return: (页面XML头, 页面XML尾, [(起始偏移, 结束偏移, 元素数), ...])
+    """
+    root_match = _TAG_RE.search(xml_bytes)
+    if root_match is None:
+        raise ValueError("不是有效的XML文档")
+    root_name = root_match.group(2)
+    prefix = root_name.split(b':')[0] + b':' if b':' in root_name else b''
+    body_name = prefix + b'body'
+    para_name = prefix + b'p'
+    sect_name = prefix + b'sectPr'
+    # 段落自身的节属性：<w:p><w:pPr><w:sectPr>，不含嵌套在文本框、内容控件里的段落
+    own_sect_path = [para_name, prefix + b'pPr']
+
+    body_match = re.compile(rb'<' + re.escape(body_name) + rb'(\s[^>]*)?>').search(xml_bytes, root_match.end())
+    if body_match is None:
+        raise ValueError("未找到body元素")
+    body_end = xml_bytes.rfind(b'</' + body_name + b'>')
+
+    head = root_match.group(0) + body_match.group(0)
+    tail = b'</' + body_name + b'></' + root_name + b'>'
+
+    # 顶层子元素的字节范围，以及是否为带 sectPr 的段落
+    children = []
+    path: List[bytes] = []
+    start = 0
+    has_sect = False
+    for match in _TAG_RE.finditer(xml_bytes, body_match.end(), body_end):
+        closing, tag, self_closing = match.group(1), match.group(2), match.group(3)
+        if closing:
+            path.pop()
+            if not path:
+                children.append((start, match.end(), has_sect))
+        elif self_closing:
+            if not path:
+                children.append((match.start(), match.end(), False))
+            elif tag == sect_name and path == own_sect_path:
+                has_sect = True
+        else:
+            if not path:
+                start = match.start()
+                has_sect = False
+            elif tag == sect_name and path == own_sect_path:
+                has_sect = True
+            path.append(tag)
+
+    # 与 split_word_by_pages 一致：带 sectPr 的段落是页面的最后一个元素
+    pages = []
+    page_start = None
+    count = 0
+    for child_start, child_end, has_sect in children:
+        if page_start is None:
+            page_start = child_start
+        count += 1
+        if has_sect:
+            pages.append((page_start, child_end, count))
+            page_start = None
+            count = 0
+    if page_start is not None:
+        pages.append((page_start, children[-1][1], count))
+
+    return head, tail, pages
+
+
+def _init_worker(doc: bytes, wrap: Tuple[bytes, bytes], options: Dict[str, Any]):
+    """工作进程初始化（spawn 模式下由参数传入文档）"""
+    global _DOC, _WRAP, _OPTIONS
+    if not _DOC:
+        _DOC = doc
+        _WRAP = wrap
+    _OPTIONS = options
+
+
+def _process_page(task: Tuple[int, int, int]) -> Dict[str, Any]:
+    """解析、分析并写出一页"""
+    page_num, start, end = task
+    head, tail = _WRAP
+    started = time.perf_counter()
+
+    parsed = etree.fromstring(head + _DOC[start:end] + tail)
+    # 与串行分割保持一致：新建根元素，只保留 body
+    new_root = etree.Element(parsed.tag, nsmap=parsed.nsmap)
+    new_body = etree.SubElement(new_root, parsed[0].tag)
+    for elem in list(parsed[0]):
+        new_body.append(elem)
+    new_tree = etree.ElementTree(new_root)
+
+    output_file = os.path.join(_OPTIONS['output_dir'], f'page_{page_num}.xml')
+    new_tree.write(output_file, encoding='utf-8', xml_declaration=True, pretty_print=True)
+
+    slots = []
+    if _OPTIONS.get('analyze', True):
+        slots = XMLPageAnalyzer(output_file, tree=new_tree).slot_records()
+
+    return {
+        'page_num': page_num,
+        'path': output_file,
+        'elements': len(new_body),
+        'slots': slots,
+        'seconds': round(time.perf_counter() - started, 4),
+    }
+
+
+def split_and_analyze(xml_file: str,
+                      output_dir: str = 'split_pages',
+                      workers: Optional[int] = None,
+                      analyze: bool = True,
+                      metrics=None) -> List[Dict[str, Any]]:
+    """
+    并行分割页面并分析待填字段
+
+    :param xml_file: 输入的 document.xml，或docx文件
+    :param output_dir: 页面输出目录
+    :param workers: 工作进程数，默认CPU核数；1 表示在当前进程内串行处理
+    :param analyze: 是否同时提取待填字段
+    :param metrics: 可选的 WorkflowMetrics，记录每页耗时
+    :return: 按页码排序的页面记录 [{page_num, path, elements, slots, seconds}, ...]
+    """
+    global _DOC, _WRAP, _OPTIONS
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    _DOC = read_part(xml_file)
+    head, tail, pages = scan_page_ranges(_DOC)
+    _WRAP = (head, tail)
+    _OPTIONS = {'output_dir': output_dir, 'analyze': analyze}
+
+    tasks = [(page_num, start, end) for page_num, (start, end, _) in enumerate(pages, 1)]
+    workers = min(workers or os.cpu_count() or 1, max(len(tasks), 1))
+
+    print(f"找到 {len(tasks)} 个页面，使用 {workers} 个进程处理")
+
+    if workers == 1:
+        results = [_process_page(task) for task in tasks]
+    else:
+        methods = multiprocessing.get_all_start_methods()
+        ctx = multiprocessing.get_context('fork' if 'fork' in methods else None)
+        # fork 模式下子进程直接继承 _DOC，任务只携带字节范围
+        initargs = (b'', (b'', b''), _OPTIONS) if ctx.get_start_method() == 'fork' else (_DOC, _WRAP, _OPTIONS)
+        with ctx.Pool(workers, initializer=_init_worker, initargs=initargs) as pool:
+            results = list(pool.imap(_process_page, tasks))
+
+    for result in results:
+        logger.info("✓ 第 %d 页已保存: %s (%d 个元素, %d 个字段)",
+                    result['page_num'], result['path'], result['elements'], len(result['slots']))
+        if metrics is not None:
+            metrics.record_page('split', result['page_num'], result['seconds'], slots=len(result['slots']))
+
+    return results
+
+
+if __name__ == '__main__':
+    import sys
+
+    # 进度信息与 print 的输出一样写到标准输出
+    logging.basicConfig(level=logging.INFO, format='%(message)s', stream=sys.stdout)
+
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    page_records = split_and_analyze('template.xml', 'split_pages', workers)
+    print(f"\n✓ 页面分割完成！共 {len(page_records)} 页, "
+          f"{sum(len(p['slots']) for p in page_records)} 个待填字段")
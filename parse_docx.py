@@ -1,12 +1,101 @@
+"""
+docx 读取工具
+直接从 docx 压缩包中流式读取部件，交给 lxml 解析，不经过中间XML文件和 str 解码
+"""
+import os
+import shutil
 import zipfile
+from contextlib import contextmanager
 
-def docx_to_xml(path, output_xml='template.xml'):
-    xml_content = ""
-    with zipfile.ZipFile(path) as docx:
-        # 读取 Word 主文档内容 XML
-        xml_content = docx.read('word/document.xml').decode('utf-8')
-    with open(output_xml, "w", encoding="utf-8") as f:
-        f.write(xml_content)
+from lxml import etree
 
-file_path = "template2.docx"
-xml_data = docx_to_xml(file_path)
\ No newline at end of file
+DOCUMENT_PART = 'word/document.xml'
+DOCX_EXTENSIONS = ('.docx', '.docm', '.dotx', '.dotm')
+
+
+def is_docx(path) -> bool:
+    """按扩展名判断是否为Word文件"""
+    return isinstance(path, (str, os.PathLike)) and os.fspath(path).lower().endswith(DOCX_EXTENSIONS)
+
+
+@contextmanager
+def open_part(docx_path, part: str = DOCUMENT_PART):
+    """
+    以二进制流打开docx中的部件（边解压边读取）
+
+    用法:
+        with open_part('template.docx') as f:
+            tree = etree.parse(f)
+    """
+    with zipfile.ZipFile(docx_path) as docx:
+        with docx.open(part) as stream:
+            yield stream
+
+
+def parse_xml(source, part: str = DOCUMENT_PART, parser=None):
+    """
+    解析XML文件，或直接解析docx中的部件
+
+    :param source: .xml 路径、.docx 路径或文件对象
+    :param part: source 为docx时要解析的部件
+    :return: ElementTree
+    """
+    if is_docx(source):
+        with open_part(source, part) as stream:
+            return etree.parse(stream, parser)
+    return etree.parse(source, parser)
+
+
+def iterparse_part(docx_path, part: str = DOCUMENT_PART, **kwargs):
+    """
+    流式遍历docx中的部件，参数同 etree.iterparse
+
+    用法:
+        for event, elem in iterparse_part('template.docx', tag='{...}tbl'):
+            ...
+            elem.clear()
+    """
+    with open_part(docx_path, part) as stream:
+        yield from etree.iterparse(stream, **kwargs)
+
+
+def read_part(source, part: str = DOCUMENT_PART) -> bytes:
+    """读取部件的原始字节（.xml 路径时读取整个文件）"""
+    if is_docx(source):
+        with zipfile.ZipFile(source) as docx:
+            return docx.read(part)
+    with open(source, 'rb') as f:
+        return f.read()
+
+
+def replace_part(template_docx, output_docx, data, part: str = DOCUMENT_PART):
+    """
+    复制docx，并将其中一个部件替换为新内容，其余部件流式复制
+
+    :param data: 新内容（bytes 或 ElementTree / Element）
+    """
+    if not isinstance(data, bytes):
+        data = etree.tostring(data, encoding='utf-8', xml_declaration=True, standalone=True)
+    with zipfile.ZipFile(template_docx) as zin, \
+            zipfile.ZipFile(output_docx, 'w', zipfile.ZIP_DEFLATED) as zout:
+        for info in zin.infolist():
+            out_info = zipfile.ZipInfo(info.filename, info.date_time)
+            out_info.compress_type = zipfile.ZIP_DEFLATED
+            out_info.external_attr = info.external_attr
+            if info.filename == part:
+                zout.writestr(out_info, data)
+                continue
+            with zin.open(info) as src, zout.open(out_info, 'w', force_zip64=True) as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+
+
+def docx_to_xml(path, output_xml='template.xml', part: str = DOCUMENT_PART):
+    """将docx中的部件原样导出为XML文件（流式复制，不解码）"""
+    with open_part(path, part) as src, open(output_xml, 'wb') as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+    return output_xml
+
+
+if __name__ == '__main__':
+    file_path = "template2.docx"
+    xml_data = docx_to_xml(file_path)
@@ -0,0 +1,349 @@
+"""
+流水线式完整流程
+分割 → 分析 → 大模型 → 应用修改 → 合并写出，各阶段之间用有界队列连接、同时运行：
+每页就绪后立即进入下一阶段，合并阶段按页码顺序把已完成的页面直接写入输出docx，
+总耗时接近大模型阶段的关键路径，而不是各阶段耗时之和
+
+用法:
+    python pipeline.py template.docx -o output.docx --llm-config llm_config.json --data fill_data.json
+    python pipeline.py template.docx -o output.docx --concurrency 8 --queue-size 16
+"""
+import argparse
+import json
+import logging
+import os
+import queue
+import shutil
+import sys
+import threading
+import time
+import zipfile
+from typing import Any, Callable, Dict, List, Optional
+
+from lxml import etree
+
+from parallel_pages import scan_page_ranges
+from parse_docx import DOCUMENT_PART, read_part
+
+logger = logging.getLogger(__name__)
+
+XML_DECLARATION = b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\r\n'
+
+# 队列结束标记
+_DONE = object()
+
+
+class _Stages:
+    """阶段线程、有界队列与出错时的整体中止"""
+
+    def __init__(self, metrics=None):
+        self.abort = threading.Event()
+        self.errors: List[str] = []
+        self.busy: Dict[str, float] = {}
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+
+    def put(self, q: queue.Queue, item) -> bool:
+        """放入队列；下游已中止时返回 False"""
+        while not self.abort.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(self, q: queue.Queue):
+        """取出队列元素；中止时返回 _DONE"""
+        while True:
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                if self.abort.is_set():
+                    return _DONE
+
+    def record(self, stage: str, page_num: int, started: float, slots: int = 0):
+        """记录一页在某阶段的耗时"""
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.busy[stage] = self.busy.get(stage, 0.0) + elapsed
+        if self.metrics is not None:
+            self.metrics.record_page(stage, page_num, elapsed, slots=slots)
+
+    def start(self, name: str, fn: Callable, *args):
+        def run():
+            try:
+                fn(*args)
+            except Exception as e:
+                logger.exception("流水线阶段 %s 出错", name)
+                with self._lock:
+                    self.errors.append(f"{name}: {e}")
+                self.abort.set()
+
+        thread = threading.Thread(target=run, name=f'pipeline-{name}', daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+
+def run_pipeline(template_docx: str,
+                 output_docx: str,
+                 llm_config_file: str = 'llm_config.json',
+                 data_file: str = 'fill_data.json',
+                 template_name: str = 'tender_form',
+                 concurrency: int = 4,
+                 queue_size: int = 8,
+                 dedupe: bool = True,
+                 skip_llm: bool = False,
+                 allow_failed_pages: bool = False,
+                 metrics=None,
+                 telemetry_file: Optional[str] = None) -> Dict[str, Any]:
+    """
+    以流水线方式运行完整流程
+
+    :param template_docx: 原始Word文件
+    :param output_docx: 输出Word文件
+    :param llm_config_file: LLM配置文件
+    :param data_file: 填充数据文件
+    :param template_name: 提示词模板
+    :param concurrency: 大模型阶段的并发线程数
+    :param queue_size: 各阶段之间队列的容量（页）
+    :param dedupe: 是否合并相同的大模型请求
+    :param skip_llm: 跳过大模型阶段（只分割、合并、打包）
+    :param allow_failed_pages: 部分页面处理失败时仍输出文档
+    :param metrics: 可选的 WorkflowMetrics，记录每个阶段的逐页耗时
+    :param telemetry_file: LLM调用遥测导出路径（.json 或 .prom）
+    :return: 统计信息；ok 为 False 时未生成输出文件
+    """
+    from process_with_llm import (LLMPageProcessor, XMLPageAnalyzer, new_page_flight, print_routing,
+                                  process_page)
+    from stream_patcher import serialize_child
+
+    started = time.perf_counter()
+    llm_config = None
+    telemetry = None
+    router = None
+    if not skip_llm:
+        from llm_connector import load_config_from_file
+        from llm_telemetry import LLMTelemetry
+        from model_router import load_router
+
+        llm_config = load_config_from_file(llm_config_file)
+        router = load_router(llm_config_file, llm_config)
+        telemetry = LLMTelemetry()
+
+    fill_data = {}
+    if data_file and os.path.exists(data_file):
+        with open(data_file, 'r', encoding='utf-8') as f:
+            fill_data = json.load(f)
+
+    doc = read_part(template_docx)
+    head, tail, pages = scan_page_ranges(doc)
+    root_ns = {k.encode(): v.encode() for k, v in etree.fromstring(head + tail).nsmap.items() if k}
+    workers = max(1, concurrency)
+    print(f"找到 {len(pages)} 个页面，大模型并发 {workers}，队列容量 {queue_size}")
+
+    stages = _Stages(metrics)
+    flight = new_page_flight() if dedupe else None
+    to_analyze: queue.Queue = queue.Queue(queue_size)
+    to_llm: queue.Queue = queue.Queue(queue_size)
+    to_apply: queue.Queue = queue.Queue(queue_size)
+    to_merge: queue.Queue = queue.Queue(queue_size)
+    stats = {'pages': len(pages), 'successful': 0, 'failed': 0, 'shared': 0, 'repair': {},
+             'failed_pages': []}
+    remaining_llm = [workers]
+    llm_lock = threading.Lock()
+
+    def split_stage():
+        for page_num, (start, end, _) in enumerate(pages, 1):
+            t0 = time.perf_counter()
+            root = etree.fromstring(head + doc[start:end] + tail)
+            stages.record('split', page_num, t0)
+            if not stages.put(to_analyze, (page_num, root)):
+                return
+        stages.put(to_analyze, _DONE)
+
+    def analyze_stage():
+        while (item := stages.get(to_analyze)) is not _DONE:
+            page_num, root = item
+            t0 = time.perf_counter()
+            analyzer = XMLPageAnalyzer(f'page_{page_num}.xml', tree=root.getroottree())
+            page_info = analyzer.get_page_info()
+            slots = len(page_info['blank_fields']) + len(page_info['placeholder_fields'])
+            stages.record('analyze', page_num, t0, slots)
+            if not stages.put(to_llm, {'page_num': page_num, 'analyzer': analyzer, 'page_info': page_info}):
+                return
+        for _ in range(workers):
+            stages.put(to_llm, _DONE)
+
+    def llm_stage():
+        processor = None
+        if not skip_llm:
+            from llm_connector import LLMConnector
+            processor = LLMPageProcessor(LLMConnector(llm_config, telemetry), router=router)
+        while (item := stages.get(to_llm)) is not _DONE:
+            page_num = item['page_num']
+            t0 = time.perf_counter()
+            if processor is None:
+                item['result'] = {'page_num': page_num, 'status': 'success', 'updates': []}
+            else:
+                data_context = {'page_title': f'第{page_num}页', 'data': fill_data.get(f'page_{page_num}', {})}
+                item['result'] = process_page(processor, page_num, item['page_info'], data_context,
+                                              template_name, flight)
+            stages.record('llm', page_num, t0)
+            if not stages.put(to_apply, item):
+                return
+        with llm_lock:
+            remaining_llm[0] -= 1
+            last = remaining_llm[0] == 0
+        if last:
+            stages.put(to_apply, _DONE)
+
+    def apply_stage():
+        while (item := stages.get(to_apply)) is not _DONE:
+            page_num, result = item['page_num'], item['result']
+            t0 = time.perf_counter()
+            if result['status'] == 'success':
+                if result['updates']:
+                    item['analyzer'].apply_updates(result['updates'])
+                    stats['successful'] += 1
+                if 'shared_from' in result:
+                    stats['shared'] += 1
+                if 'repair' in result:
+                    for key, value in result['repair'].items():
+                        stats['repair'][key] = stats['repair'].get(key, 0) + value
+            else:
+                stats['failed'] += 1
+                stats['failed_pages'].append(page_num)
+                logger.error("  ❌ 第%d页处理失败: %s", page_num, result.get('error', 'Unknown error'))
+            stages.record('apply', page_num, t0)
+            if not stages.put(to_merge, (page_num, item['analyzer'].root)):
+                return
+        stages.put(to_merge, _DONE)
+
+    stages.start('split', split_stage)
+    stages.start('analyze', analyze_stage)
+    for i in range(workers):
+        stages.start(f'llm-{i}', llm_stage)
+    stages.start('apply', apply_stage)
+
+    # 合并阶段在当前线程运行：先复制其余部件，再按页码顺序流式写入 document.xml
+    tmp_output = output_docx + '.tmp'
+    written = 0
+    try:
+        with zipfile.ZipFile(template_docx) as zin, \
+                zipfile.ZipFile(tmp_output, 'w', zipfile.ZIP_DEFLATED) as zout:
+            document_info = None
+            for info in zin.infolist():
+                out_info = zipfile.ZipInfo(info.filename, info.date_time)
+                out_info.compress_type = zipfile.ZIP_DEFLATED
+                out_info.external_attr = info.external_attr
+                if info.filename == DOCUMENT_PART:
+                    document_info = out_info
+                    continue
+                with zin.open(info) as src, zout.open(out_info, 'w', force_zip64=True) as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+
+            with zout.open(document_info, 'w', force_zip64=True) as dst:
+                dst.write(XML_DECLARATION + head)
+                waiting: Dict[int, Any] = {}
+                while (item := stages.get(to_merge)) is not _DONE:
+                    waiting[item[0]] = item[1]
+                    # 前面的页面都已写出时才写当前页，保证页面顺序
+                    while written + 1 in waiting:
+                        t0 = time.perf_counter()
+                        body = waiting.pop(written + 1)[0]
+                        for child in body:
+                            dst.write(serialize_child(child, root_ns))
+                        written += 1
+                        stages.record('merge', written, t0)
+                        if written == 1:
+                            stats['first_page_written_s'] = round(time.perf_counter() - started, 4)
+                dst.write(tail)
+    except BaseException:
+        # 合并出错时让其他阶段退出，避免阻塞在已满的队列上
+        stages.abort.set()
+        if os.path.exists(tmp_output):
+            os.remove(tmp_output)
+        raise
+    finally:
+        stages.join()
+
+    stats['wall_s'] = round(time.perf_counter() - started, 4)
+    stats['stage_busy_s'] = {name: round(value, 4) for name, value in stages.busy.items()}
+    if flight is not None:
+        stats['dedupe'] = dict(flight.stats)
+    if router is not None:
+        stats['routing'] = router.stats
+        print_routing(router)
+    if llm_config is not None and llm_config.pool is not None:
+        stats['pool'] = llm_config.pool.summary()
+        llm_config.pool.print_summary()
+    if telemetry is not None:
+        stats['llm_telemetry'] = telemetry.totals()
+        if metrics is not None:
+            for key, value in stats['llm_telemetry'].items():
+                metrics.incr(f'llm_{key}', value)
+        if telemetry_file:
+            if telemetry_file.endswith('.prom'):
+                telemetry.write_prometheus(telemetry_file)
+            else:
+                telemetry.export_json(telemetry_file, include_records=True)
+
+    stats['ok'] = not stages.errors and written == len(pages) and (allow_failed_pages or not stats['failed'])
+    if stages.errors:
+        stats['errors'] = stages.errors
+    if stats['ok']:
+        os.replace(tmp_output, output_docx)
+    elif os.path.exists(tmp_output):
+        os.remove(tmp_output)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='流水线式完整流程：分割、大模型处理、合并、打包同时进行')
+    parser.add_argument('template', help='原始Word文件')
+    parser.add_argument('-o', '--output', required=True, help='输出docx')
+    parser.add_argument('--llm-config', default='llm_config.json', help='LLM配置文件')
+    parser.add_argument('--data', default='fill_data.json', help='填充数据文件')
+    parser.add_argument('--template-name', default='tender_form', help='提示词模板')
+    parser.add_argument('--concurrency', type=int, default=4, help='大模型并发数')
+    parser.add_argument('--queue-size', type=int, default=8, help='阶段间队列容量')
+    parser.add_argument('--no-dedupe', action='store_true', help='不合并相同的大模型请求')
+    parser.add_argument('--skip-llm', action='store_true', help='跳过大模型处理')
+    parser.add_argument('--allow-failed-pages', action='store_true', help='部分页面处理失败时仍输出文档')
+    parser.add_argument('--stats-json', default=None, help='统计信息JSON路径')
+    args = parser.parse_args(argv)
+
+    try:
+        stats = run_pipeline(args.template, args.output, args.llm_config, args.data, args.template_name,
+                             concurrency=args.concurrency, queue_size=args.queue_size,
+                             dedupe=not args.no_dedupe, skip_llm=args.skip_llm,
+                             allow_failed_pages=args.allow_failed_pages)
+    except FileNotFoundError as e:
+        print(f"❌ {e}")
+        return 1
+    busy = ', '.join(f"{name} {seconds:.2f}s" for name, seconds in stats['stage_busy_s'].items())
+    print(f"\n{'✓' if stats['ok'] else '✗'} {stats['pages']} 页, 成功 {stats['successful']}, "
+          f"失败 {stats['failed']}, 复用 {stats['shared']}, 总耗时 {stats['wall_s']:.2f}s")
+    print(f"  各阶段累计耗时: {busy}")
+    if stats['repair']:
+        repair = stats['repair']
+        print(f"  字段补填: {repair['rounds']} 次请求，{repair['requested']} 个字段中修复 {repair['repaired']} 个")
+    for error in stats.get('errors', []):
+        print(f"  ❌ {error}")
+    if args.stats_json:
+        with open(args.stats_json, 'w', encoding='utf-8') as f:
+            json.dump(stats, f, ensure_ascii=False, indent=2)
+    if stats['ok']:
+        print(f"✓ 已生成: {args.output}")
+    return 0 if stats['ok'] else 1
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.WARNING, format='%(message)s')
+    sys.exit(main())
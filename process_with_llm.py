@@ -3,20 +3,36 @@ XML解析和大模型处理脚本
 从分割的页面XML中提取内容 → 调用大模型 → 更新XML
 """
 import json
+import logging
 import os
 import glob
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from lxml import etree
-from typing import Dict, List, Any, Optional
-from llm_connector import LLMConnector, LLMConfig
+from typing import Dict, List, Any, Optional, Tuple
+from llm_connector import LLMConnector, LLMConfig, LLMProvider
+from parse_docx import is_docx, parse_xml, replace_part
+from single_flight import SingleFlight, request_key
+from llm_json import parse_json, validate
+from data_index import DataIndex, page_queries, select_page_data
+from model_router import FAST, STRONG, ModelRouter, load_router
+from slot_repair import failing_slots, format_failed_fields, merge_repair, repairable_slots
 from prompt_library import PromptLibrary
 
+logger = logging.getLogger(__name__)
+
 
 class XMLPageAnalyzer:
     """页面XML分析器"""
     
-    def __init__(self, page_xml_path: str):
+    def __init__(self, page_xml_path: str, tree=None):
+        """
+        :param page_xml_path: 页面XML文件路径或docx路径（save() 时写回此路径）
+        :param tree: 已解析的 ElementTree，传入时不再重新读取文件
+        """
         self.page_path = page_xml_path
-        self.tree = etree.parse(page_xml_path)
+        self.tree = tree if tree is not None else parse_xml(page_xml_path)
         self.root = self.tree.getroot()
         self.ns = {
             'ns0': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main',
@@ -40,7 +56,8 @@ class XMLPageAnalyzer:
                 # 检查是否是空白字段（如下划线、虚线、方括号等）
                 text = t.text.strip()
                 if text in ['_', '__', '___', '____', '—', '、', '[]', '[ ]', '【】', '【  】']:
-                    para = t.getparent().getparent().getparent()
+                    # 所在段落（run 可能包在超链接、域等元素里）
+                    para = next(t.iterancestors('{%s}p' % self.ns['ns0']), t.getparent().getparent())
                     para_text = self._get_paragraph_context(para)
                     
                     blank_fields.append({
@@ -75,15 +92,49 @@ class XMLPageAnalyzer:
         
         return placeholder_fields
     
+    def find_table_slots(self) -> List[str]:
+        """找出表格中待填的空单元格，返回其标签（列标题或左侧标签）"""
+        if self.root.find('.//ns0:tbl', self.ns) is None:
+            return []
+        from table_model import iter_tables
+        return [cell['full_label'] for table in iter_tables(self.root) for cell in table.empty_cells()]
+    
     def get_page_info(self) -> Dict[str, Any]:
         """获取页面信息"""
         return {
             'text_content': self.extract_text_content(),
             'blank_fields': self.find_blank_fields(),
             'placeholder_fields': self.find_placeholder_fields(),
+            'table_cells': len(self.root.findall('.//ns0:tc', self.ns)),
+            'table_slots': self.find_table_slots(),
             'page_xml': etree.tostring(self.root, encoding='utf-8', pretty_print=True).decode('utf-8')[:2000]  # 前2000字符
         }
     
+    def slot_records(self) -> List[Dict[str, Any]]:
+        """
+        返回紧凑的字段记录（不含元素引用，可跨进程传递、可序列化为JSON）
+        """
+        records = []
+        for field in self.find_blank_fields():
+            records.append({
+                'field_id': field['field_id'],
+                'kind': 'blank',
+                'name': '',
+                'original_value': field['original_value'],
+                'context': field['context'],
+                'xpath': field['xpath'],
+            })
+        for field in self.find_placeholder_fields():
+            records.append({
+                'field_id': field['field_id'],
+                'kind': 'placeholder',
+                'name': field['placeholder_name'],
+                'original_value': field['original_value'],
+                'context': field['context'],
+                'xpath': field['xpath'],
+            })
+        return records
+    
     def _get_paragraph_context(self, para_elem) -> str:
         """获取段落的上下文文本"""
         texts = []
@@ -106,10 +157,12 @@ class XMLPageAnalyzer:
         :param updates: 更新列表，格式：
             [{"old_text": "旧文本", "new_text": "新文本", "xpath": "xpath"}]
         """
+        # getpath() 使用文档自身的前缀（w: 或 ns0:），求值时两套前缀都要能解析
+        namespaces = {**{k: v for k, v in self.root.nsmap.items() if k}, **self.ns}
         for update in updates:
             if 'xpath' in update:
                 try:
-                    elem = self.root.xpath(update['xpath'], namespaces=self.ns)[0]
+                    elem = self.root.xpath(update['xpath'], namespaces=namespaces)[0]
                     if elem.text and update['old_text'] in elem.text:
                         elem.text = elem.text.replace(update['old_text'], update['new_text'])
                 except:
@@ -124,15 +177,36 @@ class XMLPageAnalyzer:
                         t.text = t.text.replace(update['old_text'], update['new_text'])
     
     def save(self):
-        """保存修改后的XML"""
+        """保存修改后的XML（docx路径时替换其中的 word/document.xml）"""
+        if is_docx(self.page_path):
+            tmp_path = self.page_path + '.tmp'
+            replace_part(self.page_path, tmp_path, self.tree)
+            os.replace(tmp_path, self.page_path)
+            return
         self.tree.write(self.page_path, encoding='utf-8', xml_declaration=True)
 
 
 class LLMPageProcessor:
     """LLM页面处理器"""
     
-    def __init__(self, llm_connector: LLMConnector):
+    def __init__(self, llm_connector: LLMConnector, repair_rounds: Optional[int] = None,
+                 min_confidence: Optional[float] = None, router: Optional[ModelRouter] = None):
+        """
+        :param llm_connector: LLM连接器（配置了路由时为强模型）
+        :param repair_rounds: 字段补填的最大轮数，默认取连接器配置
+        :param min_confidence: 字段最低置信度，默认取连接器配置
+        :param router: 可选的模型路由器，简单页面交给快速模型
+        """
         self.llm = llm_connector
+        config = llm_connector.config
+        self.repair_rounds = config.repair_rounds if repair_rounds is None else repair_rounds
+        self.min_confidence = config.min_confidence if min_confidence is None else min_confidence
+        self.router = router
+        self._indexes: Dict[int, DataIndex] = {}
+        self.tier_llm = {}
+        if router is not None:
+            self.tier_llm = {STRONG: llm_connector,
+                             FAST: LLMConnector(router.configs[FAST], llm_connector.telemetry)}
     
     def process_page_with_llm(self, 
                              page_num: int,
@@ -148,45 +222,132 @@ class LLMPageProcessor:
         :param template_name: 使用的提示词模板
         :return: 处理结果
         """
-        print(f"  🤖 第{page_num}页: 调用大模型处理...")
+        logger.info("  🤖 第%d页: 调用大模型处理...", page_num)
         
-        template = PromptLibrary.get_template(template_name)
-        
-        # 准备提示词参数
-        prompt_vars = {
-            'page_num': page_num,
-            'page_title': data_context.get('page_title', ''),
-            'fields_to_fill': self._format_fields(page_info.get('blank_fields', []) + 
-                                                  page_info.get('placeholder_fields', [])),
-            'provided_data': self._format_data(data_context.get('data', {})),
-        }
-        
-        system_prompt, user_prompt = template.format(**prompt_vars)
+        request = self.page_request(page_num, page_info, data_context, template_name)
         
         try:
             # 调用LLM
-            response = self.llm.call(user_prompt, system_prompt)
+            response = request['llm'].call(**request['call'])
             
-            # 解析LLM响应
-            result = self._parse_llm_response(response)
+            # 解析LLM响应（无法解析时抛出 LLMJSONError，本页记为失败以便重试）
+            result = self.page_result(page_num, response, request)
             
-            return {
-                'page_num': page_num,
-                'status': 'success',
-                'updates': result.get('updates', []),
-                'filled_fields': result.get('filled_fields', []),
-                'unfilled_fields': result.get('unfilled_fields', []),
-                'raw_response': response
-            }
+            # 未通过校验的字段单独补填
+            repair = self.start_repair(result, page_num, page_info, data_context, template_name, request['tier'])
+            self._repair_slots(repair)
+            return self.finish_repair(repair, request['tier'])
         
         except Exception as e:
-            print(f"  ❌ 第{page_num}页处理失败: {e}")
+            logger.error("  ❌ 第%d页处理失败: %s", page_num, e)
             return {
                 'page_num': page_num,
                 'status': 'failed',
                 'error': str(e)
             }
     
+    def page_request(self, page_num: int, page_info: Dict[str, Any], data_context: Dict[str, Any],
+                     template_name: str = 'tender_form') -> Dict[str, Any]:
+        """
+        准备一页的模型请求（实时调用和批量提交共用）
+        
+        :return: {'llm': 选定的连接器, 'tier', 'complexity', 'schema',
+                  'call': LLMConnector.call() 的参数}
+        """
+        template = PromptLibrary.get_template(template_name)
+        
+        # 准备提示词参数
+        prompt_vars = {
+            'page_num': page_num,
+            'page_title': data_context.get('page_title', ''),
+            'fields_to_fill': self._page_fields(page_info),
+            'provided_data': self._format_data(self._page_data(page_info, data_context.get('data', {}))),
+        }
+        
+        # 系统提示词和共用上下文在前，页面内容在后，便于命中服务商的提示词缓存
+        system_prompt, context, user_prompt = template.format_parts(**prompt_vars)
+        
+        # 按页面复杂度选择模型
+        llm, tier, complexity = self.llm, None, None
+        if self.router is not None:
+            tier, complexity = self.router.route(page_info, data_context.get('data', {}))
+            llm = self.tier_llm[tier]
+            logger.info("  🧭 第%d页: 复杂度 %.1f → %s (%s)", page_num, complexity.score, tier, llm.config.model)
+        
+        return {
+            'llm': llm, 'tier': tier, 'complexity': complexity, 'schema': template.output_schema,
+            'call': {'prompt': user_prompt, 'system_prompt': system_prompt, 'context': context,
+                     'schema': template.output_schema},
+        }
+    
+    def page_result(self, page_num: int, response: str, request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        解析一页的模型响应
+        
+        :param request: page_request() 的结果
+        :raises LLMJSONError: 响应中没有可解析的JSON
+        """
+        result = self._parse_llm_response(response, request['schema'])
+        result.update(page_num=page_num, status='success', raw_response=response)
+        if request['tier'] is not None:
+            result.update(model_tier=request['tier'], complexity=request['complexity'].to_dict())
+        return result
+    
+    def start_repair(self, result: Dict[str, Any], page_num: int, page_info: Dict[str, Any],
+                     data_context: Dict[str, Any], template_name: str, tier: Optional[str] = None) -> 'PageRepair':
+        """
+        开始一页的字段补填；快速模型的低置信度/未通过字段升级给强模型补填
+        """
+        if tier == FAST:
+            escalate_below = max(self.min_confidence, self.router.escalate_below)
+            return PageRepair(self, result, page_num, page_info, data_context, template_name,
+                              min_confidence=escalate_below, rounds=max(self.repair_rounds, 1))
+        return PageRepair(self, result, page_num, page_info, data_context, template_name,
+                          self.min_confidence, self.repair_rounds)
+    
+    def finish_repair(self, repair: 'PageRepair', tier: Optional[str] = None) -> Dict[str, Any]:
+        """结束补填，返回页面结果"""
+        result = repair.finish()
+        if tier == FAST and result.get('repair'):
+            self.router.record_escalation(result['repair']['requested'])
+        return result
+    
+    def _repair_slots(self, repair: 'PageRepair'):
+        """逐轮发出补填请求（始终使用 self.llm）"""
+        request = repair.next_request()
+        while request is not None:
+            try:
+                repair.apply(self.llm.call(**request))
+            except Exception as e:
+                repair.apply(None, str(e))
+            request = repair.next_request()
+    
+    def field_keys(self, page_info: Dict[str, Any], data_context: Dict[str, Any],
+                   template_name: str = 'tender_form') -> List[str]:
+        """
+        每个待填字段的合并键，顺序同 page_fields()
+
+        键由模板、归一化的字段上下文（占位符名、所在段落文本、原文及其在同一段落中的序号）
+        和为该字段检索到的数据子集组成，与页码和同页的其他字段无关：
+        "投标人名称：____" 出现在多页时，只要数据相同就是同一个键。
+        段落中除空白外没有文字的字段（如表格里单独的 "____"）无从判断含义，键中加入页面文本和位置，不与其他页面合并
+        """
+        data = data_context.get('data', {})
+        occurrences: Dict[Tuple[str, str, str], int] = {}
+        keys = []
+        for field in page_fields(page_info):
+            kind = 'placeholder_fields' if 'placeholder_name' in field else 'blank_fields'
+            slot = (field.get('placeholder_name', ''), field.get('context', ''), field['original_value'])
+            occurrences[slot] = occurrences.get(slot, 0) + 1
+            field_data = self._format_data(self._page_data({kind: [field]}, data))
+            labelled = slot[0] or slot[1].replace(slot[2], '').strip(' _—、[]【】')
+            page = () if labelled else (page_info.get('text_content', ''), field['xpath'])
+            keys.append(request_key(template_name, *slot, occurrences[slot], field_data, *page))
+        return keys
+    
+    def _page_fields(self, page_info: Dict[str, Any]) -> str:
+        return self._format_fields(page_fields(page_info))
+    
     def _format_fields(self, fields: List[Dict]) -> str:
         """格式化字段列表"""
         if not fields:
@@ -194,13 +355,30 @@ class LLMPageProcessor:
         
         formatted = []
         for field in fields[:10]:  # 只显示前10个
+            # 列出字段位置，模型在 xml_updates 中原样返回，更新能对应到具体字段
             if 'placeholder_name' in field:
-                formatted.append(f"  - ${{{field['placeholder_name']}}}: {field.get('context', '')[:100]}")
+                formatted.append(f"  - ${{{field['placeholder_name']}}} ({field['xpath']}): "
+                                 f"{field.get('context', '')[:100]}")
             else:
-                formatted.append(f"  - [空白]: {field.get('context', '')[:100]}")
+                formatted.append(f"  - [空白] ({field['xpath']}): {field.get('context', '')[:100]}")
         
         return '\n'.join(formatted)
     
+    def _page_data(self, page_info: Dict[str, Any], data: Dict) -> Dict:
+        """
+        只取本页字段相关的数据键（BM25 检索，见 data_index）；数据键较少时整份返回
+        
+        同一份数据的索引在本处理器内复用
+        """
+        if not data or self.llm.config.data_top_k <= 0:
+            return data
+        cached = self._indexes.get(id(data))
+        if cached is None or cached.data is not data:
+            if len(self._indexes) >= 16:
+                self._indexes.clear()
+            cached = self._indexes[id(data)] = DataIndex(data)
+        return select_page_data(data, page_queries(page_info), self.llm.config.data_top_k, cached)
+    
     def _format_data(self, data: Dict) -> str:
         """格式化数据"""
         if not data:
@@ -217,54 +395,379 @@ class LLMPageProcessor:
         
         return '\n'.join(lines)
     
-    def _parse_llm_response(self, response: str) -> Dict[str, Any]:
+    def _parse_llm_response(self, response: str, schema: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         解析LLM响应
         
         :param response: LLM的原始响应
+        :param schema: 模板声明的输出结构
         :return: 解析后的更新列表
+        :raises LLMJSONError: 响应中没有可解析的JSON
         """
-        try:
-            # 尝试从response中提取JSON
-            import re
-            
-            # 查找JSON块
-            json_match = re.search(r'\{[\s\S]*\}', response)
-            if json_match:
-                json_str = json_match.group()
-                result = json.loads(json_str)
-                
-                # 标准化响应格式
-                updates = []
-                for item in result.get('xml_updates', []):
-                    updates.append({
-                        'old_text': item.get('old_content', ''),
-                        'new_text': item.get('new_content', ''),
-                        'xpath': item.get('xpath', '')
-                    })
-                
-                return {
-                    'updates': updates,
-                    'filled_fields': result.get('fields_filled', []),
-                    'unfilled_fields': result.get('unfilled_fields', [])
-                }
+        result = parse_json(response, schema or {'type': 'object'})
+        if schema:
+            for error in validate(result, schema):
+                logger.warning("  ⚠️  响应结构不符: %s", error)
         
-        except json.JSONDecodeError:
-            pass
+        # 标准化响应格式
+        updates = []
+        for item in result.get('xml_updates') or []:
+            if not isinstance(item, dict):
+                continue
+            updates.append({
+                'old_text': item.get('old_content', ''),
+                'new_text': item.get('new_content', ''),
+                'xpath': item.get('xpath', '')
+            })
         
-        # 如果无法解析JSON，尝试从文本中提取
-        print(f"  ⚠️  无法解析JSON响应，尝试文本提取...")
         return {
-            'updates': [],
-            'filled_fields': [],
-            'unfilled_fields': []
+            'updates': updates,
+            'filled_fields': result.get('fields_filled') or [],
+            'unfilled_fields': result.get('unfilled_fields') or []
         }
 
 
+class PageRepair:
+    """
+    一页的字段补填：逐字段校验，只把未通过的字段放进补填请求
+
+    next_request() 给出下一轮请求，apply() 合并其响应，finish() 在结果中记录 repair
+    （轮数、请求字段数、修复字段数）和仍未通过的 slot_errors。
+    实时处理逐轮调用；批量处理把各页同一轮的请求合成一个批量任务
+    """
+
+    def __init__(self, processor: LLMPageProcessor, result: Dict[str, Any], page_num: int,
+                 page_info: Dict[str, Any], data_context: Dict[str, Any], template_name: str,
+                 min_confidence: float, rounds: int):
+        """
+        :param result: 页面结果（补填结果直接合并进来）
+        :param min_confidence: 最低置信度
+        :param rounds: 最大轮数
+        """
+        self.processor = processor
+        self.result = result
+        self.page_num = page_num
+        self.page_info = page_info
+        self.data_context = data_context
+        self.data = data_context.get('data', {})
+        self.min_confidence = min_confidence
+        self.rounds = rounds
+        self.repair_name = PromptLibrary.REPAIR_TEMPLATES.get(template_name)
+        self.failing = failing_slots(result, page_info, self.data, min_confidence)
+        self.stats = {'rounds': 0, 'requested': 0, 'repaired': 0}
+        self.retry: List[Dict[str, Any]] = []
+        self.done = not self.repair_name
+
+    def next_request(self) -> Optional[Dict[str, Any]]:
+        """
+        下一轮补填请求（LLMConnector.call() 的参数）
+
+        只补填数据中有对应键的字段，其余再问也无从取值；没有可补填的字段或已达轮数上限时返回 None
+        """
+        if self.done or self.stats['rounds'] >= self.rounds:
+            return None
+        self.retry = repairable_slots(self.failing, self.data)
+        if not self.retry:
+            return None
+        template = PromptLibrary.get_template(self.repair_name)
+        system_prompt, context, user_prompt = template.format_parts(
+            page_num=self.page_num,
+            page_title=self.data_context.get('page_title', ''),
+            failed_fields=format_failed_fields(self.retry),
+            provided_data=self.processor._format_data(self.processor._page_data(self.page_info, self.data)),
+        )
+        self.stats['rounds'] += 1
+        self.stats['requested'] += len(self.retry)
+        logger.info("  🔁 第%d页: %d个字段未通过校验，补填第%d轮",
+                    self.page_num, len(self.retry), self.stats['rounds'])
+        return {'prompt': user_prompt, 'system_prompt': system_prompt, 'context': context,
+                'schema': template.output_schema}
+
+    def apply(self, response: Optional[str], error: str = ''):
+        """
+        合并一轮补填的响应；请求失败（response 为 None）、无法解析或没有修复任何字段时停止补填
+        """
+        try:
+            if response is None:
+                raise RuntimeError(error)
+            repaired = parse_json(response, PromptLibrary.get_template(self.repair_name).output_schema)
+        except Exception as e:
+            logger.warning("  ⚠️  第%d页补填失败: %s", self.page_num, e)
+            self.done = True
+            return
+        fixed = merge_repair(self.result, repaired, self.retry, self.data, self.min_confidence)
+        self.stats['repaired'] += fixed
+        if not fixed:
+            self.done = True
+            return
+        self.failing = failing_slots(self.result, self.page_info, self.data, self.min_confidence)
+
+    def finish(self) -> Dict[str, Any]:
+        if self.stats['rounds']:
+            self.result['repair'] = self.stats
+        self.result['slot_errors'] = [{'field': slot['name'], 'reason': slot['reason']}
+                                      for slot in self.failing]
+        return self.result
+
+
+def print_routing(router: ModelRouter):
+    """打印模型路由统计"""
+    stats = router.stats
+    print(f"  模型路由: 快速模型 {stats['pages'][FAST]} 页 ({router.configs[FAST].model})，"
+          f"强模型 {stats['pages'][STRONG]} 页 ({router.configs[STRONG].model})，"
+          f"升级 {stats['escalated_pages']} 页 / {stats['escalated_slots']} 个字段")
+
+
+def page_fields(page_info: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """页面的待填字段，顺序同提示词中的字段列表（空白字段在前，占位符在后）"""
+    return page_info.get('blank_fields', []) + page_info.get('placeholder_fields', [])
+
+
+def subset_page(page_info: Dict[str, Any], indexes: List[int]) -> Dict[str, Any]:
+    """只含指定字段（page_fields() 中的序号）的页面信息，用于只询问尚无答案的字段"""
+    fields = page_fields(page_info)
+    chosen = [fields[i] for i in indexes]
+    return dict(page_info,
+                blank_fields=[f for f in chosen if 'placeholder_name' not in f],
+                placeholder_fields=[f for f in chosen if 'placeholder_name' in f])
+
+
+def field_answers(result: Dict[str, Any], fields: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+    """
+    把一页的模型结果拆成逐个字段的答案，可转给其他页面的同一字段
+
+    更新按 xpath 对应到字段（提示词中列出了字段位置）；xpath 对不上的占位符更新按原文对应。
+    答案为 {'page_num', 'new_text', 'filled'}，filled 为模型对该字段的 fields_filled 条目；
+    失败的结果或没有对应更新的字段为 None
+
+    :param fields: 本次询问的字段
+    """
+    answers: List[Optional[Dict[str, Any]]] = [None] * len(fields)
+    if result.get('status') != 'success':
+        return answers
+    by_xpath = {field['xpath']: i for i, field in enumerate(fields)}
+    for update in result.get('updates', []):
+        if not update.get('new_text'):
+            continue
+        index = by_xpath.get(update.get('xpath'))
+        matched = [index] if index is not None else [
+            i for i, field in enumerate(fields)
+            if 'placeholder_name' in field and field['original_value'] == update.get('old_text')]
+        for i in matched:
+            if answers[i] is None:
+                answers[i] = {'page_num': result['page_num'], 'new_text': update['new_text'], 'filled': None}
+    filled = [item for item in result.get('filled_fields', []) if isinstance(item, dict)]
+    for field, answer in zip(fields, answers):
+        if answer is not None:
+            answer['filled'] = next((item for item in filled
+                                     if item.get('new_value') == answer['new_text']
+                                     and item.get('original_value', field['original_value']) == field['original_value']),
+                                    None)
+    return answers
+
+
+def merge_field_answers(page_num: int, fields: List[Dict[str, Any]], keys: List[str],
+                        answers: Dict[str, Dict[str, Any]], own_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    组合一页的结果：本页询问的结果，加上其他页面对同一字段的答案（xpath 换成本页字段的位置）
+
+    :param keys: 本页字段的合并键，与 fields 一一对应
+    :param answers: {合并键: 答案}
+    :param own_results: 本页发出的模型请求的结果（全部字段都复用时为空）
+    :return: 页面结果；复用了其他页面的答案时含 shared_fields（字段数）和 shared_from（来源页码）
+    """
+    failed = next((r for r in own_results if r['status'] != 'success'), None)
+    if failed is not None:
+        return dict(failed, page_num=page_num)
+    result = {'page_num': page_num, 'status': 'success', 'updates': [], 'filled_fields': [], 'unfilled_fields': []}
+    for own in own_results:
+        for name in ('updates', 'filled_fields', 'unfilled_fields'):
+            own[name] = result[name] + own.get(name, [])
+        result = own
+    sources = set()
+    for field, key in zip(fields, keys):
+        answer = answers.get(key)
+        if answer is None or answer['page_num'] == page_num:
+            continue
+        result['updates'].append({'old_text': field['original_value'], 'new_text': answer['new_text'],
+                                  'xpath': field['xpath']})
+        if answer['filled'] is not None:
+            result['filled_fields'].append(dict(answer['filled']))
+        sources.add(answer['page_num'])
+        result['shared_fields'] = result.get('shared_fields', 0) + 1
+    if sources:
+        result['shared_from'] = sorted(sources)
+    result['llm_calls'] = len(own_results)
+    return result
+
+
+def process_page(processor: 'LLMPageProcessor', page_num: int, page_info: Dict[str, Any],
+                 data_context: Dict[str, Any], template_name: str = 'tender_form',
+                 flight: Optional[SingleFlight] = None) -> Dict[str, Any]:
+    """
+    调用大模型处理一页；传入 flight 时按字段合并请求
+
+    字段上下文和所需数据都相同的字段（见 field_keys）在整个运行中只询问一次：已有答案的字段直接复用，
+    其他页面正在询问的字段等待其答案，本页只把其余字段发给模型。
+    其他页面没能答出的字段（请求失败或模型未填写），本页再询问一次
+
+    :return: 处理结果（复用其他页面的答案时含 shared_fields / shared_from）
+    """
+    if flight is None:
+        return processor.process_page_with_llm(page_num, page_info, data_context, template_name)
+    fields = page_fields(page_info)
+    keys = processor.field_keys(page_info, data_context, template_name)
+    own_results: List[Dict[str, Any]] = []
+
+    def ask(missing: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        missing = set(missing)
+        indexes = [i for i, key in enumerate(keys) if key in missing]
+        result = processor.process_page_with_llm(page_num, subset_page(page_info, indexes), data_context,
+                                                 template_name)
+        own_results.append(result)
+        answers = field_answers(result, [fields[i] for i in indexes])
+        return {keys[i]: answer for i, answer in zip(indexes, answers)}
+
+    answers: Dict[str, Dict[str, Any]] = {}
+    pending = list(dict.fromkeys(keys))
+    for _ in range(2):
+        done = flight.do_many(pending, ask)
+        answers.update((key, answer) for key, (answer, _) in done.items() if answer is not None)
+        pending = [key for key, (answer, shared) in done.items() if answer is None and shared]
+        if not pending:
+            break
+
+    result = merge_field_answers(page_num, fields, keys, answers, own_results)
+    if result.get('shared_fields'):
+        logger.info("  ♻️  第%d页: %d个字段复用第%s页的答案", page_num, result['shared_fields'],
+                    '、'.join(map(str, result['shared_from'])))
+    return result
+
+
+def process_pages_batch(processor: LLMPageProcessor, pages: List[Tuple[int, Dict[str, Any], Dict[str, Any]]],
+                        work_dir: str, template_name: str = 'tender_form', dedupe: bool = True,
+                        poll_interval: Optional[float] = None,
+                        timeout: Optional[float] = None) -> Dict[int, Dict[str, Any]]:
+    """
+    通过服务商批量接口处理一组页面：全部页面的请求合成一个批量任务（配置了路由时每个模型一个），
+    各页的补填请求按轮次再各合成一个批量任务
+
+    :param pages: [(页码, 页面信息, 数据上下文)]
+    :param work_dir: 批量文件目录（中断后重新运行会继续等待已提交的任务）
+    :param dedupe: 字段上下文和所需数据都相同的字段只提交一次（见 field_keys），其他页面复用答案
+    :param poll_interval: 轮询间隔（秒），默认取连接器配置
+    :param timeout: 每个批量任务的最长等待时间（秒）
+    :return: {页码: 处理结果}
+    :raises RuntimeError: 批量任务失败
+    :raises TimeoutError: 批量任务超时未完成
+    """
+    owners: Dict[str, int] = {}
+    field_args: Dict[int, Tuple[List[Dict[str, Any]], List[str]]] = {}
+    asked_keys: Dict[int, List[str]] = {}
+    requests: Dict[int, Dict[str, Any]] = {}
+    page_args = {page_num: (page_info, data_context) for page_num, page_info, data_context in pages}
+    for page_num, page_info, data_context in pages:
+        if dedupe:
+            # 每个字段由第一个出现它的页面询问；页面只提交自己负责的字段，没有则不提交
+            keys = processor.field_keys(page_info, data_context, template_name)
+            field_args[page_num] = (page_fields(page_info), keys)
+            indexes = [i for i, key in enumerate(keys) if owners.setdefault(key, page_num) == page_num]
+            if not indexes:
+                continue
+            page_info = subset_page(page_info, indexes)
+            page_args[page_num] = (page_info, data_context)
+            asked_keys[page_num] = [keys[i] for i in indexes]
+        requests[page_num] = processor.page_request(page_num, page_info, data_context, template_name)
+
+    def submit(llm: LLMConnector, calls: Dict[int, Dict[str, Any]], name: str) -> Dict[int, Dict[str, str]]:
+        ids = {f'page-{page_num}': page_num for page_num in calls}
+        answers = llm.call_batch([dict(call, custom_id=custom_id) for custom_id, call in
+                                  zip(ids, calls.values())], work_dir, name, poll_interval, timeout)
+        return {ids[custom_id]: answer for custom_id, answer in answers.items()}
+
+    # 每个模型一个批量任务
+    answers: Dict[int, Dict[str, str]] = {}
+    for tier in dict.fromkeys(request['tier'] for request in requests.values()):
+        group = {page_num: request for page_num, request in requests.items() if request['tier'] == tier}
+        llm = next(iter(group.values()))['llm']
+        print(f"  📦 提交批量任务: {len(group)} 页" + (f" ({tier}: {llm.config.model})" if tier else ''))
+        answers.update(submit(llm, {page_num: request['call'] for page_num, request in group.items()},
+                              f'pages-{tier}' if tier else 'pages'))
+
+    results: Dict[int, Dict[str, Any]] = {}
+    repairs: Dict[int, PageRepair] = {}
+    for page_num, request in requests.items():
+        answer = answers[page_num]
+        try:
+            if 'error' in answer:
+                raise RuntimeError(answer['error'])
+            result = processor.page_result(page_num, answer['text'], request)
+        except Exception as e:
+            logger.error("  ❌ 第%d页处理失败: %s", page_num, e)
+            results[page_num] = {'page_num': page_num, 'status': 'failed', 'error': str(e)}
+            continue
+        page_info, data_context = page_args[page_num]
+        repairs[page_num] = processor.start_repair(result, page_num, page_info, data_context,
+                                                   template_name, request['tier'])
+
+    # 补填：每轮把各页的补填请求合成一个批量任务
+    round_num = 0
+    while True:
+        calls = {page_num: repair.next_request() for page_num, repair in repairs.items()}
+        calls = {page_num: call for page_num, call in calls.items() if call is not None}
+        if not calls:
+            break
+        round_num += 1
+        print(f"  📦 提交补填批量任务 (第{round_num}轮): {len(calls)} 页")
+        for page_num, answer in submit(processor.llm, calls, f'repair-{round_num}').items():
+            repairs[page_num].apply(answer.get('text'), answer.get('error', ''))
+    for page_num, repair in repairs.items():
+        results[page_num] = processor.finish_repair(repair, requests[page_num]['tier'])
+
+    if not dedupe:
+        return results
+    answers: Dict[str, Dict[str, Any]] = {}
+    for page_num, result in results.items():
+        asked = page_fields(page_args[page_num][0])
+        answers.update((key, answer) for key, answer in zip(asked_keys[page_num], field_answers(result, asked))
+                       if answer is not None)
+    for page_num, (fields, keys) in field_args.items():
+        own = [results[page_num]] if page_num in results else []
+        results[page_num] = merge_field_answers(page_num, fields, keys, answers, own)
+    return results
+
+
+def apply_page_result(analyzer: XMLPageAnalyzer, result: Dict[str, Any]):
+    """把成功的处理结果写回页面文件"""
+    if result['status'] != 'success':
+        logger.error("  ❌ 处理失败: %s", result.get('error', 'Unknown error'))
+        return
+    if result['updates']:
+        analyzer.apply_updates(result['updates'])
+        analyzer.save()
+        logger.info("  ✓ 已应用%d处修改", len(result['updates']))
+    else:
+        logger.info("  ℹ️  页面无需修改")
+
+
+def new_page_flight() -> SingleFlight:
+    """
+    字段请求合并器（process_page 使用，按字段的合并键缓存答案）：
+    只缓存答出的字段，请求失败或未答出的字段由后续页面重新询问
+    """
+    return SingleFlight(cacheable=lambda answer: answer is not None)
+
+
 def process_all_pages_with_llm(input_dir: str = 'split_pages',
                                llm_config_file: str = 'llm_config.json',
                                data_file: str = 'fill_data.json',
-                               template_name: str = 'tender_form') -> Dict[str, Any]:
+                               template_name: str = 'tender_form',
+                               metrics=None,
+                               telemetry_file: Optional[str] = None,
+                               concurrency: int = 1,
+                               dedupe: bool = True,
+                               batch: bool = False,
+                               batch_dir: Optional[str] = None) -> Dict[str, Any]:
     """
     处理所有页面
     
@@ -272,6 +775,12 @@ def process_all_pages_with_llm(input_dir: str = 'split_pages',
     :param llm_config_file: LLM配置文件
     :param data_file: 填充数据文件
     :param template_name: 使用的模板
+    :param metrics: 可选的 WorkflowMetrics，记录每页耗时和字段数
+    :param telemetry_file: LLM调用遥测导出路径（.json 或 .prom）
+    :param concurrency: 同时处理的页面数（每个线程使用独立的连接器）
+    :param dedupe: 是否按字段合并请求：字段上下文和所需数据都相同的字段只询问一次模型，其他页面复用答案
+    :param batch: 通过服务商批量接口离线处理（OpenAI / Claude），不占用实时接口的限流额度
+    :param batch_dir: 批量文件目录，默认 <input_dir>/.llm_batch；中断后重新运行会继续等待已提交的任务
     :return: 处理结果统计
     """
     
@@ -284,6 +793,9 @@ def process_all_pages_with_llm(input_dir: str = 'split_pages',
         print(f"❌ 未找到LLM配置文件: {llm_config_file}")
         print("请先创建配置文件，使用: setup_llm_config.py")
         return None
+    if batch and llm_config.provider not in (LLMProvider.OPENAI, LLMProvider.CLAUDE):
+        print(f"❌ {llm_config.provider.value} 没有批量接口，批量模式仅支持 openai / claude")
+        return None
     
     # 加载数据
     fill_data = {}
@@ -291,9 +803,17 @@ def process_all_pages_with_llm(input_dir: str = 'split_pages',
         with open(data_file, 'r', encoding='utf-8') as f:
             fill_data = json.load(f)
     
-    # 初始化处理器
+    # 初始化处理器：每个线程一个连接器（独立的HTTP会话），共用遥测
     llm = LLMConnector(llm_config)
-    processor = LLMPageProcessor(llm)
+    router = load_router(llm_config_file, llm_config)
+    local = threading.local()
+    
+    def get_processor() -> LLMPageProcessor:
+        if not hasattr(local, 'processor'):
+            local.processor = LLMPageProcessor(LLMConnector(llm_config, llm.telemetry), router=router)
+        return local.processor
+    
+    flight = new_page_flight()
     
     # 获取所有页面文件
     page_files = sorted(glob.glob(os.path.join(input_dir, 'page_*.xml')),
@@ -307,63 +827,142 @@ def process_all_pages_with_llm(input_dir: str = 'split_pages',
         'processed': 0,
         'successful': 0,
         'failed': 0,
+        'shared': 0,
+        'shared_fields': 0,
+        'llm_calls': 0,
+        'repair': {},
         'page_results': []
     }
     
-    for page_file in page_files:
+    def handle_page(page_file: str) -> Dict[str, Any]:
         page_num = int(page_file.split('page_')[1].split('.')[0])
         
-        print(f"\n【第{page_num}页】")
+        logger.info("\n【第%d页】", page_num)
+        page_ctx = metrics.page('llm', page_num) if metrics is not None else nullcontext({})
         
         try:
-            # 分析页面
-            analyzer = XMLPageAnalyzer(page_file)
-            page_info = analyzer.get_page_info()
+            with page_ctx as page_record:
+                # 分析页面
+                analyzer = XMLPageAnalyzer(page_file)
+                page_info = analyzer.get_page_info()
+                page_record['slots'] = len(page_info['blank_fields']) + len(page_info['placeholder_fields'])
             
-            # 准备数据上下文
-            data_context = {
-                'page_title': f'第{page_num}页',
-                'data': fill_data.get(f'page_{page_num}', {})
-            }
-            
-            # 调用LLM处理
-            result = processor.process_page_with_llm(
-                page_num,
-                page_info,
-                data_context,
-                template_name
-            )
-            
-            results['page_results'].append(result)
+                # 准备数据上下文
+                data_context = {
+                    'page_title': f'第{page_num}页',
+                    'data': fill_data.get(f'page_{page_num}', {})
+                }
             
-            if result['status'] == 'success':
-                # 应用更新
-                if result['updates']:
-                    analyzer.apply_updates(result['updates'])
-                    analyzer.save()
-                    print(f"  ✓ 已应用{len(result['updates'])}处修改")
-                    results['successful'] += 1
-                else:
-                    print(f"  ℹ️  页面无需修改")
-            else:
-                results['failed'] += 1
-                print(f"  ❌ 处理失败: {result.get('error', 'Unknown error')}")
+                # 调用LLM处理（相同请求只调用一次）
+                result = process_page(get_processor(), page_num, page_info, data_context, template_name,
+                                      flight if dedupe else None)
             
-            results['processed'] += 1
+                apply_page_result(analyzer, result)
+                return result
         
         except Exception as e:
-            print(f"  ❌ 页面处理异常: {e}")
+            logger.error("  ❌ 页面处理异常: %s", e)
+            return {'page_num': page_num, 'status': 'failed', 'error': str(e)}
+    
+    def handle_batch(page_files: List[str]) -> List[Dict[str, Any]]:
+        # 先分析全部页面，批量任务结束后再逐页应用修改
+        loaded, page_results = [], {}
+        for page_file in page_files:
+            page_num = int(page_file.split('page_')[1].split('.')[0])
+            try:
+                analyzer = XMLPageAnalyzer(page_file)
+                data_context = {'page_title': f'第{page_num}页', 'data': fill_data.get(f'page_{page_num}', {})}
+                loaded.append((page_num, analyzer, analyzer.get_page_info(), data_context))
+            except Exception as e:
+                logger.error("  ❌ 第%d页分析异常: %s", page_num, e)
+                page_results[page_num] = {'page_num': page_num, 'status': 'failed', 'error': str(e)}
+        
+        try:
+            page_results.update(process_pages_batch(
+                get_processor(), [(page_num, page_info, data_context)
+                                  for page_num, _, page_info, data_context in loaded],
+                batch_dir or os.path.join(input_dir, '.llm_batch'), template_name, dedupe))
+        except (RuntimeError, TimeoutError, ValueError) as e:
+            print(f"❌ 批量处理失败: {e}")
+            for page_num, *_ in loaded:
+                page_results[page_num] = {'page_num': page_num, 'status': 'failed', 'error': str(e)}
+            return [page_results[page_num] for page_num in sorted(page_results)]
+        
+        for page_num, analyzer, page_info, _ in loaded:
+            page_ctx = metrics.page('llm', page_num) if metrics is not None else nullcontext({})
+            try:
+                with page_ctx as page_record:
+                    page_record['slots'] = len(page_info['blank_fields']) + len(page_info['placeholder_fields'])
+                    apply_page_result(analyzer, page_results[page_num])
+            except Exception as e:
+                logger.error("  ❌ 第%d页应用修改异常: %s", page_num, e)
+                page_results[page_num] = {'page_num': page_num, 'status': 'failed', 'error': str(e)}
+        return [page_results[page_num] for page_num in sorted(page_results)]
+    
+    if batch:
+        page_results = handle_batch(page_files)
+    elif concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            page_results = list(pool.map(handle_page, page_files))
+    else:
+        page_results = [handle_page(page_file) for page_file in page_files]
+    
+    for result in page_results:
+        results['processed'] += 1
+        results['page_results'].append(result)
+        results['llm_calls'] += result.get('llm_calls', 1)
+        if result['status'] != 'success':
             results['failed'] += 1
-            results['processed'] += 1
+            continue
+        if result['updates']:
+            results['successful'] += 1
+        if 'shared_from' in result:
+            results['shared'] += 1
+            results['shared_fields'] += result['shared_fields']
+        if 'repair' in result:
+            for key, value in result['repair'].items():
+                results['repair'][key] = results['repair'].get(key, 0) + value
+    if dedupe and not batch:
+        # 按字段计数：calls 为询问模型的字段数，coalesced + cache_hits 为复用答案的字段数
+        results['dedupe'] = dict(flight.stats)
     
     print("\n" + "=" * 60)
     print(f"\n处理完成！")
     print(f"  总页数: {results['total_pages']}")
     print(f"  成功: {results['successful']}")
     print(f"  失败: {results['failed']}")
+    if dedupe:
+        print(f"  合并请求: {results['shared_fields']} 个字段复用其他页面的答案（{results['shared']} 页），"
+              f"实际调用 {results['llm_calls']} 次")
+    if results['repair']:
+        repair = results['repair']
+        print(f"  字段补填: {repair['rounds']} 次请求，{repair['requested']} 个字段中修复 {repair['repaired']} 个")
+    if router is not None:
+        results['routing'] = router.stats
+        print_routing(router)
+    if llm_config.pool is not None:
+        results['pool'] = llm_config.pool.summary()
+        llm_config.pool.print_summary()
+    
+    # LLM 调用遥测
+    llm.telemetry.print_summary()
+    results['llm_telemetry'] = llm.telemetry.totals()
+    if metrics is not None:
+        for key, value in results['llm_telemetry'].items():
+            metrics.incr(f'llm_{key}', value)
+    if telemetry_file:
+        if telemetry_file.endswith('.prom'):
+            llm.telemetry.write_prometheus(telemetry_file)
+        else:
+            llm.telemetry.export_json(telemetry_file, include_records=True)
+        print(f"  遥测数据已导出: {telemetry_file}")
     
     return results
 
 
 if __name__ == '__main__':
+    import sys
+
+    # 进度信息与 print 的输出一样写到标准输出
+    logging.basicConfig(level=logging.INFO, format='%(message)s', stream=sys.stdout)
     process_all_pages_with_llm()
@@ -1,28 +1,119 @@
 """
 提示词模板库 - 为不同场景提供完善的提示词
 """
-from typing import Dict, List
+from typing import Any, Dict, List, Optional
 from enum import Enum
 
 
+# ============ 输出JSON结构 ============
+
+TENDER_FORM_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "fields_filled": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "field_name": {"type": "string"},
+                    "original_value": {"type": "string"},
+                    "new_value": {"type": "string"},
+                    "confidence": {"type": "number"},
+                },
+                "required": ["field_name", "new_value"],
+            },
+        },
+        "unfilled_fields": {"type": "array", "items": {"type": "string"}},
+        "notes": {"type": "string"},
+        "xml_updates": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "xpath": {"type": "string"},
+                    "old_content": {"type": "string"},
+                    "new_content": {"type": "string"},
+                },
+                "required": ["old_content", "new_content"],
+            },
+        },
+    },
+    "required": ["fields_filled", "xml_updates"],
+}
+
+DATA_EXTRACTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "page_number": {"type": "integer"},
+        "page_title": {"type": "string"},
+        "fields": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "field_id": {"type": "string"},
+                    "field_name": {"type": "string"},
+                    "data_type": {"type": "string"},
+                    "required": {"type": "boolean"},
+                    "related_fields": {"type": "array", "items": {"type": "string"}},
+                    "xpath": {"type": "string"},
+                },
+                "required": ["field_name"],
+            },
+        },
+        "validation_rules": {"type": "array", "items": {"type": "string"}},
+        "notes": {"type": "string"},
+    },
+    "required": ["fields"],
+}
+
+
 class PromptTemplate:
-    """提示词模板"""
+    """
+    提示词模板
+
+    用户提示词分为两部分，按"静态在前"的顺序拼接，便于服务商缓存提示词前缀：
+      context_template - 各页共用的部分（任务要求、输出格式），即可缓存的前缀
+      user_prompt_template - 每页不同的部分（按页筛选的数据、页码、待填字段）
+
+    output_schema 为模型应返回的 JSON Schema，连接器据此启用服务商的JSON输出模式；
+    输出为自由文本的模板为 None
+    """
     
-    def __init__(self, name: str, system_prompt: str, user_prompt_template: str):
+    def __init__(self, name: str, system_prompt: str, user_prompt_template: str,
+                 context_template: str = '', output_schema: Optional[Dict[str, Any]] = None):
         self.name = name
         self.system_prompt = system_prompt
         self.user_prompt_template = user_prompt_template
+        self.context_template = context_template
+        self.output_schema = output_schema
+    
+    def format_parts(self, **kwargs) -> tuple:
+        """
+        分段格式化提示词
+
+        :param kwargs: 模板变量
+        :return: (系统提示词, 共用上下文, 页面提示词)
+        """
+        system = self.system_prompt.format(**kwargs)
+        context = self.context_template.format(**kwargs) if self.context_template else ''
+        user = self.user_prompt_template.format(**kwargs)
+        return system, context, user
     
     def format(self, **kwargs) -> tuple:
         """
         格式化提示词
         
         :param kwargs: 模板变量
-        :return: (系统提示词, 用户提示词)
+        :return: (系统提示词, 用户提示词)，用户提示词中共用上下文在前
         """
-        system = self.system_prompt.format(**kwargs)
-        user = self.user_prompt_template.format(**kwargs)
-        return system, user
+        system, context, user = self.format_parts(**kwargs)
+        return system, join_prompt(context, user)
+
+
+def join_prompt(context: str, prompt: str) -> str:
+    """共用上下文在前、页面内容在后拼接为一条用户提示词"""
+    return f"{context}\n\n{prompt}" if context else prompt
 
 
 class PromptLibrary:
@@ -42,19 +133,9 @@ class PromptLibrary:
 4. 【完整性】如果某个字段有多个相关数据，确保全部填写
 5. 【合规性】填写内容应符合招标规范和法律要求""",
         
-        user_prompt_template="""请根据以下数据，填写Word文档中的相应字段。
-
-【页面信息】
-第{page_num}页 - {page_title}
-
-【页面内容分析】
-当前页面包含以下需要填写的字段（用[  ]表示）：
-{fields_to_fill}
-
-【提供的数据】
-{provided_data}
-
-【任务要求】
+        # 静态部分在前：任务要求和输出格式各页相同；提供的数据按页面字段筛选（见 data_index），
+        # 每页不同，放在页面部分，不破坏缓存前缀
+        context_template="""【任务要求】
 1. 分析当前页面中所有空白字段
 2. 根据提供的数据，智能匹配和填写每个字段
 3. 输出修改后的XML内容，保持原始格式不变
@@ -73,7 +154,46 @@ class PromptLibrary:
         {{"xpath": "XML路径", "old_content": "旧内容", "new_content": "新内容"}},
         ...
     ]
-}}"""
+}}""",
+        
+        user_prompt_template="""【提供的数据】
+{provided_data}
+
+请根据以上数据，填写Word文档中的相应字段。
+
+【页面信息】
+第{page_num}页 - {page_title}
+
+【页面内容分析】
+当前页面包含以下需要填写的字段（用[  ]表示，括号内为字段位置，xml_updates 的 xpath 请原样填写该位置）：
+{fields_to_fill}""",
+        
+        output_schema=TENDER_FORM_SCHEMA
+    )
+    
+    # ============ 字段补填模板 ============
+    
+    # 系统提示词和共用上下文与表单填写模板相同，补填请求可命中同一提示词前缀缓存
+    FIELD_REPAIR = PromptTemplate(
+        name="字段补填",
+        system_prompt=TENDER_FORM_FILLING.system_prompt,
+        context_template=TENDER_FORM_FILLING.context_template,
+        
+        user_prompt_template="""【提供的数据】
+{provided_data}
+
+以下字段上一次的填写未通过校验，请只重新填写这些字段，不要返回其他字段。
+
+【页面信息】
+第{page_num}页 - {page_title}
+
+【待修正字段】
+{failed_fields}
+
+要求：new_value 必须取自提供的数据，original_value 与上面列出的原文保持一致；
+数据中确实没有的字段放入 unfilled_fields。""",
+        
+        output_schema=TENDER_FORM_SCHEMA
     )
     
     # ============ 合同条款填写模板 ============
@@ -253,14 +373,20 @@ class PromptLibrary:
     ],
     "validation_rules": ["规则1", "规则2"],
     "notes": "特殊说明"
-}}"""
+}}""",
+        
+        output_schema=DATA_EXTRACTION_SCHEMA
     )
     
+    # 支持字段补填的模板 → 补填模板
+    REPAIR_TEMPLATES = {'tender_form': 'field_repair'}
+    
     @classmethod
     def get_template(cls, template_name: str) -> PromptTemplate:
         """获取指定的提示词模板"""
         templates = {
             'tender_form': cls.TENDER_FORM_FILLING,
+            'field_repair': cls.FIELD_REPAIR,
             'contract_clause': cls.CONTRACT_CLAUSE_FILLING,
             'table_data': cls.TABLE_DATA_FILLING,
             'free_text': cls.FREE_TEXT_GENERATION,
@@ -0,0 +1,536 @@
+"""
+全文检索索引（SQLite FTS5）
+页面文本按内容哈希只抽取一次，以页面、段落、表格单元格三种粒度写入 FTS5 表；
+查询直接返回文档路径、页码、段落/单元格位置和字段标签，不再逐个重新解析XML
+
+段落、单元格的相同文本（各份标书里重复的固定条款、表头）在 FTS5 表中只存一行，出现位置另存于
+occurrences；检索先对不重复的文本排序，再按顺序展开到出现位置，凑够条数即停止。
+整页文本单独存放，只在指定 page 粒度时检索
+
+可索引：分割后的页面目录（page_*.xml）、Word文件（.docx）、document.xml，
+以及包含这些文件的归档目录（递归）。文件未变化时跳过，内容相同的页面（各份标书的固定条款）只存一份
+
+用法:
+    index = SearchIndex('search_index.db')
+    index.index_path('split_pages')
+    index.index_path('archive/')
+    for hit in index.search('投标保证金'):
+        print(hit['path'], hit['page_num'], hit['location'], hit['snippet'])
+
+    python search_index.py index split_pages archive/ --db search_index.db
+    python search_index.py search 投标保证金 --db search_index.db --kind cell
+"""
+import argparse
+import glob
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import sys
+import time
+import zipfile
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from lxml import etree
+
+from parse_docx import DOCX_EXTENSIONS, read_part
+
+logger = logging.getLogger(__name__)
+
+W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+W_P = f'{{{W_NS}}}p'
+W_T = f'{{{W_NS}}}t'
+W_TC = f'{{{W_NS}}}tc'
+W_TBL = f'{{{W_NS}}}tbl'
+
+KINDS = ('page', 'paragraph', 'cell')
+DEFAULT_KINDS = ('paragraph', 'cell')
+PREVIEW_CHARS = 100
+
+# 与 XMLPageAnalyzer.find_blank_fields 相同的空白标记，另加连续下划线
+_BLANK_MARKS = {'_', '__', '___', '____', '—', '、', '[]', '[ ]', '【】', '【  】'}
+_SLOT_RE = re.compile(r'\$\{[^}]+\}|_{2,}')
+# trigram 分词器只能匹配至少3个字符的词
+_MIN_MATCH_CHARS = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    signature TEXT NOT NULL,
+    pages INTEGER NOT NULL,
+    indexed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    source_id INTEGER NOT NULL,
+    page_num INTEGER NOT NULL,
+    content_id INTEGER NOT NULL,
+    PRIMARY KEY (source_id, page_num)
+);
+CREATE INDEX IF NOT EXISTS pages_content ON pages(content_id);
+CREATE TABLE IF NOT EXISTS contents (
+    id INTEGER PRIMARY KEY,
+    hash TEXT UNIQUE NOT NULL,
+    preview TEXT NOT NULL,
+    units INTEGER NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS page_text USING fts5(text, tokenize='trigram');
+CREATE VIRTUAL TABLE IF NOT EXISTS units USING fts5(text, label, tokenize='trigram');
+CREATE TABLE IF NOT EXISTS unit_keys (
+    key TEXT PRIMARY KEY,
+    unit_id INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS occurrences (
+    unit_id INTEGER NOT NULL,
+    content_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    loc TEXT NOT NULL,
+    xpath TEXT NOT NULL,
+    slot INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS occurrences_unit ON occurrences(unit_id);
+CREATE INDEX IF NOT EXISTS occurrences_content ON occurrences(content_id);
+"""
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _text(elem) -> str:
+    return ''.join(t.text for t in elem.iter(W_T) if t.text)
+
+
+def _is_blank_para(para) -> bool:
+    return any(t.text and t.text.strip() in _BLANK_MARKS for t in para.iter(W_T))
+
+
+def extract_units(root) -> List[Dict[str, Any]]:
+    """
+    抽取页面的检索单元：整页文本、表格外的每个段落、每个表格单元格（空单元格以标签检索）
+
+    :param root: 页面XML根元素
+    :return: [{kind, text, label, loc, xpath, slot}]，首项为整页（另带 preview）；loc 为 'p3'（第3段）或 't0:r2:c1'（表0第2行第1列），
+             slot 为 1 表示该处有待填字段（占位符、下划线空白或带标签的空单元格）
+    """
+    from table_model import iter_tables
+
+    tree = root.getroottree()
+    paragraphs = [p for p in root.iter(W_P)]
+    page_text = '\n'.join(t for t in (_text(p) for p in paragraphs) if t)
+    # 预览与 modify_pages.extract_all_text 的格式一致：非空文本节点以空格连接
+    preview = ' '.join(t.text for t in root.iter(W_T) if t.text and t.text.strip())
+    if len(preview) > PREVIEW_CHARS:
+        preview = preview[:PREVIEW_CHARS] + '...'
+    units = [{'kind': 'page', 'text': page_text, 'label': '', 'loc': '', 'xpath': '', 'slot': 0,
+              'preview': preview}]
+
+    ordinal = 0
+    for para in paragraphs:
+        if next(para.iterancestors(W_TC), None) is not None:
+            continue
+        ordinal += 1
+        text = _text(para)
+        if not text.strip():
+            continue
+        slot = int(bool(_SLOT_RE.search(text)) or _is_blank_para(para))
+        units.append({'kind': 'paragraph', 'text': text, 'label': '', 'loc': f'p{ordinal}',
+                      'xpath': tree.getpath(para), 'slot': slot})
+
+    if root.find(f'.//{W_TBL}') is None:
+        return units
+    for table in iter_tables(root):
+        empty = {(c['row_index'], c['grid_col']): c['full_label'] for c in table.empty_cells()}
+        for cell_id, cell in enumerate(table.cells):
+            text = table.texts[cell_id]
+            label = empty.get((cell.row, cell.col), '')
+            if not text and not label:
+                continue
+            if text:
+                label = table.labels_for(cell_id)[1] if cell.row >= table.header_rows else ''
+            units.append({'kind': 'cell', 'text': text, 'label': label,
+                          'loc': f't{table.index}:r{cell.row}:c{cell.col}',
+                          'xpath': tree.getpath(cell.element),
+                          'slot': int(not text or bool(_SLOT_RE.search(text)))})
+    return units
+
+
+def format_location(kind: str, loc: str) -> str:
+    """把 loc 转为可读位置：'第3段' / '表格0 第2行第1列'"""
+    if kind == 'paragraph' and loc.startswith('p'):
+        return f'第{loc[1:]}段'
+    if kind == 'cell':
+        table, row, col = (part[1:] for part in loc.split(':'))
+        return f'表格{table} 第{row}行第{col}列'
+    return '整页'
+
+
+def _page_number(path: str) -> int:
+    return int(os.path.basename(path).split('page_')[1].split('.')[0])
+
+
+def _file_signature(paths: Iterable[str]) -> str:
+    """文件名、大小、修改时间的摘要：文件未变化时不必读取内容"""
+    parts = []
+    for path in paths:
+        stat = os.stat(path)
+        parts.append(f'{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}')
+    return content_hash('\n'.join(parts).encode('utf-8'))
+
+
+def _match_expression(query: str) -> Tuple[Optional[str], List[str]]:
+    """
+    把查询拆成空格分隔的词：足够长的词作为 FTS5 短语（AND），过短的词改用 LIKE 过滤
+
+    :return: (MATCH 表达式或 None, LIKE 词列表)
+    """
+    phrases, short = [], []
+    for term in query.split():
+        if len(term) >= _MIN_MATCH_CHARS:
+            phrases.append('"' + term.replace('"', '""') + '"')
+        else:
+            short.append(term)
+    return (' AND '.join(phrases) or None), short
+
+
+def _window(text: str, term: str, chars: int = 16) -> str:
+    """与 FTS5 snippet() 相同格式的片段：命中词前后各取 chars 个字符"""
+    pos = text.find(term)
+    if pos < 0:
+        return text[:chars * 2] + ('…' if len(text) > chars * 2 else '')
+    start, end = max(0, pos - chars), pos + len(term) + chars
+    return (('…' if start else '') + text[start:pos] + f'[{term}]' +
+            text[pos + len(term):end] + ('…' if end < len(text) else ''))
+
+
+class SearchIndex:
+    """页面全文检索索引"""
+
+    def __init__(self, db_path: str = 'search_index.db'):
+        """
+        :param db_path: SQLite 数据库路径（':memory:' 为内存库）
+        :raises RuntimeError: SQLite 未编译 FTS5 或不支持 trigram 分词器（需 SQLite 3.34+）
+        """
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.row_factory = sqlite3.Row
+        try:
+            self.conn.executescript(_SCHEMA)
+        except sqlite3.OperationalError as e:
+            self.conn.close()
+            raise RuntimeError(f"SQLite {sqlite3.sqlite_version} 不支持 FTS5 trigram 分词器: {e}") from e
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---- 建立索引 ----
+
+    def index_path(self, path: str) -> Dict[str, int]:
+        """
+        索引页面目录、Word文件/document.xml，或递归索引归档目录
+
+        :return: 统计 {sources, skipped, pages, extracted}（extracted 为本次新抽取文本的页面数）
+        """
+        stats = {'sources': 0, 'skipped': 0, 'pages': 0, 'extracted': 0}
+        if os.path.isdir(path):
+            targets = []
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                if any(f.startswith('page_') and f.endswith('.xml') for f in filenames):
+                    targets.append(dirpath)
+                targets.extend(os.path.join(dirpath, f) for f in sorted(filenames)
+                               if f.lower().endswith(DOCX_EXTENSIONS) and not f.startswith('~$'))
+        else:
+            targets = [path]
+
+        for target in targets:
+            try:
+                if os.path.isdir(target):
+                    result = self.index_pages_dir(target)
+                else:
+                    result = self.index_document(target)
+            except (OSError, ValueError, KeyError, zipfile.BadZipFile, etree.XMLSyntaxError) as e:
+                logger.warning("  ⚠️  无法索引 %s: %s", target, e)
+                continue
+            for key in stats:
+                stats[key] += result.get(key, 0)
+        return stats
+
+    def index_pages_dir(self, input_dir: str) -> Dict[str, int]:
+        """索引分割后的页面目录（page_*.xml），页码取自文件名"""
+        page_files = sorted(glob.glob(os.path.join(input_dir, 'page_*.xml')), key=_page_number)
+        signature = _file_signature(page_files)
+        if self._unchanged(input_dir, signature):
+            return {'skipped': 1}
+
+        def pages():
+            for page_file in page_files:
+                with open(page_file, 'rb') as f:
+                    data = f.read()
+                yield _page_number(page_file), data, (lambda data=data: etree.fromstring(data))
+
+        return self._index_source(input_dir, signature, pages())
+
+    def index_document(self, path: str) -> Dict[str, int]:
+        """索引 Word 文件或 document.xml：按 sectPr 划分页面（与分割结果的页码一致）"""
+        from parallel_pages import scan_page_ranges
+
+        signature = _file_signature([path])
+        if self._unchanged(path, signature):
+            return {'skipped': 1}
+        doc = read_part(path)
+        head, tail, ranges = scan_page_ranges(doc)
+
+        def pages():
+            for page_num, (start, end, _) in enumerate(ranges, 1):
+                data = doc[start:end]
+                yield page_num, data, (lambda data=data: etree.fromstring(head + data + tail))
+
+        return self._index_source(path, signature, pages())
+
+    def _unchanged(self, path: str, signature: str) -> bool:
+        row = self.conn.execute('SELECT signature FROM sources WHERE path = ?',
+                                (os.path.abspath(path),)).fetchone()
+        return row is not None and row['signature'] == signature
+
+    def _index_source(self, path: str, signature: str, pages) -> Dict[str, int]:
+        """
+        写入一个来源的全部页面（单个事务）；内容哈希已存在的页面不再解析
+
+        :param pages: [(页码, 页面字节, 解析函数)]
+        """
+        path = os.path.abspath(path)
+        stats = {'sources': 1, 'pages': 0, 'extracted': 0}
+        with self.conn:
+            row = self.conn.execute('SELECT id FROM sources WHERE path = ?', (path,)).fetchone()
+            if row is None:
+                source_id = self.conn.execute(
+                    'INSERT INTO sources (path, signature, pages, indexed_at) VALUES (?, ?, 0, ?)',
+                    (path, signature, time.time())).lastrowid
+            else:
+                source_id = row['id']
+                self.conn.execute('DELETE FROM pages WHERE source_id = ?', (source_id,))
+
+            for page_num, data, parse in pages:
+                digest = content_hash(data)
+                row = self.conn.execute('SELECT id FROM contents WHERE hash = ?', (digest,)).fetchone()
+                if row is None:
+                    content_id = self._store_units(digest, extract_units(parse()))
+                    stats['extracted'] += 1
+                else:
+                    content_id = row['id']
+                self.conn.execute('INSERT INTO pages (source_id, page_num, content_id) VALUES (?, ?, ?)',
+                                  (source_id, page_num, content_id))
+                stats['pages'] += 1
+
+            self.conn.execute('UPDATE sources SET signature = ?, pages = ?, indexed_at = ? WHERE id = ?',
+                              (signature, stats['pages'], time.time(), source_id))
+        return stats
+
+    def _store_units(self, digest: str, units: List[Dict[str, Any]]) -> int:
+        """写入一份新页面内容的检索单元，返回内容ID（整页文本以内容ID为 rowid 存入 page_text）"""
+        content_id = self.conn.execute('INSERT INTO contents (hash, preview, units) VALUES (?, ?, ?)',
+                                       (digest, units[0]['preview'], len(units))).lastrowid
+        occurrences = []
+        for u in units:
+            if u['kind'] == 'page':
+                self.conn.execute('INSERT INTO page_text (rowid, text) VALUES (?, ?)', (content_id, u['text']))
+                continue
+            key = content_hash(f"{u['text']}\0{u['label']}".encode('utf-8'))
+            row = self.conn.execute('SELECT unit_id FROM unit_keys WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                unit_id = self.conn.execute('INSERT INTO units (text, label) VALUES (?, ?)',
+                                            (u['text'], u['label'])).lastrowid
+                self.conn.execute('INSERT INTO unit_keys (key, unit_id) VALUES (?, ?)', (key, unit_id))
+            else:
+                unit_id = row['unit_id']
+            occurrences.append((unit_id, content_id, u['kind'], u['loc'], u['xpath'], u['slot']))
+        self.conn.executemany(
+            'INSERT INTO occurrences (unit_id, content_id, kind, loc, xpath, slot) VALUES (?, ?, ?, ?, ?, ?)',
+            occurrences)
+        return content_id
+
+    def prune(self) -> Dict[str, int]:
+        """删除文件已不存在的来源，以及不再被任何页面引用的内容"""
+        with self.conn:
+            gone = [row['id'] for row in self.conn.execute('SELECT id, path FROM sources')
+                    if not os.path.exists(row['path'])]
+            for source_id in gone:
+                self.conn.execute('DELETE FROM pages WHERE source_id = ?', (source_id,))
+                self.conn.execute('DELETE FROM sources WHERE id = ?', (source_id,))
+            orphan = 'SELECT id FROM contents WHERE id NOT IN (SELECT content_id FROM pages)'
+            self.conn.execute(f'DELETE FROM occurrences WHERE content_id IN ({orphan})')
+            self.conn.execute(f'DELETE FROM page_text WHERE rowid IN ({orphan})')
+            removed = self.conn.execute(f'DELETE FROM contents WHERE id IN ({orphan})').rowcount
+            unused = 'SELECT unit_id FROM unit_keys WHERE unit_id NOT IN (SELECT unit_id FROM occurrences)'
+            self.conn.execute(f'DELETE FROM units WHERE rowid IN ({unused})')
+            self.conn.execute(f'DELETE FROM unit_keys WHERE unit_id IN ({unused})')
+        return {'sources': len(gone), 'contents': removed}
+
+    # ---- 查询 ----
+
+    def search(self, query: str, kinds: Iterable[str] = DEFAULT_KINDS, limit: int = 20,
+               slots_only: bool = False, path_prefix: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        检索条款或字段
+
+        空格分隔的多个词须同时出现；不少于3个字符的词走 FTS5 索引，更短的词按子串过滤
+
+        :param kinds: 检索粒度，'page' / 'paragraph' / 'cell' 的组合
+        :param slots_only: 只返回有待填字段的位置
+        :param path_prefix: 只检索该路径下的来源
+        :return: [{path, page_num, kind, location, loc, label, slot, xpath, snippet, score}]，按相关度排序
+        """
+        match, short = _match_expression(query)
+        if match is None and not short:
+            return []
+        kinds = [k for k in kinds if k in KINDS] or list(KINDS)
+        source_filter, source_params = '', []
+        if path_prefix:
+            source_filter = ' AND s.path LIKE ?'
+            source_params = [os.path.abspath(path_prefix) + '%']
+
+        hits = []
+        # 先在不重复的文本上匹配、排序，再按相关度顺序展开到各个出现位置，凑够 limit 条即停止
+        unit_kinds = [k for k in kinds if k != 'page']
+        if unit_kinds:
+            where = f"o.kind IN ({','.join('?' * len(unit_kinds))})" + (' AND o.slot = 1' if slots_only else '')
+            sql = ('SELECT s.path, p.page_num, o.kind, o.loc, o.slot, o.xpath FROM occurrences o '
+                   'JOIN pages p ON p.content_id = o.content_id JOIN sources s ON s.id = p.source_id '
+                   f'WHERE o.unit_id = ? AND {where}{source_filter} LIMIT ?')
+            for unit in self._ranked('units', ('text', 'label'), match, short):
+                rows = self.conn.execute(sql, [unit['rowid'], *unit_kinds, *source_params,
+                                               limit - len(hits)]).fetchall()
+                hits.extend(dict(row, label=unit['label'], snippet=unit['snippet'], score=unit['score'])
+                            for row in rows)
+                if len(hits) >= limit:
+                    break
+
+        if 'page' in kinds and not slots_only:
+            page_hits = []
+            sql = ('SELECT s.path, p.page_num FROM pages p JOIN sources s ON s.id = p.source_id '
+                   f'WHERE p.content_id = ?{source_filter} LIMIT ?')
+            for page in self._ranked('page_text', ('text',), match, short):
+                rows = self.conn.execute(sql, [page['rowid'], *source_params, limit - len(page_hits)]).fetchall()
+                page_hits.extend(dict(row, kind='page', loc='', slot=0, xpath='', label='',
+                                      snippet=page['snippet'], score=page['score']) for row in rows)
+                if len(page_hits) >= limit:
+                    break
+            hits = sorted(hits + page_hits, key=lambda hit: hit['score'])[:limit]
+
+        for hit in hits:
+            hit['location'] = format_location(hit['kind'], hit['loc'])
+            if match is None:
+                hit['snippet'] = _window(hit['snippet'], short[0])
+            hit['snippet'] = hit['snippet'].replace('\n', ' ')
+        return hits
+
+    def _ranked(self, table: str, columns: Sequence[str], match: Optional[str], short: List[str]):
+        """
+        在 FTS5 表上匹配，按 bm25 排序逐行返回（游标，按需读取）
+
+        :param columns: 可检索的列，过短的词在这些列上按子串过滤
+        """
+        where, params = [], []
+        if match is not None:
+            where.append(f'{table} MATCH ?')
+            params.append(match)
+        for term in short:
+            like = '%' + re.sub(r'([%_\\])', r'\\\1', term) + '%'
+            where.append('(' + ' OR '.join(f"{c} LIKE ? ESCAPE '\\'" for c in columns) + ')')
+            params += [like] * len(columns)
+        if match is not None:
+            weights = ', '.join(['1.0', '2.0'][:len(columns)])
+            snippet, rank = f"snippet({table}, 0, '[', ']', '…', 16)", f'bm25({table}, {weights})'
+        else:
+            snippet, rank = 'text', '0'
+        return self.conn.execute(f"SELECT rowid, *, {snippet} AS snippet, {rank} AS score "
+                                 f"FROM {table} WHERE {' AND '.join(where)} ORDER BY score", params)
+
+    def page_previews(self, path: str) -> List[Tuple[int, str]]:
+        """来源（页面目录或文档）的各页文本预览 [(页码, 预览)]，需已建立索引"""
+        rows = self.conn.execute(
+            'SELECT p.page_num, c.preview FROM pages p JOIN sources s ON s.id = p.source_id '
+            'JOIN contents c ON c.id = p.content_id WHERE s.path = ? ORDER BY p.page_num',
+            (os.path.abspath(path),))
+        return [(row['page_num'], row['preview']) for row in rows]
+
+    def stats(self) -> Dict[str, int]:
+        """索引规模：来源数、页面数、不重复的页面内容数、检索单元数（不重复的文本数）"""
+        count = lambda sql: self.conn.execute(sql).fetchone()[0]
+        return {
+            'sources': count('SELECT COUNT(*) FROM sources'),
+            'pages': count('SELECT COUNT(*) FROM pages'),
+            'contents': count('SELECT COUNT(*) FROM contents'),
+            'occurrences': count('SELECT COUNT(*) FROM occurrences'),
+            'units': count('SELECT COUNT(*) FROM unit_keys'),
+        }
+
+
+def run_index(db_path: str, paths: Iterable[str], prune: bool = False) -> int:
+    """建立/更新索引并打印统计（命令行入口共用）"""
+    start = time.perf_counter()
+    with SearchIndex(db_path) as index:
+        for path in paths:
+            stats = index.index_path(path)
+            print(f"✓ {path}: {stats['sources']} 个来源已索引（{stats['skipped']} 个未变化跳过），"
+                  f"{stats['pages']} 页，其中 {stats['extracted']} 页为新内容")
+        if prune:
+            pruned = index.prune()
+            print(f"  清理: {pruned['sources']} 个已删除的来源，{pruned['contents']} 份无引用内容")
+        total = index.stats()
+    print(f"  索引共 {total['sources']} 个来源，{total['pages']} 页（{total['contents']} 份不重复内容），"
+          f"{total['occurrences']} 个检索单元（{total['units']} 段不重复文本），"
+          f"用时 {time.perf_counter() - start:.2f}s")
+    return 0
+
+
+def run_search(db_path: str, query: str, kinds: Optional[Iterable[str]] = None, limit: int = 20,
+               slots_only: bool = False, path_prefix: Optional[str] = None) -> int:
+    """检索并打印结果（命令行入口共用），无结果时返回1"""
+    with SearchIndex(db_path) as index:
+        start = time.perf_counter()
+        hits = index.search(query, kinds=kinds or DEFAULT_KINDS, limit=limit,
+                            slots_only=slots_only, path_prefix=path_prefix)
+        elapsed = (time.perf_counter() - start) * 1000
+    for hit in hits:
+        label = f" [{hit['label']}]" if hit['label'] else ''
+        slot = ' ✎' if hit['slot'] else ''
+        print(f"{hit['path']} 第{hit['page_num']}页 {hit['location']}{label}{slot}")
+        print(f"    {hit['snippet'] or hit['label']}")
+    print(f"{'✓' if hits else '⚠️ '} {len(hits)} 条结果（{elapsed:.1f} ms）")
+    return 0 if hits else 1
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='页面全文检索索引（SQLite FTS5）')
+    parser.add_argument('--db', default='search_index.db', help='索引数据库路径')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('index', help='索引页面目录、Word文件或归档目录')
+    p.add_argument('paths', nargs='+', help='页面目录 / .docx / document.xml / 归档目录')
+    p.add_argument('--prune', action='store_true', help='清理已删除的文件和无引用的内容')
+
+    p = sub.add_parser('search', help='检索')
+    p.add_argument('query', help='检索词，空格分隔的多个词须同时出现')
+    p.add_argument('--kind', action='append', choices=KINDS, default=None,
+                   help='检索粒度，可重复指定（默认段落和单元格）')
+    p.add_argument('--slots', action='store_true', help='只返回有待填字段的位置（✎）')
+    p.add_argument('--path', default=None, help='只检索该路径下的来源')
+    p.add_argument('-n', '--limit', type=int, default=20, help='最多返回条数')
+
+    args = parser.parse_args(argv)
+    if args.command == 'index':
+        return run_index(args.db, args.paths, args.prune)
+    return run_search(args.db, args.query, args.kind, args.limit, args.slots, args.path)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,10 +1,18 @@
 """
 LLM 配置设置向导
 帮助用户配置LLM连接信息
+
+用法:
+    python setup_llm_config.py                      交互式配置（可录入多账号连接池）
+    python setup_llm_config.py sample               创建示例文件
+    python setup_llm_config.py pool-add --key sk-b --name acct-b --weight 2 --rpm 500
+                                                    向已有配置的连接池追加账号
 """
 import json
 import os
+from typing import Any, Dict, List
 from llm_connector import LLMProvider, LLMConfig, save_config_to_file
+from llm_pool import LLMPool
 
 
 def setup_llm_config():
@@ -81,6 +89,13 @@ def setup_llm_config():
         except ValueError:
             print("⚠️  令牌数无效，使用默认值 2000")
     
+    # 多账号连接池
+    pool = None
+    use_pool = input("\n是否配置多账号连接池（多个API Key/地址分摊请求）? (y/n): ").strip().lower()
+    if use_pool == 'y':
+        entries = [{'name': 'acct-1', 'api_key': api_key}] + input_pool_entries(start=2)
+        pool = LLMPool.from_config(entries)
+    
     # 创建配置
     config = LLMConfig(
         provider=provider,
@@ -88,7 +103,8 @@ def setup_llm_config():
         api_url=api_url,
         model=model,
         temperature=temperature,
-        max_tokens=max_tokens
+        max_tokens=max_tokens,
+        pool=pool
     )
     
     # 显示配置摘要
@@ -100,6 +116,8 @@ def setup_llm_config():
     print(f"API URL: {api_url}")
     print(f"温度: {temperature}")
     print(f"最大令牌数: {max_tokens}")
+    if pool is not None:
+        print(f"连接池: {', '.join(entry.name for entry in pool.entries)}")
     
     # 确认保存
     confirm = input("\n确认保存配置? (y/n): ").strip().lower()
@@ -112,6 +130,59 @@ def setup_llm_config():
         return None
 
 
+def input_pool_entries(start: int = 1) -> List[Dict[str, Any]]:
+    """
+    交互式录入连接池账号，API Key 留空结束
+    
+    :param start: 默认账号名称的起始序号
+    :return: 账号列表（未填写的字段取配置主体的值）
+    """
+    entries = []
+    while True:
+        index = start + len(entries)
+        print(f"\n--- 账号 {index} (API Key 留空结束) ---")
+        api_key = input("API Key: ").strip()
+        if not api_key:
+            return entries
+        entry = {'name': input(f"名称 (默认 acct-{index}): ").strip() or f'acct-{index}', 'api_key': api_key}
+        api_url = input("API URL (留空同主配置): ").strip()
+        if api_url:
+            entry['api_url'] = api_url
+        for key, label, cast in (('weight', '权重 (默认1)', float),
+                                 ('rpm', '每分钟请求数上限 (留空不限)', int),
+                                 ('tpm', '每分钟token数上限 (留空不限)', int)):
+            value = input(f"{label}: ").strip()
+            if value:
+                try:
+                    entry[key] = cast(value)
+                except ValueError:
+                    print(f"⚠️  {label} 无效，使用默认值")
+        entries.append(entry)
+
+
+def add_pool_entry(config_file: str, entry: Dict[str, Any]) -> int:
+    """
+    向已有配置文件的连接池追加一个账号；配置中还没有连接池时，主体账号作为第一个账号
+    
+    :return: 追加后的账号数
+    """
+    with open(config_file, 'r', encoding='utf-8') as f:
+        config_data = json.load(f)
+    
+    pool = config_data.get('pool')
+    if not pool:
+        pool = [{'name': 'acct-1', 'api_key': config_data['api_key']}]
+    entries = pool['entries'] if isinstance(pool, dict) else pool
+    entries.append({'name': entry.get('name') or f'acct-{len(entries) + 1}',
+                    **{k: v for k, v in entry.items() if k != 'name' and v is not None}})
+    LLMPool.from_config(pool)  # 校验（名称不能重复）
+    config_data['pool'] = pool
+    
+    with open(config_file, 'w', encoding='utf-8') as f:
+        json.dump(config_data, f, ensure_ascii=False, indent=2)
+    return len(entries)
+
+
 def create_sample_data_file():
     """创建示例数据文件"""
     
@@ -167,6 +238,31 @@ if __name__ == '__main__':
         print("创建示例文件...")
         create_sample_data_file()
         create_sample_config()
+    elif len(sys.argv) > 1 and sys.argv[1] == 'pool-add':
+        import argparse
+        parser = argparse.ArgumentParser(prog='setup_llm_config.py pool-add', description='向连接池追加账号')
+        parser.add_argument('--config', default='llm_config.json', help='配置文件')
+        parser.add_argument('--key', required=True, help='API Key')
+        parser.add_argument('--name', default=None, help='账号名称')
+        parser.add_argument('--url', default=None, help='API URL（默认同主配置）')
+        parser.add_argument('--provider', default=None, choices=[p.value for p in LLMProvider],
+                            help='服务商（默认同主配置）')
+        parser.add_argument('--model', default=None, help='模型（默认同主配置）')
+        parser.add_argument('--weight', type=float, default=None, help='权重（默认1）')
+        parser.add_argument('--rpm', type=int, default=None, help='每分钟请求数上限')
+        parser.add_argument('--tpm', type=int, default=None, help='每分钟token数上限')
+        args = parser.parse_args(sys.argv[2:])
+        if not os.path.exists(args.config):
+            print(f"❌ 配置文件不存在: {args.config}，请先运行 setup_llm_config.py")
+            sys.exit(1)
+        try:
+            count = add_pool_entry(args.config, {
+                'name': args.name, 'api_key': args.key, 'api_url': args.url, 'provider': args.provider,
+                'model': args.model, 'weight': args.weight, 'rpm': args.rpm, 'tpm': args.tpm})
+        except ValueError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        print(f"✓ 已追加账号，连接池共 {count} 个账号: {args.config}")
     else:
         print("\n欢迎使用 Word 智能填写系统 LLM 配置向导\n")
         
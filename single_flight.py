@@ -0,0 +1,164 @@
+"""
+请求合并（single-flight）
+相同键的并发调用只执行一次，其余调用等待并共享结果；
+可选地在本次运行内缓存成功结果，后续相同请求直接复用；
+do_many() 按键合并一组请求（如一页上的多个字段），只执行尚无结果、也没有其他调用正在执行的键
+
+用法:
+    flight = SingleFlight()
+    result, shared = flight.do(request_key(fields, data), call_llm, prompt)
+    answers = flight.do_many(field_keys, lambda missing: ask_llm(missing))
+"""
+import hashlib
+import json
+import re
+import threading
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_text(text: str) -> str:
+    """合并连续空白并去除首尾空白"""
+    return _WHITESPACE_RE.sub(' ', text).strip()
+
+
+def request_key(*parts: Any) -> str:
+    """
+    由任意可JSON序列化的部分生成稳定的请求键（字符串统一做空白归一化）
+
+    :return: sha256 十六进制摘要
+    """
+    def normalize(value):
+        if isinstance(value, str):
+            return normalize_text(value)
+        if isinstance(value, dict):
+            return {str(k): normalize(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [normalize(v) for v in value]
+        return value
+
+    payload = json.dumps(normalize(list(parts)), ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """线程安全的请求合并器"""
+
+    def __init__(self, cache_results: bool = True,
+                 cacheable: Optional[Callable[[Any], bool]] = None):
+        """
+        :param cache_results: 是否缓存已完成的结果（本对象生命周期内有效）
+        :param cacheable: 判断结果是否可缓存，默认全部缓存；异常从不缓存
+        """
+        self.cache_results = cache_results
+        self.cacheable = cacheable or (lambda result: True)
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._results: Dict[Hashable, Any] = {}
+        self.stats = {'calls': 0, 'coalesced': 0, 'cache_hits': 0}
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs) -> Tuple[Any, bool]:
+        """
+        执行 fn(*args, **kwargs)，相同 key 的并发调用只执行一次
+
+        :return: (结果, 是否为共享结果)；执行出错时所有等待者都会收到同一个异常
+        """
+        with self._lock:
+            if key in self._results:
+                self.stats['cache_hits'] += 1
+                return self._results[key], True
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.stats['coalesced'] += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.stats['calls'] += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                if call.error is None and self.cache_results and self.cacheable(call.result):
+                    self._results[key] = call.result
+            call.done.set()
+        return call.result, False
+
+    def do_many(self, keys: Iterable[Hashable],
+                fn: Callable[[List[Hashable]], Dict[Hashable, Any]]) -> Dict[Hashable, Tuple[Any, bool]]:
+        """
+        合并执行一组键：已缓存的直接复用，其他调用正在执行的等待其结果，
+        其余的键交给一次 fn(待执行的键列表) 调用；fn 返回 {键: 结果}，缺少的键结果为 None
+
+        先执行自己的键再等待其他调用，多个调用互相等待对方的键时不会死锁；stats 按键计数
+
+        :return: {键: (结果, 是否为共享结果)}；fn 出错时所有等待这些键的调用都会收到同一个异常
+        """
+        results: Dict[Hashable, Tuple[Any, bool]] = {}
+        waiting: Dict[Hashable, _Call] = {}
+        owned: Dict[Hashable, _Call] = {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                if key in self._results:
+                    self.stats['cache_hits'] += 1
+                    results[key] = (self._results[key], True)
+                elif key in self._calls:
+                    call = waiting[key] = self._calls[key]
+                    call.waiters += 1
+                    self.stats['coalesced'] += 1
+                else:
+                    owned[key] = self._calls[key] = _Call()
+                    self.stats['calls'] += 1
+
+        if owned:
+            values: Dict[Hashable, Any] = {}
+            error: Optional[BaseException] = None
+            try:
+                values = fn(list(owned))
+            except BaseException as e:
+                error = e
+            with self._lock:
+                for key, call in owned.items():
+                    del self._calls[key]
+                    call.result, call.error = values.get(key), error
+                    if error is None and self.cache_results and self.cacheable(call.result):
+                        self._results[key] = call.result
+            for key, call in owned.items():
+                call.done.set()
+                results[key] = (call.result, False)
+            if error is not None:
+                raise error
+
+        for key, call in waiting.items():
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            results[key] = (call.result, True)
+        return results
+
+    def saved(self) -> int:
+        """合并或复用而省下的调用次数"""
+        return self.stats['coalesced'] + self.stats['cache_hits']
@@ -0,0 +1,217 @@
+"""
+字段级校验与补填
+逐个校验大模型返回的字段：值非空、格式符合字段类型、能在提供的数据中找到出处；
+只把未通过的字段放进一次小请求重新询问，而不是重跑整页
+
+用法:
+    slots = repairable_slots(failing_slots(result, page_info, data, min_confidence=0.6), data)
+    prompt_vars['failed_fields'] = format_failed_fields(slots)
+    merge_repair(result, repaired, slots, data)
+"""
+import re
+from typing import Any, Dict, List, Optional
+
+from single_flight import normalize_text
+
+# (字段名关键字, 格式正则, 说明)：字段名包含关键字时，值必须匹配格式
+SLOT_TYPE_RULES = [
+    (('日期', '时间'), re.compile(r'\d{4}\s*[年\-/.]\s*\d{1,2}'), '日期'),
+    (('金额', '价格', '报价', '总价', '单价', '费用'), re.compile(r'\d|[壹贰叁肆伍陆柒捌玖拾佰仟万亿]'), '金额'),
+    (('电话', '手机', '传真'), re.compile(r'\d[\d\-\s()（）+]{5,}\d'), '电话号码'),
+    (('邮箱', '电子邮件', 'email', 'Email'), re.compile(r'[^@\s]+@[^@\s]+'), '邮箱地址'),
+    (('统一社会信用代码',), re.compile(r'^[0-9A-Z]{18}$'), '18位统一社会信用代码'),
+    (('邮编', '邮政编码'), re.compile(r'^\d{6}$'), '6位邮政编码'),
+]
+
+_PLACEHOLDER_RE = re.compile(r'\$\{([^}]+)\}')
+_DIGITS_RE = re.compile(r'\d+')
+
+
+def data_text(data: Any) -> str:
+    """把提供的数据展平为一段文本（空白已归一化），用于追溯字段值的出处"""
+    values = []
+
+    def walk(value):
+        if isinstance(value, dict):
+            for v in value.values():
+                walk(v)
+        elif isinstance(value, (list, tuple)):
+            for v in value:
+                walk(v)
+        elif value is not None:
+            values.append(normalize_text(str(value)))
+
+    walk(data)
+    return '\n'.join(values)
+
+
+def data_keys(data: Any) -> List[str]:
+    """提供的数据中的全部键（含嵌套）"""
+    keys = []
+
+    def walk(value):
+        if isinstance(value, dict):
+            for k, v in value.items():
+                keys.append(normalize_text(str(k)))
+                walk(v)
+        elif isinstance(value, (list, tuple)):
+            for v in value:
+                walk(v)
+
+    walk(data)
+    return keys
+
+
+def has_source(name: str, keys: List[str]) -> bool:
+    """数据中是否有与字段名对应的键（互相包含即可）"""
+    name = normalize_text(name)
+    return bool(name) and any(k and (k in name or name in k) for k in keys)
+
+
+def is_traceable(value: str, blob: str) -> bool:
+    """
+    值能否在数据中找到出处：原文出现，或其中的数字全部出现（允许日期、金额改写格式）
+    """
+    value = normalize_text(value)
+    if value in blob:
+        return True
+    digits = _DIGITS_RE.findall(value)
+    return bool(digits) and all(d in blob for d in digits)
+
+
+def check_slot(name: str, value: Any, confidence: Any = None, blob: str = '',
+               min_confidence: float = 0.0) -> Optional[str]:
+    """
+    校验单个字段
+
+    :param blob: data_text() 的结果，为空时不做出处校验
+    :return: 未通过的原因，通过时为 None
+    """
+    value = '' if value is None else str(value).strip()
+    if not value:
+        return '未填写'
+    if _PLACEHOLDER_RE.search(value):
+        return '仍是占位符'
+    if isinstance(confidence, (int, float)) and confidence < min_confidence:
+        return f'置信度低({confidence})'
+    for keywords, pattern, desc in SLOT_TYPE_RULES:
+        if any(k in name for k in keywords) and not pattern.search(value):
+            return f'格式应为{desc}'
+    if blob and not is_traceable(value, blob):
+        return '提供的数据中找不到该值'
+    return None
+
+
+def _field_name(item: Any) -> str:
+    if isinstance(item, dict):
+        return str(item.get('field_name') or item.get('name') or '')
+    return str(item)
+
+
+def collect_slots(result: Dict[str, Any], page_info: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    汇总页面上的字段：模型填写的字段、模型声明未填的字段、页面上未被任何修改覆盖的占位符
+
+    :return: [{'name', 'original', 'value', 'confidence', 'xpath'}]
+    """
+    placeholders = [f['placeholder_name'] for f in page_info.get('placeholder_fields', [])]
+    updates = result.get('updates', [])
+    slots: Dict[str, Dict[str, Any]] = {}
+
+    def add(name, value='', confidence=None, original=''):
+        if not name or name in slots:
+            return
+        if not original and name in placeholders:
+            original = f'${{{name}}}'
+        xpath = next((u.get('xpath', '') for u in updates if original and u.get('old_text') == original), '')
+        slots[name] = {'name': name, 'original': original, 'value': value,
+                       'confidence': confidence, 'xpath': xpath}
+
+    for item in result.get('filled_fields', []):
+        if isinstance(item, dict):
+            add(_field_name(item), item.get('new_value', ''), item.get('confidence'),
+                item.get('original_value') or '')
+    for item in result.get('unfilled_fields', []):
+        add(_field_name(item))
+
+    replaced = ''.join(u.get('old_text', '') for u in updates if u.get('new_text'))
+    for name in placeholders:
+        if f'${{{name}}}' not in replaced:
+            add(name)
+    return list(slots.values())
+
+
+def failing_slots(result: Dict[str, Any], page_info: Dict[str, Any], data: Any,
+                  min_confidence: float = 0.0) -> List[Dict[str, Any]]:
+    """返回未通过校验的字段，每项带 reason"""
+    blob = data_text(data)
+    failing = []
+    for slot in collect_slots(result, page_info):
+        reason = check_slot(slot['name'], slot['value'], slot['confidence'], blob, min_confidence)
+        if reason:
+            failing.append(dict(slot, reason=reason))
+    return failing
+
+
+def repairable_slots(slots: List[Dict[str, Any]], data: Any) -> List[Dict[str, Any]]:
+    """
+    值得补填的字段：有原文可定位，且数据中有对应的键。
+    数据里本就没有的字段再问也填不出来，没有原文的字段补填后也无处替换，都不浪费请求
+    """
+    keys = data_keys(data)
+    return [slot for slot in slots if slot['original'] and has_source(slot['name'], keys)]
+
+
+def format_failed_fields(slots: List[Dict[str, Any]]) -> str:
+    """补填提示词中的待修正字段列表"""
+    lines = []
+    for slot in slots:
+        line = f"  - {slot['name']}"
+        if slot['original']:
+            line += f" | 原文: {slot['original']}"
+        if slot['value']:
+            line += f" | 上次填写: {slot['value']}"
+        lines.append(f"{line} | 问题: {slot['reason']}")
+    return '\n'.join(lines)
+
+
+def merge_repair(result: Dict[str, Any], repaired: Dict[str, Any], slots: List[Dict[str, Any]],
+                 data: Any, min_confidence: float = 0.0) -> int:
+    """
+    把补填结果中通过校验的字段合并进页面结果（替换原修改、更新已填/未填列表）
+
+    :param repaired: 补填请求解析后的结果（fields_filled 结构）
+    :param slots: 本轮发出的待修正字段
+    :return: 修复成功的字段数
+    """
+    blob = data_text(data)
+    by_name = {slot['name']: slot for slot in slots}
+    by_original = {slot['original']: slot for slot in slots if slot['original']}
+    fixed = 0
+
+    for item in repaired.get('fields_filled') or []:
+        if not isinstance(item, dict):
+            continue
+        slot = by_name.get(_field_name(item)) or by_original.get(item.get('original_value') or '')
+        if slot is None or slot.get('fixed'):
+            continue
+        value = item.get('new_value', '')
+        if check_slot(slot['name'], value, item.get('confidence'), blob, min_confidence):
+            continue
+        original = slot['original'] or item.get('original_value') or ''
+        if not original:
+            continue
+
+        update = {'old_text': original, 'new_text': str(value)}
+        if slot['xpath']:
+            update['xpath'] = slot['xpath']
+        result['updates'] = [u for u in result.get('updates', [])
+                             if not (u.get('old_text') == original and u.get('xpath', '') == slot['xpath'])]
+        result['updates'].append(update)
+        result['filled_fields'] = [f for f in result.get('filled_fields', [])
+                                   if _field_name(f) != slot['name']] + [item]
+        result['unfilled_fields'] = [f for f in result.get('unfilled_fields', [])
+                                     if _field_name(f) != slot['name']]
+        slot['fixed'] = True
+        fixed += 1
+    return fixed
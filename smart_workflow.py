@@ -4,10 +4,12 @@
 """
 import os
 import sys
-import subprocess
 import json
+import logging
 from datetime import datetime
 
+from workflow_metrics import WorkflowMetrics, format_mb
+
 
 def print_header(text: str):
     """打印标题"""
@@ -60,19 +62,20 @@ def check_prerequisites():
     return True
 
 
-def step1_split_pages():
+def step1_split_pages(metrics=None):
     """步骤1：分割页面"""
     print_step(1, "分割Word文档为单独的页面")
     
     if not os.path.exists("split_pages"):
         print("正在分割页面...")
-        result = subprocess.run([sys.executable, "split_pages.py"], capture_output=True, text=True)
+        from split_pages import split_word_by_pages
         
-        if result.returncode == 0:
+        try:
+            split_word_by_pages("template.xml", "split_pages", metrics=metrics)
             print("✓ 页面分割成功")
             return True
-        else:
-            print(f"✗ 页面分割失败:\n{result.stderr}")
+        except Exception as e:
+            print(f"✗ 页面分割失败:\n{e}")
             return False
     else:
         print("⚠️  split_pages 目录已存在，跳过分割")
@@ -129,66 +132,118 @@ def step3_check_fill_data():
     return True
 
 
-def step4_process_with_llm():
-    """步骤4：用大模型处理页面"""
+def step4_process_with_llm(metrics=None, telemetry_file=None, interactive=True):
+    """
+    步骤4：用大模型处理页面
+    
+    :param interactive: 是否询问确认；标准输入不是终端时自动视为非交互
+    """
     print_step(4, "用大模型智能处理页面")
     
     print("⚠️  这一步需要调用大模型API，可能需要几秒到几分钟的时间...")
     print("(取决于页面数量和网络连接)")
     
-    confirm = input("\n是否继续? (y/n): ").strip().lower()
-    if confirm != 'y':
-        print("已跳过LLM处理")
-        return True
+    if interactive and sys.stdin.isatty():
+        confirm = input("\n是否继续? (y/n): ").strip().lower()
+        if confirm != 'y':
+            print("已跳过LLM处理")
+            return True
     
     print("\n正在处理页面...")
-    result = subprocess.run([sys.executable, "process_with_llm.py"], capture_output=True, text=True)
+    from process_with_llm import process_all_pages_with_llm
     
-    print(result.stdout)
+    result = process_all_pages_with_llm(metrics=metrics, telemetry_file=telemetry_file)
     
-    if result.returncode == 0:
+    if result is not None:
+        if metrics is not None:
+            metrics.incr('llm_pages_failed', result['failed'])
         print("✓ LLM处理完成")
         return True
     else:
-        print(f"✗ LLM处理失败:\n{result.stderr}")
+        print("✗ LLM处理失败")
         return False
 
 
-def step5_merge_pages():
+def step5_merge_pages(metrics=None):
     """步骤5：合并页面"""
     print_step(5, "合并修改后的页面为单个XML")
     
     print("正在合并页面...")
-    result = subprocess.run([sys.executable, "merge_pages.py"], capture_output=True, text=True)
+    from merge_pages import merge_pages
     
-    print(result.stdout)
+    try:
+        merge_pages("split_pages", "merged_document.xml", metrics=metrics)
+    except Exception as e:
+        print(f"✗ 页面合并失败:\n{e}")
+        return False
     
-    if result.returncode == 0 and os.path.exists("merged_document.xml"):
+    if os.path.exists("merged_document.xml"):
         print("✓ 页面合并成功")
         return True
     else:
-        print(f"✗ 页面合并失败:\n{result.stderr}")
+        print("✗ 页面合并失败")
         return False
 
 
-def step6_convert_to_word():
+def step6_convert_to_word(metrics=None):
     """步骤6：转换为Word"""
     print_step(6, "转换为Word文档")
     
     print("正在转换为Word...")
-    result = subprocess.run([sys.executable, "xml_to_docx.py"], capture_output=True, text=True)
+    from xml_to_docx import xml_to_docx
     
-    print(result.stdout)
-    
-    if result.returncode == 0 and os.path.exists("output_document.docx"):
+    if xml_to_docx("merged_document.xml", "output_document.docx", "template.docx") \
+            and os.path.exists("output_document.docx"):
         print("✓ Word文档生成成功")
         return True
     else:
-        print(f"✗ Word转换失败:\n{result.stderr}")
+        print("✗ Word转换失败")
         return False
 
 
-def generate_report(results: dict):
+def step_pipeline(metrics=None, telemetry_file=None, interactive=True):
+    """流水线模式：分割、大模型处理、合并、打包同时进行（替代步骤1、4、5、6）"""
+    print_step(4, "流水线处理：分割 → 大模型 → 合并 → 转为Word")
+    
+    if interactive and sys.stdin.isatty():
+        confirm = input("\n这一步需要调用大模型API，是否继续? (y/n): ").strip().lower()
+        if confirm != 'y':
+            print("已取消")
+            return False
+    
+    from pipeline import run_pipeline
+    
+    stats = run_pipeline("template.docx", "output_document.docx", metrics=metrics,
+                         telemetry_file=telemetry_file)
+    if metrics is not None:
+        metrics.incr('llm_pages_failed', stats['failed'])
+    if stats['ok']:
+        print(f"✓ 流水线完成 ({stats['wall_s']:.2f}s, 首页写出 {stats.get('first_page_written_s', 0):.2f}s)")
+        return True
+    reason = '; '.join(stats.get('errors', [])) or f"{stats['failed']} 页处理失败"
+    print(f"✗ 流水线失败: {reason}")
+    return False
+
+
+def print_metrics(metrics: WorkflowMetrics):
+    """打印性能指标摘要"""
+    summary = metrics.summary()
+    
+    print(f"\n性能指标 (总耗时 {summary['wall_s']:.2f}s, 峰值内存 {format_mb(summary['rss_peak_kb'])}):")
+    for name, stage in summary['stages'].items():
+        line = (f"  {name:<18} 墙钟 {stage['wall_s']:>8.3f}s  CPU {stage['cpu_s']:>8.3f}s  "
+                f"内存增量 {format_mb(stage['rss_delta_kb']):>8}")
+        if 'tracemalloc_peak_kb' in stage:
+            line += f"  Python堆峰值 {stage['tracemalloc_peak_kb'] // 1024} MB"
+        print(line)
+    
+    for name, stats in summary['page_stats'].items():
+        print(f"  [{name}] {stats['pages']} 页, {stats['slots']} 个字段, "
+              f"{stats['pages_per_s']} 页/秒, {stats['slots_per_s']} 字段/秒, "
+              f"单页 p50 {stats['wall_p50_s']:.3f}s / p95 {stats['wall_p95_s']:.3f}s")
+
+
+def generate_report(results: dict, metrics: WorkflowMetrics = None):
     """生成处理报告"""
     print_header("处理报告")
     
@@ -208,6 +263,9 @@ def generate_report(results: dict):
         status = "✓" if results.get(f"step{i}", False) else "✗"
         print(f"  {status} 步骤{i}: {step_name}")
     
+    if metrics is not None:
+        print_metrics(metrics)
+    
     all_success = all(results.values())
     
     if all_success:
@@ -228,8 +286,22 @@ def generate_report(results: dict):
     return all_success
 
 
-def run_complete_workflow():
-    """运行完整工作流"""
+def run_complete_workflow(metrics_json: str = None,
+                          metrics_prom: str = None,
+                          trace_memory: bool = False,
+                          llm_telemetry: str = None,
+                          interactive: bool = True,
+                          pipeline: bool = False):
+    """
+    运行完整工作流
+    
+    :param metrics_json: 性能指标JSON输出路径
+    :param metrics_prom: Prometheus textfile 输出路径
+    :param trace_memory: 是否用 tracemalloc 统计各阶段Python内存
+    :param llm_telemetry: LLM调用遥测导出路径（.json 或 .prom）
+    :param interactive: 是否在调用大模型前询问确认
+    :param pipeline: 流水线模式，各阶段同时运行，直接从 template.docx 读取
+    """
     print_header("Word 智能填写完整工作流")
     
     print("\n本工作流包括以下步骤:")
@@ -241,6 +313,7 @@ def run_complete_workflow():
     print("  6. 转为最终的Word文档")
     
     results = {}
+    metrics = WorkflowMetrics(trace_memory=trace_memory)
     
     # 前置检查
     if not check_prerequisites():
@@ -249,17 +322,24 @@ def run_complete_workflow():
     
     # 执行步骤
     steps = [
-        (1, step1_split_pages),
-        (2, step2_check_llm_config),
-        (3, step3_check_fill_data),
-        (4, step4_process_with_llm),
-        (5, step5_merge_pages),
-        (6, step6_convert_to_word),
+        (1, 'split', lambda: step1_split_pages(metrics)),
+        (2, 'check_llm_config', step2_check_llm_config),
+        (3, 'check_fill_data', step3_check_fill_data),
+        (4, 'llm', lambda: step4_process_with_llm(metrics, llm_telemetry, interactive)),
+        (5, 'merge', lambda: step5_merge_pages(metrics)),
+        (6, 'pack', lambda: step6_convert_to_word(metrics)),
     ]
     
-    for step_num, step_func in steps:
+    if pipeline:
+        # 步骤1、4、5、6合并为一个流水线阶段，报告中共用同一结果
+        steps = steps[1:3] + [(4, 'pipeline', lambda: step_pipeline(metrics, llm_telemetry, interactive))]
+    
+    for step_num, stage_name, step_func in steps:
         try:
-            result = step_func()
+            with metrics.stage(stage_name) as stage_record:
+                result = step_func()
+                if not result:
+                    stage_record['status'] = 'failed'
             results[f"step{step_num}"] = result
             
             if not result:
@@ -271,15 +351,40 @@ def run_complete_workflow():
             results[f"step{step_num}"] = False
             break
     
+    if pipeline and 'step4' in results:
+        for step_num in (1, 5, 6):
+            results[f"step{step_num}"] = results['step4']
+    
     # 生成报告
-    success = generate_report(results)
+    success = generate_report(results, metrics)
+    
+    if metrics_json:
+        print(f"\n✓ 性能指标已保存: {metrics.write_json(metrics_json)}")
+    if metrics_prom:
+        print(f"✓ Prometheus 指标已保存: {metrics.write_prometheus(metrics_prom)}")
     
     return success
 
 
 if __name__ == '__main__':
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Word 智能填写完整工作流')
+    parser.add_argument('--metrics-json', default=None, help='性能指标JSON输出路径')
+    parser.add_argument('--metrics-prom', default=None, help='Prometheus textfile 输出路径 (*.prom)')
+    parser.add_argument('--tracemalloc', action='store_true', help='统计各阶段Python内存分配')
+    parser.add_argument('--log-level', default='INFO', help='逐页日志级别 (DEBUG/INFO/WARNING)')
+    parser.add_argument('--llm-telemetry', default=None, help='LLM调用遥测导出路径 (.json / .prom)')
+    parser.add_argument('-y', '--yes', action='store_true', help='非交互模式，不询问确认')
+    parser.add_argument('--pipeline', action='store_true', help='流水线模式：各阶段同时运行')
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=args.log_level.upper(), format='%(message)s', stream=sys.stdout)
+    
     try:
-        success = run_complete_workflow()
+        success = run_complete_workflow(args.metrics_json, args.metrics_prom, args.tracemalloc,
+                                        args.llm_telemetry, interactive=not args.yes,
+                                        pipeline=args.pipeline)
         sys.exit(0 if success else 1)
     
     except KeyboardInterrupt:
@@ -1,22 +1,34 @@
-import xml.etree.ElementTree as ET
+import logging
 import os
+import time
 from lxml import etree
 
-def split_word_by_pages(xml_file, output_dir='split_pages'):
+from parse_docx import parse_xml
+
+logger = logging.getLogger(__name__)
+
+def split_word_by_pages(xml_file, output_dir='split_pages', workers=1, metrics=None):
     """
     将Word XML按页分割，保留原始格式（包括表格）。
     每一页都是一个包含完整XML声明和命名空间的独立文件。
     
-    :param xml_file: 输入的XML文件路径
+    :param xml_file: 输入的XML文件路径，也可直接传入docx（流式读取 word/document.xml）
     :param output_dir: 输出目录
+    :param workers: 进程数，大于1（或为None，即CPU核数）时使用多进程分割
+    :param metrics: 可选的 WorkflowMetrics，记录每页耗时
     """
     
+    if workers != 1:
+        from parallel_pages import split_and_analyze
+        split_and_analyze(xml_file, output_dir, workers=workers, analyze=False, metrics=metrics)
+        return
+    
     # 创建输出目录
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
     
     # 使用lxml保留完整格式和命名空间
-    tree = etree.parse(xml_file)
+    tree = parse_xml(xml_file)
     root = tree.getroot()
     
     # 定义命名空间
@@ -56,6 +68,7 @@ def split_word_by_pages(xml_file, output_dir='split_pages'):
     start_idx = 0
     
     for boundary_idx in page_boundaries:
+        page_start = time.perf_counter()
         # 为当前页创建新的XML文档
         new_root = etree.Element(root.tag, nsmap=root.nsmap)
         new_body = etree.SubElement(new_root, '{%s}body' % ns['ns0'])
@@ -72,13 +85,16 @@ def split_word_by_pages(xml_file, output_dir='split_pages'):
         new_tree = etree.ElementTree(new_root)
         new_tree.write(output_file, encoding='utf-8', xml_declaration=True, pretty_print=True)
         
-        print(f"✓ 第 {page_num} 页已保存: {output_file} ({boundary_idx - start_idx + 1} 个元素)")
+        logger.info("✓ 第 %d 页已保存: %s (%d 个元素)", page_num, output_file, boundary_idx - start_idx + 1)
+        if metrics is not None:
+            metrics.record_page('split', page_num, time.perf_counter() - page_start)
         
         page_num += 1
         start_idx = boundary_idx + 1
     
     # 处理最后一页（如果最后一段没有sectPr）
     if start_idx < len(all_elements):
+        page_start = time.perf_counter()
         new_root = etree.Element(root.tag, nsmap=root.nsmap)
         new_body = etree.SubElement(new_root, '{%s}body' % ns['ns0'])
         
@@ -92,9 +108,15 @@ def split_word_by_pages(xml_file, output_dir='split_pages'):
         new_tree = etree.ElementTree(new_root)
         new_tree.write(output_file, encoding='utf-8', xml_declaration=True, pretty_print=True)
         
-        print(f"✓ 第 {page_num} 页已保存: {output_file} ({len(all_elements) - start_idx} 个元素)")
+        logger.info("✓ 第 %d 页已保存: %s (%d 个元素)", page_num, output_file, len(all_elements) - start_idx)
+        if metrics is not None:
+            metrics.record_page('split', page_num, time.perf_counter() - page_start)
 
 
 if __name__ == '__main__':
+    import sys
+
+    # 进度信息与 print 的输出一样写到标准输出
+    logging.basicConfig(level=logging.INFO, format='%(message)s', stream=sys.stdout)
     split_word_by_pages('template.xml')
     print("\n✓ 页面分割完成！")
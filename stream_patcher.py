@@ -0,0 +1,414 @@
+"""
+流式修改器
+按编辑列表（字段地址 → 新文本）修改 word/document.xml：
+从模板zip中流式读取正文（iterparse），逐个处理 w:body 的子元素，立即写入输出docx，
+整个文档只顺序读一遍、写一遍，不需要分割/合并页面文件。
+placeholder 编辑同时作用于页眉、页脚、脚注、尾注和批注（这些部件较小，在线程池中整体解析）
+
+编辑列表格式（JSON数组）:
+    [
+      {"placeholder": "项目名称", "text": "XX项目"},                         替换 ${项目名称}
+      {"para_id": "1A2B3C4D", "old": "____", "text": "张三"},                 段落中第一处 old
+      {"xpath": "/w:document/w:body/w:p[11]/w:r[3]/w:t", "text": "张三"},   整段文本或指定节点
+      {"xpath": "/w:document/w:body/w:tbl[2]/w:tr[3]/w:tc[2]/w:p", "text": "100万元"}
+    ]
+xpath 为整篇 document.xml 中的路径（XMLPageAnalyzer 对完整文档给出的 xpath 即为此格式）。
+也可以直接传入 {"占位符": "值"} 对象，等同于一组 placeholder 编辑
+
+用法:
+    python stream_patcher.py template.docx edits.json -o output.docx
+"""
+import argparse
+import json
+import re
+import shutil
+import sys
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from xml.sax.saxutils import escape
+
+from lxml import etree
+
+from fill_engine import (DOCUMENT_PART, PLACEHOLDER_RE, TEXT_PART_RE, W_NS, W_P, W_T, XML_SPACE,
+                         compile_part, flatten_record, merge_split_placeholders, render_segments)
+
+W14_PARA_ID = '{http://schemas.microsoft.com/office/word/2010/wordml}paraId'
+XML_DECLARATION = b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\r\n'
+
+# xpath 中标识 body 子元素的步骤，如 w:p[11]、w:tbl[2]、*[5]
+_STEP_RE = re.compile(r'^(?:(\*)|([\w.-]+):([\w.-]+))(?:\[(\d+)\])?$')
+_NS_DECL_RE = re.compile(rb'\sxmlns:([\w.-]+)="([^"]*)"')
+
+
+def load_edits(path: str) -> List[Dict[str, Any]]:
+    """
+    读取编辑列表
+
+    :param path: JSON文件：编辑数组、{"edits": [...]}，或 {占位符: 值} 对象
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, dict) and isinstance(data.get('edits'), list):
+        data = data['edits']
+    if isinstance(data, dict):
+        return [{'placeholder': name, 'text': value} for name, value in flatten_record(data).items()
+                if not isinstance(value, (dict, list))]
+    return data
+
+
+def _set_text(elem, text: str):
+    """设置节点文本；非 w:t 节点时写入第一个 w:t 并清空其余，保留第一个run的格式"""
+    t_nodes = [elem] if elem.tag == W_T else list(elem.iter(W_T))
+    if not t_nodes:
+        return False
+    t_nodes[0].text = text
+    t_nodes[0].set(XML_SPACE, 'preserve')
+    for t in t_nodes[1:]:
+        t.text = ''
+    return True
+
+
+def _replace_old(elem, old: str, text: str) -> bool:
+    """替换节点下第一处 old 文本"""
+    for t in ([elem] if elem.tag == W_T else elem.iter(W_T)):
+        if t.text and old in t.text:
+            t.text = t.text.replace(old, text, 1)
+            t.set(XML_SPACE, 'preserve')
+            return True
+    return False
+
+
+class EditIndex:
+    """按地址类型索引编辑，流式处理时按 body 子元素查找"""
+
+    def __init__(self, edits: List[Dict[str, Any]]):
+        self.edits = edits
+        self.applied = [0] * len(edits)
+        self.placeholders: Dict[str, Tuple[int, str]] = {}
+        self.by_para_id: Dict[str, List[int]] = {}
+        # (body 子元素步骤键) → [(剩余xpath, 编辑序号)]
+        self.by_child: Dict[Tuple[str, int], List[Tuple[str, int]]] = {}
+
+        for i, edit in enumerate(edits):
+            if 'text' not in edit:
+                raise ValueError(f"第{i + 1}条编辑缺少 text: {edit}")
+            edit['text'] = '' if edit['text'] is None else str(edit['text'])
+            if 'placeholder' in edit:
+                self.placeholders[edit['placeholder']] = (i, edit['text'])
+            elif 'para_id' in edit:
+                self.by_para_id.setdefault(str(edit['para_id']).upper(), []).append(i)
+            elif 'xpath' in edit:
+                key, rest = self._split_xpath(edit['xpath'])
+                self.by_child.setdefault(key, []).append((rest, i))
+            else:
+                raise ValueError(f"第{i + 1}条编辑缺少地址 (placeholder / para_id / xpath): {edit}")
+
+    @staticmethod
+    def _split_xpath(xpath: str) -> Tuple[Tuple[str, int], str]:
+        """/w:document/w:body/w:p[11]/w:r[3]/w:t → (('p', 11), '/w:r[3]/w:t')"""
+        steps = xpath.strip().lstrip('/').split('/')
+        if len(steps) < 3 or not steps[1].endswith('body'):
+            raise ValueError(f"xpath 必须从文档根开始并指向 body 内的元素: {xpath}")
+        match = _STEP_RE.match(steps[2])
+        if not match:
+            raise ValueError(f"无法识别的 xpath 步骤 '{steps[2]}': {xpath}")
+        star, _, local, index = match.groups()
+        key = ('*' if star else local, int(index or 1))
+        rest = '/'.join(steps[3:])
+        return key, ('/' + rest if rest else '')
+
+    def apply(self, child, positions: List[Tuple[str, int]], namespaces: Dict[str, str]) -> int:
+        """
+        对一个 body 子元素应用所有匹配的编辑
+
+        :param positions: 该子元素的步骤键，如 [('*', 12), ('p', 11)]
+        :return: 应用的编辑数
+        """
+        count = 0
+        for key in positions:
+            for rest, i in self.by_child.get(key, ()):
+                edit = self.edits[i]
+                targets = child.xpath('.' + rest, namespaces=namespaces) if rest else [child]
+                for target in targets[:1]:
+                    done = (_replace_old(target, edit['old'], edit['text']) if edit.get('old')
+                            else _set_text(target, edit['text']))
+                    if done:
+                        self.applied[i] += 1
+                        count += 1
+
+        if self.by_para_id:
+            for p in child.iter(W_P):
+                para_id = p.get(W14_PARA_ID)
+                for i in self.by_para_id.get(para_id.upper() if para_id else '', ()):
+                    edit = self.edits[i]
+                    done = (_replace_old(p, edit['old'], edit['text']) if edit.get('old')
+                            else _set_text(p, edit['text']))
+                    if done:
+                        self.applied[i] += 1
+                        count += 1
+
+        if self.placeholders and self._has_placeholder(child):
+            # 先合并被拆分到多个run中的占位符
+            merge_split_placeholders(child)
+            replaced = [0]
+
+            def substitute(match):
+                entry = self.placeholders.get(match.group(1))
+                if entry is None:
+                    return match.group(0)
+                self.applied[entry[0]] += 1
+                replaced[0] += 1
+                return entry[1]
+
+            for t in child.iter(W_T):
+                if t.text and '${' in t.text:
+                    new_text = PLACEHOLDER_RE.sub(substitute, t.text)
+                    if new_text != t.text:
+                        t.text = new_text
+                        t.set(XML_SPACE, 'preserve')
+            count += replaced[0]
+
+        return count
+
+    def _has_placeholder(self, child) -> bool:
+        """子元素文本中是否含有待替换的占位符（不含时不改动run结构）"""
+        text = ''.join(t.text or '' for t in child.iter(W_T))
+        return '${' in text and any(m.group(1) in self.placeholders for m in PLACEHOLDER_RE.finditer(text))
+
+    def unmatched(self) -> List[Dict[str, Any]]:
+        return [edit for edit, n in zip(self.edits, self.applied) if n == 0]
+
+
+def _patch_text_part(data: bytes, placeholders: Dict[str, Tuple[int, str]]) -> Tuple[bytes, List[int]]:
+    """
+    替换小部件（页眉页脚等）中的占位符
+
+    :return: (新内容, 命中的编辑序号)；没有命中时返回 (b'', [])，部件保持原样
+    """
+    segments = compile_part(data)
+    if segments is None:
+        return b'', []
+    hits = [placeholders[name][0] for name in segments[1::2] if name in placeholders]
+    if not hits:
+        return b'', []
+    values = {name: text for name, (_, text) in placeholders.items()}
+    return render_segments(segments, values), hits
+
+
+def _open_tag(elem) -> Tuple[bytes, bytes]:
+    """生成元素自身的开始/结束标签（含命名空间声明和属性，不含子元素）"""
+    shell = etree.Element(elem.tag, dict(elem.attrib), nsmap=elem.nsmap)
+    data = etree.tostring(shell)
+    qname = data[1:].split(None, 1)[0].split(b'/', 1)[0].rstrip(b'>')
+    return data[:-2] + b'>', b'</' + qname + b'>'
+
+
+def serialize_child(child, root_ns: Dict[bytes, bytes]) -> bytes:
+    """序列化 body 子元素，去掉与根元素重复的命名空间声明"""
+    data = etree.tostring(child, encoding='utf-8')
+    end = data.index(b'>')
+
+    def keep(match):
+        return b'' if root_ns.get(match.group(1)) == match.group(2) else match.group(0)
+
+    return _NS_DECL_RE.sub(keep, data[:end]) + data[end:]
+
+
+class _PrefixedStream:
+    """已读出开头若干字节的流，供 iterparse 从头读取"""
+
+    def __init__(self, head: bytes, stream):
+        self.head = head
+        self.stream = stream
+
+    def read(self, size: int = -1) -> bytes:
+        if not self.head:
+            return self.stream.read(size)
+        if size is None or size < 0:
+            data, self.head = self.head + self.stream.read(), b''
+        else:
+            data, self.head = self.head[:size], self.head[size:]
+        return data
+
+
+def _read_declaration(source) -> Tuple[bytes, _PrefixedStream]:
+    """读取原始XML声明（含其后的换行），输出时原样保留"""
+    head = source.read(1024)
+    declaration = XML_DECLARATION
+    if head.startswith(b'<?xml') and b'?>' in head:
+        end = head.index(b'?>') + 2
+        while head[end:end + 1] in (b'\r', b'\n'):
+            end += 1
+        declaration = head[:end]
+    return declaration, _PrefixedStream(head, source)
+
+
+def _text(value: Optional[str]) -> bytes:
+    return escape(value).encode('utf-8') if value else b''
+
+
+def stream_patch_document(source, target, index: EditIndex) -> Dict[str, int]:
+    """
+    流式处理 document.xml
+
+    元素的尾部文本要等到下一个事件才解析完，因此每个 body 子元素在下一个同级元素开始
+    （或 body 结束）时才写出。未修改的元素只经过 lxml 重新序列化，内容与原文一致
+
+    :param source: 可读的二进制流
+    :param target: 可写的二进制流
+    :return: 统计
+    """
+    stats = {'body_elements': 0, 'patched_elements': 0, 'replacements': 0}
+    root = body = pending = None
+    root_ns: Dict[bytes, bytes] = {}
+    namespaces: Dict[str, str] = {}
+    root_close = body_close = b''
+    root_text_written = body_text_written = body_tail_pending = False
+    depth = 0
+    counters: Dict[str, int] = {}
+
+    def flush():
+        nonlocal pending
+        if pending is not None:
+            target.write(serialize_child(pending, root_ns))
+            # 释放已写出的元素
+            pending.getparent().remove(pending)
+            pending = None
+
+    declaration, stream = _read_declaration(source)
+    target.write(declaration)
+    for event, elem in etree.iterparse(stream, events=('start', 'end'), remove_blank_text=False,
+                                       huge_tree=True):
+        if event == 'start':
+            depth += 1
+            if depth == 1:
+                root = elem
+                namespaces = {k: v for k, v in root.nsmap.items() if k}
+                namespaces.setdefault('w', W_NS)
+                root_ns = {k.encode(): v.encode() for k, v in root.nsmap.items() if k}
+                open_tag, root_close = _open_tag(root)
+                target.write(open_tag)
+            elif depth == 2:
+                flush()
+                if not root_text_written:
+                    target.write(_text(root.text))
+                    root_text_written = True
+                if body_tail_pending:
+                    target.write(_text(body.tail))
+                    body_tail_pending = False
+                if elem.tag == f'{{{W_NS}}}body':
+                    body = elem
+                    open_tag, body_close = _open_tag(body)
+                    target.write(_NS_DECL_RE.sub(b'', open_tag))
+            elif depth == 3 and elem.getparent() is body:
+                flush()
+                if not body_text_written:
+                    target.write(_text(body.text))
+                    body_text_written = True
+            continue
+
+        depth -= 1
+        if depth == 2 and elem.getparent() is body:
+            local = etree.QName(elem).localname
+            counters['*'] = counters.get('*', 0) + 1
+            counters[local] = counters.get(local, 0) + 1
+            replaced = index.apply(elem, [('*', counters['*']), (local, counters[local])], namespaces)
+            stats['body_elements'] += 1
+            if replaced:
+                stats['patched_elements'] += 1
+                stats['replacements'] += replaced
+            pending = elem
+        elif depth == 1 and elem is body:
+            flush()
+            if not body_text_written:
+                target.write(_text(body.text))
+            target.write(body_close)
+            body_tail_pending = True
+        elif depth == 1:
+            # body 之外的根子元素（如 w:background）
+            pending = elem
+        elif depth == 0:
+            flush()
+            if body_tail_pending:
+                target.write(_text(body.tail))
+            if not root_text_written:
+                target.write(_text(root.text))
+            target.write(root_close)
+
+    return stats
+
+
+def patch_docx(template_docx: str, edits: List[Dict[str, Any]], output_docx: str,
+               part: str = DOCUMENT_PART, workers: int = 8) -> Dict[str, Any]:
+    """
+    按编辑列表修改模板并直接写出新的docx
+
+    :param template_docx: 模板Word文件
+    :param edits: 编辑列表
+    :param output_docx: 输出Word文件
+    :param part: 流式修改的部件
+    :param workers: 处理页眉页脚等小部件的线程数
+    :return: 统计信息（含未匹配的编辑）
+    """
+    start = time.perf_counter()
+    index = EditIndex(edits)
+    stats = {}
+
+    with zipfile.ZipFile(template_docx) as zin, \
+            zipfile.ZipFile(output_docx, 'w', zipfile.ZIP_DEFLATED) as zout:
+        # 页眉页脚等小部件先在线程池中处理，未命中的部件原样复制
+        replacements: Dict[str, bytes] = {}
+        small_parts = [name for name in zin.namelist() if name != part and TEXT_PART_RE.match(name)]
+        if index.placeholders and small_parts:
+            contents = [zin.read(name) for name in small_parts]
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+                results = list(pool.map(_patch_text_part, contents, [index.placeholders] * len(contents)))
+            for name, (data, hits) in zip(small_parts, results):
+                if hits:
+                    replacements[name] = data
+                    for i in hits:
+                        index.applied[i] += 1
+
+        for info in zin.infolist():
+            out_info = zipfile.ZipInfo(info.filename, info.date_time)
+            out_info.compress_type = zipfile.ZIP_DEFLATED
+            out_info.external_attr = info.external_attr
+            with zin.open(info) as src, zout.open(out_info, 'w', force_zip64=True) as dst:
+                if info.filename == part:
+                    stats.update(stream_patch_document(src, dst, index))
+                elif info.filename in replacements:
+                    dst.write(replacements[info.filename])
+                else:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+
+    unmatched = index.unmatched()
+    stats.update({
+        'other_parts_patched': len(replacements),
+        'edits': len(edits),
+        'applied': len(edits) - len(unmatched),
+        'unmatched': unmatched,
+        'seconds': round(time.perf_counter() - start, 3),
+    })
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='按编辑列表流式修改Word文档')
+    parser.add_argument('template', help='模板Word文件')
+    parser.add_argument('edits', help='编辑列表JSON')
+    parser.add_argument('-o', '--output', required=True, help='输出Word文件')
+    args = parser.parse_args(argv)
+
+    stats = patch_docx(args.template, load_edits(args.edits), args.output)
+    print(f"✓ 已生成: {args.output} ({stats['seconds']}s)")
+    print(f"  编辑: {stats['applied']}/{stats['edits']} 已应用, "
+          f"{stats['patched_elements']}/{stats['body_elements']} 个正文元素被修改")
+    for edit in stats['unmatched'][:10]:
+        print(f"  ⚠️  未匹配: {json.dumps(edit, ensure_ascii=False)}")
+    return 0 if not stats['unmatched'] else 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
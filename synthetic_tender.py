@@ -0,0 +1,273 @@
+"""
+合成招标文件生成器
+按指定规模（页数、表格、行数、跨run占位符、图片）生成可复现的测试用docx
+"""
+import argparse
+import random
+import struct
+import zipfile
+import zlib
+from dataclasses import dataclass, asdict
+from typing import List
+from xml.sax.saxutils import escape
+
+W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+R_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+REL_TYPE = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+
+DOCUMENT_NAMESPACES = (
+    f'xmlns:w="{W_NS}" xmlns:r="{R_NS}" '
+    'xmlns:w14="http://schemas.microsoft.com/office/word/2010/wordml" '
+    'xmlns:wp="http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing" '
+    'xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main" '
+    'xmlns:pic="http://schemas.openxmlformats.org/drawingml/2006/picture" '
+    'xmlns:mc="http://schemas.openxmlformats.org/markup-compatibility/2006" '
+    'mc:Ignorable="w14"'
+)
+
+FIELD_LABELS = [
+    '投标人名称', '法定代表人', '授权委托人', '联系电话', '传真', '通讯地址', '邮政编码',
+    '注册资本', '成立日期', '开户银行', '银行账号', '项目负责人', '技术负责人', '电子邮箱',
+]
+COLUMN_LABELS = ['序号', '姓名', '职务', '职称', '证书编号', '从业年限', '备注']
+FILLER_TEXT = '本项目投标人应按照招标文件的要求编制投标文件，并对其内容的真实性、准确性和完整性负责。'
+
+
+@dataclass
+class TenderSpec:
+    """合成文档规模参数"""
+    pages: int = 10
+    paragraphs_per_page: int = 6
+    tables_per_page: int = 1
+    table_rows: int = 8
+    table_cols: int = 4
+    placeholders_per_page: int = 2
+    split_placeholder_ratio: float = 0.5
+    blanks_per_page: int = 2
+    images: int = 0
+    image_size: int = 64
+    headers: int = 1
+    seed: int = 2026
+
+
+def _png(size: int, rng: random.Random) -> bytes:
+    """生成随机噪点PNG（不可压缩，接近真实扫描件）"""
+    raw = b''.join(b'\x00' + bytes(rng.getrandbits(8) for _ in range(size * 3)) for _ in range(size))
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+    header = struct.pack('>IIBBBBB', size, size, 8, 2, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', zlib.compress(raw)) + chunk(b'IEND', b'')
+
+
+def _run(text: str, underline: bool = False) -> str:
+    rpr = '<w:rPr><w:u w:val="single"/></w:rPr>' if underline else ''
+    return f'<w:r>{rpr}<w:t xml:space="preserve">{escape(text)}</w:t></w:r>'
+
+
+def _paragraph(runs: List[str], para_id: int, ppr: str = '') -> str:
+    return f'<w:p w14:paraId="{para_id:08X}">{ppr}{"".join(runs)}</w:p>'
+
+
+def _placeholder_runs(name: str, split: bool) -> List[str]:
+    """占位符，split 时模拟Word把 ${...} 拆到多个run中"""
+    if not split:
+        return [_run(f'${{{name}}}')]
+    cut = max(1, len(name) // 2)
+    return [_run('${' + name[:cut]), _run(name[cut:]), _run('}')]
+
+
+def _image_run(rel_id: str, image_id: int) -> str:
+    emu = 914400
+    return (
+        '<w:r><w:drawing><wp:inline><wp:extent cx="%d" cy="%d"/>'
+        '<wp:docPr id="%d" name="Picture %d"/><a:graphic><a:graphicData '
+        'uri="http://schemas.openxmlformats.org/drawingml/2006/picture"><pic:pic>'
+        '<pic:nvPicPr><pic:cNvPr id="%d" name="image%d.png"/><pic:cNvPicPr/></pic:nvPicPr>'
+        '<pic:blipFill><a:blip r:embed="%s"/><a:stretch><a:fillRect/></a:stretch></pic:blipFill>'
+        '<pic:spPr><a:xfrm><a:off x="0" y="0"/><a:ext cx="%d" cy="%d"/></a:xfrm>'
+        '<a:prstGeom prst="rect"/></pic:spPr></pic:pic></a:graphicData></a:graphic>'
+        '</wp:inline></w:drawing></w:r>'
+    ) % (emu, emu, image_id, image_id, image_id, image_id, rel_id, emu, emu)
+
+
+def _cell(text: str, width: int, extra: str = '') -> str:
+    runs = _run(text) if text else ''
+    return (f'<w:tc><w:tcPr><w:tcW w:w="{width}" w:type="dxa"/>{extra}</w:tcPr>'
+            f'<w:p>{runs}</w:p></w:tc>')
+
+
+def _table(rows: int, cols: int, rng: random.Random) -> str:
+    width = 9000 // cols
+    grid = ''.join(f'<w:gridCol w:w="{width}"/>' for _ in range(cols))
+    parts = [f'<w:tbl><w:tblPr><w:tblW w:w="9000" w:type="dxa"/></w:tblPr><w:tblGrid>{grid}</w:tblGrid>']
+
+    # 表头行
+    header = ''.join(_cell(COLUMN_LABELS[c % len(COLUMN_LABELS)], width) for c in range(cols))
+    parts.append(f'<w:tr>{header}</w:tr>')
+
+    for r in range(1, rows):
+        cells = []
+        c = 0
+        while c < cols:
+            if c == 0:
+                # 首列标签，偶尔纵向合并
+                if r % 5 == 1 and r + 1 < rows:
+                    cells.append(_cell(rng.choice(FIELD_LABELS), width, '<w:vMerge w:val="restart"/>'))
+                elif r % 5 == 2:
+                    cells.append(_cell('', width, '<w:vMerge/>'))
+                else:
+                    cells.append(_cell(rng.choice(FIELD_LABELS), width))
+                c += 1
+            elif c + 1 < cols and rng.random() < 0.15:
+                cells.append(_cell('', width * 2, '<w:gridSpan w:val="2"/>'))
+                c += 2
+            else:
+                cells.append(_cell('' if rng.random() < 0.6 else str(rng.randint(1, 999)), width))
+                c += 1
+        parts.append(f'<w:tr>{"".join(cells)}</w:tr>')
+
+    parts.append('</w:tbl>')
+    return ''.join(parts)
+
+
+def _sect_pr(header_rel: str) -> str:
+    ref = f'<w:headerReference w:type="default" r:id="{header_rel}"/>' if header_rel else ''
+    return (f'<w:sectPr>{ref}<w:pgSz w:w="11906" w:h="16838"/>'
+            '<w:pgMar w:top="1440" w:right="1800" w:bottom="1440" w:left="1800" '
+            'w:header="851" w:footer="992" w:gutter="0"/></w:sectPr>')
+
+
+def build_document_xml(spec: TenderSpec, image_rels: List[str], header_rels: List[str]) -> bytes:
+    """生成 word/document.xml"""
+    rng = random.Random(spec.seed)
+    body = []
+    para_id = 1
+    image_index = 0
+    images_per_page = spec.images / spec.pages if spec.pages else 0
+    placed_images = 0.0
+
+    for page in range(1, spec.pages + 1):
+        body.append(_paragraph([_run(f'第{page}章 投标文件格式')], para_id))
+        para_id += 1
+
+        for i in range(spec.paragraphs_per_page):
+            runs = [_run(FILLER_TEXT)]
+            if i < spec.placeholders_per_page:
+                label = FIELD_LABELS[(page + i) % len(FIELD_LABELS)]
+                runs = [_run(f'{label}：')] + _placeholder_runs(
+                    label, rng.random() < spec.split_placeholder_ratio)
+            elif i < spec.placeholders_per_page + spec.blanks_per_page:
+                label = FIELD_LABELS[(page * 3 + i) % len(FIELD_LABELS)]
+                runs = [_run(f'{label}：'), _run('____', underline=True)]
+            body.append(_paragraph(runs, para_id))
+            para_id += 1
+
+        for _ in range(spec.tables_per_page):
+            body.append(_table(spec.table_rows, spec.table_cols, rng))
+
+        placed_images += images_per_page
+        while image_index < len(image_rels) and image_index < int(placed_images):
+            image_index += 1
+            body.append(_paragraph([_image_run(image_rels[image_index - 1], image_index)], para_id))
+            para_id += 1
+
+        header_rel = header_rels[(page - 1) % len(header_rels)] if header_rels else ''
+        if page < spec.pages:
+            # 分节符：页面最后一个段落带 sectPr
+            body.append(_paragraph([], para_id, f'<w:pPr>{_sect_pr(header_rel)}</w:pPr>'))
+            para_id += 1
+        else:
+            body.append(_sect_pr(header_rel))
+
+    return ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            f'<w:document {DOCUMENT_NAMESPACES}><w:body>{"".join(body)}</w:body></w:document>').encode('utf-8')
+
+
+def generate_tender(output_docx: str, spec: TenderSpec) -> str:
+    """
+    生成合成招标文件
+
+    :param output_docx: 输出的docx路径
+    :param spec: 规模参数
+    :return: 输出路径
+    """
+    rng = random.Random(spec.seed + 1)
+    rels = []
+    overrides = [
+        '<Override PartName="/word/document.xml" ContentType="application/'
+        'vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    ]
+    media = {}
+    headers = {}
+
+    image_rels = []
+    for i in range(1, spec.images + 1):
+        rel_id = f'rIdImg{i}'
+        image_rels.append(rel_id)
+        rels.append(f'<Relationship Id="{rel_id}" Type="{REL_TYPE}/image" Target="media/image{i}.png"/>')
+        media[f'word/media/image{i}.png'] = _png(spec.image_size, rng)
+
+    header_rels = []
+    for i in range(1, spec.headers + 1):
+        rel_id = f'rIdHdr{i}'
+        header_rels.append(rel_id)
+        rels.append(f'<Relationship Id="{rel_id}" Type="{REL_TYPE}/header" Target="header{i}.xml"/>')
+        overrides.append(f'<Override PartName="/word/header{i}.xml" ContentType="application/'
+                         'vnd.openxmlformats-officedocument.wordprocessingml.header+xml"/>')
+        headers[f'word/header{i}.xml'] = (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            f'<w:hdr xmlns:w="{W_NS}" xmlns:r="{R_NS}"><w:p>'
+            f'{_run("项目名称：")}{_run("${项目名称}")}</w:p></w:hdr>'
+        ).encode('utf-8')
+
+    content_types = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Default Extension="png" ContentType="image/png"/>'
+        f'{"".join(overrides)}</Types>'
+    )
+    package_rels = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        f'<Relationships xmlns="{REL_NS}"><Relationship Id="rId1" '
+        f'Type="{REL_TYPE}/officeDocument" Target="word/document.xml"/></Relationships>'
+    )
+    document_rels = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        f'<Relationships xmlns="{REL_NS}">{"".join(rels)}</Relationships>'
+    )
+
+    with zipfile.ZipFile(output_docx, 'w', zipfile.ZIP_DEFLATED) as docx:
+        docx.writestr('[Content_Types].xml', content_types)
+        docx.writestr('_rels/.rels', package_rels)
+        docx.writestr('word/_rels/document.xml.rels', document_rels)
+        docx.writestr('word/document.xml', build_document_xml(spec, image_rels, header_rels))
+        for name, data in headers.items():
+            docx.writestr(name, data)
+        for name, data in media.items():
+            docx.writestr(name, data, compress_type=zipfile.ZIP_STORED)
+
+    return output_docx
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='生成合成招标文件（用于基准测试）')
+    parser.add_argument('output', help='输出的docx文件')
+    defaults = TenderSpec()
+    for name, value in asdict(defaults).items():
+        parser.add_argument(f'--{name.replace("_", "-")}', type=type(value), default=value)
+    args = parser.parse_args(argv)
+
+    spec = TenderSpec(**{name: getattr(args, name) for name in asdict(defaults)})
+    generate_tender(args.output, spec)
+    print(f"✓ 已生成合成招标文件: {args.output} ({spec.pages} 页)")
+    return 0
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(main())
@@ -0,0 +1,494 @@
+"""
+表格网格模型
+一次遍历 w:tbl 构建逻辑网格：解析 w:gridSpan 横向合并、w:vMerge 纵向合并，
+单元格文本存放在共享数组中，空单元格检测与按标签填充都基于同一个模型；
+人员、设备、业绩等列表表格可按原型行批量生成数据行
+
+用法:
+    tree, tables = load_tables('template.docx')
+    for table in tables:
+        for cell in table.empty_cells():
+            print(cell['full_label'])
+
+    expand_table_rows('template.docx', [{'records': staff}], 'output.docx')
+"""
+import copy
+import json
+import os
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from lxml import etree
+
+from parse_docx import is_docx, parse_xml, replace_part
+
+W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+W_TBL = f'{{{W_NS}}}tbl'
+W_TR = f'{{{W_NS}}}tr'
+W_TC = f'{{{W_NS}}}tc'
+W_T = f'{{{W_NS}}}t'
+W_P = f'{{{W_NS}}}p'
+W_R = f'{{{W_NS}}}r'
+W_PPR = f'{{{W_NS}}}pPr'
+W_RPR = f'{{{W_NS}}}rPr'
+XML_SPACE = '{http://www.w3.org/XML/1998/namespace}space'
+W_VAL = f'{{{W_NS}}}val'
+W_GRID_SPAN = f'{{{W_NS}}}gridSpan'
+W_GRID_BEFORE = f'{{{W_NS}}}gridBefore'
+W_VMERGE = f'{{{W_NS}}}vMerge'
+W_TBL_HEADER = f'{{{W_NS}}}tblHeader'
+_WALK_TAGS = (W_TBL, W_TR, W_TC, W_T, W_GRID_SPAN, W_VMERGE, W_GRID_BEFORE, W_TBL_HEADER)
+
+PLACEHOLDER_RE = re.compile(r'\$\{([^}]+)\}')
+# 记录中缺少这些字段时，按行号自动编号
+SEQUENCE_HEADERS = ('序号', '编号', 'No.', 'NO.')
+
+# 无 w:tblHeader 标记时，首行全部非空且至少有这么多列才视为标题行
+MIN_HEADER_COLUMNS = 3
+
+
+@dataclass
+class TableCell:
+    """逻辑单元格（纵向合并的多个 w:tc 归并为一个）"""
+    element: Any            # 起始 w:tc
+    row: int                # 起始行
+    col: int                # 起始网格列
+    cell_index: int         # 在起始行中的 w:tc 序号
+    col_span: int = 1
+    row_span: int = 1
+
+
+class TableModel:
+    """单个表格的逻辑网格"""
+
+    def __init__(self, tbl, index: int = 0):
+        """
+        :param tbl: w:tbl 元素
+        :param index: 表格在文档中的序号（文档顺序，含嵌套表格）
+        """
+        self.element = tbl
+        self.index = index
+        self.rows: List[Any] = []
+        self.cells: List[TableCell] = []
+        self.texts: List[str] = []
+        # grid[r][c] → cells/texts 中的序号，无单元格处为 None
+        self.grid: List[List[Optional[int]]] = []
+        # 每行的 w:tc 对应的逻辑单元格序号（纵向合并的续行指向起始单元格）
+        self.row_cell_ids: List[List[int]] = []
+        self.marked_header_rows = set()
+        self._build()
+        self.width = max((len(row) for row in self.grid), default=0)
+        for row in self.grid:
+            row.extend([None] * (self.width - len(row)))
+        self.header_rows = self._detect_header_rows()
+
+    def _build(self):
+        """单遍 iterwalk：只访问行、单元格、合并属性和文本节点；嵌套表格的文本计入外层单元格"""
+        nested = 0
+        r = -1
+        grid_row: List[Optional[int]] = []
+        cell_ids: List[int] = []
+        prev_row: List[Optional[int]] = []
+        col = cell_index = span = 0
+        vmerge = tc = None
+        parts: List[str] = []
+
+        for event, elem in etree.iterwalk(self.element, events=('start', 'end'), tag=_WALK_TAGS):
+            tag = elem.tag
+            if tag == W_T:
+                if event == 'start' and elem.text:
+                    parts.append(elem.text)
+            elif tag == W_TBL:
+                if elem is not self.element:
+                    nested += 1 if event == 'start' else -1
+            elif nested:
+                continue
+            elif tag == W_TC:
+                if event == 'start':
+                    tc, span, vmerge, parts = elem, 1, None, []
+                    continue
+                cell_id = prev_row[col] if vmerge not in (None, 'restart') and col < len(prev_row) else None
+                if cell_id is None:
+                    cell_id = len(self.cells)
+                    self.cells.append(TableCell(tc, r, col, cell_index, span))
+                    self.texts.append(''.join(parts).strip())
+                else:
+                    self.cells[cell_id].row_span += 1
+                grid_row.extend([cell_id] * span)
+                cell_ids.append(cell_id)
+                col += span
+                cell_index += 1
+            elif tag == W_TR:
+                if event == 'start':
+                    r += 1
+                    grid_row, cell_ids = [], []
+                    col = cell_index = 0
+                    self.rows.append(elem)
+                    continue
+                self.grid.append(grid_row)
+                self.row_cell_ids.append(cell_ids)
+                prev_row = grid_row
+            elif event == 'end':
+                continue
+            elif tag == W_GRID_SPAN:
+                value = elem.get(W_VAL, '')
+                span = max(int(value), 1) if value.isdigit() else 1
+            elif tag == W_VMERGE:
+                vmerge = elem.get(W_VAL, '')
+            elif tag == W_GRID_BEFORE:
+                value = elem.get(W_VAL, '')
+                col = int(value) if value.isdigit() else 0
+                grid_row.extend([None] * col)
+            elif tag == W_TBL_HEADER:
+                if elem.get(W_VAL, 'true') not in ('false', '0', 'off'):
+                    self.marked_header_rows.add(r)
+
+    def _detect_header_rows(self) -> int:
+        """
+        标题行数：w:tblHeader 标记的前导行；无标记时首行全部非空且列数足够则视为标题，
+        其后紧接的子标题行一并计入（多行标题）
+        """
+        marked = 0
+        while marked in self.marked_header_rows:
+            marked += 1
+        if marked:
+            return marked
+        if len(self.grid) < 2 or self.width < MIN_HEADER_COLUMNS:
+            return 0
+        first = [cell_id for cell_id in dict.fromkeys(self.grid[0]) if cell_id is not None]
+        if len(first) < MIN_HEADER_COLUMNS or not all(self.texts[cell_id] for cell_id in first):
+            return 0
+        rows = 1
+        while rows < len(self.grid) - 1 and self._is_sub_header_row(rows):
+            rows += 1
+        return rows
+
+    def _is_sub_header_row(self, row: int) -> bool:
+        """
+        紧接标题的一行是否为子标题行：只由上方标题的纵向合并续行和非空单元格组成，
+        并且确实从属于上方标题（含纵向合并续行，或上方有横向合并的标题单元格）
+
+        例如"执业或职业资格证明"横跨三列，下一行为"证书名称/级别/证号"，其余列纵向合并
+        """
+        ids = [cell_id for cell_id in dict.fromkeys(self.grid[row]) if cell_id is not None]
+        if not ids:
+            return False
+        continued = False
+        for cell_id in ids:
+            if self.cells[cell_id].row < row:
+                continued = True
+            elif not self.texts[cell_id]:
+                return False
+        if continued:
+            return True
+        above = {cell_id for cell_id in self.grid[row - 1] if cell_id is not None}
+        return any(self.cells[cell_id].col_span > 1 for cell_id in above)
+
+    def text_at(self, row: int, col: int) -> str:
+        """网格位置上的文本（合并单元格返回起始单元格文本）"""
+        cell_id = self.grid[row][col]
+        return '' if cell_id is None else self.texts[cell_id]
+
+    def column_header(self, col: int) -> str:
+        """列标题，多行标题用 "_" 连接"""
+        labels = []
+        for r in range(self.header_rows):
+            text = self.text_at(r, col)
+            if text and text not in labels:
+                labels.append(text)
+        return '_'.join(labels)
+
+    def column_keys(self, col: int) -> Tuple[str, ...]:
+        """
+        列可匹配的记录字段名：完整列标题，多行标题时再加上最下层的子标题
+
+        例如 ("执业或职业资格证明_证书名称", "证书名称")
+        """
+        header = self.column_header(col)
+        leaf = self.text_at(self.header_rows - 1, col) if self.header_rows > 1 else ''
+        return tuple(key for key in dict.fromkeys((header, leaf)) if key)
+
+    def left_labels(self, row: int, col: int) -> List[str]:
+        """同一行中位于 col 左侧的非空文本（合并单元格只计一次）"""
+        labels = []
+        seen = set()
+        for cell_id in self.grid[row][:col]:
+            if cell_id is None or cell_id in seen:
+                continue
+            seen.add(cell_id)
+            if self.texts[cell_id]:
+                labels.append(self.texts[cell_id])
+        return labels
+
+    def labels_for(self, cell_id: int) -> Tuple[str, str, str]:
+        """
+        推断单元格标签
+
+        有标题行时：label 为列标题，full_label 为 "首列标签_列标题"；
+        无标题行时：label 为左侧最近的非空文本，full_label 为左侧全部非空文本的连接
+
+        :return: (label, full_label, header)
+        """
+        cell = self.cells[cell_id]
+        if self.header_rows:
+            header = self.column_header(cell.col)
+            row_label = self.text_at(cell.row, 0) if cell.col > 0 else ''
+            return header, '_'.join(t for t in (row_label, header) if t), header
+        left = self.left_labels(cell.row, cell.col)
+        return (left[-1] if left else ''), '_'.join(left), ''
+
+    def empty_cells(self) -> List[Dict[str, Any]]:
+        """
+        空单元格及其上下文标签（标题行之后、有可用标签的单元格）
+
+        :return: [{table_index, row_index, cell_index, grid_col, col_span, row_span,
+                   label, full_label, header, text}, ...]
+        """
+        results = []
+        for cell_id, cell in enumerate(self.cells):
+            if self.texts[cell_id] or cell.row < self.header_rows:
+                continue
+            label, full_label, header = self.labels_for(cell_id)
+            if not full_label:
+                continue
+            results.append({
+                'table_index': self.index,
+                'row_index': cell.row,
+                'cell_index': cell.cell_index,
+                'grid_col': cell.col,
+                'col_span': cell.col_span,
+                'row_span': cell.row_span,
+                'label': label,
+                'full_label': full_label,
+                'header': header,
+                'text': '',
+            })
+        return results
+
+    def cell_element(self, row: int, cell_index: int):
+        """按 (行号, w:tc序号) 取逻辑单元格的起始 w:tc"""
+        return self.cells[self.row_cell_ids[row][cell_index]].element
+
+    def row_is_blank(self, row: int) -> bool:
+        """该行的单元格全部为空且都起始于本行（不含纵向合并的续行）"""
+        ids = self.row_cell_ids[row]
+        return bool(ids) and all(not self.texts[i] and self.cells[i].row == row for i in ids)
+
+    def row_has_placeholders(self, row: int) -> bool:
+        return any('${' in self.texts[i] for i in self.row_cell_ids[row])
+
+    def detect_row_template(self) -> Optional[int]:
+        """
+        查找可重复的原型行
+
+        优先使用含 ${字段} 占位符的行；否则取标题行之后的第一行空行
+        :return: 行号，未找到时为 None
+        """
+        for r in range(self.header_rows, len(self.rows)):
+            if self.row_has_placeholders(r):
+                return r
+        if self.header_rows:
+            for r in range(self.header_rows, len(self.rows)):
+                if self.row_is_blank(r):
+                    return r
+        return None
+
+
+def _owner_row(tc):
+    parent = tc.getparent()
+    while parent is not None and parent.tag != W_TR:
+        parent = parent.getparent()
+    return parent
+
+
+def _row_tcs(tr) -> List[Any]:
+    """行内的 w:tc（含内容控件包装的单元格，不含嵌套表格）"""
+    return [tc for tc in tr.iter(W_TC) if _owner_row(tc) is tr]
+
+
+def set_cell_text(tc, value: str):
+    """
+    写入单元格文本，沿用第一个 run 的格式；单元格没有 run 时沿用段落标记的格式
+
+    :param tc: w:tc 元素
+    :param value: 新文本
+    """
+    texts = list(tc.iter(W_T))
+    if texts:
+        texts[0].text = value
+        texts[0].set(XML_SPACE, 'preserve')
+        for t in texts[1:]:
+            t.text = ''
+        return
+    p = tc.find(W_P)
+    if p is None:
+        p = etree.SubElement(tc, W_P)
+    r = etree.SubElement(p, W_R)
+    mark_rpr = p.find(f'{W_PPR}/{W_RPR}')
+    if mark_rpr is not None:
+        r.append(copy.deepcopy(mark_rpr))
+    t = etree.SubElement(r, W_T)
+    t.text = value
+    t.set(XML_SPACE, 'preserve')
+
+
+def expand_rows(table: TableModel, records: List[Dict[str, Any]], row: Optional[int] = None,
+                consume_blank_rows: bool = True, numbering: bool = True) -> int:
+    """
+    以原型行为模板，按记录克隆出N行并填入数据，格式与原型行一致
+
+    原型行含 ${字段} 时按占位符替换；否则按列标题匹配记录的键（多行标题也可用子标题）。
+    新行通过 addnext 依次接在前一行之后，插入成本与行数成线性关系。
+    执行后 table 的网格已过期，如需继续使用请重新构建 TableModel。
+
+    :param table: 表格模型
+    :param records: 记录列表，每条记录为 {字段: 值}
+    :param row: 原型行号，默认自动检测
+    :param consume_blank_rows: 是否同时删除原型行之后连续的空行（模板中预留的空白行）
+    :param numbering: 记录中没有"序号"等字段时自动编号
+    :return: 生成的行数
+    """
+    if row is None:
+        row = table.detect_row_template()
+    if row is None:
+        raise ValueError(f"表格 {table.index} 中未找到可重复的原型行")
+
+    proto = table.rows[row]
+    parent = proto.getparent()
+    placeholder_mode = table.row_has_placeholders(row)
+    if placeholder_mode:
+        from fill_engine import merge_split_placeholders
+        merge_split_placeholders(proto)
+        headers = []
+    else:
+        headers = [table.column_keys(table.cells[i].col) for i in table.row_cell_ids[row]]
+
+    # 原型行之后连续的空行一并替换
+    consumed = [proto]
+    if consume_blank_rows:
+        for r in range(row + 1, len(table.rows)):
+            if table.rows[r].getparent() is not parent or not table.row_is_blank(r):
+                break
+            consumed.append(table.rows[r])
+
+    anchor = consumed[-1]
+    for n, record in enumerate(records, 1):
+        clone = copy.deepcopy(proto)
+        for vmerge in list(clone.iter(W_VMERGE)):
+            vmerge.getparent().remove(vmerge)
+
+        def value_of(field: str) -> Optional[str]:
+            if field in record:
+                value = record[field]
+                return '' if value is None else str(value)
+            if numbering and field in SEQUENCE_HEADERS:
+                return str(n)
+            return None
+
+        if placeholder_mode:
+            for t in clone.iter(W_T):
+                if t.text and '${' in t.text:
+                    t.text = PLACEHOLDER_RE.sub(lambda m: value_of(m.group(1)) or '', t.text)
+        else:
+            for tc, keys in zip(_row_tcs(clone), headers):
+                value = next((v for v in map(value_of, keys) if v is not None), None)
+                if value is not None:
+                    set_cell_text(tc, value)
+
+        anchor.addnext(clone)
+        anchor = clone
+
+    for tr in consumed:
+        parent.remove(tr)
+    return len(records)
+
+
+def match_table(tables: List[TableModel], keys: Iterable[str]) -> Optional[TableModel]:
+    """按列标题与记录字段的重合数选择表格（并列时取第一个）"""
+    keys = set(keys)
+    best, best_score = None, 0
+    for table in tables:
+        if not table.header_rows:
+            continue
+        headers = {key for c in range(table.width) for key in table.column_keys(c)}
+        score = len(keys & headers)
+        if score > best_score:
+            best, best_score = table, score
+    return best
+
+
+def load_row_specs(path: str) -> List[Dict[str, Any]]:
+    """
+    读取行扩展数据
+
+    支持三种格式：
+        [{"table_index": 3, "row": 1, "records": [...]}, ...]
+        {"tables": [...]}
+        [{"姓名": "张三", "职务": "项目经理"}, ...]   # 单个表格，按列标题自动匹配
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get('tables', [data])
+    if data and all(isinstance(item, dict) and 'records' not in item for item in data):
+        return [{'records': data}]
+    return data
+
+
+def expand_table_rows(source, specs: List[Dict[str, Any]], output_file=None) -> List[Dict[str, Any]]:
+    """
+    按行扩展数据批量生成表格行
+
+    :param source: document.xml 或 docx 路径
+    :param specs: [{"table_index"?: int, "row"?: int, "records": [...]}, ...]，
+                  省略 table_index 时按列标题匹配
+    :param output_file: 输出路径（.docx 或 .xml），默认覆盖输入
+    :return: 每个表格的处理结果 [{table_index, row, rows}, ...]
+    """
+    tree, tables = load_tables(source)
+    results = []
+    for spec in specs:
+        records = spec.get('records') or []
+        if 'table_index' in spec:
+            table = tables[spec['table_index']]
+        else:
+            keys = {key for record in records for key in record}
+            table = match_table(tables, keys)
+            if table is None:
+                raise ValueError(f"未找到列标题匹配的表格: {sorted(keys)}")
+        row = spec.get('row')
+        if row is None:
+            row = table.detect_row_template()
+        count = expand_rows(table, records, row, spec.get('consume_blank_rows', True))
+        # 重建该表格的模型，后续规格可继续作用于同一表格
+        tables[table.index] = TableModel(table.element, table.index)
+        results.append({'table_index': table.index, 'row': row, 'rows': count})
+
+    output_file = output_file or source
+    if is_docx(output_file):
+        if not is_docx(source):
+            raise ValueError(f"输出为docx时输入也必须是docx: {source}")
+        tmp_file = output_file + '.tmp'
+        replace_part(source, tmp_file, tree)
+        os.replace(tmp_file, output_file)
+    else:
+        tree.write(output_file, encoding='utf-8', xml_declaration=True)
+    return results
+
+
+def iter_tables(root) -> Iterator[TableModel]:
+    """按文档顺序为每个 w:tbl（含嵌套表格）构建模型"""
+    for index, tbl in enumerate(root.iter(W_TBL)):
+        yield TableModel(tbl, index)
+
+
+def load_tables(source) -> Tuple[Any, List[TableModel]]:
+    """
+    解析文档并构建全部表格模型
+
+    :param source: document.xml 或 docx 路径
+    :return: (ElementTree, [TableModel, ...])
+    """
+    tree = parse_xml(source)
+    return tree, list(iter_tables(tree.getroot()))
@@ -0,0 +1,385 @@
+"""
+统一命令行入口
+所有步骤在同一进程内执行，路径全部显式指定，不会等待任何交互输入，适合调度系统运行
+
+用法:
+    python tender_cli.py split template.docx -o pages --workers 4
+    python tender_cli.py analyze pages --llm-config llm_config.json --data fill_data.json
+    python tender_cli.py analyze pages --dry-run -o slots.json
+    python tender_cli.py analyze pages --llm-config llm_config.json --data fill_data.json --batch
+    python tender_cli.py fill template.docx data.json -o filled.docx
+    python tender_cli.py fill template.docx records.jsonl -o out_dir --workers 8
+    python tender_cli.py patch template.docx edits.json -o patched.docx
+    python tender_cli.py rows template.docx staff.json -o output.docx
+    python tender_cli.py merge pages -o merged.xml
+    python tender_cli.py pack merged.xml --template template.docx -o output.docx
+    python tender_cli.py run template.docx --data fill_data.json -o output.docx --metrics-json metrics.json
+    python tender_cli.py run template.docx --data fill_data.json -o output.docx --pipeline --llm-concurrency 8
+    python tender_cli.py index split_pages archive/ --db search_index.db
+    python tender_cli.py search 投标保证金 --db search_index.db --kind cell
+"""
+import argparse
+import glob
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = '.tender_cache'
+
+
+def _page_files(pages_dir: str) -> List[str]:
+    return sorted(glob.glob(os.path.join(pages_dir, 'page_*.xml')),
+                  key=lambda x: int(x.split('page_')[-1].split('.')[0]))
+
+
+def _page_slots(page_file: str) -> Dict[str, Any]:
+    from process_with_llm import XMLPageAnalyzer
+
+    page_num = int(page_file.split('page_')[-1].split('.')[0])
+    return {'page_num': page_num, 'path': page_file, 'slots': XMLPageAnalyzer(page_file).slot_records()}
+
+
+def _cache_dir(args) -> Optional[str]:
+    return None if args.no_cache else args.cache_dir
+
+
+# ---------- 子命令 ----------
+
+def cmd_split(args) -> int:
+    from split_pages import split_word_by_pages
+
+    if args.clean and os.path.isdir(args.output):
+        shutil.rmtree(args.output)
+    # docx 直接流式读取 word/document.xml，不再生成中间文件
+    split_word_by_pages(args.input, args.output, workers=args.workers)
+    print(f"✓ 已分割 {len(_page_files(args.output))} 页 → {args.output}")
+    return 0
+
+
+def cmd_analyze(args) -> int:
+    if args.dry_run:
+        page_files = _page_files(args.pages_dir)
+        if args.workers == 1:
+            pages = [_page_slots(f) for f in page_files]
+        else:
+            with multiprocessing.Pool(args.workers) as pool:
+                pages = pool.map(_page_slots, page_files)
+        total = sum(len(p['slots']) for p in pages)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(pages, f, ensure_ascii=False, indent=2)
+            print(f"✓ {len(pages)} 页, {total} 个字段 → {args.output}")
+        else:
+            print(json.dumps(pages, ensure_ascii=False, indent=2))
+        return 0
+
+    from process_with_llm import process_all_pages_with_llm
+
+    result = process_all_pages_with_llm(args.pages_dir, args.llm_config, args.data,
+                                        args.template_name, telemetry_file=args.telemetry,
+                                        concurrency=args.llm_concurrency, dedupe=not args.no_dedupe,
+                                        batch=args.batch, batch_dir=args.batch_dir)
+    if result is None:
+        return 1
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    return 0 if result['failed'] == 0 else 1
+
+
+def cmd_fill(args) -> int:
+    keep_missing = not args.blank_missing
+    data = None
+    if args.data.lower().endswith('.json'):
+        with open(args.data, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+    if isinstance(data, dict):
+        from fill_engine import load_compiled_template
+
+        start = time.perf_counter()
+        template = load_compiled_template(args.template, _cache_dir(args))
+        template.render_docx(data, args.output, keep_missing, args.compresslevel)
+        print(f"✓ 已生成: {args.output} ({time.perf_counter() - start:.2f}s)")
+        return 0
+
+    from bulk_fill import bulk_fill
+
+    bulk_fill(args.template, args.data, args.output,
+              workers=args.workers,
+              name_field=args.name_field,
+              keep_missing=keep_missing,
+              compresslevel=args.compresslevel,
+              cache_dir=_cache_dir(args))
+    return 0
+
+
+def cmd_patch(args) -> int:
+    from stream_patcher import load_edits, patch_docx
+
+    stats = patch_docx(args.template, load_edits(args.edits), args.output)
+    print(f"✓ 已生成: {args.output} ({stats['seconds']}s, {stats['applied']}/{stats['edits']} 处编辑已应用)")
+    for edit in stats['unmatched'][:10]:
+        print(f"  ⚠️  未匹配: {json.dumps(edit, ensure_ascii=False)}")
+    return 0 if not stats['unmatched'] or args.allow_unmatched else 2
+
+
+def cmd_rows(args) -> int:
+    from table_model import expand_table_rows, load_row_specs
+
+    start = time.perf_counter()
+    results = expand_table_rows(args.template, load_row_specs(args.rows), args.output)
+    for r in results:
+        print(f"  表格 {r['table_index']}：原型行 {r['row']} → {r['rows']} 行")
+    print(f"✓ 已生成: {args.output} ({time.perf_counter() - start:.2f}s)")
+    return 0
+
+
+def cmd_index(args) -> int:
+    from search_index import run_index
+
+    return run_index(args.db, args.paths, args.prune)
+
+
+def cmd_search(args) -> int:
+    from search_index import run_search
+
+    return run_search(args.db, args.query, args.kind, args.limit, args.slots, args.path)
+
+
+def cmd_merge(args) -> int:
+    from merge_pages import merge_pages
+
+    return 0 if merge_pages(args.pages_dir, args.output) else 1
+
+
+def cmd_pack(args) -> int:
+    from xml_to_docx import xml_to_docx
+
+    return 0 if xml_to_docx(args.xml, args.output, args.template) else 1
+
+
+def _run_pipeline(args, metrics) -> int:
+    """流水线模式：各阶段同时运行，不落盘中间文件"""
+    from pipeline import run_pipeline
+
+    with metrics.stage('pipeline') as record:
+        try:
+            stats = run_pipeline(args.template, args.output, args.llm_config, args.data, args.template_name,
+                                 concurrency=args.llm_concurrency, queue_size=args.queue_size,
+                                 dedupe=not args.no_dedupe, skip_llm=args.skip_llm,
+                                 allow_failed_pages=args.allow_failed_pages,
+                                 metrics=metrics, telemetry_file=args.llm_telemetry)
+        except FileNotFoundError as e:
+            print(f"❌ {e}")
+            stats = {'ok': False}
+        if not stats['ok']:
+            record['status'] = 'failed'
+        for error in stats.get('errors', []):
+            print(f"  ❌ {error}")
+
+    if args.metrics_json:
+        print(f"✓ 性能指标已保存: {metrics.write_json(args.metrics_json)}")
+    if args.metrics_prom:
+        print(f"✓ Prometheus 指标已保存: {metrics.write_prometheus(args.metrics_prom)}")
+    if stats['ok']:
+        print(f"\n✓ 完成: {args.output} ({metrics.summary()['wall_s']:.2f}s)")
+        return 0
+    print("\n❌ 流程失败")
+    return 1
+
+
+def cmd_run(args) -> int:
+    """完整流程：提取 → 分割 → 大模型处理 → 合并 → 打包"""
+    from workflow_metrics import WorkflowMetrics
+
+    metrics = WorkflowMetrics(run_name=args.run_name, trace_memory=args.tracemalloc)
+    if args.pipeline:
+        return _run_pipeline(args, metrics)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='tender_run_')
+    pages_dir = os.path.join(workdir, 'pages')
+    merged_xml = os.path.join(workdir, 'merged.xml')
+    if os.path.isdir(pages_dir):
+        shutil.rmtree(pages_dir)
+    os.makedirs(workdir, exist_ok=True)
+
+    ok = True
+    try:
+        from split_pages import split_word_by_pages
+        with metrics.stage('split'):
+            split_word_by_pages(args.template, pages_dir, workers=args.workers, metrics=metrics)
+
+        if args.skip_llm:
+            print("⚠️  已跳过LLM处理 (--skip-llm)")
+        else:
+            from process_with_llm import process_all_pages_with_llm
+            with metrics.stage('llm') as record:
+                result = process_all_pages_with_llm(pages_dir, args.llm_config, args.data, args.template_name,
+                                                    metrics=metrics, telemetry_file=args.llm_telemetry,
+                                                    concurrency=args.llm_concurrency, dedupe=not args.no_dedupe)
+                if result is None or (result['failed'] and not args.allow_failed_pages):
+                    record['status'] = 'failed'
+                    ok = False
+
+        if ok:
+            from merge_pages import merge_pages
+            from xml_to_docx import xml_to_docx
+            with metrics.stage('merge'):
+                merge_pages(pages_dir, merged_xml, metrics=metrics)
+            with metrics.stage('pack') as record:
+                if not xml_to_docx(merged_xml, args.output, args.template):
+                    record['status'] = 'failed'
+                    ok = False
+    finally:
+        if not args.workdir and not args.keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+        elif ok:
+            print(f"  中间文件: {workdir}")
+
+        if args.metrics_json:
+            print(f"✓ 性能指标已保存: {metrics.write_json(args.metrics_json)}")
+        if args.metrics_prom:
+            print(f"✓ Prometheus 指标已保存: {metrics.write_prometheus(args.metrics_prom)}")
+
+    if ok:
+        print(f"\n✓ 完成: {args.output} ({metrics.summary()['wall_s']:.2f}s)")
+    else:
+        print("\n❌ 流程失败")
+    return 0 if ok else 1
+
+
+# ---------- 参数 ----------
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='招标文件智能填写工具')
+    parser.add_argument('--log-level', default='WARNING', help='日志级别 (DEBUG/INFO/WARNING)')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    def add_llm_args(p):
+        p.add_argument('--llm-config', default='llm_config.json', help='LLM配置文件')
+        p.add_argument('--data', default='fill_data.json', help='填充数据文件')
+        p.add_argument('--template-name', default='tender_form', help='提示词模板')
+        p.add_argument('--llm-concurrency', type=int, default=1, help='同时处理的页面数')
+        p.add_argument('--no-dedupe', action='store_true', help='不合并相同的大模型请求')
+
+    p = sub.add_parser('split', help='按页分割文档')
+    p.add_argument('input', help='Word文件 (.docx) 或 document.xml')
+    p.add_argument('-o', '--output', default='split_pages', help='页面输出目录')
+    p.add_argument('-w', '--workers', type=int, default=1, help='进程数，0 表示CPU核数')
+    p.add_argument('--clean', action='store_true', help='先清空输出目录')
+    p.set_defaults(func=cmd_split)
+
+    p = sub.add_parser('analyze', help='分析页面并调用大模型填写')
+    p.add_argument('pages_dir', help='页面目录')
+    add_llm_args(p)
+    p.add_argument('--telemetry', default=None, help='LLM调用遥测导出路径 (.json / .prom)')
+    p.add_argument('--dry-run', action='store_true', help='只列出待填字段，不调用大模型')
+    p.add_argument('--batch', action='store_true', help='通过服务商批量接口离线处理（openai / claude）')
+    p.add_argument('--batch-dir', default=None, help='批量文件目录，默认 <页面目录>/.llm_batch')
+    p.add_argument('-w', '--workers', type=int, default=1, help='--dry-run 时的进程数')
+    p.add_argument('-o', '--output', default=None, help='结果JSON路径')
+    p.set_defaults(func=cmd_analyze)
+
+    p = sub.add_parser('fill', help='按占位符填充模板（单个JSON对象或批量记录）')
+    p.add_argument('template', help='模板Word文件')
+    p.add_argument('data', help='JSON对象，或 .jsonl/.csv/JSON数组 批量记录')
+    p.add_argument('-o', '--output', required=True, help='输出docx；批量时为目录或 .zip')
+    p.add_argument('-w', '--workers', type=int, default=None, help='批量模式进程数（默认CPU核数）')
+    p.add_argument('--name-field', default=None, help='批量模式下用于命名输出文件的字段')
+    p.add_argument('--blank-missing', action='store_true', help='缺少数据的占位符置空')
+    p.add_argument('--compresslevel', type=int, default=None, help='docx压缩级别 1-9')
+    p.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help='模板编译结果缓存目录')
+    p.add_argument('--no-cache', action='store_true', help='不使用模板缓存')
+    p.set_defaults(func=cmd_fill)
+
+    p = sub.add_parser('patch', help='按编辑列表单遍流式修改文档')
+    p.add_argument('template', help='模板Word文件')
+    p.add_argument('edits', help='编辑列表JSON（字段地址 → 新文本）')
+    p.add_argument('-o', '--output', required=True, help='输出docx')
+    p.add_argument('--allow-unmatched', action='store_true', help='存在未匹配的编辑时仍返回0')
+    p.set_defaults(func=cmd_patch)
+
+    p = sub.add_parser('rows', help='按原型行批量生成列表表格的数据行（人员、设备、业绩等）')
+    p.add_argument('template', help='模板Word文件或document.xml')
+    p.add_argument('rows', help='行数据JSON（记录列表，或 [{table_index, row, records}, ...]）')
+    p.add_argument('-o', '--output', required=True, help='输出docx或XML')
+    p.set_defaults(func=cmd_rows)
+
+    p = sub.add_parser('index', help='建立全文检索索引（页面目录、Word文件或归档目录，增量更新）')
+    p.add_argument('paths', nargs='+', help='页面目录 / .docx / document.xml / 归档目录')
+    p.add_argument('--db', default='search_index.db', help='索引数据库路径')
+    p.add_argument('--prune', action='store_true', help='清理已删除的文件和无引用的内容')
+    p.set_defaults(func=cmd_index)
+
+    p = sub.add_parser('search', help='检索条款或字段，返回文档、页码和段落/单元格位置')
+    p.add_argument('query', help='检索词，空格分隔的多个词须同时出现')
+    p.add_argument('--db', default='search_index.db', help='索引数据库路径')
+    p.add_argument('--kind', action='append', choices=('page', 'paragraph', 'cell'), default=None,
+                   help='检索粒度，可重复指定（默认段落和单元格）')
+    p.add_argument('--slots', action='store_true', help='只返回有待填字段的位置（✎）')
+    p.add_argument('--path', default=None, help='只检索该路径下的来源')
+    p.add_argument('-n', '--limit', type=int, default=20, help='最多返回条数')
+    p.set_defaults(func=cmd_search)
+
+    p = sub.add_parser('merge', help='合并页面')
+    p.add_argument('pages_dir', help='页面目录')
+    p.add_argument('-o', '--output', default='merged_document.xml', help='合并后的XML')
+    p.set_defaults(func=cmd_merge)
+
+    p = sub.add_parser('pack', help='将XML打包为Word文档')
+    p.add_argument('xml', help='document.xml')
+    p.add_argument('--template', required=True, help='提供其余部件的原始Word文件')
+    p.add_argument('-o', '--output', required=True, help='输出docx')
+    p.set_defaults(func=cmd_pack)
+
+    p = sub.add_parser('run', help='完整流程：分割 → 大模型处理 → 合并 → 打包')
+    p.add_argument('template', help='原始Word文件')
+    p.add_argument('-o', '--output', required=True, help='输出docx')
+    add_llm_args(p)
+    p.add_argument('-w', '--workers', type=int, default=1, help='分割进程数，0 表示CPU核数')
+    p.add_argument('--workdir', default=None, help='中间文件目录（默认临时目录，结束后删除）')
+    p.add_argument('--keep-workdir', action='store_true', help='保留临时中间文件')
+    p.add_argument('--skip-llm', action='store_true', help='跳过大模型处理')
+    p.add_argument('--allow-failed-pages', action='store_true', help='部分页面处理失败时仍继续合并输出')
+    p.add_argument('--pipeline', action='store_true',
+                   help='流水线模式：分割、大模型、合并、打包同时进行，每页就绪即进入下一阶段')
+    p.add_argument('--queue-size', type=int, default=8, help='流水线模式下阶段间队列容量')
+    p.add_argument('--run-name', default='tender_workflow', help='指标中的运行名称')
+    p.add_argument('--metrics-json', default=None, help='性能指标JSON输出路径')
+    p.add_argument('--metrics-prom', default=None, help='Prometheus textfile 输出路径')
+    p.add_argument('--tracemalloc', action='store_true', help='统计各阶段Python内存分配')
+    p.add_argument('--llm-telemetry', default=None, help='LLM调用遥测导出路径 (.json / .prom)')
+    p.set_defaults(func=cmd_run)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=getattr(logging, args.log_level.upper(), logging.WARNING),
+                        format='%(message)s', stream=sys.stdout)
+    if getattr(args, 'workers', None) == 0:
+        args.workers = None
+
+    try:
+        return args.func(args)
+    except KeyboardInterrupt:
+        print("\n⚠️  用户中止")
+        return 130
+    except Exception as e:
+        logger.debug("命令执行异常", exc_info=True)
+        print(f"❌ {args.command} 失败: {e}")
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
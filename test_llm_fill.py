@@ -13,6 +13,7 @@ from datetime import datetime
 from llm_connector import LLMConnector, load_config_from_file
 from prompt_library import PromptLibrary
 from process_with_llm import XMLPageAnalyzer, LLMPageProcessor
+from data_index import flatten, page_queries, select_page_data
 from merge_pages import merge_pages
 from xml_to_docx import xml_to_docx
 
@@ -147,8 +148,11 @@ def main():
     with open('split_pages/page_8.xml', 'r', encoding='utf-8') as f:
         page_8_xml_content = f.read()
     
-    # Prepare data for LLM
-    data_str = json.dumps(TEST_DATA, ensure_ascii=False, indent=2)
+    # Prepare data for LLM: only the TEST_DATA keys relevant to each page's fields
+    page_2_data = select_page_data(TEST_DATA, page_queries(XMLPageAnalyzer('split_pages/page_2.xml').get_page_info()))
+    page_8_data = select_page_data(TEST_DATA, page_queries(XMLPageAnalyzer('split_pages/page_8.xml').get_page_info()))
+    print(f"Data keys: page_2 {len(flatten(page_2_data))}, page_8 {len(flatten(page_8_data))}, "
+          f"total {len(flatten(TEST_DATA))}")
     global_data_str = json.dumps(GLOBAL_DATA, ensure_ascii=False, indent=2)
     
     if llm_config.api_key == 'sk-your-api-key-here' or not llm_config.api_key:
@@ -174,7 +178,7 @@ Below is the XML content of page 2 (Business Section):
 
 Below is the data you should use to fill the XML:
 <PROVIDED_DATA>
-{data_str}
+{json.dumps(page_2_data, ensure_ascii=False, indent=2)}
 </PROVIDED_DATA>
 
 Global data:
@@ -214,7 +218,7 @@ Below is the XML content of page 8 (Enterprise Information Table):
 
 Below is the data you should use to fill the XML:
 <PROVIDED_DATA>
-{data_str}
+{json.dumps(page_8_data, ensure_ascii=False, indent=2)}
 </PROVIDED_DATA>
 
 Global data:
@@ -0,0 +1,27 @@
+from data_index import MIN_KEYS_TO_FILTER, DataIndex, select_page_data
+
+DATA = {
+    'company': {'bidder': 'ACME', 'legalRepresentative': '张三', 'phone': '010-1234'},
+    'bank': {'bankName': '工商银行', 'bankAccountNo': '6222'},
+    **{f'extra{i}': f'值{i}' for i in range(MIN_KEYS_TO_FILTER)},
+}
+
+
+def test_select_keeps_only_matching_keys():
+    selected = DataIndex(DATA).select(['投标人名称', '开户银行'], top_k=1)
+    assert selected == {'company': {'bidder': 'ACME'}, 'bank': {'bankName': '工商银行'}}
+
+
+def test_any_query_without_hits_returns_full_data():
+    # "质保期" 不在任何键或值中：只按另一个字段筛选会把它需要的数据漏掉
+    assert DataIndex(DATA).select(['投标人名称', '质保期'], top_k=1) is DATA
+
+
+def test_empty_queries_select_nothing():
+    assert DataIndex(DATA).select(['', ' ']) == {}
+
+
+def test_small_profiles_are_never_filtered():
+    small = {'company': DATA['company']}
+    assert select_page_data(small, ['投标人名称'], top_k=1) is small
+    assert select_page_data(DATA, ['投标人名称'], top_k=1) == {'company': {'bidder': 'ACME'}}
@@ -0,0 +1,172 @@
+import asyncio
+import http.client
+import io
+import json
+import os
+import socket
+import threading
+import time
+import zipfile
+
+import pytest
+
+import fill_service
+from fill_service import AdmissionGate, FillService, ServiceError, TemplateCache
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class RunningService:
+    """在后台线程的事件循环中运行 FillService"""
+
+    def __init__(self, service: FillService):
+        self.service = service
+        self.loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        async def main():
+            ready = asyncio.Event()
+            self.task = asyncio.ensure_future(service.serve('127.0.0.1', 0, ready))
+            await ready.wait()
+            started.set()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+
+        self.thread = threading.Thread(target=self.loop.run_until_complete, args=(main(),), daemon=True)
+        self.thread.start()
+        assert started.wait(5)
+        self.port = service.port
+
+    def request(self, method: str, path: str, body=None):
+        conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=10)
+        payload = json.dumps(body).encode('utf-8') if isinstance(body, dict) else body
+        conn.request(method, path, body=payload)
+        response = conn.getresponse()
+        data = response.read()
+        conn.close()
+        return response.status, dict(response.getheaders()), data
+
+    def raw(self, request: bytes) -> bytes:
+        with socket.create_connection(('127.0.0.1', self.port), timeout=5) as sock:
+            sock.sendall(request)
+            chunks = []
+            while chunk := sock.recv(65536):
+                chunks.append(chunk)
+        return b''.join(chunks)
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.task.cancel)
+        self.thread.join(5)
+        self.service.executor.shutdown(wait=False)
+        self.service.llm_executor.shutdown(wait=False)
+
+
+@pytest.fixture
+def running():
+    services = []
+
+    def start(**options) -> RunningService:
+        options.setdefault('llm_config_file', None)
+        options.setdefault('template_root', ROOT)
+        service = RunningService(FillService(**options))
+        services.append(service)
+        return service
+
+    yield start
+    for service in services:
+        service.stop()
+
+
+def test_fill_returns_docx_and_reuses_compiled_template(running):
+    server = running()
+    status, headers, body = server.request('POST', '/fill', {'template_path': 'template.docx', 'data': {}})
+    assert status == 200 and headers['Content-Type'] == fill_service.DOCX_CONTENT_TYPE
+    assert 'word/document.xml' in zipfile.ZipFile(io.BytesIO(body)).namelist()
+
+    digest = headers['X-Template-SHA256']
+    status, _, _ = server.request('POST', '/fill', {'template_sha256': digest})
+    assert status == 200
+    health = json.loads(server.request('GET', '/health')[2])
+    assert health['template_cache'] == {'size': 1, 'max_size': 16, 'hits': 1, 'misses': 1}
+
+
+@pytest.mark.parametrize('method, path, body, status', [
+    ('POST', '/fill', b'{not json', 400),
+    ('POST', '/fill', b'[1, 2]', 400),
+    ('POST', '/fill', {'data': {}}, 400),
+    ('POST', '/fill', {'template_path': 'template.docx', 'data': [1]}, 400),
+    ('POST', '/fill', {'template_path': '../etc/passwd'}, 403),
+    ('POST', '/fill', {'template_path': 'missing.docx'}, 404),
+    ('POST', '/fill', {'template_sha256': '0' * 64}, 404),
+    ('POST', '/fill', {'template_base64': '%%%'}, 400),
+    ('GET', '/fill', None, 405),
+    ('GET', '/nothing', None, 404),
+    ('POST', '/analyze', {'template_path': 'template.docx', 'use_llm': True}, 503),
+])
+def test_bad_requests_get_json_errors(running, method, path, body, status):
+    got, headers, payload = running().request(method, path, body)
+    assert got == status and headers['Content-Type'] == 'application/json'
+    assert json.loads(payload)['error']
+
+
+@pytest.mark.parametrize('length', [b'abc', b'-5'])
+def test_invalid_content_length_is_rejected(running, length):
+    response = running().raw(b'POST /fill HTTP/1.1\r\nHost: x\r\nContent-Length: ' + length + b'\r\n\r\n{}')
+    assert response.startswith(b'HTTP/1.1 400 ')
+    assert b'Connection: close' in response
+
+
+def test_overloaded_service_answers_503_with_retry_after(running):
+    server = running(workers=1, max_queue=0)
+    service = server.service
+    release = asyncio.Event()
+
+    async def slow_fill(body):
+        async with service.fill_gate.admit():
+            await release.wait()
+        return 200, 'application/json', b'{}', {}
+
+    service.handle_fill = slow_fill
+    first = threading.Thread(target=server.request, args=('POST', '/fill', {}))
+    first.start()
+    deadline = time.monotonic() + 5
+    while service.fill_gate.active == 0 and time.monotonic() < deadline:
+        time.sleep(0.005)
+    status, headers, payload = server.request('POST', '/fill', {})
+    server.loop.call_soon_threadsafe(release.set)
+    first.join(5)
+
+    assert status == 503 and headers['Retry-After'] == '1'
+    assert service.fill_gate.rejected == 1
+    metrics = server.request('GET', '/metrics')[2].decode('utf-8')
+    assert 'fill_service_fill_rejected_total{gate="fill"} 1' in metrics
+
+
+def test_gate_queue_timeout():
+    async def scenario():
+        gate = AdmissionGate('fill', 1, 4, queue_timeout=0.01)
+        async with gate.admit():
+            with pytest.raises(ServiceError) as info:
+                async with gate.admit():
+                    pass
+        return info.value
+
+    error = asyncio.run(scenario())
+    assert error.status == 503 and error.headers == {'Retry-After': '2'}
+
+
+def test_template_cache_evicts_least_recently_used(monkeypatch):
+    monkeypatch.setattr(fill_service, 'CompiledTemplate', lambda data: data.decode())
+    cache = TemplateCache(max_size=2)
+
+    async def scenario():
+        for digest in ('a', 'b'):
+            await cache.get_or_compile(digest, digest.encode(), asyncio.get_running_loop(), None)
+        assert cache.get('a') == 'a'
+        await cache.get_or_compile('c', b'c', asyncio.get_running_loop(), None)
+
+    asyncio.run(scenario())
+    assert cache.get('b') is None and cache.get('a') == 'a' and cache.get('c') == 'c'
+    assert cache.to_dict() == {'size': 2, 'max_size': 2, 'hits': 3, 'misses': 3}
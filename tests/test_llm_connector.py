@@ -0,0 +1,60 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from llm_connector import LLMConfig, LLMConnector, LLMProvider, load_config_from_file
+
+BODIES = {
+    '/json/chat/completions': ('application/json', b'{"choices": [oops'),
+    '/sse/chat/completions': ('text/event-stream', b'data: {"choices": [{"delta": {"content": "a"}}]}\n\ndata: {broken\n\n'),
+    '/usage/chat/completions': ('application/json', b'{"choices": [], "usage": {"prompt_tokens": "n/a"}}'),
+}
+
+
+class BrokenHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('content-length', 0)))
+        content_type, body = BODIES[self.path]
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def broken_url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), BrokenHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+
+
+@pytest.mark.parametrize('path, stream', [('json', False), ('sse', True), ('usage', False)])
+def test_unparseable_response_is_recorded_as_error(broken_url, path, stream):
+    llm = LLMConnector(LLMConfig(provider=LLMProvider.OPENAI, api_key='k', api_url=f'{broken_url}/{path}',
+                                 model='m', stream=stream))
+    with pytest.raises(Exception):
+        llm.call('prompt')
+    assert llm.telemetry.totals()['calls'] == 1 and llm.telemetry.totals()['errors'] == 1
+    record = llm.telemetry.records[0]
+    assert record.status == 'error' and record.error and record.http_status == 200
+
+
+@pytest.mark.parametrize('settings, expected', [
+    ({}, None),
+    ({'json_mode': 'json_object'}, 'json_object'),
+    ({'json_mode': 'json_schema'}, 'json_schema'),
+])
+def test_json_mode_is_opt_in(tmp_path, settings, expected):
+    config_file = tmp_path / 'llm_config.json'
+    config_file.write_text(json.dumps({'provider': 'openai', 'api_key': 'k', 'api_url': 'http://unused',
+                                       'model': 'm', **settings}), encoding='utf-8')
+    llm = LLMConnector(load_config_from_file(str(config_file)))
+    body = llm.batch_request('1', 'prompt', schema={'type': 'object'})['body']
+    assert body.get('response_format', {}).get('type') == expected
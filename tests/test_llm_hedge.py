@@ -0,0 +1,100 @@
+import threading
+import time
+
+import pytest
+
+from llm_connector import LLMConfig, LLMConnector, LLMProvider, prompt_estimate
+from llm_hedge import RequestCancelled, check_cancelled, hedged_call
+from llm_pool import LLMPool
+from llm_telemetry import CallRecord, LatencyModel
+from mock_llm_server import MockSettings, start_mock_server
+
+PROMPT = '投标人名称：${投标人名称}'
+
+
+@pytest.fixture(scope='module')
+def slow_url():
+    server = start_mock_server(MockSettings(latency='fixed:0.3', seed=1))
+    yield f'{server.url}/v1'
+    server.shutdown()
+
+
+def warm_up(llm: LLMConnector, model: str, latency: float = 0.01):
+    """写入足够的历史样本，使对冲延迟约为 latency"""
+    for _ in range(llm.telemetry.latency.min_samples):
+        llm.telemetry.record(CallRecord(provider='openai', model=model, latency_s=latency,
+                                        completion_tokens=100, prompt_estimate=prompt_estimate(PROMPT, 'sys')))
+
+
+def pooled(url: str, entries) -> LLMConnector:
+    config = LLMConfig(provider=LLMProvider.OPENAI, api_key='k', api_url=url, model='mock-model',
+                       timeout=5, hedge=True)
+    config.pool = LLMPool.from_config(entries)
+    return LLMConnector(config)
+
+
+def test_backup_wins_and_primary_is_cancelled():
+    cancelled = threading.Event()
+
+    def primary():
+        for _ in range(100):
+            try:
+                check_cancelled()
+            except RequestCancelled:
+                cancelled.set()
+                raise
+            time.sleep(0.01)
+        return 'primary'
+
+    result, hedged, backup_won = hedged_call(primary, lambda: 'backup', 0.02)
+    assert (result, hedged, backup_won) == ('backup', True, True)
+    assert cancelled.wait(1)
+
+
+def test_no_hedge_without_history():
+    assert hedged_call(lambda: 'primary', lambda: 'backup', None) == ('primary', False, False)
+    assert hedged_call(lambda: 'primary', lambda: 'backup', lambda: None) == ('primary', False, False)
+
+
+def test_failed_primary_falls_back_to_backup():
+    def primary():
+        time.sleep(0.05)
+        raise RuntimeError('primary down')
+
+    assert hedged_call(primary, lambda: 'backup', 0.01) == ('backup', True, True)
+
+
+def test_one_entry_pool_with_hedging_returns_primary_result(slow_url):
+    llm = pooled(slow_url, [{'name': 'only'}])
+    warm_up(llm, 'mock-model')
+    assert llm.call(PROMPT, 'sys')
+    assert llm.telemetry.hedges == {'hedged': 1, 'backup_won': 0}
+    assert llm.config.pool.summary()[0]['calls'] == 1
+
+
+def test_hedge_uses_entry_model_and_goes_to_another_entry(slow_url):
+    # 账号覆盖了模型名：对冲延迟按账号的模型查询
+    llm = pooled(slow_url, [{'name': 'a', 'model': 'entry-model'}, {'name': 'b', 'model': 'entry-model'}])
+    warm_up(llm, 'entry-model')
+    assert llm.call(PROMPT, 'sys')
+    assert llm.telemetry.hedges['hedged'] == 1
+    time.sleep(0.5)
+    assert sorted(s['calls'] for s in llm.config.pool.summary()) == [1, 1]
+
+
+def test_latency_model_buckets_by_estimate():
+    model = LatencyModel(min_samples=3)
+    for _ in range(3):
+        model.observe(CallRecord(provider='p', model='m', latency_s=1.0, prompt_tokens=5000, prompt_estimate=100))
+        model.observe(CallRecord(provider='p', model='m', latency_s=9.0, prompt_tokens=5000, prompt_estimate=4000))
+    assert model.hedge_delay('p', 'm', 100) == 1.0
+    assert model.hedge_delay('p', 'm', 4000) == 9.0
+    assert model.hedge_delay('p', 'other', 100) is None
+
+
+def test_adaptive_timeout_from_history():
+    model = LatencyModel(min_samples=3)
+    for _ in range(3):
+        # 流式：首字节 0.5 秒，之后 100 token/秒
+        model.observe(CallRecord(provider='p', model='m', latency_s=2.5, ttfb_s=0.5, completion_tokens=200))
+    assert model.timeout_for('p', 'm', max_tokens=1000, margin=1.0) == pytest.approx(10.5)
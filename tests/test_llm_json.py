@@ -0,0 +1,58 @@
+import pytest
+
+from llm_json import LLMJSONError, parse_json, repair_json, validate
+
+OBJECT = {'type': 'object', 'required': ['updates'],
+          'properties': {'updates': {'type': 'array', 'items': {'type': 'object', 'required': ['new_text']}}}}
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('{"a": 1}', {'a': 1}),
+    ('说明如下：\n```json\n{"a": 1}\n```\n以上', {'a': 1}),
+    ('结果是 {"a": 1} 请查收', {'a': 1}),
+    ('{"a": [1, 2,], "b": 3,}', {'a': [1, 2], 'b': 3}),
+    ('{"a": 1, // 注释\n /* 块注释 */ "b": 2}', {'a': 1, 'b': 2}),
+    ("{'a': 'it\\'s'}", {'a': "it's"}),
+    ('{"a": True, "b": None, "c": False}', {'a': True, 'b': None, 'c': False}),
+    ('{a: 1, name: "x"}', {'a': 1, 'name': 'x'}),
+    ('{"a": "第一行\n第二行"}', {'a': '第一行\n第二行'}),
+    ('{"a": 1, 备注: 无}', {'a': 1, '备注': '无'}),
+])
+def test_repairs(text, expected):
+    assert parse_json(text) == expected
+
+
+def test_unescaped_inner_quotes_raise_llm_json_error():
+    # 字符串内未转义的双引号无法可靠还原：报告为解析失败，而不是其他异常
+    with pytest.raises(LLMJSONError):
+        parse_json('{"a": "他说"你好""}')
+
+
+def test_truncated_output_keeps_complete_items():
+    text = '{"updates": [{"new_text": "ACME"}, {"new_text": "张三"}, {"new_te'
+    assert parse_json(text, OBJECT) == {'updates': [{'new_text': 'ACME'}, {'new_text': '张三'}]}
+
+
+def test_truncated_string_and_brackets_are_closed():
+    assert repair_json('{"a": [1, {"b": "未完') == '{"a": [1, {"b": "未完"}]}'
+    assert repair_json('{"a":') == '{"a":null}'
+
+
+def test_schema_type_picks_array_over_object():
+    assert parse_json('说明 {"x": 1} 数据 [1, 2]', {'type': 'array'}) == [1, 2]
+
+
+def test_wrong_top_level_type_and_garbage_raise():
+    with pytest.raises(LLMJSONError):
+        parse_json('[1, 2]', {'type': 'object'})
+    with pytest.raises(LLMJSONError) as info:
+        parse_json('抱歉，无法完成')
+    assert info.value.text == '抱歉，无法完成'
+    with pytest.raises(LLMJSONError):
+        parse_json(None)
+
+
+def test_validate_reports_missing_and_mistyped_fields():
+    assert validate({'updates': [{'new_text': 'x'}]}, OBJECT) == []
+    assert validate({'updates': [{}, 'x']}, OBJECT) == [
+        '$.updates[0].new_text: 缺少必填字段', '$.updates[1]: 应为 object，实际为 str']
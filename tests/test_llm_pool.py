@@ -0,0 +1,81 @@
+import time
+
+import pytest
+
+from llm_connector import LLMConfig, LLMConnector, LLMProvider
+from llm_pool import CLOSED, HALF_OPEN, OPEN, LLMPool, PoolExhaustedError
+from mock_llm_server import MockSettings, start_mock_server
+
+DEAD_URL = 'http://127.0.0.1:9/v1'
+
+
+@pytest.fixture(scope='module')
+def mock_url():
+    server = start_mock_server(MockSettings(latency='fixed:0.01', seed=1))
+    yield f'{server.url}/v1'
+    server.shutdown()
+
+
+def connector(url: str, entries, **pool_settings) -> LLMConnector:
+    config = LLMConfig(provider=LLMProvider.OPENAI, api_key='k', api_url=url, model='mock-model', timeout=5)
+    config.pool = LLMPool.from_config({'entries': entries, **pool_settings})
+    return LLMConnector(config)
+
+
+def test_breaker_opens_then_half_open_probe_closes_it():
+    pool = LLMPool.from_config({'entries': [{'name': 'a'}], 'failure_threshold': 2, 'cooldown': 0.05})
+    for _ in range(2):
+        pool.release(pool.acquire(), ok=False)
+    entry = pool.entries[0]
+    assert entry.state == OPEN and entry.ejections == 1
+
+    # 冷却期内没有可用账号
+    pool.max_wait = 0
+    with pytest.raises(PoolExhaustedError):
+        pool.acquire()
+
+    time.sleep(0.06)
+    pool.max_wait = 1
+    probe = pool.acquire()
+    assert probe.state == HALF_OPEN and probe.probing
+    pool.release(probe, ok=True)
+    assert entry.state == CLOSED and entry.failures == 0 and entry.cooldown == 0
+
+
+def test_failed_probe_reopens_with_doubled_cooldown():
+    pool = LLMPool.from_config({'entries': [{'name': 'a'}], 'failure_threshold': 1, 'cooldown': 0.05})
+    pool.release(pool.acquire(), ok=False)
+    time.sleep(0.06)
+    pool.release(pool.acquire(), ok=False)
+    entry = pool.entries[0]
+    assert entry.state == OPEN and entry.cooldown == pytest.approx(0.1) and entry.ejections == 2
+
+
+def test_cancelled_call_does_not_count_as_failure():
+    pool = LLMPool.from_config({'entries': [{'name': 'a'}], 'failure_threshold': 1})
+    pool.release(pool.acquire(), ok=None)
+    assert pool.entries[0].state == CLOSED and pool.entries[0].errors == 0
+
+
+def test_rpm_limit_spreads_requests():
+    pool = LLMPool.from_config([{'name': 'a', 'rpm': 1}, {'name': 'b', 'rpm': 1}])
+    pool.max_wait = 0
+    names = {pool.acquire().name, pool.acquire().name}
+    assert names == {'a', 'b'}
+    with pytest.raises(PoolExhaustedError):
+        pool.acquire()
+
+
+def test_failover_skips_dead_entry(mock_url):
+    llm = connector(mock_url, [{'name': 'dead', 'api_url': DEAD_URL}, {'name': 'live'}])
+    for _ in range(3):
+        assert llm.call('投标人名称：${投标人名称}', 'sys')
+    stats = {s['name']: s for s in llm.config.pool.summary()}
+    assert stats['live']['calls'] == 3
+    assert stats['dead']['errors'] >= 1
+
+
+def test_all_entries_already_tried_raises_pool_exhausted(mock_url):
+    llm = connector(mock_url, [{'name': 'only'}])
+    with pytest.raises(PoolExhaustedError):
+        llm._call_pool('prompt', tried={'only'})
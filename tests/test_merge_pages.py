@@ -0,0 +1,26 @@
+import os
+
+from lxml import etree
+
+from merge_pages import merge_pages
+from parse_docx import parse_xml
+from split_pages import split_word_by_pages
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+
+def body_tags(tree):
+    return [child.tag for child in tree.getroot().find(W + 'body')]
+
+
+def test_split_then_merge_keeps_tables_and_final_sectpr(tmp_path):
+    template = os.path.join(ROOT, 'template.docx')
+    pages = str(tmp_path / 'pages')
+    split_word_by_pages(template, pages)
+    merged = merge_pages(pages, str(tmp_path / 'merged.xml'))
+
+    original, result = body_tags(parse_xml(template)), body_tags(etree.parse(merged))
+    assert result == original
+    assert result.count(W + 'tbl') == 13
+    assert result[-1] == W + 'sectPr'
@@ -0,0 +1,45 @@
+import glob
+import os
+
+from lxml import etree
+
+from parallel_pages import scan_page_ranges, split_and_analyze
+from split_pages import split_word_by_pages
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+W = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+
+# 第二段的文本框里嵌套了带 sectPr 的段落：不是页面分割点
+DOC = f'''<?xml version="1.0" encoding="UTF-8"?>
+<w:document xmlns:w="{W}"><w:body>
+<w:p><w:r><w:t>第一页</w:t></w:r></w:p>
+<w:p><w:r><w:txbxContent><w:p><w:pPr><w:sectPr/></w:pPr></w:p></w:txbxContent></w:r></w:p>
+<w:p><w:pPr><w:sectPr><w:pgSz w:w="11906"/></w:sectPr></w:pPr></w:p>
+<w:tbl><w:tr><w:tc><w:p><w:pPr><w:sectPr/></w:pPr></w:p></w:tc></w:tr></w:tbl>
+<w:p><w:r><w:t>第二页</w:t></w:r></w:p>
+<w:sectPr/>
+</w:body></w:document>'''.encode('utf-8')
+
+
+def page_sizes(directory):
+    files = sorted(glob.glob(os.path.join(directory, 'page_*.xml')),
+                   key=lambda f: int(f.rsplit('_', 1)[1].split('.')[0]))
+    return [len(etree.parse(f).getroot()[0]) for f in files]
+
+
+def test_only_the_paragraph_own_sectpr_ends_a_page():
+    _, _, pages = scan_page_ranges(DOC)
+    assert [count for _, _, count in pages] == [3, 3]
+
+
+def test_parallel_split_matches_serial_split(tmp_path):
+    source = tmp_path / 'doc.xml'
+    source.write_bytes(DOC)
+    for path in (str(source), os.path.join(ROOT, 'template.docx')):
+        serial, parallel = tmp_path / 'serial', tmp_path / 'parallel'
+        for directory in (serial, parallel):
+            for f in glob.glob(str(directory / '*.xml')):
+                os.remove(f)
+        split_word_by_pages(path, str(serial))
+        split_and_analyze(path, str(parallel), workers=1, analyze=False)
+        assert page_sizes(str(parallel)) == page_sizes(str(serial))
@@ -0,0 +1,16 @@
+from prompt_library import PromptLibrary
+
+
+def test_filtered_data_stays_out_of_the_cached_prefix():
+    # 提供的数据按页筛选、每页不同：必须在缓存断点（共用上下文）之后
+    for name, fields in (('tender_form', 'fields_to_fill'), ('field_repair', 'failed_fields')):
+        template = PromptLibrary.get_template(name)
+        parts = [template.format_parts(page_num=n, page_title=f'第{n}页', provided_data=data, **{fields: '-'})
+                 for n, data in ((1, '投标人名称: ACME'), (2, '开户银行: 工商银行'))]
+        assert parts[0][:2] == parts[1][:2]
+        assert 'ACME' in parts[0][2] and 'ACME' not in parts[0][1]
+
+
+def test_repair_template_shares_the_form_prefix():
+    form, repair = PromptLibrary.get_template('tender_form'), PromptLibrary.get_template('field_repair')
+    assert (form.system_prompt, form.context_template) == (repair.system_prompt, repair.context_template)
@@ -0,0 +1,83 @@
+import os
+
+import pytest
+
+from search_index import SearchIndex
+
+W = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+CLAUSE = '投标保证金为人民币伍万元整。'
+
+
+def write_page(directory, page_num, *paragraphs, table=None):
+    """写一个页面文件；table 为 [[单元格文本, ...], ...]"""
+    body = ''.join(f'<w:p><w:r><w:t>{text}</w:t></w:r></w:p>' for text in paragraphs)
+    if table:
+        rows = ''.join('<w:tr>' + ''.join(f'<w:tc><w:p><w:r><w:t>{text}</w:t></w:r></w:p></w:tc>' if text else
+                                          '<w:tc><w:p/></w:tc>' for text in row) + '</w:tr>' for row in table)
+        body += f'<w:tbl>{rows}</w:tbl>'
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, f'page_{page_num}.xml'), 'w', encoding='utf-8') as f:
+        f.write(f'<w:document xmlns:w="{W}"><w:body>{body}</w:body></w:document>')
+
+
+@pytest.fixture
+def index():
+    with SearchIndex(':memory:') as index:
+        yield index
+
+
+def locations(hits):
+    return sorted((os.path.basename(hit['path']), hit['page_num'], hit['location']) for hit in hits)
+
+
+def test_index_and_query_round_trip(tmp_path, index):
+    pages = tmp_path / 'bid_a'
+    write_page(pages, 1, '第一章 投标须知', CLAUSE)
+    write_page(pages, 2, '联系电话：${联系电话}', CLAUSE, table=[['投标人名称', ''], ['注册资本', '100万元']])
+
+    assert index.index_path(str(tmp_path)) == {'sources': 1, 'skipped': 0, 'pages': 2, 'extracted': 2}
+    hits = index.search('投标保证金')
+    assert locations(hits) == [('bid_a', 1, '第2段'), ('bid_a', 2, '第2段')]
+    assert hits[0]['snippet'] == '[投标保证金]为人民币伍万元整。' and hits[0]['slot'] == 0
+    # 两页中相同的条款只存一行
+    assert index.stats() == {'sources': 1, 'pages': 2, 'contents': 2, 'occurrences': 8, 'units': 7}
+
+    cell, = index.search('投标人名称', kinds=['cell'], slots_only=True)
+    assert (cell['page_num'], cell['location'], cell['label'], cell['slot']) == (2, '表格0 第0行第1列', '投标人名称', 1)
+    phone, = index.search('电话')
+    assert phone['slot'] == 1 and phone['snippet'] == '联系[电话]：${联系电话}'
+    assert [hit['page_num'] for hit in index.search('投标须知 保证金', kinds=['page'])] == [1]
+    assert index.search('不存在的条款') == [] and index.search('  ') == []
+    assert index.page_previews(str(pages)) == [(1, '第一章 投标须知 ' + CLAUSE),
+                                               (2, '联系电话：${联系电话} ' + CLAUSE + ' 投标人名称 注册资本 100万元')]
+
+
+def test_reindex_skips_unchanged_and_replaces_updated_pages(tmp_path, index):
+    bid_a, bid_b = tmp_path / 'bid_a', tmp_path / 'bid_b'
+    write_page(bid_a, 1, CLAUSE)
+    write_page(bid_a, 2, '工期：九十日历天')
+    write_page(bid_b, 1, CLAUSE)
+    assert index.index_path(str(tmp_path))['extracted'] == 2
+    assert index.index_path(str(tmp_path)) == {'sources': 0, 'skipped': 2, 'pages': 0, 'extracted': 0}
+
+    write_page(bid_a, 2, '工期：一百二十日历天')
+    assert index.index_path(str(bid_a)) == {'sources': 1, 'skipped': 0, 'pages': 2, 'extracted': 1}
+    assert locations(index.search('一百二十日历天')) == [('bid_a', 2, '第1段')]
+    assert index.search('九十日历天') == []
+    assert locations(index.search(CLAUSE, path_prefix=str(bid_b))) == [('bid_b', 1, '第1段')]
+
+    assert index.prune() == {'sources': 0, 'contents': 1}
+    assert index.stats()['contents'] == 2 and index.stats()['units'] == 2
+    os.remove(bid_b / 'page_1.xml')
+    os.rmdir(bid_b)
+    assert index.prune() == {'sources': 1, 'contents': 0}
+    assert locations(index.search(CLAUSE)) == [('bid_a', 1, '第1段')]
+
+
+def test_index_docx_pages_by_section(index):
+    template = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'template.docx')
+    stats = index.index_path(template)
+    assert stats['pages'] == stats['extracted'] == 33
+    hits = index.search('项目名称', kinds=['cell'], slots_only=True, limit=50)
+    assert hits and all(hit['label'] == '项目名称' and hit['xpath'].startswith('/w:document/w:body/')
+                        for hit in hits)
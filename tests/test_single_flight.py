@@ -0,0 +1,207 @@
+import json
+import re
+import threading
+import time
+from collections import Counter
+
+from lxml import etree
+
+from llm_connector import LLMConfig, LLMProvider
+from process_with_llm import LLMPageProcessor, XMLPageAnalyzer, new_page_flight, process_page, process_pages_batch
+from single_flight import SingleFlight
+
+W = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+FIELD_RE = re.compile(r'^  - (?:\[空白\]|\$\{[^}]+\}) \(([^)]+)\): (.*)$', re.M)
+VALUES = {'投标人名称': 'ACME', '法定代表人': '张三', '联系电话': '010-1234', '邮政编码': None}
+
+
+def analyzer(*paragraphs: str) -> XMLPageAnalyzer:
+    """每段为 "标签：" 加一个空白 run；段落中的 "|" 表示再接一个空白"""
+    body = ''
+    for text in paragraphs:
+        runs = ''.join(f'<w:r><w:t>{part}</w:t></w:r><w:r><w:t>____</w:t></w:r>' for part in text.split('|'))
+        body += f'<w:p>{runs}</w:p>'
+    xml = f'<w:document xmlns:w="{W}"><w:body>{body}</w:body></w:document>'
+    return XMLPageAnalyzer('unused.xml', etree.ElementTree(etree.fromstring(xml.encode('utf-8'))))
+
+
+def texts(page: XMLPageAnalyzer):
+    return [t.text for t in page.root.iter(f'{{{W}}}t')]
+
+
+class FakeLLM:
+    """按提示词中列出的字段位置作答的连接器，记录每次被询问的字段"""
+
+    def __init__(self, delay: float = 0.0, fail: bool = False):
+        self.config = LLMConfig(provider=LLMProvider.OPENAI, api_key='k', api_url='http://unused', model='m',
+                                repair_rounds=0)
+        self.delay = delay
+        self.fail = fail
+        self.asked = []
+        self.lock = threading.Lock()
+
+    def call(self, prompt, system_prompt=None, context=None, schema=None, **kwargs):
+        labels, updates = [], []
+        seen = Counter()
+        for xpath, text in FIELD_RE.findall(prompt):
+            seen[text] += 1
+            label = sorted((text.find(name), name) for name in VALUES if name in text)[seen[text] - 1][1]
+            labels.append(label)
+            if VALUES[label] is not None:
+                updates.append({'xpath': xpath, 'old_content': '____', 'new_content': VALUES[label]})
+        with self.lock:
+            self.asked.append(labels)
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError('service down')
+        return json.dumps({'fields_filled': [], 'unfilled_fields': [], 'xml_updates': updates}, ensure_ascii=False)
+
+    def call_batch(self, calls, work_dir, name, poll_interval=None, timeout=None):
+        return {call.pop('custom_id'): {'text': self.call(**call)} for call in calls}
+
+
+def run(llm, pages, flight):
+    results = []
+    for page_num, page in enumerate(pages, 1):
+        result = process_page(LLMPageProcessor(llm), page_num, page.get_page_info(), {'data': {}}, flight=flight)
+        if result['status'] == 'success':
+            page.apply_updates(result['updates'])
+        results.append(result)
+    return results
+
+
+def test_field_shared_across_pages_with_different_neighbours():
+    pages = [analyzer('投标人名称：', '法定代表人：'), analyzer('投标人名称：', '联系电话：')]
+    llm = FakeLLM()
+    first, second = run(llm, pages, new_page_flight())
+
+    assert llm.asked == [['投标人名称', '法定代表人'], ['联系电话']]
+    assert second['shared_fields'] == 1 and second['shared_from'] == [1] and second['llm_calls'] == 1
+    assert 'shared_from' not in first
+    assert texts(pages[0]) == ['投标人名称：', 'ACME', '法定代表人：', '张三']
+    assert texts(pages[1]) == ['投标人名称：', 'ACME', '联系电话：', '010-1234']
+
+
+def test_page_with_only_known_fields_makes_no_call():
+    pages = [analyzer('投标人名称：', '法定代表人：'), analyzer('法定代表人：')]
+    llm = FakeLLM()
+    _, second = run(llm, pages, new_page_flight())
+    assert len(llm.asked) == 1
+    assert second['llm_calls'] == 0 and texts(pages[1]) == ['法定代表人：', '张三']
+
+
+def test_blanks_in_one_paragraph_keep_their_own_answers():
+    pages = [analyzer('投标人名称：|法定代表人：'), analyzer('投标人名称：|法定代表人：')]
+    llm = FakeLLM()
+    run(llm, pages, new_page_flight())
+    assert len(llm.asked) == 1
+    assert texts(pages[1]) == ['投标人名称：', 'ACME', '法定代表人：', '张三']
+
+
+def test_unanswered_and_failed_fields_are_asked_again():
+    llm = FakeLLM()
+    flight = new_page_flight()
+    run(llm, [analyzer('邮政编码：'), analyzer('邮政编码：')], flight)
+    assert llm.asked == [['邮政编码'], ['邮政编码']]
+
+    down = FakeLLM(fail=True)
+    failed = run(down, [analyzer('投标人名称：')], flight)[0]
+    assert failed['status'] == 'failed'
+    up = FakeLLM()
+    page = analyzer('投标人名称：')
+    run(up, [page], flight)
+    assert up.asked == [['投标人名称']] and texts(page)[1] == 'ACME'
+
+
+def test_label_less_blanks_are_not_shared():
+    pages = [analyzer(''), analyzer('投标人名称：', '')]
+    keys = [LLMPageProcessor(FakeLLM()).field_keys(page.get_page_info(), {'data': {}}) for page in pages]
+    assert keys[0][0] != keys[1][1]
+
+
+def test_concurrent_pages_ask_each_field_once():
+    llm = FakeLLM(delay=0.05)
+    flight = new_page_flight()
+    pages = [analyzer('投标人名称：', '法定代表人：') for _ in range(4)] + [analyzer('投标人名称：', '联系电话：')]
+    results = [None] * len(pages)
+
+    def work(i):
+        results[i] = process_page(LLMPageProcessor(llm), i + 1, pages[i].get_page_info(), {'data': {}},
+                                  flight=flight)
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(len(pages))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    asked = Counter(label for labels in llm.asked for label in labels)
+    assert asked == {'投标人名称': 1, '法定代表人': 1, '联系电话': 1}
+    for page, result in zip(pages, results):
+        page.apply_updates(result['updates'])
+        assert texts(page)[1] == 'ACME'
+
+
+def test_batch_submits_each_field_once(tmp_path):
+    llm = FakeLLM()
+    pages = [analyzer('投标人名称：', '法定代表人：'), analyzer('投标人名称：', '联系电话：'), analyzer('法定代表人：')]
+    results = process_pages_batch(LLMPageProcessor(llm), [(i, page.get_page_info(), {'data': {}})
+                                                          for i, page in enumerate(pages, 1)], str(tmp_path))
+    assert llm.asked == [['投标人名称', '法定代表人'], ['联系电话']]
+    assert results[3]['llm_calls'] == 0 and results[3]['shared_from'] == [1]
+    for page_num, page in enumerate(pages, 1):
+        page.apply_updates(results[page_num]['updates'])
+    assert texts(pages[1]) == ['投标人名称：', 'ACME', '联系电话：', '010-1234']
+    assert texts(pages[2]) == ['法定代表人：', '张三']
+
+
+def test_do_many_runs_missing_keys_only():
+    flight = SingleFlight()
+    assert flight.do_many(['a', 'b'], lambda keys: {k: k.upper() for k in keys}) == {
+        'a': ('A', False), 'b': ('B', False)}
+    calls = []
+    result = flight.do_many(['b', 'c'], lambda keys: calls.append(keys) or {k: k.upper() for k in keys})
+    assert calls == [['c']] and result == {'b': ('B', True), 'c': ('C', False)}
+
+
+def test_concurrent_identical_calls_run_once():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow(value):
+        calls.append(value)
+        started.set()
+        release.wait(5)
+        return value * 2
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do('k', slow, 21)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(flight.do('k', slow, 21))) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+
+    assert calls == [21]
+    assert sorted(shared for _, shared in results) == [False, True, True, True]
+    assert all(value == 42 for value, _ in results)
+    assert flight.saved() == 3
+
+
+def test_errors_are_not_cached():
+    flight = SingleFlight()
+
+    def fail():
+        raise RuntimeError('boom')
+
+    for _ in range(2):
+        try:
+            flight.do('k', fail)
+        except RuntimeError:
+            pass
+    assert flight.stats['calls'] == 2
+    assert flight.do('k', lambda: 'ok') == ('ok', False)
@@ -0,0 +1,93 @@
+import zipfile
+
+import pytest
+
+from stream_patcher import patch_docx
+
+NAMESPACES = ('xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" '
+              'xmlns:w14="http://schemas.microsoft.com/office/word/2010/wordml" '
+              'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"')
+HEAD = f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\r\n<w:document {NAMESPACES}><w:body>'
+TAIL = '</w:body></w:document>'
+CHILDREN = [
+    '<w:p w14:paraId="00000001"><w:r><w:t>项目：${项目名称}</w:t></w:r></w:p>',
+    '<w:p w14:paraId="00000002"><w:pPr><w:jc w:val="center"/></w:pPr>'
+    '<w:r><w:rPr><w:b/></w:rPr><w:t xml:space="preserve">法人：____ </w:t></w:r></w:p>',
+    '<w:tbl><w:tr><w:tc><w:p><w:r><w:t>金额</w:t></w:r></w:p></w:tc>'
+    '<w:tc><w:p><w:r><w:t>____</w:t></w:r></w:p></w:tc></w:tr></w:tbl>',
+    '<w:p><w:r><w:t>编号：${包编号}</w:t></w:r>'
+    '<mc:AlternateContent xmlns:mc="http://schemas.openxmlformats.org/markup-compatibility/2006"/></w:p>',
+    '<w:sectPr><w:pgSz w:w="11906" w:h="16838"/><w:pgMar w:top="1440" r:id="rId1"/></w:sectPr>',
+]
+DOCUMENT = HEAD + ''.join(CHILDREN) + TAIL
+PARTS = {
+    '[Content_Types].xml': '<?xml version="1.0"?><Types/>',
+    'word/document.xml': DOCUMENT,
+    'word/header1.xml': f'<w:hdr {NAMESPACES}><w:p><w:r><w:t>${{项目名称}}</w:t></w:r></w:p></w:hdr>',
+    'word/header2.xml': f'<w:hdr {NAMESPACES}><w:p><w:r><w:t>${{包编号}}</w:t></w:r></w:p></w:hdr>',
+    'word/styles.xml': '<w:styles/>',
+    'word/media/image1.png': b'\x89PNG\r\n\x1a\n\x00\xff',
+}
+
+
+@pytest.fixture
+def template(tmp_path):
+    path = tmp_path / 'template.docx'
+    with zipfile.ZipFile(path, 'w') as z:
+        for name, data in PARTS.items():
+            z.writestr(name, data)
+    return path
+
+
+def patched_parts(template, edits):
+    output = template.parent / 'output.docx'
+    stats = patch_docx(str(template), edits, str(output))
+    with zipfile.ZipFile(output) as z:
+        return stats, {name: z.read(name) for name in z.namelist()}
+
+
+def original(name):
+    data = PARTS[name]
+    return data if isinstance(data, bytes) else data.encode('utf-8')
+
+
+def test_placeholder_patch_leaves_everything_else_byte_identical(template):
+    stats, parts = patched_parts(template, [{'placeholder': '项目名称', 'text': 'XX项目'}])
+
+    assert stats['applied'] == 1 and stats['patched_elements'] == 1 and stats['other_parts_patched'] == 1
+    expected = DOCUMENT.replace(CHILDREN[0], '<w:p w14:paraId="00000001"><w:r>'
+                                             '<w:t xml:space="preserve">项目：XX项目</w:t></w:r></w:p>')
+    assert parts['word/document.xml'] == expected.encode('utf-8')
+    assert list(parts) == list(PARTS)
+    assert b'XX\xe9\xa1\xb9\xe7\x9b\xae' in parts['word/header1.xml']
+    for name in PARTS:
+        if name not in ('word/document.xml', 'word/header1.xml'):
+            assert parts[name] == original(name), name
+
+
+@pytest.mark.parametrize('edit, child, patched', [
+    ({'para_id': '00000002', 'old': '____', 'text': '张三'}, 1,
+     '<w:p w14:paraId="00000002"><w:pPr><w:jc w:val="center"/></w:pPr>'
+     '<w:r><w:rPr><w:b/></w:rPr><w:t xml:space="preserve">法人：张三 </w:t></w:r></w:p>'),
+    ({'xpath': '/w:document/w:body/w:tbl[1]/w:tr[1]/w:tc[2]/w:p', 'text': '100万元'}, 2,
+     '<w:tbl><w:tr><w:tc><w:p><w:r><w:t>金额</w:t></w:r></w:p></w:tc>'
+     '<w:tc><w:p><w:r><w:t xml:space="preserve">100万元</w:t></w:r></w:p></w:tc></w:tr></w:tbl>'),
+    ({'xpath': '/w:document/w:body/w:p[3]/w:r[1]/w:t', 'text': '编号：A-01'}, 3,
+     '<w:p><w:r><w:t xml:space="preserve">编号：A-01</w:t></w:r>'
+     '<mc:AlternateContent xmlns:mc="http://schemas.openxmlformats.org/markup-compatibility/2006"/></w:p>'),
+])
+def test_addressed_edit_changes_only_its_element(template, edit, child, patched):
+    stats, parts = patched_parts(template, [edit])
+
+    assert stats['applied'] == 1 and stats['other_parts_patched'] == 0
+    document = HEAD + ''.join(patched if i == child else c for i, c in enumerate(CHILDREN)) + TAIL
+    assert parts['word/document.xml'] == document.encode('utf-8')
+    for name in PARTS:
+        if name != 'word/document.xml':
+            assert parts[name] == original(name), name
+
+
+def test_unmatched_edit_keeps_document_byte_identical(template):
+    stats, parts = patched_parts(template, [{'para_id': 'FFFFFFFF', 'text': 'x'}])
+    assert stats['unmatched'] == [{'para_id': 'FFFFFFFF', 'text': 'x'}]
+    assert parts['word/document.xml'] == original('word/document.xml')
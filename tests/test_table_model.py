@@ -0,0 +1,85 @@
+import os
+
+from lxml import etree
+
+from table_model import TableModel, expand_table_rows, load_tables
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+W = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+
+
+def cell(text='', span=1, vmerge=None):
+    props = ''
+    if span > 1:
+        props += f'<w:gridSpan w:val="{span}"/>'
+    if vmerge is not None:
+        props += f'<w:vMerge w:val="{vmerge}"/>' if vmerge else '<w:vMerge/>'
+    run = f'<w:r><w:t>{text}</w:t></w:r>' if text else ''
+    return f'<w:tc><w:tcPr>{props}</w:tcPr><w:p>{run}</w:p></w:tc>'
+
+
+def table(*rows) -> TableModel:
+    body = ''.join(f'<w:tr>{"".join(row)}</w:tr>' for row in rows)
+    return TableModel(etree.fromstring(f'<w:tbl xmlns:w="{W}">{body}</w:tbl>'.encode('utf-8')))
+
+
+def test_grid_span_covers_grid_columns():
+    model = table([cell('序号'), cell('名称', span=2), cell('备注')],
+                  [cell(), cell(), cell(), cell()])
+    assert model.width == 4
+    assert model.grid[0] == [0, 1, 1, 2]
+    assert model.cells[2].col == 3
+    assert model.header_rows == 1
+    assert [model.column_header(c) for c in range(4)] == ['序号', '名称', '名称', '备注']
+
+
+def test_vmerge_continuation_joins_the_start_cell():
+    model = table([cell('姓名'), cell('项目经理', vmerge='restart'), cell('')],
+                  [cell('职称'), cell(vmerge=''), cell('')])
+    merged = model.cells[model.grid[0][1]]
+    assert model.grid[1][1] == model.grid[0][1]
+    assert merged.row_span == 2
+    # 续行的 w:tc 指向起始单元格
+    assert model.row_cell_ids[1][1] == model.grid[0][1]
+    assert not model.row_is_blank(1)
+
+
+def test_two_row_header_joins_labels_per_column():
+    model = table([cell('序号', vmerge='restart'), cell('姓名', vmerge='restart'),
+                   cell('资格证明', span=2), cell('备注', vmerge='restart')],
+                  [cell(vmerge=''), cell(vmerge=''), cell('证书名称'), cell('证号'), cell(vmerge='')],
+                  [cell(), cell(), cell(), cell(), cell()])
+    assert model.header_rows == 2
+    assert [model.column_header(c) for c in range(5)] == [
+        '序号', '姓名', '资格证明_证书名称', '资格证明_证号', '备注']
+    assert model.detect_row_template() == 2
+    assert [c['header'] for c in model.empty_cells()][2:4] == ['资格证明_证书名称', '资格证明_证号']
+
+
+def test_filled_data_row_is_not_a_sub_header():
+    model = table([cell('序号'), cell('姓名'), cell('职务')],
+                  [cell('1'), cell('张三'), cell('项目经理')],
+                  [cell(), cell(), cell()])
+    assert model.header_rows == 1
+
+
+def test_template_certificate_columns_have_their_own_headers():
+    _, tables = load_tables(os.path.join(ROOT, 'template.docx'))
+    staff = tables[6]
+    assert staff.header_rows == 2
+    assert [staff.column_header(c) for c in range(5, 8)] == [
+        '执业或职业资格证明_证书名称', '执业或职业资格证明_级别', '执业或职业资格证明_证号']
+
+
+def test_expanding_staff_table_fills_certificate_columns_separately(tmp_path):
+    staff = [{'姓名': '张三', '证书名称': '建造师', '级别': '一级', '证号': 'A001'},
+             {'姓名': '李四', '执业或职业资格证明_证书名称': '造价师', '执业或职业资格证明_级别': '二级',
+              '执业或职业资格证明_证号': 'B002'}]
+    output = str(tmp_path / 'staff.docx')
+    results = expand_table_rows(os.path.join(ROOT, 'template.docx'), [{'records': staff}], output)
+    assert results[0]['table_index'] == 6
+
+    table = load_tables(output)[1][6]
+    rows = [[table.text_at(r, c) for c in range(table.width)] for r in (2, 3)]
+    assert rows[0][:3] == ['1', '', '张三'] and rows[0][5:8] == ['建造师', '一级', 'A001']
+    assert rows[1][:3] == ['2', '', '李四'] and rows[1][5:8] == ['造价师', '二级', 'B002']
@@ -0,0 +1,31 @@
+import importlib
+import sys
+
+import workflow_metrics
+
+
+def test_metrics_without_resource_or_psutil(monkeypatch):
+    # Windows 上没有 resource 模块；也没有安装 psutil
+    monkeypatch.setitem(sys.modules, 'resource', None)
+    monkeypatch.setitem(sys.modules, 'psutil', None)
+    module = importlib.reload(workflow_metrics)
+    try:
+        assert module.peak_rss_kb() is None
+        metrics = module.WorkflowMetrics('win')
+        with metrics.stage('split'):
+            pass
+        summary = metrics.summary()
+        assert summary['rss_peak_kb'] is None
+        assert summary['stages']['split']['rss_delta_kb'] is None
+        text = metrics.to_prometheus()
+        assert 'stage_wall_seconds' in text and 'rss_peak_bytes{' not in text
+        assert module.format_mb(None) == 'n/a'
+    finally:
+        monkeypatch.undo()
+        importlib.reload(workflow_metrics)
+
+
+def test_peak_rss_reported_with_resource():
+    rss = workflow_metrics.peak_rss_kb()
+    assert rss is None or rss > 0
+    assert workflow_metrics.format_mb(2048) == '2 MB'
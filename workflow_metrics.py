@@ -0,0 +1,238 @@
+"""
+工作流性能指标
+按阶段/按页记录耗时、CPU、内存与吞吐量，输出 JSON 和 Prometheus textfile
+"""
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_kb(children: bool = True) -> Optional[int]:
+    """
+    峰值常驻内存（KB）
+
+    :param children: 同时计入已结束的子进程（取两者较大值；Windows 上只统计本进程）
+    :return: 没有 resource 模块（Windows）时用 psutil 的峰值工作集，两者都不可用时为 None
+    """
+    if resource is not None:
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if children:
+            rss = max(rss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+        # macOS 以字节为单位，Linux 以KB为单位
+        return rss // 1024 if sys.platform == 'darwin' else rss
+    try:
+        import psutil
+    except ImportError:
+        return None
+    info = psutil.Process().memory_info()
+    return getattr(info, 'peak_wset', info.rss) // 1024
+
+
+def format_mb(kb: Optional[int]) -> str:
+    """KB 数值格式化为 MB；不可用时为 n/a"""
+    return 'n/a' if kb is None else f'{kb // 1024} MB'
+
+
+def _cpu_seconds() -> float:
+    """当前进程及已结束子进程的CPU时间"""
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class WorkflowMetrics:
+    """工作流指标收集器"""
+
+    def __init__(self, run_name: str = 'tender_workflow', trace_memory: bool = False):
+        """
+        :param run_name: 运行名称（Prometheus 标签 run）
+        :param trace_memory: 是否启用 tracemalloc 统计Python内存分配（有额外开销）
+        """
+        self.run_name = run_name
+        self.trace_memory = trace_memory
+        self.started_at = datetime.now()
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self.pages: List[Dict[str, Any]] = []
+        self.counters: Dict[str, float] = {}
+        self._start_wall = time.perf_counter()
+
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        测量一个阶段
+
+        用法:
+            with metrics.stage('split'):
+                split_word_by_pages(...)
+        """
+        record = {'status': 'ok'}
+        rss_before = peak_rss_kb()
+        if self.trace_memory:
+            traced_before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        cpu_start = _cpu_seconds()
+        wall_start = time.perf_counter()
+
+        try:
+            yield record
+        except BaseException:
+            record['status'] = 'error'
+            raise
+        finally:
+            record['wall_s'] = round(time.perf_counter() - wall_start, 4)
+            record['cpu_s'] = round(_cpu_seconds() - cpu_start, 4)
+            rss_peak = peak_rss_kb()
+            record['rss_peak_kb'] = rss_peak
+            record['rss_delta_kb'] = None if rss_peak is None else rss_peak - rss_before
+            if self.trace_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                record['tracemalloc_peak_kb'] = (peak - traced_before) // 1024
+                record['tracemalloc_delta_kb'] = (current - traced_before) // 1024
+            self.stages[name] = record
+
+    @contextmanager
+    def page(self, stage: str, page_num: int):
+        """
+        测量单页处理，可在 with 块内设置 record['slots']
+
+        用法:
+            with metrics.page('llm', 3) as record:
+                record['slots'] = len(fields)
+        """
+        record = {'stage': stage, 'page': page_num, 'slots': 0}
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['wall_s'] = round(time.perf_counter() - wall_start, 5)
+            record['cpu_s'] = round(time.process_time() - cpu_start, 5)
+            self.pages.append(record)
+
+    def record_page(self, stage: str, page_num: int, wall_s: float, cpu_s: float = 0.0, slots: int = 0):
+        """记录已在别处测得的单页耗时（如工作进程返回的结果）"""
+        self.pages.append({'stage': stage, 'page': page_num, 'slots': slots,
+                           'wall_s': round(wall_s, 5), 'cpu_s': round(cpu_s, 5)})
+
+    def incr(self, name: str, value: float = 1):
+        """累加计数器"""
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def summary(self) -> Dict[str, Any]:
+        """汇总指标"""
+        total_wall = time.perf_counter() - self._start_wall
+
+        page_stats = {}
+        for stage in dict.fromkeys(p['stage'] for p in self.pages):
+            records = [p for p in self.pages if p['stage'] == stage]
+            walls = [p['wall_s'] for p in records]
+            slots = sum(p['slots'] for p in records)
+            elapsed = self.stages.get(stage, {}).get('wall_s') or sum(walls)
+            page_stats[stage] = {
+                'pages': len(records),
+                'slots': slots,
+                'wall_p50_s': round(_percentile(walls, 0.5), 5),
+                'wall_p95_s': round(_percentile(walls, 0.95), 5),
+                'wall_max_s': round(max(walls), 5),
+                'cpu_s': round(sum(p['cpu_s'] for p in records), 4),
+                'pages_per_s': round(len(records) / elapsed, 3) if elapsed else 0.0,
+                'slots_per_s': round(slots / elapsed, 3) if elapsed else 0.0,
+            }
+
+        return {
+            'run': self.run_name,
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'wall_s': round(total_wall, 4),
+            'rss_peak_kb': peak_rss_kb(),
+            'stages': self.stages,
+            'page_stats': page_stats,
+            'counters': self.counters,
+            'pages': self.pages,
+        }
+
+    def write_json(self, path: str) -> str:
+        """输出JSON指标文件"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.summary(), f, ensure_ascii=False, indent=2)
+        return path
+
+    def to_prometheus(self, prefix: str = 'tender') -> str:
+        """生成 Prometheus 文本格式"""
+        summary = self.summary()
+        run = self.run_name.replace('"', '')
+        lines = []
+
+        def metric(name, help_text, samples):
+            lines.append(f'# HELP {prefix}_{name} {help_text}')
+            lines.append(f'# TYPE {prefix}_{name} gauge')
+            for labels, value in samples:
+                if value is None:
+                    continue
+                label_str = ','.join(f'{k}="{v}"' for k, v in (('run', run),) + labels)
+                lines.append(f'{prefix}_{name}{{{label_str}}} {value}')
+
+        stages = summary['stages'].items()
+        metric('stage_wall_seconds', 'Wall-clock time per workflow stage.',
+               [((('stage', s),), r['wall_s']) for s, r in stages])
+        metric('stage_cpu_seconds', 'CPU time per workflow stage, including child processes.',
+               [((('stage', s),), r['cpu_s']) for s, r in stages])
+        metric('stage_rss_peak_bytes', 'Peak resident set size observed at the end of the stage.',
+               [((('stage', s),), r['rss_peak_kb'] and r['rss_peak_kb'] * 1024) for s, r in stages])
+        metric('stage_success', 'Whether the stage finished without an exception.',
+               [((('stage', s),), int(r['status'] == 'ok')) for s, r in stages])
+        if self.trace_memory:
+            metric('stage_tracemalloc_peak_bytes', 'Peak Python heap growth during the stage.',
+                   [((('stage', s),), r.get('tracemalloc_peak_kb', 0) * 1024) for s, r in stages])
+
+        page_stats = summary['page_stats'].items()
+        metric('pages_total', 'Pages processed per stage.',
+               [((('stage', s),), r['pages']) for s, r in page_stats])
+        metric('slots_total', 'Fill slots processed per stage.',
+               [((('stage', s),), r['slots']) for s, r in page_stats])
+        metric('pages_per_second', 'Page throughput per stage.',
+               [((('stage', s),), r['pages_per_s']) for s, r in page_stats])
+        metric('slots_per_second', 'Slot throughput per stage.',
+               [((('stage', s),), r['slots_per_s']) for s, r in page_stats])
+        metric('page_wall_seconds', 'Per-page wall-clock time quantiles.',
+               [((('stage', s), ('quantile', q)), r[key]) for s, r in page_stats
+                for q, key in (('0.5', 'wall_p50_s'), ('0.95', 'wall_p95_s'), ('1', 'wall_max_s'))])
+
+        for name, value in summary['counters'].items():
+            metric(name, f'Workflow counter {name}.', [((), value)])
+
+        metric('run_wall_seconds', 'Total wall-clock time of the run.', [((), summary['wall_s'])])
+        metric('run_rss_peak_bytes', 'Peak resident set size of the run.',
+               [((), summary['rss_peak_kb'] and summary['rss_peak_kb'] * 1024)])
+        metric('run_timestamp_seconds', 'Unix time when the run started.',
+               [((), int(self.started_at.timestamp()))])
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path: str, prefix: str = 'tender') -> str:
+        """
+        输出 node_exporter textfile collector 格式文件（先写临时文件再原子替换）
+        """
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus(prefix))
+        os.replace(tmp_path, path)
+        return path
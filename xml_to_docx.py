@@ -4,6 +4,7 @@
 import zipfile
 import shutil
 import os
+import tempfile
 from lxml import etree
 
 def xml_to_docx(xml_file, output_docx, template_docx='template.docx'):
@@ -24,13 +25,10 @@ def xml_to_docx(xml_file, output_docx, template_docx='template.docx'):
         print(f"错误：未找到XML文件 {xml_file}")
         return False
     
+    # 创建临时目录（每次调用独立，允许多个任务并行）
+    temp_dir = tempfile.mkdtemp(prefix='_temp_docx_')
+    
     try:
-        # 创建临时目录
-        temp_dir = '_temp_docx_'
-        if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
-        os.makedirs(temp_dir)
-        
         print("解析模板Word文档...")
         # 解压模板docx文件
         with zipfile.ZipFile(template_docx, 'r') as zip_ref: